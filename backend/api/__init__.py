@@ -3,3 +3,9 @@ from flask import Blueprint
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
 from . import recipes  # noqa: E402, F401
+from . import batch  # noqa: E402, F401
+from . import routing  # noqa: E402, F401
+from . import jobs  # noqa: E402, F401
+from . import metrics  # noqa: E402, F401
+from . import tracing  # noqa: E402, F401
+from . import keypool  # noqa: E402, F401
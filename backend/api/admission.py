@@ -0,0 +1,253 @@
+"""Admission control: concurrency caps with a bounded, deadline-limited wait queue."""
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator
+
+from config import Config
+
+# Weight of the newest sample in the moving average of slot hold times.
+HOLD_SMOOTHING = 0.2
+
+
+class Saturated(Exception):
+    """Raised when a call cannot get a slot; carries a Retry-After estimate."""
+
+    def __init__(self, name: str, reason: str, retry_after: int):
+        """Describe the rejected call.
+
+        Args:
+            name: Lane that was saturated (provider name or 'requests')
+            reason: 'queue_full' when the wait queue had no room,
+                'queue_timeout' when no slot freed up in time
+            retry_after: Suggested whole seconds before retrying
+        """
+        super().__init__(f'{name} is saturated ({reason})')
+        self.name = name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _LoopWaiter:
+    """Queue entry for a coroutine, woken on its event loop by set() from any thread."""
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._future = self._loop.create_future()
+        self._set = False
+
+    def set(self) -> None:
+        self._set = True
+        self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        if not self._future.done():
+            self._future.set_result(None)
+
+    def is_set(self) -> bool:
+        return self._set
+
+    async def wait(self, timeout: float) -> None:
+        try:
+            await asyncio.wait_for(asyncio.shield(self._future), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class _Lane:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self.waiters: Deque[threading.Event | _LoopWaiter] = deque()
+        self.hold_seconds: float | None = None
+        self.shed = 0
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent calls per name, queueing a bounded number of callers.
+
+    A call runs at once while its lane has a free slot. Otherwise it joins
+    the lane's FIFO queue, unless max_queue callers are already waiting, and
+    is rejected if no slot is handed to it within queue_timeout seconds. A
+    released slot passes straight to the oldest waiter, so newcomers cannot
+    overtake the queue. Rejections carry a Retry-After estimate from the
+    lane's recent slot hold times and queue length.
+    """
+
+    def __init__(self, limits: Dict[str, int], *, default_limit: int, max_queue: int, queue_timeout: float):
+        """Create the limiter.
+
+        Args:
+            limits: Mapping of name to its maximum concurrent calls (0 = unlimited)
+            default_limit: Cap for names missing from limits
+            max_queue: Callers allowed to wait per name; 0 rejects as soon as all slots are busy
+            queue_timeout: Seconds a caller may wait for a slot
+        """
+        self.limits = dict(limits)
+        self.default_limit = default_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._lanes: Dict[str, _Lane] = {}
+        self._lock = threading.Lock()
+
+    def _lane(self, name: str) -> _Lane:
+        lane = self._lanes.get(name)
+        if lane is None:
+            lane = _Lane(self.limits.get(name, self.default_limit))
+            self._lanes[name] = lane
+        return lane
+
+    def _retry_after(self, lane: _Lane) -> int:
+        hold = lane.hold_seconds if lane.hold_seconds is not None else max(self.queue_timeout, 1.0)
+        return max(1, math.ceil(hold * (len(lane.waiters) + 1) / max(lane.limit, 1)))
+
+    def acquire(self, name: str) -> float:
+        """Take a slot for name, waiting in its queue if necessary.
+
+        Returns:
+            Seconds spent waiting for the slot
+
+        Raises:
+            Saturated: If the queue is full or no slot freed up within queue_timeout
+        """
+        waiter = self._enqueue(name, threading.Event)
+        if waiter is None:
+            return 0.0
+        started = time.monotonic()
+        waiter.wait(self.queue_timeout)
+        self._settle(name, waiter)
+        return time.monotonic() - started
+
+    async def acquire_async(self, name: str) -> float:
+        """Take a slot for name like acquire, waiting on the event loop instead of blocking a thread.
+
+        A caller cancelled while queued leaves the queue, or passes on a slot
+        that was handed to it in the meantime.
+
+        Returns:
+            Seconds spent waiting for the slot
+
+        Raises:
+            Saturated: If the queue is full or no slot freed up within queue_timeout
+        """
+        waiter = self._enqueue(name, _LoopWaiter)
+        if waiter is None:
+            return 0.0
+        started = time.monotonic()
+        try:
+            await waiter.wait(self.queue_timeout)
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.is_set()
+                if not granted:
+                    self._lane(name).waiters.remove(waiter)
+            if granted:
+                self.release(name)
+            raise
+        self._settle(name, waiter)
+        return time.monotonic() - started
+
+    def _enqueue(self, name: str, waiter_type: Callable[[], Any]) -> Any:
+        """Take a free slot (returning None) or join the queue (returning the waiter)."""
+        with self._lock:
+            lane = self._lane(name)
+            if lane.limit <= 0 or (lane.active < lane.limit and not lane.waiters):
+                lane.active += 1
+                return None
+            if len(lane.waiters) >= self.max_queue:
+                lane.shed += 1
+                raise Saturated(name, 'queue_full', self._retry_after(lane))
+            waiter = waiter_type()
+            lane.waiters.append(waiter)
+            return waiter
+
+    def _settle(self, name: str, waiter: Any) -> None:
+        """Leave the queue after waiting, raising if no slot was handed over."""
+        with self._lock:
+            # A slot handed over just after the timeout still counts as granted.
+            if not waiter.is_set():
+                lane = self._lane(name)
+                lane.waiters.remove(waiter)
+                lane.shed += 1
+                raise Saturated(name, 'queue_timeout', self._retry_after(lane))
+
+    def release(self, name: str, held: float | None = None) -> None:
+        """Return a slot taken with acquire, handing it to the oldest waiter.
+
+        Args:
+            name: Name the slot was taken for
+            held: Seconds the slot was held, feeding the Retry-After estimate
+        """
+        with self._lock:
+            lane = self._lane(name)
+            if held is not None:
+                lane.hold_seconds = held if lane.hold_seconds is None else (
+                    lane.hold_seconds + HOLD_SMOOTHING * (held - lane.hold_seconds)
+                )
+            if lane.waiters:
+                lane.waiters.popleft().set()
+            else:
+                lane.active -= 1
+
+    def has_free_slot(self, name: str) -> bool:
+        """Whether a call for name would get a slot right now without queueing."""
+        with self._lock:
+            lane = self._lane(name)
+            return lane.limit <= 0 or (lane.active < lane.limit and not lane.waiters)
+
+    @contextmanager
+    def slot(self, name: str) -> Iterator[float]:
+        """Hold a slot for the duration of the block; yields the seconds waited."""
+        waited = self.acquire(name)
+        started = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self.release(name, time.monotonic() - started)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Return limit, active slots, queue length and shed count per name."""
+        with self._lock:
+            return {
+                name: {'limit': lane.limit, 'active': lane.active, 'queued': len(lane.waiters), 'shed': lane.shed}
+                for name, lane in self._lanes.items()
+            }
+
+
+_provider_limiter: ConcurrencyLimiter | None = None
+_request_limiter: ConcurrencyLimiter | None = None
+_request_limiter_ready = False
+_init_lock = threading.Lock()
+
+
+def get_provider_limiter() -> ConcurrencyLimiter:
+    """Return the process-wide per-provider call limiter."""
+    global _provider_limiter
+    if _provider_limiter is None:
+        with _init_lock:
+            if _provider_limiter is None:
+                _provider_limiter = ConcurrencyLimiter(
+                    Config.PROVIDER_CONCURRENCY,
+                    default_limit=Config.DEFAULT_PROVIDER_CONCURRENCY,
+                    max_queue=Config.PROVIDER_QUEUE_SIZE,
+                    queue_timeout=Config.PROVIDER_QUEUE_TIMEOUT,
+                )
+    return _provider_limiter
+
+
+def get_request_limiter() -> ConcurrencyLimiter | None:
+    """Return the per-worker cap on in-flight recipe requests, or None when disabled."""
+    global _request_limiter, _request_limiter_ready
+    if not _request_limiter_ready:
+        with _init_lock:
+            if not _request_limiter_ready:
+                if Config.ADMISSION_MAX_IN_FLIGHT > 0:
+                    _request_limiter = ConcurrencyLimiter(
+                        {}, default_limit=Config.ADMISSION_MAX_IN_FLIGHT, max_queue=0, queue_timeout=0.0,
+                    )
+                _request_limiter_ready = True
+    return _request_limiter
@@ -0,0 +1,212 @@
+"""Asyncio versions of the recipe pipeline stages that wait on the network.
+
+Used by the ASGI endpoints. Provider calls and their concurrency slots are
+awaited on the event loop; decoding, re-encoding, cache access and parsing
+are CPU or blocking work and run on the default executor. Hedged requests
+and cross-worker coalescing keep their thread-based implementations.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from itertools import count
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from config import Config
+from .admission import Saturated, get_provider_limiter
+from .coalescing import AsyncSingleFlight, get_flight_locks
+from .deadlines import Deadline, retry_delay
+from .imaging import PreparedImage
+from .keypool import lease_api_key
+from .recipes import (
+    ProviderError,
+    ProviderTarget,
+    RecipeCacheLookup,
+    RecipeRequest,
+    attempt_timeout,
+    build_request_prompt,
+    call_provider,
+    count_recipe_response,
+    deadline_exceeded,
+    decode_upload,
+    finish_recipe,
+    mark_coalesced,
+    prepare_upload,
+    provider_busy_error,
+    record_backoff,
+    record_provider_failure,
+    record_provider_success,
+    run_recipe_pipeline,
+)
+from .routing import get_provider_router, is_provider_fault
+from .tracing import record_span
+
+
+@asynccontextmanager
+async def provider_slot_async(target: RecipeRequest | ProviderTarget) -> AsyncIterator[None]:
+    """Hold one of the target provider's concurrency slots, queueing on the event loop.
+
+    Raises:
+        ProviderError: 'provider_busy' (429, with Retry-After) if the queue is
+            full or no slot freed up within PROVIDER_QUEUE_TIMEOUT
+    """
+    limiter = get_provider_limiter()
+    try:
+        waited = await limiter.acquire_async(target.provider)
+    except Saturated as saturated:
+        raise provider_busy_error(target, saturated) from saturated
+    if waited:
+        record_span('queue', waited, provider=target.provider)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(target.provider, time.monotonic() - started)
+
+
+async def call_provider_async(
+    target: RecipeRequest | ProviderTarget,
+    prepared: PreparedImage,
+    prompt: str,
+    deadline: Deadline,
+) -> Tuple[str, Dict[str, Any]]:
+    """Await the provider's async handler with the same bookkeeping, timeouts and retries as call_provider.
+
+    Providers without an 'async_handler' run call_provider on the executor.
+
+    Raises:
+        ProviderError: If the provider fails for any reason, or
+            'provider_busy' if no concurrency slot was available, or
+            'deadline_exceeded' if too little time is left for an attempt
+    """
+    handler = target.provider_config.get('async_handler')
+    if handler is None:
+        return await asyncio.to_thread(call_provider, target, prepared, prompt, deadline)
+
+    for attempt in count():
+        timeout = attempt_timeout(deadline)
+        queued = time.monotonic()
+        async with provider_slot_async(target):
+            with lease_api_key(target) as lease:
+                started = time.monotonic()
+                deadline.charge('queue', started - queued)
+                try:
+                    result = await handler(
+                        image_bytes=prepared.data,
+                        prompt=prompt,
+                        model=target.model,
+                        api_key=lease.api_key,
+                        mime_type=prepared.mime_type,
+                        timeout=timeout,
+                    )
+                except Exception as error:  # noqa: BLE001
+                    elapsed = time.monotonic() - started
+                    deadline.charge_attempt(target.provider, target.model, elapsed)
+                    failure = record_provider_failure(target, error, elapsed)
+                    rotated = lease.rate_limited(failure)
+                    delay = retry_delay(failure, attempt, deadline, honour_retry_after=not rotated)
+                    if delay is None:
+                        failure.budget = deadline.breakdown()
+                        if failure is error:
+                            raise
+                        raise failure from error
+                else:
+                    elapsed = time.monotonic() - started
+                    deadline.charge_attempt(target.provider, target.model, elapsed)
+                    record_provider_success(target, elapsed)
+                    return result
+        await asyncio.sleep(delay)
+        record_backoff(target, delay, deadline)
+
+
+async def call_with_fallback_async(
+    recipe_request: RecipeRequest,
+    prepared: PreparedImage,
+    prompt: str,
+) -> Tuple[ProviderTarget, str, Dict[str, Any], List[Dict[str, Any]]]:
+    """Asyncio counterpart of call_with_fallback, with the same skip and retry rules."""
+    router = get_provider_router()
+    attempts: List[Dict[str, Any]] = []
+    last_error: ProviderError | None = None
+    for target in recipe_request.targets:
+        attempt = {'provider': target.provider, 'model': target.model}
+        breaker = router.breaker(target.provider, target.model)
+        if Config.ROUTER_ENABLED and not breaker.allow():
+            attempts.append({**attempt, 'outcome': 'skipped'})
+            continue
+        try:
+            raw_text, provider_meta = await call_provider_async(target, prepared, prompt, recipe_request.deadline)
+        except ProviderError as provider_error:
+            attempts.append({**attempt, 'outcome': 'error', 'code': provider_error.code})
+            if provider_error.code == 'deadline_exceeded' or not is_provider_fault(provider_error):
+                raise
+            last_error = provider_error
+            continue
+        finally:
+            breaker.release()
+        attempts.append({**attempt, 'outcome': 'ok'})
+        return target, raw_text, provider_meta, attempts
+
+    if last_error is not None:
+        last_error.budget = recipe_request.deadline.breakdown()
+        raise last_error
+    raise ProviderError(
+        'providers_unavailable',
+        'AI providers are temporarily unavailable. Please try again shortly.',
+        status=503,
+        hint='Recent requests to the selected provider kept failing; it will be retried automatically.',
+    )
+
+
+async def generate_uncached_async(recipe_request: RecipeRequest, lookup: RecipeCacheLookup) -> Dict[str, Any]:
+    """Asyncio counterpart of generate_uncached for requests that are neither hedged nor progressive."""
+    image = await asyncio.to_thread(decode_upload, recipe_request)
+    cached_payload = await asyncio.to_thread(lookup.near, image)
+    if cached_payload is not None:
+        return cached_payload
+
+    prepared = await asyncio.to_thread(prepare_upload, recipe_request, image)
+    prompt = build_request_prompt(recipe_request)
+    target, raw_text, provider_meta, attempts = await call_with_fallback_async(recipe_request, prepared, prompt)
+    # Parsing may run a repair call and storing may hit a shared cache; both block.
+    payload = await asyncio.to_thread(
+        finish_recipe, recipe_request, lookup, prepared, raw_text, provider_meta, target=target,
+    )
+    if recipe_request.fallbacks:
+        payload['meta']['routing'] = {'attempts': attempts}
+    return payload
+
+
+async def run_recipe_pipeline_async(recipe_request: RecipeRequest, single_flight: AsyncSingleFlight) -> Dict[str, Any]:
+    """Serve a recipe request like run_recipe_pipeline without holding a thread per request.
+
+    Identical requests in flight on this event loop share one generation.
+    Hedged and progressive requests, and requests coalesced across workers
+    through COALESCE_LOCK_BACKEND, run the synchronous pipeline on the executor.
+
+    Returns:
+        Success payload for the response body
+
+    Raises:
+        ApiError: If the image is invalid or the provider fails
+    """
+    if recipe_request.hedge is not None or recipe_request.progressive or get_flight_locks() is not None:
+        return await asyncio.to_thread(run_recipe_pipeline, recipe_request)
+
+    lookup = RecipeCacheLookup(recipe_request)
+    payload = await asyncio.to_thread(lookup.exact)
+    if payload is None and not Config.COALESCE_ENABLED:
+        payload = await generate_uncached_async(recipe_request, lookup)
+    elif payload is None:
+        try:
+            payload, shared = await single_flight.do(
+                recipe_request.flight_key,
+                lambda: generate_uncached_async(recipe_request, lookup),
+                timeout=recipe_request.deadline.remaining(),
+            )
+        except TimeoutError as timeout_error:
+            raise deadline_exceeded(recipe_request.deadline) from timeout_error
+        if shared:
+            payload = mark_coalesced(payload)
+    count_recipe_response(payload)
+    return payload
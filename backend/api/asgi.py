@@ -0,0 +1,440 @@
+"""ASGI application serving recipe generation and key validation on asyncio.
+
+POST /api/generate-recipe and POST /api/validate-key are handled natively:
+the upload is parsed and spooled as it arrives, and provider and key
+validation calls are awaited, so one worker holds hundreds of requests in
+flight without a thread each. Responses, problem errors, trace headers and
+CORS headers match the Flask endpoints. Every other route, including CORS
+preflights, is passed to the Flask app on a small thread pool.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import traceback
+import uuid
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Tuple
+
+from a2wsgi import WSGIMiddleware
+from flask import Flask
+from flask_cors.core import get_cors_headers, get_cors_options
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from config import Config
+from .admission import Saturated, get_request_limiter
+from .aio import run_recipe_pipeline_async
+from .clients import close_async_clients, fingerprint_api_key
+from .coalescing import AsyncSingleFlight
+from .idempotency import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    InProgress,
+    KeyReused,
+    claim_async,
+    client_identity,
+    get_idempotency_store,
+    remember,
+    request_fingerprint,
+    scoped_key,
+    wait_budget,
+)
+from .providers import ASYNC_KEY_VALIDATORS, get_key_validation_cache
+from .ratelimit import get_rate_limiter
+from .recipes import (
+    MISSING_FILE,
+    SERVER_ERROR,
+    ApiError,
+    body_too_large_error,
+    check_rate_limit,
+    check_upload_filename,
+    error_payload,
+    idempotency_error,
+    parse_key_validation_body,
+    parse_recipe_request,
+    server_busy_error,
+    upload_error,
+)
+from .tracing import activate_trace, export_trace, record_span, stage, timing_headers, trace_from_headers
+from .uploads import SpooledUpload, UploadRejected, UploadSpool
+
+logger = logging.getLogger(__name__)
+
+# (status, body, extra headers) of a buffered JSON response.
+JsonResponse = Tuple[int, bytes, Dict[str, str]]
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its request body has arrived."""
+
+
+class AsgiRequest:
+    """The parts of an ASGI HTTP request that the native endpoints read."""
+
+    def __init__(self, scope: Dict[str, Any], receive: Callable[[], Awaitable[Dict[str, Any]]]):
+        """Wrap an HTTP scope and its receive channel."""
+        self.scope = scope
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+        self._receive = receive
+        self._upload_and_form: Tuple[SpooledUpload, MultiDict] | None = None
+
+    @property
+    def remote_addr(self) -> str | None:
+        """Client IP, taken from X-Forwarded-For only as far as TRUSTED_PROXY_COUNT proxies vouch for it."""
+        client = self.scope.get('client')
+        remote_addr = client[0] if client else None
+        if Config.TRUSTED_PROXY_COUNT:
+            # Same rule as werkzeug's ProxyFix in front of the Flask app.
+            forwarded = [value.strip() for value in ','.join(self.headers.getlist('X-Forwarded-For')).split(',')]
+            if self.headers.get('X-Forwarded-For') and len(forwarded) >= Config.TRUSTED_PROXY_COUNT:
+                remote_addr = forwarded[-Config.TRUSTED_PROXY_COUNT]
+        return remote_addr
+
+    async def body(self, max_length: int) -> AsyncIterator[bytes]:
+        """Yield the request body as it arrives.
+
+        Raises:
+            ApiError: 'file_too_large' (413) as soon as the body is known to
+                exceed max_length
+            ClientDisconnected: If the client disconnects first
+        """
+        declared = self.headers.get('Content-Length', type=int)
+        if declared is not None and declared > max_length:
+            raise body_too_large_error()
+        received = 0
+        while True:
+            message = await self._receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            received += len(chunk)
+            if received > max_length:
+                raise body_too_large_error()
+            if chunk:
+                yield chunk
+            if not message.get('more_body', False):
+                return
+
+    async def json(self, max_length: int) -> Any:
+        """Return the JSON body, or None when it is not JSON (like Flask's get_json(silent=True))."""
+        body = b''.join([chunk async for chunk in self.body(max_length)])
+        mimetype, _ = parse_options_header(self.headers.get('Content-Type'))
+        if mimetype != 'application/json' and not (mimetype.startswith('application/') and mimetype.endswith('+json')):
+            return None
+        try:
+            return json.loads(body)
+        except ValueError:
+            return None
+
+    async def upload_and_form(self, max_length: int) -> Tuple[SpooledUpload, MultiDict]:
+        """Parse the multipart body on the first call (see read_upload_and_form); later calls return the same result."""
+        if self._upload_and_form is None:
+            self._upload_and_form = await self.read_upload_and_form(max_length)
+        return self._upload_and_form
+
+    async def read_upload_and_form(self, max_length: int) -> Tuple[SpooledUpload, MultiDict]:
+        """Parse a multipart body, spooling the first 'file' part while it streams in.
+
+        The upload is checked like read_upload does: its filename before any
+        of it is spooled, its format from its first bytes and its size on
+        every chunk, so a bad upload is rejected without reading the rest.
+        Other file parts are skipped; form fields are collected.
+
+        Returns:
+            Tuple of (upload, form fields)
+
+        Raises:
+            ApiError: The same errors read_upload raises, or 'file_too_large'
+                if the whole body exceeds max_length
+        """
+        mimetype, options = parse_options_header(self.headers.get('Content-Type'))
+        boundary = options.get('boundary')
+        if mimetype != 'multipart/form-data' or not boundary:
+            raise MISSING_FILE
+
+        decoder = MultipartDecoder(boundary.encode('latin-1'))
+        parts = MultipartParts()
+        try:
+            async for chunk in self.body(max_length):
+                decoder.receive_data(chunk)
+                parts.feed(decoder)
+            decoder.receive_data(None)
+            parts.feed(decoder)
+        except BaseException as error:
+            parts.discard()
+            if isinstance(error, UploadRejected):
+                raise upload_error(error) from error
+            if isinstance(error, ValueError):
+                # A malformed body parses to no fields and no files, as in werkzeug.
+                raise MISSING_FILE from None
+            raise
+        if parts.upload is None:
+            raise MISSING_FILE
+        return parts.upload, parts.form
+
+
+class MultipartParts:
+    """Collects the upload and form fields from a multipart decoder's events."""
+
+    def __init__(self):
+        self.form = MultiDict()
+        self.upload: SpooledUpload | None = None
+        self._spool: UploadSpool | None = None
+        # UploadSpool for the upload, (name, buffer) for a form field, None for a skipped file.
+        self._part: Any = None
+
+    def feed(self, decoder: MultipartDecoder) -> None:
+        """Handle every event the decoder can produce from the data it has received.
+
+        Raises:
+            ApiError: 'missing_file' or a filename error for the upload part
+            UploadRejected: If the upload's format or size is rejected
+        """
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, (NeedData, Epilogue)):
+                return
+            if isinstance(event, File):
+                self._start_file(event)
+            elif isinstance(event, Field):
+                self._part = (event.name, bytearray())
+            elif isinstance(event, Data):
+                self._add_data(event)
+
+    def _start_file(self, event: File) -> None:
+        self._part = None
+        if event.name != 'file' or self._spool is not None:
+            return
+        if not event.filename:
+            raise MISSING_FILE
+        check_upload_filename(event.filename)
+        self._spool = self._part = UploadSpool(max_bytes=Config.UPLOAD_MAX_BYTES, memory_bytes=Config.UPLOAD_SPOOL_MEMORY_BYTES)
+
+    def _add_data(self, event: Data) -> None:
+        if isinstance(self._part, UploadSpool):
+            self._part.write(event.data)
+            if not event.more_data:
+                self.upload = self._part.finish()
+        elif self._part is not None:
+            self._part[1].extend(event.data)
+            if not event.more_data:
+                self.form.add(self._part[0], self._part[1].decode('utf-8', 'replace'))
+
+    def discard(self) -> None:
+        """Close the upload, or drop the partly written spool, after a failed parse."""
+        if self.upload is not None:
+            self.upload.close()
+        elif self._spool is not None:
+            self._spool.discard()
+
+
+class DishcoveryAsgiApp:
+    """ASGI app with native async recipe and key-validation endpoints in front of the Flask app."""
+
+    def __init__(self, flask_app: Flask, *, cors_options: Dict[str, Any], wsgi_workers: int):
+        """Wrap a Flask app.
+
+        Args:
+            flask_app: App from create_app, serving every other route
+            cors_options: The flask-cors options of the /api/* resource
+            wsgi_workers: Threads running Flask requests
+        """
+        self.flask_app = flask_app
+        self.wsgi = WSGIMiddleware(flask_app, workers=wsgi_workers)
+        self.cors_options = get_cors_options(flask_app, cors_options)
+        self.single_flight = AsyncSingleFlight()
+        self.endpoints: Dict[Tuple[str, str], Tuple[str, Callable[[AsgiRequest], Awaitable[JsonResponse]]]] = {
+            ('POST', '/api/generate-recipe'): (
+                'api.generate_recipe',
+                self.admitted(self.idempotent('api.generate_recipe', self.generate_recipe)),
+            ),
+            ('POST', '/api/validate-key'): ('api.validate_api_key', self.validate_api_key),
+        }
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        endpoint = self.endpoints.get((scope.get('method'), scope.get('path'))) if scope['type'] == 'http' else None
+        if endpoint is None:
+            await self.wsgi(scope, receive, send)
+            return
+        await self.serve(*endpoint, AsgiRequest(scope, receive), send)
+
+    async def lifespan(self, receive: Callable, send: Callable) -> None:
+        """Acknowledge startup and close the async provider clients on shutdown."""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await close_async_clients()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def serve(
+        self,
+        endpoint: str,
+        handler: Callable[[AsgiRequest], Awaitable[JsonResponse]],
+        request: AsgiRequest,
+        send: Callable,
+    ) -> None:
+        """Run a native endpoint inside its trace and send its JSON response."""
+        trace = trace_from_headers(endpoint, request.headers)
+        activate_trace(trace)
+        try:
+            try:
+                status, body, headers = await self.respond(handler, request)
+            except ClientDisconnected:
+                return
+
+            response_headers = list({'Content-Type': 'application/json', **headers}.items())
+            response_headers.append(('Content-Length', str(len(body))))
+            response_headers.extend(timing_headers(trace).items())
+            response_headers.extend(get_cors_headers(self.cors_options, request.headers, request.method).items(multi=True))
+            await send({
+                'type': 'http.response.start',
+                'status': status,
+                'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response_headers],
+            })
+            await send({'type': 'http.response.body', 'body': body})
+            export_trace(trace, method=request.method, route=request.path, status_code=status)
+        finally:
+            activate_trace(None)
+
+    async def respond(self, handler: Callable[[AsgiRequest], Awaitable[JsonResponse]], request: AsgiRequest) -> JsonResponse:
+        """Run handler, turning ApiErrors and unexpected exceptions into problem responses.
+
+        Raises:
+            ClientDisconnected: If the client went away before the request body arrived
+        """
+        try:
+            return await handler(request)
+        except ClientDisconnected:
+            raise
+        except ApiError as error:
+            return self.error_response(error)
+        except Exception as exc:  # noqa: BLE001
+            logger.error('Server error: %s', exc)
+            logger.debug(traceback.format_exc())
+            return self.error_response(SERVER_ERROR)
+
+    def admitted(self, handler: Callable[[AsgiRequest], Awaitable[JsonResponse]]) -> Callable[[AsgiRequest], Awaitable[JsonResponse]]:
+        """Wrap handler with the per-worker request cap, like the recipes.admitted decorator."""
+        async def admitted_handler(request: AsgiRequest) -> JsonResponse:
+            limiter = get_request_limiter()
+            if limiter is None:
+                return await handler(request)
+            try:
+                # The request cap never queues, so taking a slot does not block the loop.
+                limiter.acquire('requests')
+            except Saturated as saturated:
+                raise server_busy_error(saturated) from saturated
+            admitted_at = time.monotonic()
+            try:
+                return await handler(request)
+            finally:
+                limiter.release('requests', time.monotonic() - admitted_at)
+
+        return admitted_handler
+
+    def idempotent(
+        self, endpoint: str, handler: Callable[[AsgiRequest], Awaitable[JsonResponse]]
+    ) -> Callable[[AsgiRequest], Awaitable[JsonResponse]]:
+        """Wrap a multipart upload handler with Idempotency-Key replay, like the recipes.idempotent decorator.
+
+        A keyed request's body is parsed here, to fingerprint it before the
+        key is claimed; handler gets the same upload and form from
+        upload_and_form and closes the upload as usual.
+        """
+        async def idempotent_handler(request: AsgiRequest) -> JsonResponse:
+            raw_key = request.headers.get(IDEMPOTENCY_HEADER)
+            store = get_idempotency_store()
+            if raw_key is None or store is None:
+                return await handler(request)
+            owner = uuid.uuid4().hex
+            upload, form = await request.upload_and_form(self.max_content_length)
+            try:
+                key = scoped_key(endpoint, client_identity(form, request.remote_addr), raw_key)
+                fingerprint = request_fingerprint(form, [('file', upload.sha256.hex())])
+                stored = await claim_async(store, key, owner, fingerprint, wait=wait_budget(request.headers))
+            except (ValueError, InProgress, KeyReused) as error:
+                upload.close()
+                raise idempotency_error(error) from None
+            if stored is not None:
+                upload.close()
+                return stored.status, stored.body, {**stored.headers, REPLAYED_HEADER: 'true'}
+
+            try:
+                status, body, headers = await self.respond(handler, request)
+            except BaseException:
+                store.abandon(key, owner)
+                raise
+            await asyncio.to_thread(remember, store, key, owner, status, {'Content-Type': 'application/json', **headers}, body)
+            return status, body, headers
+
+        return idempotent_handler
+
+    def json_response(self, payload: Any, status: int = 200, headers: Dict[str, str] | None = None) -> JsonResponse:
+        """Serialize payload exactly as Flask's jsonify would."""
+        return status, self.flask_app.json.response(payload).get_data(), headers or {}
+
+    def error_response(self, error: ApiError) -> JsonResponse:
+        """Render an ApiError (or ProviderError) like recipes.error_response."""
+        headers = {'Retry-After': str(error.retry_after)} if error.retry_after is not None else {}
+        return self.json_response(error_payload(error), error.status, headers)
+
+    @property
+    def max_content_length(self) -> int:
+        return self.flask_app.config['MAX_CONTENT_LENGTH']
+
+    async def generate_recipe(self, request: AsgiRequest) -> JsonResponse:
+        """Generate a recipe from a food image; the async counterpart of the Flask endpoint."""
+        await check_rate_limit_async('recipe', 'ip', request.remote_addr)
+        with stage('read_upload'):
+            upload, form = await request.upload_and_form(self.max_content_length)
+        try:
+            recipe_request = parse_recipe_request(upload, form, request.headers)
+            await check_rate_limit_async('recipe', 'key', fingerprint_api_key(recipe_request.api_key))
+            payload = await run_recipe_pipeline_async(recipe_request, self.single_flight)
+            with stage('serialize'):
+                return self.json_response(payload)
+        finally:
+            upload.close()
+
+    async def validate_api_key(self, request: AsgiRequest) -> JsonResponse:
+        """Validate an API key and list its models; the async counterpart of the Flask endpoint."""
+        await check_rate_limit_async('validate', 'ip', request.remote_addr)
+        data = await request.json(self.max_content_length)
+        provider, api_key = parse_key_validation_body(data, ASYNC_KEY_VALIDATORS)
+        await check_rate_limit_async('validate', 'key', fingerprint_api_key(api_key))
+
+        try:
+            started = time.perf_counter()
+            result = await get_key_validation_cache().validate_async(provider, api_key, ASYNC_KEY_VALIDATORS[provider])
+            record_span('provider', time.perf_counter() - started, provider=provider)
+        except Exception as e:  # noqa: BLE001
+            logger.error(f"Error validating {provider} API key: {e}")
+            raise ApiError(
+                'validation_error',
+                'Failed to validate API key',
+                status=500,
+                hint='Check your internet connection and try again',
+                debug=str(e),
+            ) from e
+        return self.json_response(result, 200 if result['valid'] else 401)
+
+
+async def check_rate_limit_async(scope: str, kind: str, identity: str | None) -> None:
+    """Run check_rate_limit on the executor, since its bucket store may be remote."""
+    if get_rate_limiter() is not None and identity:
+        await asyncio.to_thread(check_rate_limit, scope, kind, identity)
+
+
+def create_asgi_app(flask_app: Flask, *, cors_options: Dict[str, Any]) -> DishcoveryAsgiApp:
+    """Build the ASGI app around a Flask app from create_app."""
+    return DishcoveryAsgiApp(flask_app, cors_options=cors_options, wsgi_workers=Config.ASGI_WSGI_WORKERS)
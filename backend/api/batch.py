@@ -0,0 +1,153 @@
+"""Multi-image recipe generation with bounded concurrent fan-out."""
+
+import contextvars
+import dataclasses
+import logging
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from flask import jsonify, request
+
+from config import Config
+from . import api_bp
+from .recipes import (
+    SERVER_ERROR,
+    ApiError,
+    RecipeRequest,
+    admitted,
+    check_rate_limit,
+    check_recipe_rate_limits,
+    error_payload,
+    error_response,
+    idempotent,
+    parse_recipe_request,
+    read_upload,
+    request_files,
+    run_recipe_pipeline,
+)
+
+logger = logging.getLogger(__name__)
+
+
+_executor: ThreadPoolExecutor | None = None
+_init_lock = threading.Lock()
+
+
+def get_batch_executor() -> ThreadPoolExecutor:
+    """Return the process-wide worker pool shared by all batch requests."""
+    global _executor
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.BATCH_MAX_WORKERS, thread_name_prefix='recipe-batch')
+    return _executor
+
+
+def run_batch_item(recipe_request: RecipeRequest) -> Dict[str, Any]:
+    """Run the single-image pipeline for one batch item, capturing its error."""
+    try:
+        return run_recipe_pipeline(recipe_request)
+    except ApiError as error:
+        return error_payload(error)
+    except Exception as exc:  # noqa: BLE001
+        logger.error('Server error in batch item: %s', exc)
+        logger.debug(traceback.format_exc())
+        return error_payload(SERVER_ERROR)
+
+
+def run_batch(base_request: RecipeRequest, uploads: List[Any]) -> List[Dict[str, Any]]:
+    """Fan a batch of uploads out over the worker pool.
+
+    Decoding and preprocessing run in parallel on the pool; provider calls
+    queue for the same per-provider admission slots as every other request.
+    Results keep the order of uploads.
+
+    Args:
+        base_request: Validated shared options; its upload is replaced per
+            item, and each item gets a child of its deadline
+        uploads: Uploaded files, each either a SpooledUpload or an ApiError from read_upload
+
+    Returns:
+        One result payload (success or problem body) per upload, in order
+    """
+    executor = get_batch_executor()
+
+    futures = []
+    for upload in uploads:
+        if isinstance(upload, ApiError):
+            futures.append(upload)
+            continue
+        # Items run side by side: each has the batch's time left, but its own attempts and retries.
+        item_request = dataclasses.replace(base_request, upload=upload, deadline=base_request.deadline.child())
+        futures.append(executor.submit(contextvars.copy_context().run, run_batch_item, item_request))
+
+    return [
+        error_payload(future) if isinstance(future, ApiError) else future.result()
+        for future in futures
+    ]
+
+
+@api_bp.route('/generate-recipe/batch', methods=['POST'])
+@admitted
+@idempotent
+def generate_recipe_batch():
+    """Generate recipes for several food images uploaded in one request.
+
+    Accepts the same form fields as /generate-recipe with the images sent as
+    repeated 'files' parts. Shared options are validated once; each image then
+    succeeds or fails on its own and results are returned in upload order.
+    """
+    try:
+        files = request_files('files') or request_files('file')
+        if not files:
+            return error_response(ApiError(
+                'missing_file',
+                'No image files provided. Please upload one or more food photos.',
+                hint='Send each photo as a "files" form part.',
+            ))
+        if len(files) > Config.BATCH_MAX_FILES:
+            return error_response(ApiError(
+                'too_many_files',
+                f'Too many images. Send at most {Config.BATCH_MAX_FILES} per batch.',
+            ))
+
+        # Each image costs one token, charged before any image is read or decoded.
+        check_rate_limit('recipe', 'ip', request.remote_addr, cost=len(files))
+        base_request = parse_recipe_request(None, request.form, request.headers)
+        check_recipe_rate_limits(base_request, cost=len(files))
+
+        uploads: List[Any] = []
+        for file in files:
+            try:
+                uploads.append(read_upload(file))
+            except ApiError as error:
+                uploads.append(error)
+
+        started = time.perf_counter()
+        results = run_batch(base_request, uploads)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        items = [
+            {'index': index, 'filename': file.filename or None, **result}
+            for index, (file, result) in enumerate(zip(files, results))
+        ]
+        succeeded = sum(1 for result in results if result.get('success'))
+        return jsonify({
+            'success': succeeded > 0,
+            'results': items,
+            'meta': {
+                'count': len(items),
+                'succeeded': succeeded,
+                'failed': len(items) - succeeded,
+                'elapsed_ms': round(elapsed_ms, 1),
+            },
+        })
+    except ApiError as error:
+        return error_response(error)
+    except Exception as exc:  # noqa: BLE001
+        logger.error('Server error: %s', exc)
+        logger.debug(traceback.format_exc())
+        return error_response(SERVER_ERROR)
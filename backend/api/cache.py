@@ -0,0 +1,346 @@
+"""Content-addressed result cache for generated recipes."""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from config import Config
+from .sqlitedb import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    image_bytes: bytes,
+    *,
+    language: str,
+    dietary_restrictions: str,
+    cuisine_preference: str,
+    provider: str,
+    model: str,
+) -> str:
+    """Build a content-addressed cache key for a recipe request.
+
+    The key covers the image content and every input that changes the prompt
+    or the model output, so two requests share a key only when the provider
+    would be asked exactly the same question.
+
+    Args:
+        image_bytes: Raw uploaded image data
+        language: Requested recipe language
+        dietary_restrictions: Dietary requirements from the request
+        cuisine_preference: Cuisine preference from the request
+        provider: Provider identifier ('gemini', 'openai', or 'anthropic')
+        model: Model identifier used for generation
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    return make_cache_key_for_digest(
+        hashlib.sha256(image_bytes).digest(),
+        language=language,
+        dietary_restrictions=dietary_restrictions,
+        cuisine_preference=cuisine_preference,
+        provider=provider,
+        model=model,
+    )
+
+
+def make_cache_key_for_digest(
+    image_sha256: bytes,
+    *,
+    language: str,
+    dietary_restrictions: str,
+    cuisine_preference: str,
+    provider: str,
+    model: str,
+) -> str:
+    """Build the same key as make_cache_key from the image's SHA-256 digest.
+
+    Lets a spooled upload, hashed while it was read, be keyed without
+    reading it back.
+    """
+    digest = hashlib.sha256()
+    digest.update(image_sha256)
+    params = json.dumps(
+        [language, dietary_restrictions, cuisine_preference, provider, model],
+        ensure_ascii=False,
+        separators=(',', ':'),
+    )
+    digest.update(params.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CacheBackend(ABC):
+    """Byte-oriented storage interface used by RecipeCache."""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """Return the stored value for key, or None when missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """Store value under key for ttl seconds."""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove key if present."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Return entry count and byte size of the backend."""
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU store bounded by entry count and total byte size."""
+
+    def __init__(self, *, max_entries: int, max_bytes: int):
+        """Initialize an empty in-memory store.
+
+        Args:
+            max_entries: Maximum number of entries kept before LRU eviction
+            max_bytes: Maximum total size of stored values in bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl)
+            self._size += len(value)
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._size}
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+
+class SQLiteCacheBackend(CacheBackend):
+    """SQLite-backed LRU store that several worker processes can share."""
+
+    def __init__(self, path: str, *, max_entries: int, max_bytes: int):
+        """Open (or create) the cache database.
+
+        Args:
+            path: Filesystem path of the SQLite database
+            max_entries: Maximum number of entries kept before LRU eviction
+            max_bytes: Maximum total size of stored values in bytes
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._db = SQLiteDatabase(path, [
+            (
+                'CREATE TABLE IF NOT EXISTS recipe_cache ('
+                ' key TEXT PRIMARY KEY,'
+                ' value BLOB NOT NULL,'
+                ' size INTEGER NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' accessed_at REAL NOT NULL)'
+            ),
+            'CREATE INDEX IF NOT EXISTS recipe_cache_accessed ON recipe_cache (accessed_at)',
+        ])
+
+    def get(self, key: str) -> bytes | None:
+        conn = self._db.connect()
+        now = time.time()
+        row = conn.execute(
+            'SELECT value, expires_at FROM recipe_cache WHERE key = ?',
+            (key,),
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at <= now:
+            conn.execute('DELETE FROM recipe_cache WHERE key = ?', (key,))
+            return None
+        conn.execute('UPDATE recipe_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        if len(value) > self.max_bytes:
+            return
+        conn = self._db.connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR REPLACE INTO recipe_cache (key, value, size, expires_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now + ttl, now),
+            )
+            conn.execute('DELETE FROM recipe_cache WHERE expires_at <= ?', (now,))
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Drop least recently used rows until both limits are satisfied."""
+        count, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM recipe_cache').fetchone()
+        while count > self.max_entries or size > self.max_bytes:
+            row = conn.execute('SELECT key, size FROM recipe_cache ORDER BY accessed_at ASC LIMIT 1').fetchone()
+            if row is None:
+                break
+            conn.execute('DELETE FROM recipe_cache WHERE key = ?', (row[0],))
+            count -= 1
+            size -= row[1]
+
+    def delete(self, key: str) -> None:
+        self._db.connect().execute('DELETE FROM recipe_cache WHERE key = ?', (key,))
+
+    def clear(self) -> None:
+        self._db.connect().execute('DELETE FROM recipe_cache')
+
+    def stats(self) -> Dict[str, Any]:
+        count, size = self._db.connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM recipe_cache'
+        ).fetchone()
+        return {'backend': 'sqlite', 'entries': count, 'bytes': size}
+
+
+class RecipeCache:
+    """JSON-serializing front end over a CacheBackend."""
+
+    def __init__(self, backend: CacheBackend, *, default_ttl: float):
+        """Wrap a storage backend.
+
+        Args:
+            backend: Storage backend holding serialized entries
+            default_ttl: Lifetime in seconds for entries stored without an explicit ttl
+        """
+        self.backend = backend
+        self.default_ttl = default_ttl
+
+    def get(self, key: str) -> Dict[str, Any] | None:
+        """Return the cached entry for key, or None on a miss.
+
+        Backend failures are logged and treated as misses so a broken cache
+        never takes recipe generation down with it.
+        """
+        try:
+            raw = self.backend.get(key)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Recipe cache lookup failed: %s', exc)
+            return None
+        if raw is None:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            self.backend.delete(key)
+            return None
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float | None = None) -> None:
+        """Store a JSON-serializable entry under key."""
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        try:
+            self.backend.set(key, raw, self.default_ttl if ttl is None else ttl)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Recipe cache store failed: %s', exc)
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return backend statistics."""
+        return self.backend.stats()
+
+
+def build_recipe_cache(config: Any) -> RecipeCache | None:
+    """Create the recipe cache described by the application config.
+
+    Args:
+        config: Configuration object exposing the RECIPE_CACHE_* settings
+
+    Returns:
+        Configured RecipeCache, or None when caching is disabled
+    """
+    backend_name = (config.RECIPE_CACHE_BACKEND or 'none').lower()
+    if backend_name == 'memory':
+        backend: CacheBackend = MemoryCacheBackend(
+            max_entries=config.RECIPE_CACHE_MAX_ENTRIES,
+            max_bytes=config.RECIPE_CACHE_MAX_BYTES,
+        )
+    elif backend_name == 'sqlite':
+        backend = SQLiteCacheBackend(
+            config.RECIPE_CACHE_PATH,
+            max_entries=config.RECIPE_CACHE_MAX_ENTRIES,
+            max_bytes=config.RECIPE_CACHE_MAX_BYTES,
+        )
+    elif backend_name == 'none':
+        return None
+    else:
+        logger.warning('Unknown RECIPE_CACHE_BACKEND "%s"; caching disabled.', backend_name)
+        return None
+    return RecipeCache(backend, default_ttl=config.RECIPE_CACHE_TTL)
+
+
+_recipe_cache: RecipeCache | None = None
+_recipe_cache_ready = False
+_recipe_cache_lock = threading.Lock()
+
+
+def get_recipe_cache() -> RecipeCache | None:
+    """Return the process-wide recipe cache, building it on first use."""
+    global _recipe_cache, _recipe_cache_ready
+    if not _recipe_cache_ready:
+        with _recipe_cache_lock:
+            if not _recipe_cache_ready:
+                _recipe_cache = build_recipe_cache(Config)
+                _recipe_cache_ready = True
+    return _recipe_cache
+
+
+def reset_recipe_cache() -> None:
+    """Drop the process-wide cache so the next call rebuilds it from config."""
+    global _recipe_cache, _recipe_cache_ready
+    with _recipe_cache_lock:
+        _recipe_cache = None
+        _recipe_cache_ready = False
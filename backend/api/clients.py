@@ -0,0 +1,358 @@
+"""Pooled, thread-safe provider SDK clients."""
+
+import asyncio
+import hashlib
+import importlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from types import ModuleType
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Tuple
+
+from config import Config
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+# Provider SDKs take over a second to import together, so each is imported on
+# first use of its provider instead of when the app loads.
+SDK_MODULES: Dict[str, str] = {
+    'gemini': 'google.generativeai',
+    'openai': 'openai',
+    'anthropic': 'anthropic',
+}
+
+_sdk_load_seconds: Dict[str, float] = {}
+_sdk_lock = threading.Lock()
+
+
+def load_sdk(provider: str) -> ModuleType:
+    """Import a provider's SDK on first use and return the module.
+
+    Later calls return the module from the import cache. Concurrent first
+    calls wait on Python's per-module import lock, so an SDK is never
+    imported twice even while a prewarm thread is still loading it.
+
+    Raises:
+        KeyError: If provider has no SDK
+    """
+    name = SDK_MODULES[provider]
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    with _sdk_lock:
+        if provider not in _sdk_load_seconds:
+            _sdk_load_seconds[provider] = time.perf_counter() - started
+            logger.info('Loaded %s SDK (%s) in %.3fs', provider, name, _sdk_load_seconds[provider])
+    return module
+
+
+def sdk_load_times() -> Dict[str, float]:
+    """Return the seconds spent importing each SDK loaded so far."""
+    with _sdk_lock:
+        return dict(_sdk_load_seconds)
+
+
+def prewarm_sdks(providers: Iterable[str]) -> threading.Thread | None:
+    """Import provider SDKs on a background thread.
+
+    Unknown names are ignored. Requests for a provider whose SDK is still
+    loading wait for that import rather than starting another.
+
+    Args:
+        providers: Provider names, or 'all' for every SDK
+
+    Returns:
+        The started daemon thread, or None if there was nothing to load
+    """
+    names = list(SDK_MODULES) if 'all' in providers else [name for name in providers if name in SDK_MODULES]
+    if not names:
+        return None
+
+    def run():
+        for provider in names:
+            try:
+                load_sdk(provider)
+            except Exception:  # noqa: BLE001
+                logger.exception('Prewarming the %s SDK failed', provider)
+
+    thread = threading.Thread(target=run, name='sdk-prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+def fingerprint_api_key(api_key: str) -> str:
+    """Return a stable, non-reversible identifier for an API key.
+
+    Used wherever a key has to index a table so raw secrets are never kept
+    as dictionary keys, logged, or exposed in stats.
+    """
+    return hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:32]
+
+
+class ClientRegistry:
+    """Bounded cache of SDK clients keyed by provider and hashed API key.
+
+    Clients are created on first use and reused by later requests carrying the
+    same key. Entries are dropped least-recently-used once max_size is reached
+    or after idle_ttl seconds without use. Dropped clients are not closed: they
+    share the provider-wide HTTP pools and may still be serving a request on
+    another thread, so they are simply left to the garbage collector.
+    """
+
+    def __init__(
+        self,
+        factories: Dict[str, Callable[[str], Any]],
+        *,
+        max_size: int,
+        idle_ttl: float,
+        scope: Callable[[], Any] | None = None,
+    ):
+        """Create an empty registry.
+
+        Args:
+            factories: Mapping of provider name to a callable building a client from an API key
+            max_size: Maximum number of live clients
+            idle_ttl: Seconds a client may go unused before it is evicted
+            scope: Returns what a client is bound to besides its key (the
+                running event loop, for asyncio clients); a cached client built
+                in another scope is replaced rather than reused
+        """
+        self.factories = factories
+        self.max_size = max_size
+        self.idle_ttl = idle_ttl
+        self.scope = scope
+        self._clients: "OrderedDict[Tuple[str, str], Tuple[Any, float, Any]]" = OrderedDict()
+        self._building: Dict[Tuple[Tuple[str, str], Any], Future] = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def get(self, provider: str, api_key: str) -> Any:
+        """Return a client for provider authenticated with api_key.
+
+        The factory runs outside the registry lock, so a slow client build
+        never holds up requests for other keys; concurrent first calls for
+        the same key wait for that one build instead of starting their own.
+
+        Raises:
+            KeyError: If no factory is registered for provider
+            Exception: Whatever the factory raised, in every caller waiting on it
+        """
+        factory = self.factories[provider]
+        key = (provider, fingerprint_api_key(api_key))
+        scope = self.scope() if self.scope is not None else None
+        client, building, owner = self._cached_or_reserve(key, scope)
+        if building is None:
+            return client
+        if not owner:
+            return building.result()
+
+        try:
+            client = factory(api_key)
+        except BaseException as exc:
+            with self._lock:
+                del self._building[(key, scope)]
+            building.set_exception(exc)
+            raise
+        with self._lock:
+            del self._building[(key, scope)]
+            self._clients[key] = (client, time.monotonic(), scope)
+            self._clients.move_to_end(key)
+            self.created += 1
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+        building.set_result(client)
+        return client
+
+    def _cached_or_reserve(self, key: Tuple[str, str], scope: Any) -> Tuple[Any, Future | None, bool]:
+        """Look up a cached client, or find or reserve the build of a new one.
+
+        Returns:
+            (client, None, False) for a cached client, (None, future, False)
+            while another caller builds it, or (None, future, True) when this
+            caller must build it and resolve future
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(key)
+            if entry is not None and entry[2] is scope:
+                self._clients[key] = (entry[0], now, scope)
+                self._clients.move_to_end(key)
+                self.reused += 1
+                return entry[0], None, False
+            building = self._building.get((key, scope))
+            if building is not None:
+                return None, building, False
+            building = self._building[(key, scope)] = Future()
+            return None, building, True
+
+    def _evict_idle(self, now: float) -> None:
+        while self._clients:
+            key, (_, last_used, _) = next(iter(self._clients.items()))
+            if now - last_used <= self.idle_ttl:
+                break
+            del self._clients[key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return live client count and creation/reuse counters."""
+        with self._lock:
+            return {'clients': len(self._clients), 'created': self.created, 'reused': self.reused}
+
+    def clear(self) -> None:
+        """Drop every cached client."""
+        with self._lock:
+            self._clients.clear()
+
+
+_http_pools: Dict[str, 'httpx.Client'] = {}
+_http_pools_lock = threading.Lock()
+
+
+def get_http_pool(name: str) -> 'httpx.Client':
+    """Return the shared keep-alive HTTP client for a provider.
+
+    All SDK clients of one provider share this pool, so a new API key reuses
+    connections (and TLS sessions) that are already open to the provider host.
+    """
+    pool = _http_pools.get(name)
+    if pool is None:
+        with _http_pools_lock:
+            pool = _http_pools.get(name)
+            if pool is None:
+                import httpx
+
+                pool = httpx.Client(limits=_pool_limits(), timeout=httpx.Timeout(60.0, connect=10.0))
+                _http_pools[name] = pool
+    return pool
+
+
+def _pool_limits() -> 'httpx.Limits':
+    import httpx
+
+    return httpx.Limits(
+        max_connections=Config.PROVIDER_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.PROVIDER_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=Config.PROVIDER_HTTP_KEEPALIVE_SECONDS,
+    )
+
+
+_async_http_pools: Dict[str, Tuple[asyncio.AbstractEventLoop, 'httpx.AsyncClient']] = {}
+
+
+def get_async_http_pool(name: str) -> 'httpx.AsyncClient':
+    """Return the shared keep-alive async HTTP client for a provider.
+
+    The asyncio counterpart of get_http_pool. Async connections belong to
+    the event loop that opened them, so the pool is replaced when called
+    from a different loop. Must be called from a running event loop.
+    """
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    entry = _async_http_pools.get(name)
+    if entry is None or entry[0] is not loop:
+        entry = (loop, httpx.AsyncClient(limits=_pool_limits(), timeout=httpx.Timeout(60.0, connect=10.0)))
+        _async_http_pools[name] = entry
+    return entry[1]
+
+
+# SDK clients never retry on their own: call_provider retries within the
+# request's deadline, and SDK retries would spend that budget unseen.
+def _make_openai_client(api_key: str) -> Any:
+    return load_sdk('openai').OpenAI(api_key=api_key, http_client=get_http_pool('openai'), max_retries=0)
+
+
+def _make_anthropic_client(api_key: str) -> Any:
+    return load_sdk('anthropic').Anthropic(api_key=api_key, http_client=get_http_pool('anthropic'), max_retries=0)
+
+
+def _make_gemini_client(api_key: str) -> Any:
+    # Each key gets its own GenerativeServiceClient instead of going through
+    # the process-global genai.configure() state, which races when concurrent
+    # requests carry different keys. It is the generativelanguage client the
+    # SDK's own protos are built for.
+    load_sdk('gemini')
+    from google.ai import generativelanguage
+
+    return generativelanguage.GenerativeServiceClient(client_options={'api_key': api_key})
+
+
+def _make_async_openai_client(api_key: str) -> Any:
+    return load_sdk('openai').AsyncOpenAI(api_key=api_key, http_client=get_async_http_pool('openai'), max_retries=0)
+
+
+def _make_async_anthropic_client(api_key: str) -> Any:
+    return load_sdk('anthropic').AsyncAnthropic(api_key=api_key, http_client=get_async_http_pool('anthropic'), max_retries=0)
+
+
+def _make_async_gemini_client(api_key: str) -> Any:
+    load_sdk('gemini')
+    from google.ai import generativelanguage
+
+    return generativelanguage.GenerativeServiceAsyncClient(client_options={'api_key': api_key})
+
+
+PROVIDER_CLIENT_FACTORIES: Dict[str, Callable[[str], Any]] = {
+    'openai': _make_openai_client,
+    'anthropic': _make_anthropic_client,
+    'gemini': _make_gemini_client,
+}
+
+ASYNC_PROVIDER_CLIENT_FACTORIES: Dict[str, Callable[[str], Any]] = {
+    'openai': _make_async_openai_client,
+    'anthropic': _make_async_anthropic_client,
+    'gemini': _make_async_gemini_client,
+}
+
+_registry: ClientRegistry | None = None
+_async_registry: ClientRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_client_registry() -> ClientRegistry:
+    """Return the process-wide provider client registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ClientRegistry(
+                    PROVIDER_CLIENT_FACTORIES,
+                    max_size=Config.PROVIDER_CLIENT_CACHE_SIZE,
+                    idle_ttl=Config.PROVIDER_CLIENT_IDLE_SECONDS,
+                )
+    return _registry
+
+
+def get_async_client_registry() -> ClientRegistry:
+    """Return the process-wide registry of asyncio provider clients (used by the ASGI app)."""
+    global _async_registry
+    if _async_registry is None:
+        with _registry_lock:
+            if _async_registry is None:
+                # Async clients hold connections of the loop they were built on.
+                _async_registry = ClientRegistry(
+                    ASYNC_PROVIDER_CLIENT_FACTORIES,
+                    max_size=Config.PROVIDER_CLIENT_CACHE_SIZE,
+                    idle_ttl=Config.PROVIDER_CLIENT_IDLE_SECONDS,
+                    scope=asyncio.get_running_loop,
+                )
+    return _async_registry
+
+
+async def close_async_clients() -> None:
+    """Close the async HTTP pools opened on the running loop and drop the clients using them.
+
+    Called when the ASGI app shuts down.
+    """
+    loop = asyncio.get_running_loop()
+    if _async_registry is not None:
+        _async_registry.clear()
+    for name, (pool_loop, pool) in list(_async_http_pools.items()):
+        if pool_loop is loop:
+            del _async_http_pools[name]
+            await pool.aclose()
@@ -0,0 +1,215 @@
+"""Coalescing of identical in-flight recipe requests."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from config import Config
+from .sqlitedb import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time within a process.
+
+    Callers arriving while a call for the same key is in flight wait for it
+    and receive its result, or have its exception re-raised.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], *, timeout: float | None = None) -> Tuple[Any, bool]:
+        """Run fn for key, or wait for the call already running for key.
+
+        Args:
+            key: Identity of the call
+            fn: Computes the result when no call for key is running
+            timeout: Seconds a waiter waits for the running call; None waits
+                as long as it takes. The running call itself is not bounded.
+
+        Returns:
+            Tuple of (result, shared) where shared is True for waiters that
+            received another caller's result
+
+        Raises:
+            TimeoutError: If a waiter's timeout passes first
+        """
+        with self._lock:
+            flight = self._calls.get(key)
+            leader = flight is None
+            if leader:
+                flight = Future()
+                self._calls[key] = flight
+        if not leader:
+            return flight.result(timeout), True
+
+        try:
+            result = fn()
+        except BaseException as exc:
+            self._finish(key)
+            flight.set_exception(exc)
+            raise
+        self._finish(key)
+        flight.set_result(result)
+        return result, False
+
+    def _finish(self, key: str) -> None:
+        with self._lock:
+            self._calls.pop(key, None)
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being computed."""
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """Asyncio counterpart of SingleFlight for calls made on one event loop."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]], *, timeout: float | None = None) -> Tuple[Any, bool]:
+        """Await fn() for key, or the call already running for key.
+
+        The call runs as its own task, so a caller that is cancelled (its
+        client went away) or times out does not cancel it for the callers
+        still waiting.
+
+        Args:
+            key: Identity of the call
+            fn: Starts the call when none is running for key
+            timeout: Seconds a waiter waits for the running call; None waits
+                as long as it takes
+
+        Returns:
+            Tuple of (result, shared) where shared is True for waiters that
+            received another caller's result
+
+        Raises:
+            TimeoutError: If a waiter's timeout passes first
+        """
+        flight = self._calls.get(key)
+        if flight is not None:
+            return await asyncio.wait_for(asyncio.shield(flight), timeout), True
+        flight = asyncio.ensure_future(fn())
+        self._calls[key] = flight
+        flight.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(flight), False
+
+    def in_flight(self) -> int:
+        """Return the number of keys currently being computed."""
+        return len(self._calls)
+
+
+RUNNING = 'running'
+FAILED = 'failed'
+
+
+class SQLiteFlightLocks:
+    """Cross-worker flight locks kept in a SQLite database.
+
+    The worker holding a key's lock computes the result; others poll the
+    lock. A successful leader deletes its lock and hands the result over
+    through the shared recipe cache. A failing leader leaves its error behind
+    for a short linger period so waiters can re-raise it. Locks expire after
+    their ttl, so a crashed worker cannot block a key forever. Database
+    errors are logged and treated as "no lock", degrading to uncoalesced
+    generation.
+    """
+
+    def __init__(self, path: str):
+        """Open (or create) the lock database at path."""
+        self._db = SQLiteDatabase(path, [
+            (
+                'CREATE TABLE IF NOT EXISTS flight_locks ('
+                ' key TEXT PRIMARY KEY,'
+                ' owner TEXT NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' error TEXT)'
+            ),
+        ])
+
+    def acquire(self, key: str, owner: str, ttl: float) -> bool:
+        """Take the lock for key unless another live owner holds it."""
+        now = time.time()
+        try:
+            conn = self._db.connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM flight_locks WHERE key = ? AND (expires_at <= ? OR error IS NOT NULL)', (key, now))
+                cursor = conn.execute(
+                    'INSERT OR IGNORE INTO flight_locks (key, owner, expires_at) VALUES (?, ?, ?)',
+                    (key, owner, now + ttl),
+                )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            return cursor.rowcount == 1
+        except sqlite3.Error as exc:
+            logger.warning('Flight lock acquire failed: %s', exc)
+            return True
+
+    def release(self, key: str, owner: str, error: Dict[str, Any] | None = None, *, linger: float = 0.0) -> None:
+        """Release the lock, optionally leaving an error for waiters to re-raise."""
+        try:
+            if error is None:
+                self._db.connect().execute('DELETE FROM flight_locks WHERE key = ? AND owner = ?', (key, owner))
+            else:
+                self._db.connect().execute(
+                    'UPDATE flight_locks SET error = ?, expires_at = ? WHERE key = ? AND owner = ?',
+                    (json.dumps(error), time.time() + linger, key, owner),
+                )
+        except sqlite3.Error as exc:
+            logger.warning('Flight lock release failed: %s', exc)
+
+    def state(self, key: str) -> Tuple[str | None, Dict[str, Any] | None]:
+        """Return (RUNNING, None), (FAILED, error) or (None, None) when no live lock exists."""
+        try:
+            row = self._db.connect().execute(
+                'SELECT error FROM flight_locks WHERE key = ? AND expires_at > ?',
+                (key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as exc:
+            logger.warning('Flight lock lookup failed: %s', exc)
+            return None, None
+        if row is None:
+            return None, None
+        if row[0] is None:
+            return RUNNING, None
+        return FAILED, json.loads(row[0])
+
+
+_single_flight = SingleFlight()
+_flight_locks: SQLiteFlightLocks | None = None
+_flight_locks_ready = False
+_flight_locks_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide single-flight group."""
+    return _single_flight
+
+
+def get_flight_locks() -> SQLiteFlightLocks | None:
+    """Return the cross-worker lock store, or None when COALESCE_LOCK_BACKEND is 'none'."""
+    global _flight_locks, _flight_locks_ready
+    if not _flight_locks_ready:
+        with _flight_locks_lock:
+            if not _flight_locks_ready:
+                backend_name = (Config.COALESCE_LOCK_BACKEND or 'none').lower()
+                if backend_name == 'sqlite':
+                    _flight_locks = SQLiteFlightLocks(Config.COALESCE_LOCK_PATH)
+                elif backend_name != 'none':
+                    logger.warning('Unknown COALESCE_LOCK_BACKEND "%s"; cross-worker coalescing disabled.', backend_name)
+                _flight_locks_ready = True
+    return _flight_locks
@@ -0,0 +1,200 @@
+"""Request deadlines: provider timeouts cut from one time budget, and jittered retries."""
+
+import math
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict
+
+from config import Config
+from .routing import is_provider_fault
+
+if TYPE_CHECKING:
+    import httpx
+
+DEADLINE_HEADER = 'X-Request-Timeout'
+
+# Failures decided by this server, and exceptions a handler did not expect
+# (bugs rather than provider hiccups); retrying them cannot help.
+NON_RETRYABLE_CODES = frozenset({'provider_busy', 'deadline_exceeded', 'provider_failure'})
+
+# Statuses a handler may give its own ProviderError to mark it transient.
+RETRYABLE_STATUSES = frozenset({408, 429, 502, 503, 504})
+
+
+@dataclass(frozen=True)
+class ProviderTimeout:
+    """Timeouts of one provider attempt, in seconds."""
+
+    connect: float
+    read: float
+
+    @property
+    def total(self) -> float:
+        return self.connect + self.read
+
+    def to_httpx(self) -> 'httpx.Timeout':
+        """Per-request timeout for the OpenAI and Anthropic SDKs (read also bounds writes and the pool wait)."""
+        import httpx
+
+        return httpx.Timeout(self.read, connect=self.connect)
+
+
+class Deadline:
+    """Time budget of one request, with a ledger of where it was spent.
+
+    Provider attempts, queueing for provider slots and retry backoff are
+    charged as they happen; whatever else the request spent (reading the
+    upload, decoding, parsing) shows up as 'other' in breakdown(). Charges
+    may come from several threads, as in hedged requests.
+    """
+
+    def __init__(self, budget: float):
+        """Start a deadline budget seconds from now."""
+        self.budget = budget
+        self.started = time.monotonic()
+        self.attempts = 0
+        self._spent: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining(self) -> float:
+        return max(0.0, self.budget - self.elapsed())
+
+    def charge(self, bucket: str, seconds: float) -> None:
+        """Add seconds spent on bucket ('queue', 'backoff' or a provider/model pair)."""
+        with self._lock:
+            self._spent[bucket] = self._spent.get(bucket, 0.0) + seconds
+
+    def charge_attempt(self, provider: str, model: str, seconds: float) -> None:
+        """Record one provider attempt and the time it took."""
+        with self._lock:
+            self.attempts += 1
+        self.charge(f'{provider}/{model}', seconds)
+
+    def attempt_timeout(self) -> ProviderTimeout | None:
+        """Split the time left between connect and read timeouts for the next attempt.
+
+        Returns:
+            ProviderTimeout with a connect timeout of at most
+            PROVIDER_CONNECT_TIMEOUT and the rest as read timeout, or None when
+            less than PROVIDER_MIN_ATTEMPT_SECONDS is left
+        """
+        remaining = self.remaining()
+        if remaining < Config.PROVIDER_MIN_ATTEMPT_SECONDS:
+            return None
+        connect = min(Config.PROVIDER_CONNECT_TIMEOUT, remaining / 2)
+        return ProviderTimeout(connect=connect, read=remaining - connect)
+
+    def restarted(self) -> 'Deadline':
+        """A fresh deadline with the same budget, for work that starts later (queued jobs)."""
+        return Deadline(self.budget)
+
+    def child(self) -> 'Deadline':
+        """A deadline ending with this one but keeping its own ledger, for one item of a batch."""
+        return Deadline(self.remaining())
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Where the budget went, in milliseconds, for error bodies and logs."""
+        elapsed = self.elapsed()
+        with self._lock:
+            spent = dict(self._spent)
+            attempts = self.attempts
+        # Hedged attempts overlap, so the charges can add up to more than the elapsed time.
+        spent['other'] = max(0.0, elapsed - sum(spent.values()))
+        return {
+            'budget_ms': _ms(self.budget),
+            'elapsed_ms': _ms(elapsed),
+            'remaining_ms': _ms(max(0.0, self.budget - elapsed)),
+            'attempts': attempts,
+            'spent_ms': {bucket: _ms(seconds) for bucket, seconds in spent.items()},
+        }
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 1)
+
+
+def default_deadline() -> Deadline:
+    """A REQUEST_TIMEOUT deadline starting now."""
+    return Deadline(Config.REQUEST_TIMEOUT)
+
+
+def request_deadline(headers: Any) -> Deadline:
+    """Deadline for a request, starting now.
+
+    The budget is the X-Request-Timeout header in seconds when it holds a
+    positive number, otherwise REQUEST_TIMEOUT, and never more than
+    REQUEST_TIMEOUT_MAX. An unusable header is ignored rather than failing
+    the request.
+    """
+    budget = Config.REQUEST_TIMEOUT
+    try:
+        requested = float(headers.get(DEADLINE_HEADER) or 'nan')
+    except ValueError:
+        requested = math.nan
+    if math.isfinite(requested) and requested > 0:
+        budget = requested
+    return Deadline(min(budget, Config.REQUEST_TIMEOUT_MAX))
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed provider call may succeed if tried again.
+
+    An error wrapping an SDK exception is retryable when the provider was at
+    fault: rate limits, timeouts, conflicts, 5xx responses and failures
+    without an HTTP status (dropped connections). An error a handler raised
+    on its own (an empty answer, say) is retryable only if its status is in
+    RETRYABLE_STATUSES. NON_RETRYABLE_CODES never are.
+    """
+    if getattr(error, 'code', None) in NON_RETRYABLE_CODES:
+        return False
+    if error.__cause__ is None:
+        return getattr(error, 'status', None) in RETRYABLE_STATUSES
+    return is_provider_fault(error)
+
+
+def provider_retry_after(error: BaseException) -> float | None:
+    """Seconds the provider asked to wait, from a Retry-After header on the SDK error's response."""
+    current: BaseException | None = error
+    while current is not None:
+        headers = getattr(getattr(current, 'response', None), 'headers', None)
+        if headers is not None:
+            try:
+                return max(0.0, float(headers.get('retry-after')))
+            except (TypeError, ValueError):
+                return None
+        current = current.__cause__
+    return None
+
+
+def retry_delay(error: BaseException, attempt: int, deadline: Deadline, *, honour_retry_after: bool = True) -> float | None:
+    """Decide whether to retry a failed provider call, and after how long.
+
+    Uses full-jitter exponential backoff: a random delay of up to
+    PROVIDER_RETRY_BASE_DELAY * 2^attempt seconds, capped at
+    PROVIDER_RETRY_MAX_DELAY, or longer if the provider sent Retry-After.
+
+    Args:
+        error: The failure of the attempt that just ended
+        attempt: Number of retries already made for this call
+        deadline: The request's deadline
+        honour_retry_after: False when the retry will use a different API key,
+            which the provider's Retry-After does not apply to
+
+    Returns:
+        Seconds to wait before the next attempt, or None when the error is
+        not retryable, PROVIDER_MAX_RETRIES is used up, or the deadline would
+        leave less than PROVIDER_MIN_ATTEMPT_SECONDS after the wait
+    """
+    if attempt >= Config.PROVIDER_MAX_RETRIES or not is_retryable(error):
+        return None
+    ceiling = min(Config.PROVIDER_RETRY_MAX_DELAY, Config.PROVIDER_RETRY_BASE_DELAY * 2 ** attempt)
+    retry_after = provider_retry_after(error) if honour_retry_after else None
+    delay = max(random.uniform(0.0, ceiling), retry_after or 0.0)
+    if deadline.remaining() - delay < Config.PROVIDER_MIN_ATTEMPT_SECONDS:
+        return None
+    return delay
@@ -0,0 +1,236 @@
+"""Deterministic stand-in provider for offline load tests and development."""
+
+import asyncio
+import json
+import math
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from config import Config
+from .deadlines import ProviderTimeout
+from .recipes import ProviderError
+
+CANNED_RECIPE = {
+    'name': 'Tomato Basil Bruschetta',
+    'prep_time': '15 min',
+    'cook_time': '5 min',
+    'servings': '4',
+    'ingredients_with_measurements': [
+        '1 baguette, sliced',
+        '4 ripe tomatoes, diced',
+        '1 clove garlic, halved',
+        '8 basil leaves, torn',
+        '2 tbsp olive oil',
+        '1/2 tsp flaky salt',
+    ],
+    'instructions': [
+        'Toast the baguette slices until golden.',
+        'Rub each slice with the cut side of the garlic.',
+        'Toss the tomatoes with basil, olive oil and salt.',
+        'Spoon the tomatoes over the toast and serve immediately.',
+    ],
+    'nutrition': {'calories': '210 kcal', 'protein': '6g', 'fat': '8g', 'carbs': '29g'},
+    'tips': 'Use the ripest tomatoes you can find and assemble just before serving.',
+}
+
+LATENCY_DISTRIBUTIONS = ('constant', 'uniform', 'lognormal')
+
+
+class FakeProvider:
+    """Answers recipe prompts locally with configurable latency, errors and truncation.
+
+    Every call draws its latency, whether it fails and whether its response
+    is cut off from one seeded random generator, so a run with the same seed
+    and request order is reproducible. Text-only calls (image_bytes=None, as
+    sent by field repair) always receive the complete response.
+    """
+
+    def __init__(
+        self,
+        *,
+        distribution: str = 'lognormal',
+        median: float = 1.0,
+        spread: float = 0.4,
+        per_megabyte: float = 0.0,
+        error_rate: float = 0.0,
+        truncate_rate: float = 0.0,
+        responses: List[str] | None = None,
+        seed: int | None = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """Configure the fake provider.
+
+        Args:
+            distribution: 'constant', 'uniform' (median +/- spread) or
+                'lognormal' (given median, spread is sigma)
+            median: Median latency in seconds
+            spread: Distribution width, see distribution
+            per_megabyte: Seconds added per megabyte of image, standing in
+                for upload time and image tokens
+            error_rate: Fraction of calls that raise a 503 ProviderError
+            truncate_rate: Fraction of responses cut off partway through
+            responses: Raw response texts to cycle through at random;
+                defaults to one canned recipe
+            seed: Random seed; None for a nondeterministic run
+            sleep: Sleep function, replaceable in tests
+
+        Raises:
+            ValueError: If distribution is unknown
+        """
+        if distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f'Unknown latency distribution "{distribution}"; use one of {", ".join(LATENCY_DISTRIBUTIONS)}.')
+        self.distribution = distribution
+        self.median = median
+        self.spread = spread
+        self.per_megabyte = per_megabyte
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.responses = responses or [json.dumps(CANNED_RECIPE, indent=2)]
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self) -> Tuple[float, bool, bool, str]:
+        with self._lock:
+            if self.distribution == 'constant':
+                latency = self.median
+            elif self.distribution == 'uniform':
+                latency = self._rng.uniform(self.median - self.spread, self.median + self.spread)
+            else:
+                latency = self.median * math.exp(self._rng.gauss(0.0, self.spread))
+            failed = self._rng.random() < self.error_rate
+            truncated = self._rng.random() < self.truncate_rate
+            text = self._rng.choice(self.responses)
+        return max(latency, 0.0), failed, truncated, text
+
+    def _respond(self, image_bytes: memoryview | None) -> Tuple[float, str | None]:
+        """Draw one call's latency and response text; a None text means the call fails."""
+        latency, failed, truncated, text = self._draw()
+        if image_bytes is not None:
+            latency += len(image_bytes) / 1_000_000 * self.per_megabyte
+        if failed:
+            return latency, None
+        if truncated and image_bytes is not None:
+            text = text[:len(text) * 2 // 3]
+        return latency, text
+
+    @staticmethod
+    def _failure() -> ProviderError:
+        return ProviderError(
+            'fake_error',
+            'The fake provider failed on purpose.',
+            status=503,
+            hint='Lower FAKE_ERROR_RATE to make fewer calls fail.',
+        )
+
+    @staticmethod
+    def _timed_out(timeout: ProviderTimeout) -> ProviderError:
+        return ProviderError(
+            'fake_error',
+            'The fake provider did not answer in time.',
+            status=504,
+            hint='Allow more time per request or lower FAKE_LATENCY_MEDIAN.',
+            debug=f'no response within {timeout.total:.2f}s',
+        )
+
+    def generate(
+        self,
+        *,
+        image_bytes: memoryview | None,
+        prompt: str,
+        model: str,
+        api_key: str,
+        mime_type: str | None,
+        timeout: ProviderTimeout | None = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Return a response after the drawn latency; same signature as the real handlers.
+
+        A call whose latency exceeds timeout gives up after timeout.total
+        seconds, like a real SDK would.
+        """
+        latency, text = self._respond(image_bytes)
+        if timeout is not None and latency > timeout.total:
+            self._sleep(timeout.total)
+            raise self._timed_out(timeout)
+        self._sleep(latency)
+        if text is None:
+            raise self._failure()
+        return text, {'model': model}
+
+    async def generate_async(
+        self,
+        *,
+        image_bytes: memoryview | None,
+        prompt: str,
+        model: str,
+        api_key: str,
+        mime_type: str | None,
+        timeout: ProviderTimeout | None = None,
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Asyncio variant of generate that waits on the event loop instead of a thread."""
+        latency, text = self._respond(image_bytes)
+        if timeout is not None and latency > timeout.total:
+            await asyncio.sleep(timeout.total)
+            raise self._timed_out(timeout)
+        await asyncio.sleep(latency)
+        if text is None:
+            raise self._failure()
+        return text, {'model': model}
+
+    def stream(
+        self,
+        *,
+        image_bytes: memoryview | None,
+        prompt: str,
+        model: str,
+        api_key: str,
+        mime_type: str | None,
+        timeout: ProviderTimeout | None = None,
+    ) -> Iterator[str]:
+        """Yield the response in chunks, spending a third of the latency before the first one."""
+        latency, text = self._respond(image_bytes)
+        if timeout is not None and latency / 3 > timeout.total:
+            self._sleep(timeout.total)
+            raise self._timed_out(timeout)
+        if text is None:
+            self._sleep(latency)
+            raise self._failure()
+        chunks = [text[index:index + 64] for index in range(0, len(text), 64)]
+        self._sleep(latency / 3)
+        for chunk in chunks:
+            yield chunk
+            self._sleep(latency * 2 / 3 / len(chunks))
+
+
+def load_responses(path: str) -> List[str] | None:
+    """Read canned responses from a JSON list of strings or recipe objects."""
+    if not path:
+        return None
+    with open(path, encoding='utf-8') as handle:
+        entries = json.load(handle)
+    return [entry if isinstance(entry, str) else json.dumps(entry) for entry in entries]
+
+
+_fake_provider: FakeProvider | None = None
+_fake_provider_lock = threading.Lock()
+
+
+def get_fake_provider() -> FakeProvider:
+    """Return the process-wide fake provider configured from FAKE_* settings."""
+    global _fake_provider
+    if _fake_provider is None:
+        with _fake_provider_lock:
+            if _fake_provider is None:
+                _fake_provider = FakeProvider(
+                    distribution=Config.FAKE_LATENCY_DISTRIBUTION,
+                    median=Config.FAKE_LATENCY_MEDIAN,
+                    spread=Config.FAKE_LATENCY_SPREAD,
+                    per_megabyte=Config.FAKE_LATENCY_PER_MB,
+                    error_rate=Config.FAKE_ERROR_RATE,
+                    truncate_rate=Config.FAKE_TRUNCATE_RATE,
+                    responses=load_responses(Config.FAKE_RESPONSES_PATH),
+                    seed=Config.FAKE_SEED,
+                )
+    return _fake_provider
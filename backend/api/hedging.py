@@ -0,0 +1,144 @@
+"""Hedged execution: race a backup call against a slow primary."""
+
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+from config import Config
+from .latency import LatencyWindow
+
+
+@dataclass
+class HedgeOutcome:
+    """Result of a hedged call."""
+
+    result: Any
+    winner: str
+    launched: bool
+    delay: float
+    elapsed: float
+
+
+def hedge_delay(window: LatencyWindow) -> float:
+    """Pick how long to wait for the primary before launching the backup.
+
+    Uses the configured percentile of the primary's recent latencies once
+    enough samples exist, otherwise HEDGE_DEFAULT_DELAY, clamped to
+    [HEDGE_MIN_DELAY, HEDGE_MAX_DELAY].
+    """
+    delay = Config.HEDGE_DEFAULT_DELAY
+    if len(window) >= Config.HEDGE_MIN_SAMPLES:
+        delay = window.percentile(Config.HEDGE_PERCENTILE) or delay
+    return min(max(delay, Config.HEDGE_MIN_DELAY), Config.HEDGE_MAX_DELAY)
+
+
+def hedged_call(
+    primary: Callable[[], Any],
+    secondary: Callable[[], Any],
+    *,
+    delay: float,
+    accept: Callable[[Any], bool],
+    executor: ThreadPoolExecutor,
+    may_launch: Callable[[], bool] = lambda: True,
+) -> HedgeOutcome:
+    """Run primary, and secondary too if primary is slow or fails.
+
+    The secondary starts when primary has not produced an accepted result
+    within delay seconds, or immediately when primary finishes with an
+    unaccepted result or an exception, unless may_launch() says no at that
+    point; then only the primary runs. The first accepted result wins. The
+    losing call is cancelled if it has not started; a call already in flight
+    cannot be interrupted here, so callers that want it stopped signal it
+    themselves once this returns, and its result is discarded.
+
+    When neither call produces an accepted result, the primary's outcome is
+    returned (or its exception re-raised), falling back to the secondary's
+    only if the primary raised and the secondary returned something.
+
+    Args:
+        primary: Zero-argument callable for the preferred backend
+        secondary: Zero-argument callable for the backup backend
+        delay: Seconds to wait for primary before launching secondary
+        accept: Predicate deciding whether a result is good enough to win
+        executor: Pool the calls run on, each with a copy of the caller's context
+        may_launch: Asked once, when the secondary is due, whether it may start
+
+    Returns:
+        HedgeOutcome describing the winning result
+    """
+    started = time.monotonic()
+    futures: Dict[Future, str] = {_submit(executor, primary): 'primary'}
+    outcomes: Dict[str, Any] = {}
+    launched = False
+    pending = True
+
+    while futures:
+        timeout = max(0.0, started + delay - time.monotonic()) if pending else None
+        done, _ = wait(list(futures), timeout=timeout, return_when=FIRST_COMPLETED)
+        winner = _collect(done, futures, outcomes, accept)
+        if winner is not None:
+            for loser in futures:
+                loser.cancel()
+            label, result = winner
+            return HedgeOutcome(result, label, launched, delay, time.monotonic() - started)
+        if pending:
+            pending = False
+            launched = may_launch()
+            if launched:
+                futures[_submit(executor, secondary)] = 'secondary'
+
+    label, result = _best_unaccepted(outcomes)
+    return HedgeOutcome(result, label, launched, delay, time.monotonic() - started)
+
+
+def _submit(executor: ThreadPoolExecutor, fn: Callable[[], Any]) -> Future:
+    return executor.submit(contextvars.copy_context().run, fn)
+
+
+def _collect(
+    done: Iterable[Future],
+    futures: Dict[Future, str],
+    outcomes: Dict[str, Any],
+    accept: Callable[[Any], bool],
+) -> Tuple[str, Any] | None:
+    """Take finished calls out of futures, returning (label, result) of the first accepted one.
+
+    Results that are not accepted, and exceptions, are kept in outcomes by label.
+    """
+    for future in done:
+        label = futures.pop(future)
+        try:
+            result = future.result()
+        except Exception as exc:  # noqa: BLE001
+            outcomes[label] = exc
+            continue
+        if accept(result):
+            return label, result
+        outcomes[label] = result
+    return None
+
+
+def _best_unaccepted(outcomes: Dict[str, Any]) -> Tuple[str, Any]:
+    """The primary's result, else the secondary's, when neither was accepted; re-raises the primary's error otherwise."""
+    for label in ('primary', 'secondary'):
+        outcome = outcomes.get(label)
+        if outcome is not None and not isinstance(outcome, Exception):
+            return label, outcome
+    raise outcomes['primary']
+
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_hedge_executor() -> ThreadPoolExecutor:
+    """Return the process-wide pool that runs hedged provider calls."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=Config.HEDGE_MAX_WORKERS, thread_name_prefix='recipe-hedge')
+    return _executor
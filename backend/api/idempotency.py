@@ -0,0 +1,357 @@
+"""Idempotency-Key support: keep each request's final response and replay it on retry."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Tuple
+
+from config import Config
+from .clients import fingerprint_api_key
+from .deadlines import request_deadline
+from .metrics import get_metrics
+from .sqlitedb import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+_KEY_PATTERN = re.compile(r'^[\x21-\x7e]{1,255}$')
+
+# Headers kept with a stored response; per-request ones (X-Request-ID, Server-Timing) are not replayed.
+STORED_HEADERS = ('Content-Type', 'Location')
+
+STARTED = 'started'
+RUNNING = 'running'
+DONE = 'done'
+MISMATCH = 'mismatch'
+
+
+@dataclass
+class StoredResponse:
+    """A finished response kept for replay."""
+
+    status: int
+    headers: Dict[str, str]
+    body: bytes
+
+
+class InProgress(Exception):
+    """Raised when the request holding a key is still running after the wait timeout."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('A request with this Idempotency-Key is still being processed.')
+        self.retry_after = retry_after
+
+
+class KeyReused(Exception):
+    """Raised when an Idempotency-Key is sent again with a different request."""
+
+    def __init__(self):
+        super().__init__('This Idempotency-Key was already used for a different request.')
+
+
+def client_identity(form: Any, remote_addr: str | None) -> str:
+    """Who sent a request: the fingerprint of its API key, else its IP address."""
+    api_key = (form.get('api_key') or '').strip()
+    return f'key:{fingerprint_api_key(api_key)}' if api_key else f'ip:{remote_addr}'
+
+
+def scoped_key(endpoint: str, client: str, raw_key: str) -> str:
+    """Namespace a client's Idempotency-Key by endpoint and client_identity.
+
+    Two clients that happen to pick the same key never see each other's responses.
+
+    Raises:
+        ValueError: If the key is empty, longer than 255 characters or not printable ASCII
+    """
+    if not _KEY_PATTERN.match(raw_key):
+        raise ValueError('invalid Idempotency-Key')
+    return f'{endpoint}:{client}:{raw_key}'
+
+
+def request_fingerprint(form: Any, files: Iterable[Tuple[str, str]]) -> str:
+    """Hash a request's form fields and uploads, to tell a retry from a new request under the same key.
+
+    Args:
+        form: Form fields (a MultiDict)
+        files: (field name, SHA-256 hex digest of the content) per uploaded file
+
+    Returns:
+        Hex SHA-256 digest, independent of field order and multipart boundaries
+    """
+    digest = hashlib.sha256()
+    for entry in sorted(form.items(multi=True)):
+        digest.update(json.dumps(entry).encode('utf-8'))
+    for entry in sorted(files):
+        digest.update(json.dumps(entry).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class IdempotencyStore(ABC):
+    """Storage interface for idempotency keys, shared by every worker that can see it."""
+
+    @abstractmethod
+    def begin(self, key: str, owner: str, fingerprint: str, *, lock_ttl: float) -> Tuple[str, StoredResponse | None]:
+        """Claim key for owner unless a live request holds it or its response is stored.
+
+        Args:
+            key: Scoped idempotency key
+            owner: Unique id of the claiming request
+            fingerprint: request_fingerprint of the claiming request
+            lock_ttl: Seconds the claim lasts, so a crashed worker cannot hold a key forever
+
+        Returns:
+            (STARTED, None) if owner now holds the key, (MISMATCH, None) if
+            the key belongs to a request with another fingerprint, (RUNNING,
+            None) while another request holds it, or (DONE, response) once
+            it is stored
+        """
+
+    @abstractmethod
+    def complete(self, key: str, owner: str, response: StoredResponse, *, ttl: float) -> None:
+        """Store owner's final response for ttl seconds; a no-op if owner lost the key."""
+
+    @abstractmethod
+    def abandon(self, key: str, owner: str) -> None:
+        """Release owner's claim without storing anything, so a retry runs afresh."""
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """In-process store bounded by entry count; visible to one worker only."""
+
+    def __init__(self, *, max_entries: int):
+        """Create an empty store holding at most max_entries keys, evicting the least recently used."""
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float, StoredResponse | None, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def begin(self, key: str, owner: str, fingerprint: str, *, lock_ttl: float) -> Tuple[str, StoredResponse | None]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                if entry[3] != fingerprint:
+                    return MISMATCH, None
+                return (DONE, entry[2]) if entry[2] is not None else (RUNNING, None)
+            self._entries[key] = (owner, now + lock_ttl, None, fingerprint)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return STARTED, None
+
+    def complete(self, key: str, owner: str, response: StoredResponse, *, ttl: float) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == owner:
+                self._entries[key] = (owner, time.time() + ttl, response, entry[3])
+
+    def abandon(self, key: str, owner: str) -> None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == owner and entry[2] is None:
+                del self._entries[key]
+
+
+class SQLiteIdempotencyStore(IdempotencyStore):
+    """SQLite store so a retry landing on any worker sees the original request.
+
+    Holds at most max_entries keys; the oldest are deleted whenever a
+    response is stored. Database errors are logged and treated as "no
+    entry", degrading to running the request again.
+    """
+
+    def __init__(self, path: str, *, max_entries: int):
+        """Open (or create) the idempotency database at path."""
+        self.max_entries = max_entries
+        self._db = SQLiteDatabase(path, [
+            (
+                'CREATE TABLE IF NOT EXISTS idempotency_keys ('
+                ' key TEXT PRIMARY KEY,'
+                ' owner TEXT NOT NULL,'
+                ' fingerprint TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' status INTEGER,'
+                ' headers TEXT,'
+                ' body BLOB)'
+            ),
+            'CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys (created_at)',
+        ])
+
+    def begin(self, key: str, owner: str, fingerprint: str, *, lock_ttl: float) -> Tuple[str, StoredResponse | None]:
+        now = time.time()
+        try:
+            conn = self._db.connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    'SELECT status, headers, body, fingerprint FROM idempotency_keys WHERE key = ? AND expires_at > ?',
+                    (key, now),
+                ).fetchone()
+                if row is None:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO idempotency_keys (key, owner, fingerprint, created_at, expires_at)'
+                        ' VALUES (?, ?, ?, ?, ?)',
+                        (key, owner, fingerprint, now, now + lock_ttl),
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        except sqlite3.Error as exc:
+            logger.warning('Idempotency key lookup failed: %s', exc)
+            return STARTED, None
+        if row is None:
+            return STARTED, None
+        if row[3] != fingerprint:
+            return MISMATCH, None
+        if row[0] is None:
+            return RUNNING, None
+        return DONE, StoredResponse(row[0], json.loads(row[1]), bytes(row[2]))
+
+    def complete(self, key: str, owner: str, response: StoredResponse, *, ttl: float) -> None:
+        now = time.time()
+        try:
+            conn = self._db.connect()
+            conn.execute(
+                'UPDATE idempotency_keys SET expires_at = ?, status = ?, headers = ?, body = ? WHERE key = ? AND owner = ?',
+                (now + ttl, response.status, json.dumps(response.headers), response.body, key, owner),
+            )
+            conn.execute('DELETE FROM idempotency_keys WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'DELETE FROM idempotency_keys WHERE key IN ('
+                ' SELECT key FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+        except sqlite3.Error as exc:
+            logger.warning('Idempotent response store failed: %s', exc)
+
+    def abandon(self, key: str, owner: str) -> None:
+        try:
+            self._db.connect().execute(
+                'DELETE FROM idempotency_keys WHERE key = ? AND owner = ? AND status IS NULL',
+                (key, owner),
+            )
+        except sqlite3.Error as exc:
+            logger.warning('Idempotency key release failed: %s', exc)
+
+
+def _in_progress(waited: float) -> InProgress:
+    get_metrics().inc('dishcovery_idempotency_total', outcome='conflict')
+    # By then the original has finished or its claim has expired.
+    return InProgress(max(1, math.ceil(Config.IDEMPOTENCY_LOCK_TTL - waited)))
+
+
+def _claimed(state: str, stored: StoredResponse | None, waited: bool) -> StoredResponse | None:
+    if state == MISMATCH:
+        get_metrics().inc('dishcovery_idempotency_total', outcome='mismatch')
+        raise KeyReused()
+    if state == DONE:
+        get_metrics().inc('dishcovery_idempotency_total', outcome='attached' if waited else 'replayed')
+    return stored
+
+
+def wait_budget(headers: Any) -> float:
+    """Seconds a retry may wait for its original: IDEMPOTENCY_WAIT_TIMEOUT, capped at the request's deadline."""
+    return min(Config.IDEMPOTENCY_WAIT_TIMEOUT, request_deadline(headers).remaining())
+
+
+def claim(store: IdempotencyStore, key: str, owner: str, fingerprint: str, *, wait: float) -> StoredResponse | None:
+    """Claim key for this request, or wait for the request holding it.
+
+    A retry that arrives while the original request is still running polls
+    until the original finishes and then replays its response. If the
+    original gives up without storing one, the retry takes the key over.
+
+    Args:
+        store: Idempotency store
+        key: Scoped idempotency key
+        owner: Unique id of this request
+        fingerprint: request_fingerprint of this request
+        wait: Seconds to wait for a running original (see wait_budget)
+
+    Returns:
+        The stored response to replay, or None when this request now holds
+        the key and must run
+
+    Raises:
+        KeyReused: If the key was used for a request with another fingerprint
+        InProgress: If the original is still running after wait seconds
+    """
+    started = time.monotonic()
+    waited = False
+    while True:
+        state, stored = store.begin(key, owner, fingerprint, lock_ttl=Config.IDEMPOTENCY_LOCK_TTL)
+        if state != RUNNING:
+            return _claimed(state, stored, waited)
+        if time.monotonic() - started >= wait:
+            raise _in_progress(wait)
+        waited = True
+        time.sleep(Config.IDEMPOTENCY_POLL_INTERVAL)
+
+
+async def claim_async(store: IdempotencyStore, key: str, owner: str, fingerprint: str, *, wait: float) -> StoredResponse | None:
+    """Asyncio counterpart of claim; the store is read on the executor and waits are awaited."""
+    started = time.monotonic()
+    waited = False
+    while True:
+        state, stored = await asyncio.to_thread(store.begin, key, owner, fingerprint, lock_ttl=Config.IDEMPOTENCY_LOCK_TTL)
+        if state != RUNNING:
+            return _claimed(state, stored, waited)
+        if time.monotonic() - started >= wait:
+            raise _in_progress(wait)
+        waited = True
+        await asyncio.sleep(Config.IDEMPOTENCY_POLL_INTERVAL)
+
+
+def remember(store: IdempotencyStore, key: str, owner: str, status: int, headers: Any, body: bytes) -> None:
+    """Store a finished response for replay, or release the key if it must not be replayed.
+
+    Responses carrying Retry-After (load shedding, rate limits, busy
+    providers) ask the client to try again, and nothing was generated for
+    them, so they release the key instead of being stored.
+    """
+    if 'Retry-After' in headers:
+        store.abandon(key, owner)
+        return
+    kept = {name: headers[name] for name in STORED_HEADERS if name in headers}
+    store.complete(key, owner, StoredResponse(status, kept, body), ttl=Config.IDEMPOTENCY_TTL)
+    get_metrics().inc('dishcovery_idempotency_total', outcome='stored')
+
+
+def build_idempotency_store(config: Any) -> IdempotencyStore | None:
+    """Create the idempotency store described by the application config."""
+    backend_name = (config.IDEMPOTENCY_BACKEND or 'sqlite').lower()
+    if backend_name == 'none':
+        return None
+    if backend_name == 'memory':
+        return MemoryIdempotencyStore(max_entries=config.IDEMPOTENCY_MAX_ENTRIES)
+    if backend_name != 'sqlite':
+        logger.warning('Unknown IDEMPOTENCY_BACKEND "%s"; using sqlite.', backend_name)
+    return SQLiteIdempotencyStore(config.IDEMPOTENCY_PATH, max_entries=config.IDEMPOTENCY_MAX_ENTRIES)
+
+
+_store: IdempotencyStore | None = None
+_store_ready = False
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store() -> IdempotencyStore | None:
+    """Return the process-wide idempotency store, or None when IDEMPOTENCY_BACKEND is 'none'."""
+    global _store, _store_ready
+    if not _store_ready:
+        with _store_lock:
+            if not _store_ready:
+                _store = build_idempotency_store(Config)
+                _store_ready = True
+    return _store
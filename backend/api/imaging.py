@@ -0,0 +1,110 @@
+"""Single-pass image preprocessing before provider dispatch."""
+
+import io
+import math
+from dataclasses import dataclass
+from typing import BinaryIO
+
+from PIL import Image, ImageOps
+
+ENCODE_MIME_TYPES = {
+    'JPEG': 'image/jpeg',
+    'WEBP': 'image/webp',
+    'PNG': 'image/png',
+}
+
+
+@dataclass(frozen=True)
+class PreparedImage:
+    """Re-encoded image payload that is sent to a provider.
+
+    data is a read-only view of the encoder's buffer rather than a copy.
+    """
+
+    data: memoryview
+    mime_type: str
+    width: int
+    height: int
+
+
+def decode_image(source: bytes | BinaryIO, *, max_dimension: int | None = None) -> Image.Image:
+    """Decode an upload once, applying EXIF orientation and keeping the first frame.
+
+    When max_dimension is given, JPEG decoding uses DCT scaling so that a
+    large photo is never expanded to full resolution only to be shrunk again.
+    The draft never drops below the requested size.
+
+    Args:
+        source: Raw uploaded image data, or a seekable binary file holding it;
+            a file is read incrementally and left open
+        max_dimension: Longest edge the caller will downscale to, if any
+
+    Returns:
+        Fully loaded PIL image in display orientation
+
+    Raises:
+        UnidentifiedImageError: If the data is not a recognised image format
+        OSError: If the image data is truncated or corrupt
+    """
+    image = Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source)
+    if max_dimension and image.format == 'JPEG':
+        width, height = image.size
+        scale = max_dimension / max(width, height)
+        if scale < 1:
+            image.draft('RGB', (math.ceil(width * scale), math.ceil(height * scale)))
+    # Animated formats decode their first frame on load().
+    image.load()
+    ImageOps.exif_transpose(image, in_place=True)
+    return image
+
+
+def prepare_image(image: Image.Image, *, max_dimension: int, image_format: str, quality: int) -> PreparedImage:
+    """Downscale and re-encode a decoded image for upload to a provider.
+
+    Metadata is not carried over, so EXIF (including GPS) never leaves the
+    server. Transparent images are flattened onto white for formats without
+    an alpha channel.
+
+    Args:
+        image: Decoded image from decode_image
+        max_dimension: Maximum length of the longest edge in pixels
+        image_format: Output format ('JPEG', 'WEBP' or 'PNG')
+        quality: Encoder quality for lossy formats (1-100)
+
+    Returns:
+        PreparedImage holding the encoded bytes, MIME type and dimensions
+    """
+    image_format = image_format.upper()
+    if image_format not in ENCODE_MIME_TYPES:
+        raise ValueError(f'Unsupported encode format: {image_format}')
+
+    working = _to_encodable_mode(image, keep_alpha=image_format != 'JPEG')
+    if max(working.size) > max_dimension:
+        if working is image:
+            working = working.copy()
+        working.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+    buffer = io.BytesIO()
+    save_options = {'quality': quality} if image_format in {'JPEG', 'WEBP'} else {}
+    working.save(buffer, format=image_format, **save_options)
+    return PreparedImage(
+        data=buffer.getbuffer().toreadonly(),
+        mime_type=ENCODE_MIME_TYPES[image_format],
+        width=working.width,
+        height=working.height,
+    )
+
+
+def _to_encodable_mode(image: Image.Image, *, keep_alpha: bool) -> Image.Image:
+    """Convert an image to RGB, or RGBA when the target format supports alpha."""
+    has_alpha = image.mode in {'RGBA', 'LA', 'PA'} or (image.mode == 'P' and 'transparency' in image.info)
+    if has_alpha:
+        rgba = image.convert('RGBA')
+        if keep_alpha:
+            return rgba
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    if image.mode != 'RGB':
+        return image.convert('RGB')
+    return image
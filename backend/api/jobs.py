@@ -0,0 +1,442 @@
+"""Asynchronous recipe jobs: submit now, poll or subscribe for the result."""
+
+import json
+import logging
+import math
+import threading
+import time
+import traceback
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Tuple
+
+from flask import Response, jsonify, request, stream_with_context
+
+from config import Config
+from . import api_bp
+from .latency import LatencyWindow
+from .recipes import (
+    SERVER_ERROR,
+    ApiError,
+    RecipeRequest,
+    check_rate_limit,
+    check_recipe_rate_limits,
+    error_payload,
+    error_response,
+    idempotent,
+    keep_upload,
+    parse_recipe_request,
+    read_upload,
+    request_file,
+    run_recipe_pipeline,
+)
+from .sqlitedb import SQLiteDatabase
+from .streaming import sse_event
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+@dataclass
+class Job:
+    """State of one asynchronous recipe job as kept by a JobStore."""
+
+    id: str
+    status: str
+    created_at: float
+    updated_at: float
+    expires_at: float
+    result: Dict[str, Any] | None = None
+    error: Dict[str, Any] | None = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Render the job for API responses."""
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'created_at': self.created_at,
+            'updated_at': self.updated_at,
+            'expires_at': self.expires_at,
+        }
+        if self.result is not None:
+            data['result'] = self.result
+        if self.error is not None:
+            data['error'] = self.error
+        return data
+
+
+class JobStore(ABC):
+    """Storage interface for job state, shared by the submitting and polling workers."""
+
+    @abstractmethod
+    def add(self, job: Job) -> None:
+        """Store a new job."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Job | None:
+        """Return the job, or None when unknown or expired."""
+
+    @abstractmethod
+    def transition(self, job_id: str, from_statuses: Tuple[str, ...], status: str, *, ttl: float, **fields: Any) -> bool:
+        """Atomically move a job to status if it is currently in from_statuses.
+
+        Args:
+            job_id: Job to update
+            from_statuses: Statuses the job must be in for the update to apply
+            status: New status
+            ttl: Seconds the job is kept after this update
+            **fields: 'result' and/or 'error' to store alongside the status
+
+        Returns:
+            True if the job was updated
+        """
+
+    @abstractmethod
+    def purge_expired(self) -> None:
+        """Remove jobs past their expiry."""
+
+
+class MemoryJobStore(JobStore):
+    """In-process job store bounded by entry count; visible to one worker only."""
+
+    def __init__(self, *, max_entries: int):
+        """Create an empty store holding at most max_entries jobs."""
+        self.max_entries = max_entries
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_entries:
+                self._jobs.popitem(last=False)
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.expires_at <= time.time():
+                return None
+            return Job(**asdict(job))
+
+    def transition(self, job_id: str, from_statuses: Tuple[str, ...], status: str, *, ttl: float, **fields: Any) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in from_statuses:
+                return False
+            now = time.time()
+            job.status = status
+            job.updated_at = now
+            job.expires_at = now + ttl
+            for name, value in fields.items():
+                setattr(job, name, value)
+            return True
+
+    def purge_expired(self) -> None:
+        now = time.time()
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items() if job.expires_at <= now]:
+                del self._jobs[job_id]
+
+
+class SQLiteJobStore(JobStore):
+    """SQLite job store so any worker process can answer polls for any job."""
+
+    def __init__(self, path: str):
+        """Open (or create) the job database at path."""
+        self._db = SQLiteDatabase(path, [
+            (
+                'CREATE TABLE IF NOT EXISTS recipe_jobs ('
+                ' id TEXT PRIMARY KEY,'
+                ' status TEXT NOT NULL,'
+                ' created_at REAL NOT NULL,'
+                ' updated_at REAL NOT NULL,'
+                ' expires_at REAL NOT NULL,'
+                ' result TEXT,'
+                ' error TEXT)'
+            ),
+            'CREATE INDEX IF NOT EXISTS recipe_jobs_expires ON recipe_jobs (expires_at)',
+        ])
+
+    def add(self, job: Job) -> None:
+        self._db.connect().execute(
+            'INSERT INTO recipe_jobs (id, status, created_at, updated_at, expires_at, result, error)'
+            ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (job.id, job.status, job.created_at, job.updated_at, job.expires_at, _dump(job.result), _dump(job.error)),
+        )
+
+    def get(self, job_id: str) -> Job | None:
+        row = self._db.connect().execute(
+            'SELECT id, status, created_at, updated_at, expires_at, result, error'
+            ' FROM recipe_jobs WHERE id = ? AND expires_at > ?',
+            (job_id, time.time()),
+        ).fetchone()
+        if row is None:
+            return None
+        return Job(*row[:5], result=_load(row[5]), error=_load(row[6]))
+
+    def transition(self, job_id: str, from_statuses: Tuple[str, ...], status: str, *, ttl: float, **fields: Any) -> bool:
+        now = time.time()
+        assignments = ['status = ?', 'updated_at = ?', 'expires_at = ?']
+        values: list = [status, now, now + ttl]
+        for name in ('result', 'error'):
+            if name in fields:
+                assignments.append(f'{name} = ?')
+                values.append(_dump(fields[name]))
+        placeholders = ', '.join('?' for _ in from_statuses)
+        cursor = self._db.connect().execute(
+            f'UPDATE recipe_jobs SET {", ".join(assignments)} WHERE id = ? AND status IN ({placeholders})',
+            (*values, job_id, *from_statuses),
+        )
+        return cursor.rowcount == 1
+
+    def purge_expired(self) -> None:
+        self._db.connect().execute('DELETE FROM recipe_jobs WHERE expires_at <= ?', (time.time(),))
+
+
+def _dump(value: Dict[str, Any] | None) -> str | None:
+    return None if value is None else json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _load(raw: str | None) -> Dict[str, Any] | None:
+    return None if raw is None else json.loads(raw)
+
+
+class QueueFullError(ApiError):
+    """Raised when the job queue has no room; rendered as 429 with Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(
+            'queue_full',
+            'The server is busy. Please retry shortly.',
+            status=429,
+            hint=f'Retry after {retry_after} seconds.',
+            retry_after=retry_after,
+        )
+
+
+class JobRunner:
+    """Runs recipe jobs on a worker pool with a bounded backlog.
+
+    At most max_workers jobs run at once and at most max_queue more wait for
+    a worker; submissions beyond that are rejected with QueueFullError so a
+    burst turns into fast 429s instead of unbounded memory growth. The
+    Retry-After hint is estimated from recent job durations and the depth of
+    the backlog.
+    """
+
+    def __init__(self, store: JobStore, *, max_workers: int, max_queue: int, ttl: float):
+        """Create the runner.
+
+        Args:
+            store: Where job state is kept
+            max_workers: Jobs run concurrently
+            max_queue: Jobs allowed to wait for a worker
+            ttl: Seconds a job is kept after its last update
+        """
+        self.store = store
+        self.max_workers = max_workers
+        self.capacity = max_workers + max_queue
+        self.ttl = ttl
+        self.durations = LatencyWindow(100)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recipe-job')
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """Jobs queued or running in this process."""
+        return self._pending
+
+    def submit(self, recipe_request: RecipeRequest) -> Job:
+        """Queue a recipe request as a new job.
+
+        Raises:
+            QueueFullError: If the backlog is full
+        """
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise QueueFullError(self.retry_after())
+            self._pending += 1
+
+        now = time.time()
+        job = Job(id=uuid.uuid4().hex, status=QUEUED, created_at=now, updated_at=now, expires_at=now + self.ttl)
+        try:
+            self.store.purge_expired()
+            self.store.add(job)
+            self._executor.submit(self._run, job.id, recipe_request)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            raise
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job.
+
+        A queued job never starts. A running provider call cannot be
+        interrupted, so it finishes in the background and its result is
+        discarded.
+
+        Returns:
+            True if the job was cancelled, False if it was unknown or already finished
+        """
+        return self.store.transition(job_id, (QUEUED, RUNNING), CANCELLED, ttl=self.ttl)
+
+    def retry_after(self) -> int:
+        """Estimate seconds until a queue slot frees up."""
+        typical = self.durations.percentile(50) or Config.JOB_DEFAULT_RETRY_AFTER
+        backlog = max(self._pending - self.max_workers, 1)
+        return max(1, math.ceil(typical * backlog / self.max_workers))
+
+    def _run(self, job_id: str, recipe_request: RecipeRequest) -> None:
+        started = time.monotonic()
+        try:
+            if not self.store.transition(job_id, (QUEUED,), RUNNING, ttl=self.ttl):
+                return
+            # Time spent queued does not count against the request's deadline.
+            recipe_request.deadline = recipe_request.deadline.restarted()
+            try:
+                payload = run_recipe_pipeline(recipe_request)
+            except ApiError as error:
+                self.store.transition(job_id, (RUNNING,), FAILED, ttl=self.ttl, error=error_payload(error)['error'])
+                return
+            except Exception as exc:  # noqa: BLE001
+                logger.error('Server error in job %s: %s', job_id, exc)
+                logger.debug(traceback.format_exc())
+                self.store.transition(job_id, (RUNNING,), FAILED, ttl=self.ttl, error=error_payload(SERVER_ERROR)['error'])
+                return
+            self.store.transition(job_id, (RUNNING,), SUCCEEDED, ttl=self.ttl, result=payload)
+            self.durations.add(time.monotonic() - started)
+        except Exception as exc:  # noqa: BLE001
+            logger.error('Job store failure for job %s: %s', job_id, exc)
+        finally:
+            recipe_request.upload.close()
+            with self._lock:
+                self._pending -= 1
+
+
+def build_job_store(config: Any) -> JobStore:
+    """Create the job store described by the application config."""
+    backend_name = (config.JOB_STORE_BACKEND or 'memory').lower()
+    if backend_name == 'sqlite':
+        return SQLiteJobStore(config.JOB_STORE_PATH)
+    if backend_name != 'memory':
+        logger.warning('Unknown JOB_STORE_BACKEND "%s"; using memory.', backend_name)
+    return MemoryJobStore(max_entries=config.JOB_MAX_STORED)
+
+
+_runner: JobRunner | None = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner() -> JobRunner:
+    """Return the process-wide job runner."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = JobRunner(
+                    build_job_store(Config),
+                    max_workers=Config.JOB_MAX_WORKERS,
+                    max_queue=Config.JOB_MAX_QUEUE,
+                    ttl=Config.JOB_TTL,
+                )
+    return _runner
+
+
+JOB_NOT_FOUND = ApiError('job_not_found', 'Job not found. It may have expired.', status=404)
+
+
+@api_bp.route('/jobs', methods=['POST'])
+@idempotent
+def submit_job():
+    """Queue recipe generation and return a job id immediately.
+
+    Accepts the same form fields as /generate-recipe. Responds 202 with the
+    job and a Location header to poll, or 429 with Retry-After when the
+    queue is full or the client's rate limit is spent.
+    """
+    try:
+        check_rate_limit('recipe', 'ip', request.remote_addr)
+        upload = read_upload(request_file('file'))
+        recipe_request = parse_recipe_request(upload, request.form, request.headers)
+        check_recipe_rate_limits(recipe_request)
+        job = get_job_runner().submit(recipe_request)
+        # The job reads the upload after this response; it closes the spool itself.
+        keep_upload(upload)
+    except ApiError as error:
+        return error_response(error)
+    except Exception as exc:  # noqa: BLE001
+        logger.error('Server error: %s', exc)
+        logger.debug(traceback.format_exc())
+        return error_response(SERVER_ERROR)
+
+    response = jsonify({'success': True, 'job': job.to_dict()})
+    response.headers['Location'] = f'/api/jobs/{job.id}'
+    return response, 202
+
+
+@api_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id: str):
+    """Return a job's status, plus its result or error once finished."""
+    job = get_job_runner().store.get(job_id)
+    if job is None:
+        return error_response(JOB_NOT_FOUND)
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@api_bp.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id: str):
+    """Cancel a queued or running job."""
+    runner = get_job_runner()
+    runner.cancel(job_id)
+    job = runner.store.get(job_id)
+    if job is None:
+        return error_response(JOB_NOT_FOUND)
+    if job.status != CANCELLED:
+        return error_response(ApiError('job_finished', f'Job already {job.status}.', status=409))
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@api_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id: str):
+    """Subscribe to a job as Server-Sent Events.
+
+    Emits a 'status' event whenever the status changes and ends with
+    'complete' (the job, including its result or error) or 'error' if the
+    job disappears.
+    """
+    if get_job_runner().store.get(job_id) is None:
+        return error_response(JOB_NOT_FOUND)
+    return Response(
+        stream_with_context(watch_job(job_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def watch_job(job_id: str) -> Iterator[str]:
+    """Poll the job store and yield SSE messages until the job finishes."""
+    store = get_job_runner().store
+    last_status = None
+    while True:
+        job = store.get(job_id)
+        if job is None:
+            yield sse_event('error', error_payload(JOB_NOT_FOUND))
+            return
+        if job.status != last_status:
+            last_status = job.status
+            yield sse_event('status', {'id': job.id, 'status': job.status})
+        if job.status in FINISHED:
+            yield sse_event('complete', job.to_dict())
+            return
+        time.sleep(Config.JOB_POLL_INTERVAL)
@@ -0,0 +1,258 @@
+"""Pools of server API keys, so one provider's traffic is spread over several quotas."""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from flask import jsonify
+
+from config import Config
+from . import api_bp
+from .clients import fingerprint_api_key
+from .deadlines import provider_retry_after
+from .metrics import get_metrics
+from .operator import operator_only
+
+logger = logging.getLogger(__name__)
+
+LEAST_LOADED = 'least_loaded'
+ROUND_ROBIN = 'round_robin'
+STRATEGIES = (LEAST_LOADED, ROUND_ROBIN)
+
+
+@dataclass
+class PooledKey:
+    """One server API key with its load and rate-limit state."""
+
+    api_key: str
+    weight: int
+    in_flight: int = 0
+    calls: int = 0
+    throttled: int = 0
+    cooling_until: float = 0.0
+    credit: int = 0  # smooth weighted round-robin
+
+    @property
+    def label(self) -> str:
+        """Short fingerprint naming the key in stats and metrics."""
+        return fingerprint_api_key(self.api_key)[:8]
+
+
+class KeyPool:
+    """Server API keys per provider, handed out one provider attempt at a time.
+
+    least_loaded picks the key with the fewest calls in flight for its
+    weight, breaking ties by calls made for its weight, so idle pools are
+    used in weighted turns. round_robin cycles through the keys in
+    proportion to their weights regardless of load. A key the provider
+    throttled (HTTP 429) cools down and is skipped until then; when every
+    key is cooling, the one that recovers first is used.
+    """
+
+    def __init__(
+        self,
+        pools: Dict[str, List[Tuple[str, int]]],
+        *,
+        strategy: str = LEAST_LOADED,
+        cooldown: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a pool with every key ready.
+
+        Args:
+            pools: Mapping of provider name to (api_key, weight) pairs
+            strategy: 'least_loaded' or 'round_robin'
+            cooldown: Seconds a throttled key is skipped, unless the provider
+                asked for longer with Retry-After
+            clock: Monotonic time source, replaceable in tests
+
+        Raises:
+            ValueError: If strategy is unknown
+        """
+        if strategy not in STRATEGIES:
+            raise ValueError(f'Unknown API key pool strategy: {strategy}')
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.clock = clock
+        self._keys: Dict[str, List[PooledKey]] = {
+            provider: [PooledKey(api_key, max(1, weight)) for api_key, weight in entries]
+            for provider, entries in pools.items()
+            if entries
+        }
+        self._lock = threading.Lock()
+
+    def owns(self, provider: str, api_key: str | None) -> bool:
+        """Whether api_key is one of provider's pooled keys."""
+        return any(key.api_key == api_key for key in self._keys.get(provider, ()))
+
+    def acquire(self, provider: str) -> str:
+        """Pick a key for one call and count it in flight until release().
+
+        Raises:
+            KeyError: If provider has no pooled keys
+        """
+        now = self.clock()
+        with self._lock:
+            keys = self._keys[provider]
+            ready = [key for key in keys if key.cooling_until <= now]
+            if not ready:
+                key = min(keys, key=lambda pooled: pooled.cooling_until)
+            elif self.strategy == ROUND_ROBIN:
+                key = _next_in_turn(ready)
+            else:
+                key = min(ready, key=lambda pooled: (pooled.in_flight / pooled.weight, pooled.calls / pooled.weight))
+            key.in_flight += 1
+            key.calls += 1
+        get_metrics().inc('dishcovery_api_key_calls_total', provider=provider, key=key.label)
+        return key.api_key
+
+    def release(self, provider: str, api_key: str) -> None:
+        """Mark a call made with acquire() as finished."""
+        with self._lock:
+            key = self._find(provider, api_key)
+            key.in_flight = max(0, key.in_flight - 1)
+
+    def throttle(self, provider: str, api_key: str, retry_after: float | None = None) -> bool:
+        """Cool a key down after the provider rate-limited it.
+
+        Args:
+            provider: Provider name
+            api_key: The throttled key
+            retry_after: Seconds the provider asked to wait, if it said
+
+        Returns:
+            True if another of the provider's keys is ready to use now
+        """
+        now = self.clock()
+        with self._lock:
+            key = self._find(provider, api_key)
+            key.throttled += 1
+            key.cooling_until = max(key.cooling_until, now + max(self.cooldown, retry_after or 0.0))
+            seconds = key.cooling_until - now
+            others_ready = any(other.cooling_until <= now for other in self._keys[provider] if other is not key)
+        logger.warning('API key %s for %s was rate limited; cooling down for %.0fs', key.label, provider, seconds)
+        get_metrics().inc('dishcovery_api_key_throttled_total', provider=provider, key=key.label)
+        return others_ready
+
+    def _find(self, provider: str, api_key: str) -> PooledKey:
+        return next(key for key in self._keys[provider] if key.api_key == api_key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-provider key usage, throttling and cool-downs, without the keys themselves."""
+        now = self.clock()
+        with self._lock:
+            providers = {}
+            for provider, keys in self._keys.items():
+                total_calls = sum(key.calls for key in keys)
+                providers[provider] = {
+                    'keys': [
+                        {
+                            'key': key.label,
+                            'weight': key.weight,
+                            'in_flight': key.in_flight,
+                            'calls': key.calls,
+                            'share': round(key.calls / total_calls, 3) if total_calls else None,
+                            'throttled': key.throttled,
+                            'cooling_seconds': round(max(0.0, key.cooling_until - now), 1),
+                        }
+                        for key in keys
+                    ],
+                    'ready': sum(1 for key in keys if key.cooling_until <= now),
+                    'in_flight': sum(key.in_flight for key in keys),
+                    'throttled': sum(key.throttled for key in keys),
+                }
+        return {'strategy': self.strategy, 'cooldown_seconds': self.cooldown, 'providers': providers}
+
+
+def _next_in_turn(keys: List[PooledKey]) -> PooledKey:
+    # Smooth weighted round-robin: weights 2:1 give a, b, a rather than a, a, b.
+    for key in keys:
+        key.credit += key.weight
+    chosen = max(keys, key=lambda pooled: pooled.credit)
+    chosen.credit -= sum(key.weight for key in keys)
+    return chosen
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether a failed call was rejected by the provider's rate limit (HTTP 429).
+
+    Looks for the status of an SDK error in the cause chain, like
+    is_provider_fault; an error a handler raised on its own counts when its
+    status is 429.
+    """
+    current: BaseException | None = error
+    while current is not None:
+        status = getattr(current, 'status_code', None)
+        if not isinstance(status, int):
+            status = getattr(current, 'code', None)
+        if isinstance(status, int):
+            return status == 429
+        current = current.__cause__
+    return error.__cause__ is None and getattr(error, 'status', None) == 429
+
+
+@dataclass
+class KeyLease:
+    """The API key used for one provider attempt."""
+
+    provider: str
+    api_key: str
+    pool: KeyPool | None = None
+
+    def rate_limited(self, error: BaseException) -> bool:
+        """Cool the key down if error is a 429 on a pooled key.
+
+        Returns:
+            True if the key was throttled and another pooled key is ready,
+            so a retry need not wait for the provider's Retry-After
+        """
+        if self.pool is None or not is_rate_limited(error):
+            return False
+        retry_after = provider_retry_after(error) or getattr(error, 'retry_after', None)
+        return self.pool.throttle(self.provider, self.api_key, retry_after)
+
+
+@contextmanager
+def lease_api_key(target: Any) -> Iterator[KeyLease]:
+    """Pick the API key for one attempt against target (a RecipeRequest or ProviderTarget).
+
+    A server key is swapped for the pool's next key for the provider and
+    counted in flight for the block. Keys the client sent are used as is.
+    """
+    pool = get_key_pool()
+    if not pool.owns(target.provider, target.api_key):
+        yield KeyLease(target.provider, target.api_key)
+        return
+    api_key = pool.acquire(target.provider)
+    try:
+        yield KeyLease(target.provider, api_key, pool)
+    finally:
+        pool.release(target.provider, api_key)
+
+
+_pool: KeyPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> KeyPool:
+    """Return the process-wide pool of server API keys."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyPool(
+                    {provider: Config.get_api_key_pool_for(provider) for provider in Config.PROVIDER_KEY_MAP},
+                    strategy=Config.API_KEY_POOL_STRATEGY,
+                    cooldown=Config.API_KEY_COOLDOWN,
+                )
+    return _pool
+
+
+@api_bp.route('/providers/keys', methods=['GET'])
+@operator_only
+def key_pool_status():
+    """Report how evenly the server API keys are used and which are cooling down (operators only)."""
+    return jsonify(get_key_pool().snapshot())
@@ -0,0 +1,82 @@
+"""Rolling latency windows for provider calls."""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+from config import Config
+
+
+class LatencyWindow:
+    """Fixed-size window of the most recent call latencies, in seconds."""
+
+    def __init__(self, size: int):
+        """Create an empty window holding at most size samples."""
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        """Record one latency sample."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> float | None:
+        """Return the nearest-rank percentile of the window, or None when empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = max(0, min(len(samples) - 1, int(round(percent / 100.0 * len(samples))) - 1))
+        return samples[rank]
+
+    def tail_mean(self, above: float) -> float | None:
+        """Return the mean of samples greater than above, or None if there are none.
+
+        Estimates how long a call that has already run for `above` seconds
+        will take in total.
+        """
+        with self._lock:
+            tail = [sample for sample in self._samples if sample > above]
+        if not tail:
+            return None
+        return sum(tail) / len(tail)
+
+
+class LatencyTracker:
+    """Latency windows per (provider, model)."""
+
+    def __init__(self, window_size: int):
+        """Create an empty tracker whose windows hold window_size samples."""
+        self.window_size = window_size
+        self._windows: Dict[Tuple[str, str], LatencyWindow] = {}
+        self._lock = threading.Lock()
+
+    def window(self, provider: str, model: str) -> LatencyWindow:
+        """Return the window for provider and model, creating it on first use."""
+        key = (provider, model)
+        window = self._windows.get(key)
+        if window is None:
+            with self._lock:
+                window = self._windows.setdefault(key, LatencyWindow(self.window_size))
+        return window
+
+    def record(self, provider: str, model: str, seconds: float) -> None:
+        """Record a completed call's latency."""
+        self.window(provider, model).add(seconds)
+
+
+_tracker: LatencyTracker | None = None
+_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """Return the process-wide latency tracker."""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = LatencyTracker(Config.LATENCY_WINDOW_SIZE)
+    return _tracker
@@ -0,0 +1,257 @@
+"""Request metrics: counters and latency histograms in Prometheus text format."""
+
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Tuple
+
+from flask import Response
+
+from config import Config
+from . import api_bp
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans sub-millisecond parsing up to minute-long provider calls.
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+
+# name -> (type, help)
+METRICS: Dict[str, Tuple[str, str]] = {
+    'dishcovery_stage_seconds': ('histogram', 'Time spent in each stage of recipe generation.'),
+    'dishcovery_provider_call_seconds': ('histogram', 'Provider call duration by provider, model and outcome.'),
+    'dishcovery_errors_total': ('counter', 'Error bodies returned, by problem code.'),
+    'dishcovery_recipe_responses_total': ('counter', 'Recipe responses by cache status and whether they were coalesced.'),
+    'dishcovery_rate_limited_total': ('counter', 'Requests rejected by rate limiting, by scope and bucket kind (ip or key).'),
+    'dishcovery_load_shed_total': ('counter', 'Calls shed by admission control, by lane (provider or requests) and reason.'),
+    'dishcovery_provider_retries_total': ('counter', 'Provider calls retried after a retryable failure, by provider and model.'),
+    'dishcovery_idempotency_total': ('counter', 'Idempotency-Key lookups by outcome (stored, replayed, attached, conflict or mismatch).'),
+    'dishcovery_api_key_calls_total': ('counter', 'Provider calls made with each pooled server API key, by provider and key fingerprint.'),
+    'dishcovery_api_key_throttled_total': ('counter', 'Rate-limit (429) responses to pooled server API keys, by provider and key fingerprint.'),
+    'dishcovery_progressive_tiers_total': ('counter', 'Resolution tiers sent by progressive requests, by tier index and outcome (used, escalated or error code).'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Metrics:
+    """Process-local counters and fixed-bucket histograms.
+
+    Recording only touches in-memory tallies under a lock. With a directory
+    configured, every process also writes its tallies to its own snapshot
+    file (at most every flush_interval seconds, from a background thread),
+    and render() adds up the snapshots of all processes, so any gunicorn
+    worker can answer a scrape with totals for the whole server. Snapshots
+    of exited workers are kept so counters never go backwards; clear the
+    directory when the server is (re)deployed.
+    """
+
+    def __init__(self, directory: str | None = None, *, flush_interval: float = 1.0, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Create an empty registry.
+
+        Args:
+            directory: Shared snapshot directory for multi-process servers, or None
+            flush_interval: Seconds between snapshot writes while values change
+            buckets: Histogram upper bounds in seconds
+        """
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._reset()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _reset(self) -> None:
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        # (name, labels) -> [per-bucket counts (last is +Inf), sum]
+        self._histograms: Dict[Tuple[str, Labels], List[Any]] = {}
+        self._dirty = False
+        self._flusher: threading.Thread | None = None
+        self._unregistered: set = set()
+
+    def after_fork(self) -> None:
+        """Start a forked worker from zero so the parent's tallies are not counted twice."""
+        self._lock = threading.Lock()
+        self._reset()
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        """Add amount to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_registered(name)
+            self._counters[key] = self._counters.get(key, 0.0) + amount
+            self._mark_dirty()
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Record one histogram observation."""
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._check_registered(name)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+            self._mark_dirty()
+
+    @contextmanager
+    def time(self, name: str, **labels: str) -> Iterator[None]:
+        """Observe the duration of the with-block, whether or not it raises."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _check_registered(self, name: str) -> None:
+        # Called with the lock held. render() only emits names listed in METRICS.
+        if name not in METRICS and name not in self._unregistered:
+            self._unregistered.add(name)
+            logger.warning('Metric %s is not registered in METRICS and will not be rendered', name)
+
+    def _mark_dirty(self) -> None:
+        # Called with the lock held.
+        self._dirty = True
+        if self.directory and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        flusher = threading.current_thread()
+        while self._flusher is flusher:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return this process's tallies in a JSON-serializable form."""
+        with self._lock:
+            self._dirty = False
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(counts), total] for (name, labels), (counts, total) in self._histograms.items()],
+            }
+
+    def flush(self) -> None:
+        """Write this process's snapshot file, replacing the previous one atomically."""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        temporary = f'{path}.tmp'
+        try:
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                json.dump(self.snapshot(), handle)
+            os.replace(temporary, path)
+        except OSError as exc:
+            logger.warning('Metrics snapshot write failed: %s', exc)
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """Return the snapshots of every process sharing the directory (or just this one)."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            try:
+                with open(path, encoding='utf-8') as handle:
+                    snapshots.append(json.load(handle))
+            except (OSError, ValueError) as exc:
+                logger.warning('Skipping unreadable metrics snapshot %s: %s', path, exc)
+        return snapshots
+
+    def render(self) -> str:
+        """Render the merged snapshots in the Prometheus text exposition format."""
+        counters, histograms = merge_snapshots(self.collect())
+        lines: List[str] = []
+        for name, (metric_type, help_text) in METRICS.items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            if metric_type == 'counter':
+                lines.extend(_counter_lines(name, counters))
+            else:
+                lines.extend(self._histogram_lines(name, histograms))
+        return '\n'.join(lines) + '\n'
+
+    def _histogram_lines(self, name: str, histograms: Dict[Tuple[str, Labels], List[Any]]) -> List[str]:
+        lines = []
+        for (series, labels), (counts, total) in sorted(histograms.items()):
+            if series != name:
+                continue
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{_format_labels((*labels, ("le", le)))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return lines
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Tuple[Dict[Tuple[str, Labels], float], Dict[Tuple[str, Labels], List[Any]]]:
+    """Add up the counters and histograms of several processes' snapshots.
+
+    Returns:
+        Tuple of (counters, histograms) keyed by (name, labels), histograms
+        as [per-bucket counts, sum]
+    """
+    counters: Dict[Tuple[str, Labels], float] = {}
+    histograms: Dict[Tuple[str, Labels], List[Any]] = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            counters[key] = counters.get(key, 0.0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(tuple(pair) for pair in labels))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def _counter_lines(name: str, counters: Dict[Tuple[str, Labels], float]) -> List[str]:
+    return [
+        f'{name}{_format_labels(labels)} {_format_value(value)}'
+        for (series, labels), value in sorted(counters.items())
+        if series == name
+    ]
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(str(value))}"' for key, value in labels) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+_metrics: Metrics | None = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> Metrics:
+    """Return the process-wide metrics registry."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics(Config.METRICS_MULTIPROC_DIR or None, flush_interval=Config.METRICS_FLUSH_INTERVAL)
+                os.register_at_fork(after_in_child=_metrics.after_fork)
+    return _metrics
+
+
+@api_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Expose request metrics in the Prometheus text format."""
+    return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,37 @@
+"""Access control for the operational endpoints that describe server internals."""
+
+import hmac
+from functools import wraps
+
+from flask import request
+
+from config import Config
+
+
+def operator_only(view):
+    """Serve an operational endpoint only to callers holding OPERATOR_TOKEN.
+
+    Provider health, breaker state and API key usage are not for every
+    client, so without OPERATOR_TOKEN configured the endpoint answers 404 as
+    if it did not exist. With a token set, callers send it as
+    'Authorization: Bearer <token>'; anything else gets a 401.
+    """
+    @wraps(view)
+    def operator_view(*args, **kwargs):
+        # recipes imports the modules defining these endpoints, so import it late.
+        from .recipes import problem_response
+
+        token = Config.OPERATOR_TOKEN
+        if not token:
+            return problem_response('not_found', 'Not found.', status=404)
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f'Bearer {token}'.encode('utf-8')):
+            return problem_response(
+                'unauthorized',
+                'This endpoint needs the operator token.',
+                status=401,
+                hint='Send it as "Authorization: Bearer <token>".',
+            )
+        return view(*args, **kwargs)
+
+    return operator_view
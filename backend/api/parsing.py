@@ -0,0 +1,144 @@
+"""Tolerant extraction of the JSON object in model output."""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+_DECODER = json.JSONDecoder(strict=False)
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+def extract_json_object(text: str) -> Tuple[Dict[str, Any] | None, bool]:
+    """Find and decode the first JSON object in text.
+
+    Leading prose, markdown fences and anything after the object are
+    ignored. Control characters inside strings (raw newlines are common in
+    model output) are accepted. When the object is cut off, as happens when a
+    response hits the output token limit, it is repaired by dropping the
+    incomplete trailing value and closing every open array and object, so all
+    fields that were complete are kept.
+
+    Args:
+        text: Raw model output
+
+    Returns:
+        Tuple of (object, truncated): the decoded object, or None when no
+        object could be recovered, and whether repair was needed
+    """
+    start = text.find('{')
+    if start == -1:
+        return None, False
+    try:
+        value, _ = _DECODER.raw_decode(text, start)
+    except ValueError:
+        pass
+    else:
+        return (value, False) if isinstance(value, dict) else (None, False)
+
+    repaired = repair_truncated_json(text, start)
+    if repaired is None:
+        return None, False
+    try:
+        value = _DECODER.decode(repaired)
+    except ValueError:
+        return None, False
+    # An empty repair means nothing was salvaged; let callers use the raw text.
+    return (value, True) if isinstance(value, dict) and value else (None, False)
+
+
+def repair_truncated_json(text: str, start: int = 0) -> str | None:
+    """Close a truncated JSON document at its last complete value.
+
+    Scans once from start, tracking open containers and whether the scanner
+    is inside a string. Each time a value completes (a string value closes,
+    a container closes, or a comma ends a scalar), the position and the
+    closers needed at that point are remembered. The repaired document is the
+    text up to the last such checkpoint followed by those closers.
+
+    Args:
+        text: Text containing a JSON object, possibly cut off
+        start: Index of the object's opening brace
+
+    Returns:
+        Repaired JSON text, or None if no value ever completed
+    """
+    scanner = _Scanner()
+    for index in range(start, len(text)):
+        char = text[index]
+        if scanner.in_string:
+            scanner.string_char(index, char)
+        elif not scanner.structural_char(index, char):
+            break
+    return _close_at(text, start, scanner.checkpoint)
+
+
+class _Scanner:
+    """State of repair_truncated_json's pass: open containers, string and escape flags, last checkpoint."""
+
+    def __init__(self):
+        self.stack: List[str] = []
+        # Per open object: True while the next string is a key.
+        self.expecting_key: List[bool] = []
+        self.in_string = False
+        self.string_is_key = False
+        self.escaped = False
+        self.checkpoint: Tuple[int, str] | None = None
+
+    def mark(self, end: int) -> None:
+        """Remember that a value completed just before end, and the closers needed there."""
+        self.checkpoint = (end, _closers(self.stack))
+
+    def in_object(self) -> bool:
+        return bool(self.stack) and self.stack[-1] == '{'
+
+    def string_char(self, index: int, char: str) -> None:
+        """Step through a string, checkpointing where a string value (not a key) closes."""
+        if self.escaped:
+            self.escaped = False
+        elif char == '\\':
+            self.escaped = True
+        elif char == '"':
+            self.in_string = False
+            if not self.string_is_key:
+                self.mark(index + 1)
+
+    def structural_char(self, index: int, char: str) -> bool:
+        """Track containers, keys and commas outside strings.
+
+        Returns:
+            False once the scan should stop: the outermost container closed,
+            or a closer had nothing to close
+        """
+        if char == '"':
+            self.in_string = True
+            self.string_is_key = self.in_object() and self.expecting_key[-1]
+        elif char in '{[':
+            self.stack.append(char)
+            self.expecting_key.append(char == '{')
+            self.mark(index + 1)
+        elif char in '}]':
+            if not self.stack:
+                return False
+            self.stack.pop()
+            self.expecting_key.pop()
+            self.mark(index + 1)
+            return bool(self.stack)
+        elif char == ',':
+            self.mark(index)
+            if self.in_object():
+                self.expecting_key[-1] = True
+        elif char == ':' and self.in_object():
+            self.expecting_key[-1] = False
+        return True
+
+
+def _close_at(text: str, start: int, checkpoint: Tuple[int, str] | None) -> str | None:
+    """Cut text at the checkpoint, drop a dangling comma and append the closers it needs."""
+    if checkpoint is None:
+        return None
+    end, closers = checkpoint
+    return text[start:end].rstrip().rstrip(',') + closers
+
+
+def _closers(stack: List[str]) -> str:
+    return ''.join(_CLOSERS[opener] for opener in reversed(stack))
@@ -0,0 +1,66 @@
+"""Progressive-resolution inference: small images first, larger ones only when the answer falls short."""
+
+from typing import Any, Dict, List, Tuple
+
+from .parsing import extract_json_object
+from .repair import invalid_fields
+
+CONFIDENCE_KEY = 'confidence'
+
+CONFIDENCE_INSTRUCTION = (
+    f'Also include a "{CONFIDENCE_KEY}" key: a number from 0 to 1 saying how sure you are '
+    'which dish this is.'
+)
+
+
+def resolution_tiers(full_dimension: int, image_size: Tuple[int, int], tiers: List[int]) -> List[int]:
+    """Longest-edge sizes to send, in the order to try them.
+
+    Args:
+        full_dimension: The provider's full IMAGE_MAX_DIMENSIONS size
+        image_size: (width, height) of the decoded upload
+        tiers: Configured PROGRESSIVE_TIERS
+
+    Returns:
+        The configured tiers that actually shrink the image, ascending, then
+        full_dimension. An image already at or below a tier is sent once at
+        full size, since no smaller tier would make it smaller.
+    """
+    largest_useful = min(full_dimension, max(image_size))
+    return [*sorted({tier for tier in tiers if 0 < tier < largest_useful}), full_dimension]
+
+
+def confidence_of(recipe_json: Dict[str, Any]) -> float | None:
+    """The model's self-reported confidence (0-1), or None if it gave none or an unusable value."""
+    value = recipe_json.get(CONFIDENCE_KEY)
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def escalation_reason(raw_text: str, min_confidence: float) -> str | None:
+    """Decide whether a lower-resolution answer needs a larger image.
+
+    Args:
+        raw_text: Provider output for the lower-resolution image
+        min_confidence: Confidence below which the answer is not trusted
+
+    Returns:
+        'unparsed' if the output holds no JSON object, 'missing_fields' if it
+        was cut off or a required field is missing or malformed,
+        'low_confidence' if the model reported less than min_confidence, or
+        None when the answer is good enough. An answer without a confidence
+        is judged by its fields alone.
+    """
+    recipe_json, truncated = extract_json_object(raw_text)
+    if recipe_json is None:
+        return 'unparsed'
+    if truncated or invalid_fields(recipe_json):
+        return 'missing_fields'
+    confidence = confidence_of(recipe_json)
+    if confidence is not None and confidence < min_confidence:
+        return 'low_confidence'
+    return None
@@ -1,13 +1,50 @@
 """Provider API key validation and model listing."""
 
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache, partial
+from typing import Awaitable, Callable, Dict, List, Tuple
+
 import requests
-from typing import Dict, List
+from requests.adapters import HTTPAdapter
+
+from config import Config
+from .clients import fingerprint_api_key, get_async_http_pool
+
+INVALID_KEY_ERROR = "Invalid API key"
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(base_url: str) -> requests.Session:
+    """Return the shared keep-alive session for a provider host.
+
+    Reusing one session per host keeps TCP and TLS connections open between
+    validations instead of paying a fresh handshake on every keystroke.
+    """
+    session = _sessions.get(base_url)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.get(base_url)
+            if session is None:
+                session = requests.Session()
+                session.mount(base_url, HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=Config.PROVIDER_HTTP_MAX_CONNECTIONS,
+                ))
+                _sessions[base_url] = session
+    return session
 
 
 def _get_user_friendly_error(exception: requests.RequestException) -> str:
     """
     Convert a requests exception to a user-friendly error message.
-    
+
     Avoids exposing sensitive or overly technical information from
     the underlying exception.
     """
@@ -21,6 +58,121 @@ def _get_user_friendly_error(exception: requests.RequestException) -> str:
         return "Unable to validate API key. Please check your network connection and try again."
 
 
+@dataclass(frozen=True)
+class KeyCheck:
+    """How to validate one provider's keys: the models request and how to read its reply."""
+
+    base_url: str
+    request: Callable[[str], Tuple[str, Dict[str, str]]]  # api_key -> (url, headers)
+    invalid_statuses: Tuple[int, ...]
+    catalog: Callable[[Dict], List[Dict]]  # JSON reply -> friendly model list
+
+
+def _openai_catalog(data: Dict) -> List[Dict]:
+    # Filter for VISION-CAPABLE models only (exclude gpt-3.5, o1, o3)
+    vision_models = [
+        m for m in data.get("data", [])
+        if m["id"].startswith(("gpt-4o", "gpt-4-turbo", "gpt-4-vision"))
+    ]
+    # Convert to friendly names, sorted by recommendation priority
+    return build_catalog("openai", tuple((m["id"], None) for m in vision_models))
+
+
+def _anthropic_catalog(data: Dict) -> List[Dict]:
+    # All models from Anthropic API are Claude models (all have vision)
+    return build_catalog("anthropic", tuple((m["id"], m.get("display_name")) for m in data.get("data", [])))
+
+
+def _gemini_catalog(data: Dict) -> List[Dict]:
+    # Filter for models that support generateContent and are Gemini 1.5+/2.0+
+    generation_models = [
+        m for m in data.get("models", [])
+        if "generateContent" in m.get("supportedGenerationMethods", [])
+        and ("gemini-1.5" in m["name"] or "gemini-2" in m["name"])
+    ]
+    # Convert to friendly names, sorted by recommendation priority
+    return build_catalog("gemini", tuple((m["name"].replace("models/", ""), None) for m in generation_models))
+
+
+# SECURITY NOTE:
+# The Gemini API key is passed directly in the URL query parameter as required by Google AI Studio API.
+# This can expose the API key in server logs, browser history, proxy logs, and referrer headers.
+#
+# For production with Google Cloud Vertex AI, consider using OAuth2 Bearer tokens:
+# - Obtain access token via google-auth (ADC or service account)
+# - Send as: Authorization: Bearer <ACCESS_TOKEN>
+# - Add x-goog-user-project header for Cloud resources
+# - Use endpoint: https://generativelanguage.googleapis.com/v1beta/models
+# - Handle token refresh failures appropriately
+#
+# Current implementation uses AI Studio API which only supports API keys.
+KEY_CHECKS: Dict[str, KeyCheck] = {
+    "openai": KeyCheck(
+        base_url="https://api.openai.com",
+        request=lambda api_key: ("https://api.openai.com/v1/models", {"Authorization": f"Bearer {api_key}"}),
+        invalid_statuses=(401,),
+        catalog=_openai_catalog,
+    ),
+    "anthropic": KeyCheck(
+        base_url="https://api.anthropic.com",
+        request=lambda api_key: (
+            "https://api.anthropic.com/v1/models",
+            {"x-api-key": api_key, "anthropic-version": "2023-06-01"},
+        ),
+        invalid_statuses=(401,),
+        catalog=_anthropic_catalog,
+    ),
+    "gemini": KeyCheck(
+        base_url="https://generativelanguage.googleapis.com",
+        request=lambda api_key: (f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}", {}),
+        invalid_statuses=(400, 401, 403),
+        catalog=_gemini_catalog,
+    ),
+}
+
+
+def check_key(provider: str, api_key: str) -> Dict:
+    """Validate a key with a blocking request on the provider's keep-alive session."""
+    check = KEY_CHECKS[provider]
+    url, headers = check.request(api_key)
+    try:
+        response = get_session(check.base_url).get(url, headers=headers, timeout=10)
+
+        if response.status_code in check.invalid_statuses:
+            return {"valid": False, "error": INVALID_KEY_ERROR}
+
+        response.raise_for_status()
+        return {"valid": True, "models": check.catalog(response.json())}
+
+    except requests.RequestException as e:
+        return {"valid": False, "error": _get_user_friendly_error(e)}
+
+
+async def check_key_async(provider: str, api_key: str) -> Dict:
+    """Validate a key without blocking the event loop (used by the ASGI app)."""
+    import httpx
+
+    check = KEY_CHECKS[provider]
+    url, headers = check.request(api_key)
+    try:
+        response = await get_async_http_pool("key-validation").get(url, headers=headers, timeout=10)
+
+        if response.status_code in check.invalid_statuses:
+            return {"valid": False, "error": INVALID_KEY_ERROR}
+
+        response.raise_for_status()
+        return {"valid": True, "models": check.catalog(response.json())}
+
+    except httpx.TimeoutException:
+        return {"valid": False, "error": "Request timed out. Please try again."}
+    except httpx.TransportError:
+        return {"valid": False, "error": "Unable to connect to the API. Please check your network connection."}
+    except httpx.HTTPStatusError:
+        return {"valid": False, "error": "The API returned an error. Please try again later."}
+    except ValueError:
+        return {"valid": False, "error": "Unable to validate API key. Please check your network connection and try again."}
+
+
 def validate_openai_key(api_key: str) -> Dict:
     """
     Validates OpenAI API key and fetches available models.
@@ -35,38 +187,7 @@ def validate_openai_key(api_key: str) -> Dict:
             "error": str (optional)
         }
     """
-    try:
-        response = requests.get(
-            "https://api.openai.com/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-            timeout=10
-        )
-
-        if response.status_code == 401:
-            return {"valid": False, "error": "Invalid API key"}
-
-        response.raise_for_status()
-        data = response.json()
-
-        # Filter for VISION-CAPABLE models only (exclude gpt-3.5, o1, o3)
-        vision_models = [
-            m for m in data.get("data", [])
-            if m["id"].startswith(("gpt-4o", "gpt-4-turbo", "gpt-4-vision"))
-        ]
-
-        # Convert to friendly names
-        models = [
-            {"id": m["id"], "name": format_model_name(m["id"])}
-            for m in vision_models
-        ]
-
-        # Sort by recommendation priority
-        models = sort_openai_models(models)
-
-        return {"valid": True, "models": models}
-
-    except requests.RequestException as e:
-        return {"valid": False, "error": _get_user_friendly_error(e)}
+    return check_key("openai", api_key)
 
 
 def validate_anthropic_key(api_key: str) -> Dict:
@@ -85,35 +206,7 @@ def validate_anthropic_key(api_key: str) -> Dict:
             "error": str (optional)
         }
     """
-    try:
-        response = requests.get(
-            "https://api.anthropic.com/v1/models",
-            headers={
-                "x-api-key": api_key,
-                "anthropic-version": "2023-06-01"
-            },
-            timeout=10
-        )
-
-        if response.status_code == 401:
-            return {"valid": False, "error": "Invalid API key"}
-
-        response.raise_for_status()
-        data = response.json()
-
-        # All models from Anthropic API are Claude models (all have vision)
-        models = [
-            {"id": m["id"], "name": m.get("display_name", format_model_name(m["id"]))}
-            for m in data.get("data", [])
-        ]
-
-        # Sort by recommendation priority
-        models = sort_anthropic_models(models)
-
-        return {"valid": True, "models": models}
-
-    except requests.RequestException as e:
-        return {"valid": False, "error": _get_user_friendly_error(e)}
+    return check_key("anthropic", api_key)
 
 
 def validate_gemini_key(api_key: str) -> Dict:
@@ -129,53 +222,7 @@ def validate_gemini_key(api_key: str) -> Dict:
             "error": str (optional)
         }
     """
-    try:
-        # SECURITY NOTE:
-        # The Gemini API key is passed directly in the URL query parameter as required by Google AI Studio API.
-        # This can expose the API key in server logs, browser history, proxy logs, and referrer headers.
-        #
-        # For production with Google Cloud Vertex AI, consider using OAuth2 Bearer tokens:
-        # - Obtain access token via google-auth (ADC or service account)
-        # - Send as: Authorization: Bearer <ACCESS_TOKEN>
-        # - Add x-goog-user-project header for Cloud resources
-        # - Use endpoint: https://generativelanguage.googleapis.com/v1beta/models
-        # - Handle token refresh failures appropriately
-        #
-        # Current implementation uses AI Studio API which only supports API keys.
-        response = requests.get(
-            f"https://generativelanguage.googleapis.com/v1beta/models?key={api_key}",
-            timeout=10
-        )
-
-        if response.status_code in (400, 401, 403):
-            return {"valid": False, "error": "Invalid API key"}
-
-        response.raise_for_status()
-        data = response.json()
-
-        # Filter for models that support generateContent and are Gemini 1.5+/2.0+
-        generation_models = [
-            m for m in data.get("models", [])
-            if "generateContent" in m.get("supportedGenerationMethods", [])
-            and ("gemini-1.5" in m["name"] or "gemini-2" in m["name"])
-        ]
-
-        # Convert to friendly names
-        models = [
-            {
-                "id": m["name"].replace("models/", ""),
-                "name": format_model_name(m["name"].replace("models/", ""))
-            }
-            for m in generation_models
-        ]
-
-        # Sort by recommendation priority
-        models = sort_gemini_models(models)
-
-        return {"valid": True, "models": models}
-
-    except requests.RequestException as e:
-        return {"valid": False, "error": _get_user_friendly_error(e)}
+    return check_key("gemini", api_key)
 
 
 def format_model_name(model_id: str) -> str:
@@ -291,3 +338,227 @@ def sort_gemini_models(models: List[Dict]) -> List[Dict]:
         return 100  # Unknown models go last
 
     return sorted(models, key=get_priority)
+
+
+CATALOG_SORTERS: Dict[str, Callable[[List[Dict]], List[Dict]]] = {
+    "openai": sort_openai_models,
+    "anthropic": sort_anthropic_models,
+    "gemini": sort_gemini_models,
+}
+
+
+def build_catalog(provider: str, entries: Tuple[Tuple[str, str | None], ...]) -> List[Dict]:
+    """
+    Build the friendly, sorted model list for a provider.
+
+    Every key of a provider sees (nearly) the same model list, so the
+    formatting and sorting are memoized on the raw (id, display name) pairs.
+
+    Args:
+        provider: Provider name selecting the sort order
+        entries: (model_id, display_name or None) pairs from the provider API
+
+    Returns:
+        New list of {"id", "name"} dicts
+    """
+    return [dict(model) for model in _build_catalog(provider, entries)]
+
+
+@lru_cache(maxsize=32)
+def _build_catalog(provider: str, entries: Tuple[Tuple[str, str | None], ...]) -> Tuple[Dict, ...]:
+    models = [{"id": model_id, "name": name or format_model_name(model_id)} for model_id, name in entries]
+    return tuple(CATALOG_SORTERS[provider](models))
+
+
+KEY_VALIDATORS: Dict[str, Callable[[str], Dict]] = {
+    "openai": validate_openai_key,
+    "anthropic": validate_anthropic_key,
+    "gemini": validate_gemini_key,
+}
+
+ASYNC_KEY_VALIDATORS: Dict[str, Callable[[str], Awaitable[Dict]]] = {
+    provider: partial(check_key_async, provider) for provider in KEY_CHECKS
+}
+
+
+class KeyValidationCache:
+    """
+    TTL cache of key validation results with single-flight and background refresh.
+
+    Entries are keyed by provider and a hash of the API key; the raw key is
+    only held for the duration of a validation call. Valid results are kept
+    for ttl seconds and invalid-key results for invalid_ttl seconds. Network
+    failures are not cached. Concurrent validations of the same key share one
+    upstream call. A valid entry older than refresh_after is still served
+    immediately, while a background task re-validates it and refreshes the
+    model catalog.
+    """
+
+    def __init__(
+        self,
+        validators: Dict[str, Callable[[str], Dict]],
+        *,
+        ttl: float,
+        invalid_ttl: float,
+        refresh_after: float,
+        max_entries: int,
+        executor: ThreadPoolExecutor,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Create an empty cache.
+
+        Args:
+            validators: Mapping of provider name to its validate_*_key function
+            ttl: Seconds a valid result is served
+            invalid_ttl: Seconds an invalid-key result is served
+            refresh_after: Age after which a valid result is refreshed in the background
+            max_entries: Maximum cached keys; least recently used are evicted
+            executor: Pool running background refreshes
+            clock: Monotonic time source, replaceable in tests
+        """
+        self.validators = validators
+        self.ttl = ttl
+        self.invalid_ttl = invalid_ttl
+        self.refresh_after = refresh_after
+        self.max_entries = max_entries
+        self.executor = executor
+        self._clock = clock
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Dict, float, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], Future] = {}
+        self._async_inflight: Dict[Tuple[str, str], "asyncio.Future[Dict]"] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    def validate(self, provider: str, api_key: str) -> Dict:
+        """
+        Return the validation result for a key, from cache when possible.
+
+        Raises:
+            KeyError: If no validator is registered for provider
+        """
+        validator = self.validators[provider]
+        key = (provider, fingerprint_api_key(api_key))
+        with self._lock:
+            result = self._cached(key, validator, api_key)
+            if result is not None:
+                return result
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = Future()
+                self._inflight[key] = flight
+
+        if not leader:
+            return flight.result()
+        try:
+            result = self._run(key, validator, api_key)
+        except BaseException as exc:
+            flight.set_exception(exc)
+            raise
+        flight.set_result(result)
+        return result
+
+    async def validate_async(self, provider: str, api_key: str, validator: Callable[[str], Awaitable[Dict]]) -> Dict:
+        """
+        Asyncio counterpart of validate, sharing the same entries.
+
+        A miss awaits validator(api_key) on the event loop; concurrent misses
+        for one key share that call. Background refreshes of stale entries
+        still run the blocking validator on the executor.
+
+        Raises:
+            KeyError: If no validator is registered for provider
+        """
+        key = (provider, fingerprint_api_key(api_key))
+        with self._lock:
+            result = self._cached(key, self.validators[provider], api_key)
+            if result is not None:
+                return result
+            task = self._async_inflight.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(self._run_async(key, validator, api_key))
+                self._async_inflight[key] = task
+        # Shielded so one client disconnecting does not cancel the call for the others.
+        return await asyncio.shield(task)
+
+    def _cached(self, key: Tuple[str, str], validator: Callable[[str], Dict], api_key: str) -> Dict | None:
+        """Return a live entry, scheduling a refresh when it is stale; call with the lock held."""
+        now = self._clock()
+        entry = self._entries.get(key)
+        if entry is None or now >= entry[2]:
+            return None
+        result, created_at, _ = entry
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if result.get("valid") and now - created_at >= self.refresh_after and key not in self._inflight:
+            self.refreshes += 1
+            self._inflight[key] = self.executor.submit(self._run, key, validator, api_key)
+        return result
+
+    async def _run_async(self, key: Tuple[str, str], validator: Callable[[str], Awaitable[Dict]], api_key: str) -> Dict:
+        try:
+            result = await validator(api_key)
+            self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._async_inflight.pop(key, None)
+
+    def _run(self, key: Tuple[str, str], validator: Callable[[str], Dict], api_key: str) -> Dict:
+        try:
+            result = validator(api_key)
+            self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def _store(self, key: Tuple[str, str], result: Dict) -> None:
+        if result.get("valid"):
+            ttl = self.ttl
+        elif result.get("error") == INVALID_KEY_ERROR:
+            ttl = self.invalid_ttl
+        else:
+            return
+        with self._lock:
+            now = self._clock()
+            self._entries[key] = (result, now, now + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Return cached key count and hit/miss/refresh counters."""
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "refreshes": self.refreshes}
+
+    def clear(self) -> None:
+        """Drop every cached result."""
+        with self._lock:
+            self._entries.clear()
+
+
+_validation_cache: KeyValidationCache | None = None
+_validation_cache_lock = threading.Lock()
+
+
+def get_key_validation_cache() -> KeyValidationCache:
+    """Return the process-wide key validation cache."""
+    global _validation_cache
+    if _validation_cache is None:
+        with _validation_cache_lock:
+            if _validation_cache is None:
+                _validation_cache = KeyValidationCache(
+                    KEY_VALIDATORS,
+                    ttl=Config.KEY_VALIDATION_TTL,
+                    invalid_ttl=Config.KEY_VALIDATION_INVALID_TTL,
+                    refresh_after=Config.KEY_VALIDATION_REFRESH_AFTER,
+                    max_entries=Config.KEY_VALIDATION_CACHE_SIZE,
+                    executor=ThreadPoolExecutor(max_workers=2, thread_name_prefix='key-refresh'),
+                )
+    return _validation_cache
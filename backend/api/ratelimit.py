@@ -0,0 +1,325 @@
+"""Token-bucket rate limiting per client IP and hashed API key."""
+
+import logging
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Tuple
+from urllib.parse import unquote, urlsplit
+
+from config import Config
+from .sqlitedb import SQLiteDatabase
+
+logger = logging.getLogger(__name__)
+
+# (tokens per second, burst) for each (scope, kind) pair.
+Limits = Dict[Tuple[str, str], Tuple[float, float]]
+
+
+def refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    """Return a bucket's tokens at now, topped up at rate per second up to burst."""
+    return min(burst, tokens + max(0.0, now - updated) * rate)
+
+
+class BucketStore(ABC):
+    """Storage for token buckets; take() must be atomic per key."""
+
+    @abstractmethod
+    def take(self, key: str, *, rate: float, burst: float, cost: float) -> float:
+        """Take cost tokens from key's bucket if it holds enough.
+
+        A missing bucket starts full.
+
+        Returns:
+            0.0 if the tokens were taken, otherwise the seconds until enough
+            tokens will have accumulated
+        """
+
+
+class MemoryBucketStore(BucketStore):
+    """In-process buckets, least recently used dropped beyond max_keys."""
+
+    def __init__(self, *, max_keys: int, clock: Callable[[], float] = time.time):
+        """Create an empty store.
+
+        Args:
+            max_keys: Maximum buckets kept; a dropped bucket starts full again
+            clock: Time source, replaceable in tests
+        """
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str, *, rate: float, burst: float, cost: float) -> float:
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets in a SQLite database shared by the worker processes of one host."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, *, clock: Callable[[], float] = time.time):
+        """Open (or create) the bucket database at path."""
+        self.clock = clock
+        self._takes = 0
+        self._db = SQLiteDatabase(path, [
+            (
+                'CREATE TABLE IF NOT EXISTS rate_buckets ('
+                ' key TEXT PRIMARY KEY,'
+                ' tokens REAL NOT NULL,'
+                ' updated REAL NOT NULL,'
+                ' full_at REAL NOT NULL)'
+            ),
+        ])
+
+    def take(self, key: str, *, rate: float, burst: float, cost: float) -> float:
+        conn = self._db.connect()
+        now = self.clock()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = burst if row is None else refill(row[0], row[1], now, rate, burst)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, now + (burst - tokens) / rate),
+            )
+            self._takes += 1
+            if self._takes % self.PRUNE_EVERY == 0:
+                # A bucket that has refilled completely is the same as no bucket.
+                conn.execute('DELETE FROM rate_buckets WHERE full_at <= ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+
+# Runs atomically inside the Redis-protocol server. Numbers are returned as
+# strings because integer replies would truncate fractional waits.
+TAKE_SCRIPT = '''
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then
+  tokens = tokens - cost
+else
+  wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return tostring(wait)
+'''
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server."""
+
+
+class RespConnection:
+    """Minimal blocking client for the Redis serialization protocol (RESP2)."""
+
+    def __init__(self, host: str, port: int, *, timeout: float):
+        """Connect to host:port with timeout seconds for connect and each reply."""
+        self._sock = socket.create_connection((host, port), timeout=timeout)
+        self._reader = self._sock.makefile('rb')
+
+    def execute(self, *args: Any) -> Any:
+        """Send one command and return its decoded reply.
+
+        Raises:
+            RespError: If the server replied with an error
+            OSError: If the connection failed
+        """
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode('utf-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        self._sock.sendall(b''.join(parts))
+        return self._read_reply()
+
+    def _read_reply(self) -> Any:
+        line = self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Connection closed by server')
+        kind, body = line[:1], line[1:-2]
+        if kind == b'+':
+            return body.decode('utf-8')
+        if kind == b'-':
+            raise RespError(body.decode('utf-8'))
+        if kind == b':':
+            return int(body)
+        if kind == b'$':
+            length = int(body)
+            if length < 0:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2].decode('utf-8')
+        if kind == b'*':
+            count = int(body)
+            return None if count < 0 else [self._read_reply() for _ in range(count)]
+        raise ConnectionError(f'Unexpected reply type {kind!r}')
+
+    def close(self) -> None:
+        """Close the connection."""
+        try:
+            self._reader.close()
+        finally:
+            self._sock.close()
+
+
+class RedisBucketStore(BucketStore):
+    """Buckets in any server speaking the Redis protocol (Redis, Valkey, KeyDB).
+
+    Each take() runs TAKE_SCRIPT with EVAL, so concurrent workers on any host
+    see one consistent bucket. Every thread keeps its own connection and
+    reconnects after a failure. Times come from the calling worker's clock,
+    so hosts sharing a store need synchronized clocks.
+    """
+
+    def __init__(self, url: str, *, timeout: float = 1.0, clock: Callable[[], float] = time.time):
+        """Configure the store from a redis://[:password@]host[:port][/db] URL."""
+        parsed = urlsplit(url)
+        if parsed.scheme != 'redis':
+            raise ValueError(f'Unsupported rate limit store URL "{url}"; expected redis://host:port/db')
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = unquote(parsed.password) if parsed.password else None
+        self.db = int(parsed.path.strip('/') or 0)
+        self.timeout = timeout
+        self.clock = clock
+        self._local = threading.local()
+
+    def _connect(self) -> RespConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = RespConnection(self.host, self.port, timeout=self.timeout)
+            if self.password:
+                conn.execute('AUTH', self.password)
+            if self.db:
+                conn.execute('SELECT', self.db)
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, *, rate: float, burst: float, cost: float) -> float:
+        try:
+            reply = self._connect().execute('EVAL', TAKE_SCRIPT, 1, f'dishcovery:rate:{key}', rate, burst, cost, self.clock())
+        except (OSError, RespError):
+            conn = getattr(self._local, 'conn', None)
+            self._local.conn = None
+            if conn is not None:
+                conn.close()
+            raise
+        return float(reply)
+
+
+class RateLimiter:
+    """Applies per-scope token buckets to client IPs and hashed API keys.
+
+    Store failures are logged and the request is allowed, so an unreachable
+    store degrades to no rate limiting rather than to an outage.
+    """
+
+    def __init__(self, store: BucketStore, limits: Limits):
+        """Create the limiter.
+
+        Args:
+            store: Bucket storage
+            limits: (tokens per second, burst) for each (scope, kind); pairs
+                without an entry or with a rate of 0 are not limited
+        """
+        self.store = store
+        self.limits = dict(limits)
+
+    def burst(self, scope: str, kind: str) -> float | None:
+        """The most tokens one request may cost for scope and kind, or None when they are not limited."""
+        rate, burst = self.limits.get((scope, kind), (0.0, 0.0))
+        return burst if rate > 0 else None
+
+    def hit(self, scope: str, kind: str, identity: str, cost: float = 1.0) -> float:
+        """Charge cost tokens to identity's bucket for scope and kind.
+
+        Args:
+            scope: Endpoint group, 'recipe' or 'validate'
+            kind: 'ip' or 'key'
+            identity: Client IP or API key fingerprint
+            cost: Tokens the request consumes; a cost above the burst is
+                never allowed, so check it against burst() first
+
+        Returns:
+            0.0 if allowed, otherwise the seconds until the request would be
+        """
+        rate, burst = self.limits.get((scope, kind), (0.0, 0.0))
+        if rate <= 0:
+            return 0.0
+        try:
+            return self.store.take(f'{scope}:{kind}:{identity}', rate=rate, burst=burst, cost=cost)
+        except Exception as exc:  # noqa: BLE001
+            logger.warning('Rate limit store failed, allowing request: %s', exc)
+            return 0.0
+
+
+def build_bucket_store(config: Any) -> BucketStore:
+    """Create the bucket store selected by RATE_LIMIT_BACKEND ('memory', 'sqlite' or 'redis')."""
+    backend_name = (config.RATE_LIMIT_BACKEND or 'memory').lower()
+    if backend_name == 'sqlite':
+        return SQLiteBucketStore(config.RATE_LIMIT_SQLITE_PATH)
+    if backend_name == 'redis':
+        return RedisBucketStore(config.RATE_LIMIT_REDIS_URL)
+    if backend_name != 'memory':
+        logger.warning('Unknown RATE_LIMIT_BACKEND "%s"; using in-process buckets.', backend_name)
+    return MemoryBucketStore(max_keys=config.RATE_LIMIT_MAX_KEYS)
+
+
+def configured_limits(config: Any) -> Limits:
+    """Translate the RATE_LIMIT_* per-minute settings into per-second rates."""
+    settings: List[Tuple[str, str, float, float]] = [
+        ('recipe', 'ip', config.RATE_LIMIT_IP_PER_MINUTE, config.RATE_LIMIT_IP_BURST),
+        ('recipe', 'key', config.RATE_LIMIT_KEY_PER_MINUTE, config.RATE_LIMIT_KEY_BURST),
+        ('validate', 'ip', config.RATE_LIMIT_VALIDATE_PER_MINUTE, config.RATE_LIMIT_VALIDATE_BURST),
+        ('validate', 'key', config.RATE_LIMIT_VALIDATE_PER_MINUTE, config.RATE_LIMIT_VALIDATE_BURST),
+    ]
+    return {(scope, kind): (per_minute / 60.0, burst) for scope, kind, per_minute, burst in settings}
+
+
+_rate_limiter: RateLimiter | None = None
+_rate_limiter_ready = False
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter | None:
+    """Return the process-wide rate limiter, or None when RATE_LIMIT_ENABLED is off."""
+    global _rate_limiter, _rate_limiter_ready
+    if not _rate_limiter_ready:
+        with _rate_limiter_lock:
+            if not _rate_limiter_ready:
+                if Config.RATE_LIMIT_ENABLED:
+                    _rate_limiter = RateLimiter(build_bucket_store(Config), configured_limits(Config))
+                _rate_limiter_ready = True
+    return _rate_limiter
@@ -1,219 +1,1753 @@
 import base64
-import io
-import json
+import hashlib
 import logging
-import mimetypes
-import re
+import math
+import threading
+import time
 import traceback
-from typing import Any, Dict, Tuple
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import cached_property, wraps
+from itertools import count
+from typing import Any, Dict, Iterator, List, Tuple
 
-import google.generativeai as genai
-from anthropic import Anthropic
-from flask import jsonify, request
-from openai import OpenAI
-from PIL import Image, UnidentifiedImageError
+from flask import Response, g, jsonify, make_response, request, stream_with_context
+from PIL import UnidentifiedImageError
+from werkzeug.exceptions import RequestEntityTooLarge
 
 from config import Config
 from . import api_bp
+from .admission import Saturated, get_provider_limiter, get_request_limiter
+from .cache import get_recipe_cache, make_cache_key_for_digest
+from .clients import fingerprint_api_key, get_async_client_registry, get_client_registry, load_sdk
+from .coalescing import FAILED, SQLiteFlightLocks, get_flight_locks, get_single_flight
+from .deadlines import DEADLINE_HEADER, Deadline, ProviderTimeout, default_deadline, request_deadline, retry_delay
+from .hedging import get_hedge_executor, hedge_delay, hedged_call
+from .idempotency import (
+    IDEMPOTENCY_HEADER,
+    REPLAYED_HEADER,
+    InProgress,
+    KeyReused,
+    claim,
+    client_identity,
+    get_idempotency_store,
+    remember,
+    request_fingerprint,
+    scoped_key,
+    wait_budget,
+)
+from .imaging import PreparedImage, decode_image, prepare_image
+from .keypool import lease_api_key
+from .latency import get_latency_tracker
+from .metrics import get_metrics
+from .progressive import CONFIDENCE_INSTRUCTION, escalation_reason, resolution_tiers
+from .parsing import extract_json_object
+from .ratelimit import get_rate_limiter
+from .repair import build_repair_prompt, invalid_fields, merge_repair
+from .routing import CircuitBreaker, get_provider_router, is_provider_fault, parse_chain
+from .similarity import dhash, get_similarity_index
+from .streaming import RecipeStreamParser, recipe_events, sse_event
+from .tracing import record_span, stage, with_request_id
+from .uploads import CHUNK_BYTES, SpooledUpload, UploadRejected
 
 logger = logging.getLogger(__name__)
 
 
-class ProviderError(Exception):
-    """Raised when a provider fails to return a usable response."""
+class ApiError(Exception):
+    """Raised when a request cannot be served; rendered with problem_response."""
 
-    def __init__(self, code: str, message: str, *, status: int = 500, hint: str | None = None, debug: str | None = None):
-        """Initialize a provider error with structured error information.
+    # Where the request's time budget went; set on provider errors (see Deadline.breakdown)
+    budget: Dict[str, Any] | None = None
+
+    def __init__(
+        self,
+        code: str,
+        message: str,
+        *,
+        status: int = 400,
+        hint: str | None = None,
+        debug: str | None = None,
+        retry_after: int | None = None,
+    ):
+        """Initialize an API error with structured error information.
 
         Args:
-            code: Machine-readable error code (e.g., 'gemini_error', 'empty_response')
+            code: Machine-readable error code (e.g., 'invalid_image', 'missing_api_key')
             message: Human-friendly error message for the user
-            status: HTTP status code for the response (default: 500)
+            status: HTTP status code for the response (default: 400)
             hint: Optional suggestion for the user to resolve the error
             debug: Optional debug information (only shown in development mode)
+            retry_after: Optional seconds the client should wait before retrying,
+                sent as a Retry-After header
         """
         super().__init__(message)
         self.code = code
         self.status = status
         self.hint = hint
         self.debug = debug
+        self.retry_after = retry_after
+
+
+class ProviderError(ApiError):
+    """Raised when a provider fails to return a usable response."""
+
+    def __init__(
+        self,
+        code: str,
+        message: str,
+        *,
+        status: int = 500,
+        hint: str | None = None,
+        debug: str | None = None,
+        retry_after: int | None = None,
+        budget: Dict[str, Any] | None = None,
+    ):
+        """Initialize a provider error with structured error information.
+
+        Args:
+            code: Machine-readable error code (e.g., 'gemini_error', 'empty_response')
+            message: Human-friendly error message for the user
+            status: HTTP status code for the response (default: 500)
+            hint: Optional suggestion for the user to resolve the error
+            debug: Optional debug information (only shown in development mode),
+                prefixed with the current request id
+            retry_after: Optional seconds the client should wait before retrying
+            budget: Optional breakdown of the request's time budget
+        """
+        super().__init__(code, message, status=status, hint=hint, debug=with_request_id(debug), retry_after=retry_after)
+        self.budget = budget
+
+
+def problem_payload(
+    code: str,
+    message: str,
+    *,
+    hint: str | None = None,
+    debug: str | None = None,
+    budget: Dict[str, Any] | None = None,
+) -> Dict[str, Any]:
+    """Build the standardized error body shared by JSON and streaming responses.
+
+    Args:
+        code: Machine-readable error code for client-side handling
+        message: User-friendly error message
+        hint: Optional suggestion for error recovery
+        debug: Optional debug info (only included in development/debug mode)
+        budget: Optional breakdown of where the request's time budget went
+
+    Returns:
+        Dictionary with 'success' set to False and an 'error' object
+    """
+    get_metrics().inc('dishcovery_errors_total', code=code)
+    payload: Dict[str, Any] = {
+        "success": False,
+        "error": {
+            "code": code,
+            "message": message,
+        },
+    }
+
+    if hint:
+        payload["error"]["hint"] = hint
+
+    if debug and Config.FLASK_ENV.lower() in {"development", "debug"}:
+        payload["error"]["debug"] = debug
+
+    if budget:
+        payload["error"]["budget"] = budget
+
+    return payload
+
+
+def problem_response(
+    code: str,
+    message: str,
+    *,
+    status: int = 400,
+    hint: str | None = None,
+    debug: str | None = None,
+    budget: Dict[str, Any] | None = None,
+):
+    """Create a standardized error response in JSON format.
+
+    Args:
+        code: Machine-readable error code for client-side handling
+        message: User-friendly error message
+        status: HTTP status code (default: 400 for client errors)
+        hint: Optional suggestion for error recovery
+        debug: Optional debug info (only included in development/debug mode)
+        budget: Optional breakdown of where the request's time budget went
+
+    Returns:
+        Tuple of (JSON response, HTTP status code) ready for Flask to return
+    """
+    return jsonify(problem_payload(code, message, hint=hint, debug=debug, budget=budget)), status
+
+
+def error_response(error: ApiError):
+    """Render an ApiError (or ProviderError) with problem_response."""
+    response, status = problem_response(
+        code=error.code,
+        message=str(error),
+        status=error.status,
+        hint=error.hint,
+        debug=error.debug,
+        budget=error.budget,
+    )
+    if error.retry_after is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
+    return response, status
+
+
+def error_payload(error: ApiError) -> Dict[str, Any]:
+    """Render an ApiError (or ProviderError) with problem_payload."""
+    return problem_payload(error.code, str(error), hint=error.hint, debug=error.debug, budget=error.budget)
+
+
+SERVER_ERROR = ApiError('server_error', 'Server error. Please try again later.', status=500)
+
+
+@dataclass
+class ProviderTarget:
+    """One provider backend a request can be sent to: fallback or hedge backup."""
+
+    provider: str
+    provider_config: Dict[str, Any]
+    api_key: str
+    model: str
+
+
+@dataclass
+class RecipeRequest:
+    """Validated inputs of one recipe generation request."""
+
+    upload: SpooledUpload | None
+    language: str
+    dietary_restrictions: str
+    cuisine_preference: str
+    provider: str
+    provider_config: Dict[str, Any]
+    api_key: str
+    model: str
+    use_cache: bool = True
+    hedge: ProviderTarget | None = None
+    fallbacks: List[ProviderTarget] = field(default_factory=list)
+    progressive: bool = False
+    deadline: Deadline = field(default_factory=default_deadline)
+
+    @property
+    def targets(self) -> List[ProviderTarget]:
+        """The requested backend followed by its fallbacks, in the order to try them."""
+        primary = ProviderTarget(self.provider, self.provider_config, self.api_key, self.model)
+        return [primary, *self.fallbacks]
+
+    @cached_property
+    def fingerprint(self) -> str:
+        """Content-addressed key of the image and every input that shapes the answer."""
+        return make_cache_key_for_digest(
+            self.upload.sha256,
+            language=self.language,
+            dietary_restrictions=self.dietary_restrictions,
+            cuisine_preference=self.cuisine_preference,
+            provider=self.provider,
+            model=self.model,
+        )
+
+    @property
+    def flight_key(self) -> str:
+        """Coalescing key: the fingerprint plus the API key's, so a shared call is billed to and fails for one key only."""
+        return f'{self.fingerprint}:{fingerprint_api_key(self.api_key)}'
+
+    @property
+    def prompt_group(self) -> Tuple[str, ...]:
+        """Every input except the image that shapes the provider's answer."""
+        return (self.language, self.dietary_restrictions, self.cuisine_preference, self.provider, self.model)
+
+    def build_payload(self, recipe: Dict[str, Any], model: str, provider: str | None = None) -> Dict[str, Any]:
+        """Build the success payload for this request.
+
+        Args:
+            recipe: Recipe in Dishcovery's standard schema
+            model: Model that produced the recipe
+            provider: Provider that produced the recipe, when not the requested one
+        """
+        provider = provider or self.provider
+        provider_config = self.provider_config if provider == self.provider else get_provider_config(provider)
+        return build_success_payload(
+            recipe,
+            provider=provider,
+            provider_label=provider_config['label'] if provider_config else provider,
+            model=model,
+            language=self.language,
+            dietary_restrictions=self.dietary_restrictions,
+            cuisine_preference=self.cuisine_preference,
+        )
+
+
+def request_files(name: str) -> List[Any]:
+    """Return the files uploaded under a form field name.
+
+    Raises:
+        ApiError: If the request body is larger than MAX_CONTENT_LENGTH; this
+            is decided from Content-Length before any of the body is read
+    """
+    try:
+        return request.files.getlist(name)
+    except RequestEntityTooLarge as error:
+        raise body_too_large_error() from error
+
+
+def body_too_large_error() -> ApiError:
+    """Error for a request body larger than MAX_CONTENT_LENGTH."""
+    return ApiError(
+        'file_too_large',
+        f'The upload is too large. The limit is {Config.MAX_CONTENT_LENGTH // (1024 * 1024)} MB.',
+        status=413,
+        hint='Resize or compress the photo before uploading.',
+    )
+
+
+def request_file(name: str) -> Any:
+    """Return the first file uploaded under name, or None."""
+    files = request_files(name)
+    return files[0] if files else None
+
+
+def read_upload(file: Any) -> SpooledUpload:
+    """Validate an uploaded file and copy it into a bounded-memory spool.
+
+    The format is sniffed from the first bytes, so a non-image is rejected
+    before the rest of it is read, and copying stops once UPLOAD_MAX_BYTES
+    is exceeded. The spool is closed when the request ends unless
+    keep_upload is called.
+
+    Args:
+        file: Werkzeug FileStorage from request.files, or None
+
+    Returns:
+        Spooled upload with its size, SHA-256 digest and sniffed MIME type
+
+    Raises:
+        ApiError: If the file is missing, has an unsupported extension, is
+            empty, too large or not an image
+    """
+    if not file:
+        raise MISSING_FILE
+    check_upload_filename(file.filename)
+    try:
+        upload = SpooledUpload.from_stream(
+            file.stream,
+            max_bytes=Config.UPLOAD_MAX_BYTES,
+            memory_bytes=Config.UPLOAD_SPOOL_MEMORY_BYTES,
+        )
+    except UploadRejected as rejected:
+        raise upload_error(rejected) from rejected
+    g.setdefault('uploads', []).append(upload)
+    return upload
+
+
+MISSING_FILE = ApiError(
+    'missing_file',
+    'No image file provided. Please upload a food photo.',
+    hint='Choose a PNG, JPG, JPEG, GIF, or WEBP image.',
+)
+
+
+def check_upload_filename(filename: str | None) -> None:
+    """Check that an upload has a filename with an allowed image extension.
+
+    Raises:
+        ApiError: 'empty_filename' or 'unsupported_file_type'
+    """
+    if not filename:
+        raise ApiError('empty_filename', 'Empty filename. Please select a valid image.')
+
+    extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if extension not in Config.ALLOWED_EXTENSIONS:
+        raise ApiError(
+            'unsupported_file_type',
+            f'Invalid file type. Allowed: {", ".join(sorted(Config.ALLOWED_EXTENSIONS))}',
+        )
+
+
+def upload_error(rejected: UploadRejected) -> ApiError:
+    """Translate a spooling rejection into the error returned to the client."""
+    if rejected.reason == 'empty':
+        return ApiError('empty_image', 'Empty image file.')
+    if rejected.reason == 'too_large':
+        return ApiError(
+            'file_too_large',
+            f'The image is too large. The limit is {Config.UPLOAD_MAX_BYTES // (1024 * 1024)} MB.',
+            status=413,
+            hint='Resize or compress the photo before uploading.',
+        )
+    return ApiError(
+        'invalid_image',
+        'Invalid or corrupted image file.',
+        hint='Upload a PNG, JPG, GIF or WEBP photo.',
+    )
+
+
+def keep_upload(upload: SpooledUpload) -> None:
+    """Hand an upload's spool to the caller instead of closing it with the request."""
+    uploads = g.get('uploads', [])
+    if upload in uploads:
+        uploads.remove(upload)
+
+
+@api_bp.teardown_request
+def close_uploads(error):
+    """Close the request's upload spools, deleting any temporary files."""
+    for upload in g.pop('uploads', []):
+        upload.close()
+
+
+def parse_recipe_request(upload: SpooledUpload | None, form: Any, headers: Any) -> RecipeRequest:
+    """Resolve language, provider, API key and model for an uploaded image.
+
+    Requests that pin no provider, key or model are routed to the fastest
+    healthy backend of PROVIDER_FALLBACK_CHAIN; the remaining chain backends
+    become fallbacks for them and for pinned requests that run on a server
+    key. A request that sent its own API key never falls back, since that
+    would move it onto the server's keys. The request's deadline starts here
+    (see request_deadline).
+
+    Args:
+        upload: Spooled image returned by read_upload
+        form: Submitted form fields (request.form)
+        headers: Request headers
+
+    Returns:
+        Validated RecipeRequest
+
+    Raises:
+        ApiError: If the provider is unsupported or no API key is available
+    """
+    uses_server_key = not client_api_key(form)
+    routed = route_unpinned_request(form)
+    if routed:
+        primary, fallbacks = routed[0], routed[1:]
+    else:
+        primary = resolve_pinned_target(form)
+        fallbacks = fallback_targets(exclude=(primary.provider, primary.model)) if Config.ROUTER_ENABLED and uses_server_key else []
+
+    return RecipeRequest(
+        upload=upload,
+        language=form.get('language', Config.DEFAULT_LANGUAGE),
+        dietary_restrictions=form.get('dietary_restrictions', ''),
+        cuisine_preference=form.get('cuisine_preference', ''),
+        provider=primary.provider,
+        provider_config=primary.provider_config,
+        api_key=primary.api_key,
+        model=primary.model,
+        use_cache='no-cache' not in headers.get('Cache-Control', '').lower(),
+        hedge=parse_hedge_target(form, primary.provider, primary.model, server_key=uses_server_key),
+        fallbacks=fallbacks,
+        progressive=progressive_requested(form),
+        deadline=request_deadline(headers),
+    )
+
+
+def resolve_pinned_target(form: Any) -> ProviderTarget:
+    """Resolve the provider, API key and model chosen by the client or defaults.
+
+    Raises:
+        ApiError: If the provider is unsupported or no API key is available
+    """
+    provider = (form.get('provider') or Config.DEFAULT_PROVIDER).lower()
+    provider_config = get_provider_config(provider)
+    if not provider_config:
+        raise ApiError(
+            'unsupported_provider',
+            f'Provider "{provider}" is not supported.',
+            hint='Select one of: gemini, openai, anthropic.',
+        )
+
+    api_key = client_api_key(form) or Config.get_api_key_for(provider)
+    if not api_key:
+        raise ApiError(
+            'missing_api_key',
+            'API key is required for the selected provider.',
+            hint=provider_config['key_hint'],
+        )
+
+    requested_model = (form.get('model') or '').strip()
+    default_model = Config.get_default_model_for(provider) or provider_config['default_model']
+    return ProviderTarget(provider, provider_config, api_key, requested_model or default_model)
+
+
+def client_api_key(form: Any) -> str:
+    """The API key the client sent with the request, or '' when it relies on the server's."""
+    return (form.get('api_key') or '').strip()
+
+
+def chain_targets() -> List[ProviderTarget]:
+    """Backends from PROVIDER_FALLBACK_CHAIN that have a server-side API key, in chain order."""
+    targets = []
+    for provider, model in parse_chain(Config.PROVIDER_FALLBACK_CHAIN):
+        provider_config = get_provider_config(provider)
+        api_key = Config.get_api_key_for(provider)
+        if not provider_config or not api_key:
+            continue
+        model = model or Config.get_default_model_for(provider) or provider_config['default_model']
+        targets.append(ProviderTarget(provider, provider_config, api_key, model))
+    return targets
+
+
+def rank_targets(targets: List[ProviderTarget]) -> List[ProviderTarget]:
+    """Order targets fastest-healthy first using the provider router."""
+    by_backend = {(target.provider, target.model): target for target in targets}
+    return [by_backend[backend] for backend in get_provider_router().rank(list(by_backend))]
+
+
+def route_unpinned_request(form: Any) -> List[ProviderTarget]:
+    """Pick backends for a request that did not choose a provider, key or model.
+
+    Returns:
+        Chain backends ranked fastest-healthy first, or an empty list when the
+        request is pinned, routing is disabled or no chain backend has a key
+    """
+    if not Config.ROUTER_ENABLED or any(form.get(name) for name in ('provider', 'api_key', 'model')):
+        return []
+    return rank_targets(chain_targets())
+
+
+def fallback_targets(*, exclude: Tuple[str, str]) -> List[ProviderTarget]:
+    """Chain backends to fall back to from a pinned backend, ranked by health and latency."""
+    return rank_targets([
+        target for target in chain_targets()
+        if (target.provider, target.model) != exclude
+    ])
+
+
+def parse_hedge_target(form: Any, provider: str, model: str, *, server_key: bool) -> ProviderTarget | None:
+    """Resolve the backup provider for hedge mode, if hedging applies.
+
+    Hedging is on when the 'hedge' field is truthy, or when HEDGE_ENABLED is
+    set and the field is absent. The backup comes from 'hedge_provider',
+    'hedge_model' and 'hedge_api_key', falling back to the HEDGE_SECONDARY_*
+    settings. A backup without a usable key, or identical to the primary,
+    disables hedging for the request rather than failing it.
+
+    Args:
+        form: Submitted form fields
+        provider: Primary provider
+        model: Primary model
+        server_key: Whether the primary runs on a server key. The backup may
+            use the server's key only then; a request that brought its own
+            key must also send 'hedge_api_key' to be hedged.
+
+    Returns:
+        ProviderTarget, or None when the request is not hedged
+    """
+    requested = form.get('hedge')
+    enabled = Config.HEDGE_ENABLED if requested is None else requested.lower() in {'1', 'true', 'yes', 'on'}
+    if not enabled:
+        return None
+
+    hedge_provider = (form.get('hedge_provider') or Config.HEDGE_SECONDARY_PROVIDER or '').lower()
+    hedge_config = get_provider_config(hedge_provider)
+    if not hedge_config:
+        return None
+    hedge_model = (
+        (form.get('hedge_model') or '').strip()
+        or Config.HEDGE_SECONDARY_MODEL
+        or Config.get_default_model_for(hedge_provider)
+        or hedge_config['default_model']
+    )
+    hedge_key = (form.get('hedge_api_key') or '').strip()
+    if not hedge_key and server_key:
+        hedge_key = Config.get_api_key_for(hedge_provider)
+    if not hedge_key or (hedge_provider, hedge_model) == (provider, model):
+        return None
+    return ProviderTarget(provider=hedge_provider, provider_config=hedge_config, api_key=hedge_key, model=hedge_model)
+
+
+def progressive_requested(form: Any) -> bool:
+    """Whether to try low-resolution images first (the 'progressive' field, else PROGRESSIVE_ENABLED).
+
+    Hedged and streamed requests always send the full-size image.
+    """
+    requested = form.get('progressive')
+    if requested is None:
+        return Config.PROGRESSIVE_ENABLED
+    return requested.lower() in {'1', 'true', 'yes', 'on'}
+
+
+class RecipeCacheLookup:
+    """Exact and near-duplicate result cache lookups for one request."""
+
+    def __init__(self, recipe_request: RecipeRequest):
+        """Compute the cache key for a request.
+
+        Args:
+            recipe_request: Request whose image and prompt inputs form the key
+        """
+        self.recipe_request = recipe_request
+        self.cache = get_recipe_cache()
+        self.key = None
+        self.status = 'disabled'
+        self.similarity_index = None
+        self.image_hash = None
+        if self.cache is not None:
+            self.key = recipe_request.fingerprint
+            self.status = 'miss' if recipe_request.use_cache else 'bypass'
+            self.similarity_index = get_similarity_index()
+
+    def exact(self) -> Dict[str, Any] | None:
+        """Return the cached payload for byte-identical uploads, if any."""
+        if self.status != 'miss':
+            return None
+        cached = self.cache.get(self.key)
+        if cached is None:
+            return None
+        return self._cached_payload(cached, {'status': 'hit'})
+
+    def near(self, image: Any) -> Dict[str, Any] | None:
+        """Return the cached payload of a perceptually similar upload, if any.
+
+        Args:
+            image: Decoded upload; its hash is kept for store()
+        """
+        if self.similarity_index is None:
+            return None
+        self.image_hash = dhash(image)
+        if self.status != 'miss':
+            return None
+        group = self.recipe_request.prompt_group
+        match = self.similarity_index.nearest(self.image_hash, group)
+        if match is None:
+            return None
+        near_key, distance = match
+        cached = self.cache.get(near_key)
+        if cached is None:
+            # The result cache evicted the entry; forget the stale hash.
+            self.similarity_index.discard(group, near_key)
+            return None
+        return self._cached_payload(cached, {'status': 'near_hit', 'distance': distance})
+
+    def store(self, recipe: Dict[str, Any], model: str, provider: str | None = None) -> None:
+        """Cache a structured recipe under this request's key and image hash."""
+        if self.cache is None:
+            return
+        self.cache.set(self.key, {
+            'recipe': recipe,
+            'provider': provider or self.recipe_request.provider,
+            'model': model,
+            'created_at': time.time(),
+        })
+        if self.similarity_index is not None and self.image_hash is not None:
+            self.similarity_index.add(self.image_hash, self.recipe_request.prompt_group, self.key)
+
+    def _cached_payload(self, cached: Dict[str, Any], cache_meta: Dict[str, Any]) -> Dict[str, Any]:
+        payload = self.recipe_request.build_payload(
+            cached['recipe'],
+            cached.get('model', self.recipe_request.model),
+            provider=cached.get('provider'),
+        )
+        age = max(time.time() - cached.get('created_at', time.time()), 0)
+        payload['meta']['cache'] = {**cache_meta, 'age_seconds': round(age, 1)}
+        return payload
+
+
+def decode_upload(recipe_request: RecipeRequest) -> Any:
+    """Decode the upload once for validation, hashing and re-encoding.
+
+    Raises:
+        ApiError: If the image is unreadable or corrupted
+    """
+    try:
+        with stage('decode'):
+            return decode_image(
+                recipe_request.upload.open(),
+                max_dimension=Config.get_max_image_dimension_for(recipe_request.provider),
+            )
+    except UnidentifiedImageError as validation_error:
+        logger.info("Invalid image upload: %s", validation_error)
+        raise ApiError(
+            'invalid_image',
+            'Invalid or corrupted image file.',
+            hint='Try exporting the photo again as PNG or JPG.',
+        ) from validation_error
+    except Exception as validation_error:  # noqa: BLE001
+        logger.warning("Image validation failed: %s", validation_error)
+        raise ApiError('invalid_image', 'Invalid or corrupted image file.') from validation_error
+
+
+def prepare_upload(recipe_request: RecipeRequest, image: Any, max_dimension: int | None = None) -> PreparedImage:
+    """Downscale and re-encode a decoded upload for the request's provider.
+
+    Args:
+        recipe_request: Request being served
+        image: Decoded upload
+        max_dimension: Longest edge to send, if smaller than the provider's full size
+
+    Raises:
+        ApiError: If the image cannot be re-encoded
+    """
+    try:
+        with stage('prepare_image'):
+            return prepare_image(
+                image,
+                max_dimension=max_dimension or Config.get_max_image_dimension_for(recipe_request.provider),
+                image_format=Config.IMAGE_ENCODE_FORMAT,
+                quality=Config.IMAGE_ENCODE_QUALITY,
+            )
+    except Exception as prepare_error:  # noqa: BLE001
+        logger.warning("Image preprocessing failed: %s", prepare_error)
+        raise ApiError('invalid_image', 'Invalid or corrupted image file.') from prepare_error
+
+
+def build_request_prompt(recipe_request: RecipeRequest, *, ask_confidence: bool = False) -> str:
+    """Build the generation prompt for a request's preferences.
+
+    Args:
+        recipe_request: The parsed request
+        ask_confidence: Also ask the model how confident it is, which decides
+            whether a progressive request needs a larger image
+    """
+    with stage('build_prompt'):
+        prompt = build_prompt(recipe_request.language, recipe_request.dietary_restrictions, recipe_request.cuisine_preference)
+    if ask_confidence:
+        prompt = f'{prompt}\n{CONFIDENCE_INSTRUCTION}'
+    return prompt
+
+
+def call_provider(
+    recipe_request: RecipeRequest | ProviderTarget,
+    prepared: PreparedImage,
+    prompt: str,
+    deadline: Deadline,
+    *,
+    cancelled: threading.Event | None = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Run the provider handler, normalising unexpected failures to ProviderError.
+
+    Each attempt first takes a slot from the provider's concurrency limit and
+    gets connect and read timeouts from what is left of the deadline. Server
+    keys are leased from the key pool per attempt, so a retry after a 429
+    moves to another key without waiting out the provider's Retry-After.
+    Retryable failures (rate limits, 5xx, timeouts) are tried again after a
+    jittered backoff, without holding the slot, while the deadline allows.
+    Successful call latencies are recorded per provider and model, and every
+    outcome that reflects the provider's health feeds its circuit breaker.
+    Every call is observed in the provider call histogram. Time spent queued
+    for a slot is not part of the recorded latency.
+
+    Args:
+        recipe_request: Request (or hedge backup) naming provider, model and key
+        prepared: Image payload to send
+        prompt: Generation prompt
+        deadline: The request's deadline; every attempt, queue wait and backoff is charged to it
+        cancelled: Set when the result is no longer wanted, as for the losing
+            leg of a hedged call; checked once a slot is taken and during
+            backoff, since an attempt in flight cannot be interrupted
+
+    Returns:
+        Tuple of (raw_text, provider_meta) from the handler
+
+    Raises:
+        ProviderError: If the provider fails for any reason, with the
+            deadline's breakdown as its budget; 'provider_busy' if no
+            concurrency slot was available; 'deadline_exceeded' if too little
+            time is left for an attempt; 'cancelled' once cancelled is set
+    """
+    cancelled = cancelled or threading.Event()
+    for attempt in count():
+        timeout = attempt_timeout(deadline)
+        queued = time.monotonic()
+        with provider_slot(recipe_request), lease_api_key(recipe_request) as lease:
+            started = time.monotonic()
+            deadline.charge('queue', started - queued)
+            if cancelled.is_set():
+                raise call_cancelled(recipe_request)
+            try:
+                result = recipe_request.provider_config['handler'](
+                    image_bytes=prepared.data,
+                    prompt=prompt,
+                    model=recipe_request.model,
+                    api_key=lease.api_key,
+                    mime_type=prepared.mime_type,
+                    timeout=timeout,
+                )
+            except Exception as error:  # noqa: BLE001
+                elapsed = time.monotonic() - started
+                deadline.charge_attempt(recipe_request.provider, recipe_request.model, elapsed)
+                failure = record_provider_failure(recipe_request, error, elapsed)
+                rotated = lease.rate_limited(failure)
+                delay = retry_delay(failure, attempt, deadline, honour_retry_after=not rotated)
+                if delay is None:
+                    failure.budget = deadline.breakdown()
+                    if failure is error:
+                        raise
+                    raise failure from error
+            else:
+                elapsed = time.monotonic() - started
+                deadline.charge_attempt(recipe_request.provider, recipe_request.model, elapsed)
+                record_provider_success(recipe_request, elapsed)
+                return result
+        if cancelled.wait(delay):
+            raise call_cancelled(recipe_request)
+        record_backoff(recipe_request, delay, deadline)
+
+
+def call_cancelled(target: RecipeRequest | ProviderTarget) -> ProviderError:
+    """The error a cancelled provider call stops with; nobody sees it, so it is not counted anywhere."""
+    logger.info('Stopped the call to %s/%s; its result is no longer needed', target.provider, target.model)
+    return ProviderError('cancelled', 'The provider call was cancelled.', status=499)
+
+
+def attempt_timeout(deadline: Deadline) -> ProviderTimeout:
+    """Connect and read timeouts for the next provider attempt.
+
+    Raises:
+        ProviderError: 'deadline_exceeded' (504) if less than
+            PROVIDER_MIN_ATTEMPT_SECONDS of the budget is left
+    """
+    timeout = deadline.attempt_timeout()
+    if timeout is None:
+        raise deadline_exceeded(deadline)
+    return timeout
+
+
+def deadline_exceeded(deadline: Deadline) -> ProviderError:
+    """The 504 'deadline_exceeded' error for a request whose budget ran out."""
+    return ProviderError(
+        'deadline_exceeded',
+        'The request ran out of time before the AI provider answered.',
+        status=504,
+        hint=f'Try again, or allow more time with the {DEADLINE_HEADER} header.',
+        budget=deadline.breakdown(),
+    )
+
+
+def record_backoff(target: RecipeRequest | ProviderTarget, delay: float, deadline: Deadline) -> None:
+    """Account for the wait before retrying a provider call."""
+    logger.info('Retrying %s/%s after %.2fs', target.provider, target.model, delay)
+    deadline.charge('backoff', delay)
+    record_span('backoff', delay, provider=target.provider)
+    get_metrics().inc('dishcovery_provider_retries_total', provider=target.provider, model=target.model)
+
+
+def record_provider_success(target: RecipeRequest | ProviderTarget, elapsed: float) -> None:
+    """Feed a successful call's latency to the latency tracker, router and histogram."""
+    get_latency_tracker().record(target.provider, target.model, elapsed)
+    get_provider_router().record(target.provider, target.model, ok=True, seconds=elapsed)
+    observe_provider_call(target, elapsed, 'ok')
+
+
+def record_provider_failure(target: RecipeRequest | ProviderTarget, error: Exception, elapsed: float) -> ProviderError:
+    """Log and record a failed call, returning the ProviderError to raise for it.
+
+    A ProviderError is returned as is and only counts against the circuit
+    breaker when the provider was at fault; anything else is unexpected,
+    always counts, and is wrapped in a 'provider_failure' ProviderError.
+    """
+    observe_provider_call(target, elapsed, 'error')
+    if isinstance(error, ProviderError):
+        logger.warning(
+            "Provider error (%s): %s",
+            error.code,
+            error,
+        )
+        if is_provider_fault(error):
+            get_provider_router().record(target.provider, target.model, ok=False)
+        return error
+    logger.error(
+        "Unhandled provider exception: %s",
+        error,
+    )
+    logger.debug(traceback.format_exc())
+    get_provider_router().record(target.provider, target.model, ok=False)
+    return ProviderError(
+        'provider_failure',
+        'AI processing failed. Please try again later.',
+        debug=str(error),
+    )
+
+
+@contextmanager
+def provider_slot(target: RecipeRequest | ProviderTarget) -> Iterator[None]:
+    """Hold one of the target provider's concurrency slots for the block.
+
+    Waits in the provider's bounded queue when every slot is busy. Time spent
+    waiting is recorded as a 'queue' span.
+
+    Raises:
+        ProviderError: 'provider_busy' (429, with Retry-After) if the queue is
+            full or no slot freed up within PROVIDER_QUEUE_TIMEOUT
+    """
+    limiter = get_provider_limiter()
+    try:
+        waited = limiter.acquire(target.provider)
+    except Saturated as saturated:
+        raise provider_busy_error(target, saturated) from saturated
+    if waited:
+        record_span('queue', waited, provider=target.provider)
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        limiter.release(target.provider, time.monotonic() - started)
+
+
+def provider_busy_error(target: RecipeRequest | ProviderTarget, saturated: Saturated) -> ProviderError:
+    """Count a call shed by the provider limiter and build its 429 error."""
+    get_metrics().inc('dishcovery_load_shed_total', lane=target.provider, reason=saturated.reason)
+    return ProviderError(
+        'provider_busy',
+        f"Too many recipes are being generated with {target.provider_config['label']} right now.",
+        status=429,
+        hint=f'Retry in {saturated.retry_after} seconds or choose another provider.',
+        retry_after=saturated.retry_after,
+    )
+
+
+def observe_provider_call(target: RecipeRequest | ProviderTarget, seconds: float, outcome: str) -> None:
+    """Record one provider call in the provider call histogram and the request trace."""
+    get_metrics().observe(
+        'dishcovery_provider_call_seconds', seconds,
+        provider=target.provider, model=target.model, outcome=outcome,
+    )
+    record_span('provider', seconds, provider=target.provider, model=target.model, outcome=outcome)
+
+
+def finish_recipe(
+    recipe_request: RecipeRequest,
+    lookup: RecipeCacheLookup,
+    prepared: PreparedImage,
+    raw_text: str,
+    provider_meta: Dict[str, Any],
+    *,
+    parsed: Tuple[Dict[str, Any], str | None] | None = None,
+    target: RecipeRequest | ProviderTarget | None = None,
+) -> Dict[str, Any]:
+    """Parse provider output, cache it when structured and build the response payload.
+
+    With RECIPE_REPAIR_ENABLED, missing or malformed fields are first filled
+    in by a text-only follow-up to the backend that answered.
+
+    Args:
+        recipe_request: Request being served
+        lookup: Cache lookup used to store the result
+        prepared: Image payload that was sent
+        raw_text: Provider output
+        provider_meta: Metadata returned by the handler
+        parsed: Result of parse_recipe(raw_text) when already computed
+        target: Backend that answered, when not the requested one
+    """
+    target = target or recipe_request
+    repair = None
+    if Config.RECIPE_REPAIR_ENABLED:
+        parsed, repair = repair_recipe(recipe_request, target, raw_text)
+    recipe, warning = parsed or parse_recipe(raw_text)
+    used_model = provider_meta.get('model', recipe_request.model)
+    provider = target.provider
+
+    # Only structured recipes are worth replaying; raw-text fallbacks are not cached.
+    if not warning:
+        lookup.store(recipe, used_model, provider)
+
+    response_payload = recipe_request.build_payload(recipe, used_model, provider)
+    response_payload['meta']['cache'] = {'status': lookup.status}
+    response_payload['meta']['image'] = {
+        'width': prepared.width,
+        'height': prepared.height,
+        'bytes': len(prepared.data),
+    }
+
+    if repair is not None:
+        response_payload['meta']['repair'] = repair
+
+    if warning:
+        response_payload['warning'] = warning
+
+    if Config.FLASK_ENV.lower() in {'development', 'debug'}:
+        response_payload['debug'] = {
+            'raw_response': raw_text,
+        }
+
+    return response_payload
+
+
+def repair_recipe(
+    recipe_request: RecipeRequest,
+    target: RecipeRequest | ProviderTarget,
+    raw_text: str,
+) -> Tuple[Tuple[Dict[str, Any], str | None], Dict[str, Any] | None]:
+    """Parse provider output, asking the same backend to fill in invalid fields.
+
+    Missing or malformed fields are requested in a text-only follow-up that
+    carries the valid part of the recipe instead of the image, and the
+    fields that come back valid are merged in. A failed follow-up is logged
+    and the recipe is returned as parsed. Nothing is repaired when the
+    output holds no JSON object or more than RECIPE_REPAIR_MAX_FIELDS fields
+    are invalid; such responses need a full regeneration.
+
+    Args:
+        recipe_request: Request being served
+        target: Backend that produced raw_text
+        raw_text: Provider output
+
+    Returns:
+        Tuple of (parsed, repair) where parsed matches parse_recipe() and
+        repair holds the stats for meta['repair'], or None if no repair ran
+    """
+    with stage('parse'):
+        recipe_json, truncated = extract_json_object(raw_text)
+        fields = invalid_fields(recipe_json) if recipe_json is not None else []
+    if recipe_json is None:
+        return parse_recipe(raw_text), None
+    if not fields or len(fields) > Config.RECIPE_REPAIR_MAX_FIELDS:
+        return (transform_recipe(recipe_json), TRUNCATED_RECIPE_WARNING if truncated else None), None
+
+    started = time.monotonic()
+    repair: Dict[str, Any] = {'fields': fields}
+    repair_json = None
+    try:
+        timeout = attempt_timeout(recipe_request.deadline)
+        with provider_slot(target), lease_api_key(target) as lease:
+            try:
+                repair_text, _ = target.provider_config['handler'](
+                    image_bytes=None,
+                    prompt=build_repair_prompt(recipe_json, fields, recipe_request.language),
+                    model=target.model,
+                    api_key=lease.api_key,
+                    mime_type=None,
+                    timeout=timeout,
+                )
+            except Exception as error:  # noqa: BLE001
+                lease.rate_limited(error)
+                raise
+        repair_json, _ = extract_json_object(repair_text)
+    except Exception as repair_error:  # noqa: BLE001
+        logger.warning("Recipe repair failed: %s", repair_error)
+        repair['error'] = getattr(repair_error, 'code', 'provider_failure')
+    recipe_json, repair['repaired'] = merge_repair(recipe_json, repair_json, fields)
+    elapsed = time.monotonic() - started
+    get_metrics().observe('dishcovery_stage_seconds', elapsed, stage='repair')
+    record_span('repair', elapsed, fields=len(fields), repaired=len(repair['repaired']))
+    repair['elapsed_ms'] = round(elapsed * 1000, 1)
+
+    # A truncated response is whole again once every field it lost is back.
+    warning = TRUNCATED_RECIPE_WARNING if truncated and invalid_fields(recipe_json) else None
+    return (transform_recipe(recipe_json), warning), repair
+
+
+def run_recipe_pipeline(recipe_request: RecipeRequest) -> Dict[str, Any]:
+    """Serve a recipe request from cache or the provider.
+
+    Stages: exact cache lookup on the upload bytes, a single decode, the
+    near-duplicate lookup, re-encoding for the provider, the provider call and
+    parsing. Everything after the exact lookup is coalesced with identical
+    requests already in flight.
+
+    Returns:
+        Success payload for the response body
+
+    Raises:
+        ApiError: If the image is invalid or the provider fails
+    """
+    lookup = RecipeCacheLookup(recipe_request)
+    payload = lookup.exact()
+    if payload is None and not Config.COALESCE_ENABLED:
+        payload = generate_uncached(recipe_request, lookup)
+    elif payload is None:
+        try:
+            payload, shared = get_single_flight().do(
+                recipe_request.flight_key,
+                lambda: generate_with_worker_lock(recipe_request, lookup),
+                timeout=recipe_request.deadline.remaining(),
+            )
+        except TimeoutError as timeout_error:
+            raise deadline_exceeded(recipe_request.deadline) from timeout_error
+        if shared:
+            payload = mark_coalesced(payload)
+    count_recipe_response(payload)
+    return payload
+
+
+def mark_coalesced(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy of a shared payload flagged as served by another request's generation."""
+    return {**payload, 'meta': {**payload['meta'], 'coalesced': True}}
+
+
+def count_recipe_response(payload: Dict[str, Any]) -> None:
+    """Count a served recipe by cache status and whether it was coalesced."""
+    get_metrics().inc(
+        'dishcovery_recipe_responses_total',
+        cache=payload['meta']['cache']['status'],
+        coalesced='true' if payload['meta'].get('coalesced') else 'false',
+    )
+
+
+def generate_with_worker_lock(recipe_request: RecipeRequest, lookup: RecipeCacheLookup) -> Dict[str, Any]:
+    """Coalesce generation with identical requests running in other workers.
+
+    Only applies when COALESCE_LOCK_BACKEND provides a shared lock store and
+    the request may use the result cache, which is how a finished result is
+    handed to the waiting workers. The lock holder generates; other workers
+    poll until it finishes, then serve its cached result or re-raise its
+    error. If the result could not be cached, or waiting exceeds
+    COALESCE_WAIT_TIMEOUT or the request's remaining deadline, the waiter
+    generates on its own.
+    """
+    locks = get_flight_locks()
+    if locks is None or lookup.status != 'miss':
+        return generate_uncached(recipe_request, lookup)
+
+    key = recipe_request.flight_key
+    owner = uuid.uuid4().hex
+    deadline = time.monotonic() + min(Config.COALESCE_WAIT_TIMEOUT, recipe_request.deadline.remaining())
+    waited = False
+    while not locks.acquire(key, owner, Config.COALESCE_LOCK_TTL):
+        waited = True
+        cached_payload = finished_flight(locks, key, lookup)
+        if cached_payload is not None:
+            return cached_payload
+        if time.monotonic() >= deadline:
+            return generate_uncached(recipe_request, lookup)
+        time.sleep(Config.COALESCE_POLL_INTERVAL)
+
+    # The previous holder may have finished between our last poll and acquire.
+    cached_payload = lookup.exact() if waited else None
+    if cached_payload is not None:
+        locks.release(key, owner)
+        return mark_coalesced(cached_payload)
+    return generate_holding_lock(recipe_request, lookup, locks, owner)
+
+
+def finished_flight(locks: SQLiteFlightLocks, key: str, lookup: RecipeCacheLookup) -> Dict[str, Any] | None:
+    """The result of another worker's generation of key, if it has finished.
+
+    Returns:
+        The cached payload marked as coalesced, or None while the holder is
+        still running or its result did not make it into the cache
+
+    Raises:
+        ApiError: The holder's error, if it failed within COALESCE_ERROR_LINGER
+    """
+    state, error = locks.state(key)
+    if state == FAILED:
+        error_class = ProviderError if error.pop('provider', False) else ApiError
+        raise error_class(error['code'], error['message'], status=error['status'], hint=error.get('hint'))
+    cached_payload = lookup.exact() if state is None else None
+    return None if cached_payload is None else mark_coalesced(cached_payload)
+
+
+def generate_holding_lock(recipe_request: RecipeRequest, lookup: RecipeCacheLookup, locks: SQLiteFlightLocks, owner: str) -> Dict[str, Any]:
+    """Generate while holding the worker lock, then release it with the outcome for the waiters."""
+    key = recipe_request.flight_key
+    try:
+        payload = generate_uncached(recipe_request, lookup)
+    except ApiError as error:
+        locks.release(key, owner, {
+            'code': error.code,
+            'message': str(error),
+            'status': error.status,
+            'hint': error.hint,
+            'provider': isinstance(error, ProviderError),
+        }, linger=Config.COALESCE_ERROR_LINGER)
+        raise
+    except BaseException:
+        locks.release(key, owner)
+        raise
+    locks.release(key, owner)
+    return payload
+
+
+def generate_uncached(recipe_request: RecipeRequest, lookup: RecipeCacheLookup) -> Dict[str, Any]:
+    """Decode, check for near-duplicates and call the provider for a cache miss."""
+    image = decode_upload(recipe_request)
+    cached_payload = lookup.near(image)
+    if cached_payload is not None:
+        return cached_payload
+
+    if recipe_request.progressive and recipe_request.hedge is None:
+        return run_progressive_generation(recipe_request, lookup, image)
+    prepared = prepare_upload(recipe_request, image)
+    prompt = build_request_prompt(recipe_request)
+    if recipe_request.hedge is not None:
+        return run_hedged_generation(recipe_request, lookup, prepared, prompt)
+    target, raw_text, provider_meta, attempts = call_with_fallback(recipe_request, prepared, prompt)
+    payload = finish_recipe(recipe_request, lookup, prepared, raw_text, provider_meta, target=target)
+    if recipe_request.fallbacks:
+        payload['meta']['routing'] = {'attempts': attempts}
+    return payload
+
+
+def run_progressive_generation(recipe_request: RecipeRequest, lookup: RecipeCacheLookup, image: Any) -> Dict[str, Any]:
+    """Send the image at increasing resolutions until an answer is good enough.
+
+    Starts at the smallest PROGRESSIVE_TIERS size that shrinks the image and
+    escalates to the next size when escalation_reason finds the answer
+    unparsed, incomplete or below PROGRESSIVE_MIN_CONFIDENCE. The provider's
+    full size is the last tier and its answer is always used. A lower tier's
+    answer is used anyway, with its reason, when the deadline leaves no time
+    to escalate or the larger image fails. meta['progressive'] records the
+    tier used and every tier sent with its outcome ('used', 'escalated' or
+    the error code).
+    """
+    dimensions = resolution_tiers(
+        Config.get_max_image_dimension_for(recipe_request.provider), image.size, Config.PROGRESSIVE_TIERS,
+    )
+    # A single tier is never escalated, so its answer needs no confidence.
+    prompt = build_request_prompt(recipe_request, ask_confidence=len(dimensions) > 1)
+    tiers: List[Dict[str, Any]] = []
+    answer = None
+    for index, dimension in enumerate(dimensions):
+        prepared = prepare_upload(recipe_request, image, max_dimension=dimension)
+        tier: Dict[str, Any] = {'dimension': dimension, 'bytes': len(prepared.data)}
+        tiers.append(tier)
+        started = time.monotonic()
+        try:
+            result = call_with_fallback(recipe_request, prepared, prompt)
+        except ProviderError as provider_error:
+            if answer is None:
+                raise
+            tier.update(outcome=provider_error.code, elapsed_ms=round((time.monotonic() - started) * 1000, 1))
+            break
+        tier['elapsed_ms'] = round((time.monotonic() - started) * 1000, 1)
+        answer = (index, prepared, *result)
+        reason = None if index == len(dimensions) - 1 else escalation_reason(result[1], Config.PROGRESSIVE_MIN_CONFIDENCE)
+        if reason is None:
+            break
+        tier.update(outcome='escalated', reason=reason)
+        if recipe_request.deadline.attempt_timeout() is None:
+            break
+
+    index, prepared, target, raw_text, provider_meta, attempts = answer
+    tiers[index]['outcome'] = 'used'
+    for number, tier in enumerate(tiers):
+        get_metrics().inc('dishcovery_progressive_tiers_total', tier=str(number), outcome=tier['outcome'])
+    payload = finish_recipe(recipe_request, lookup, prepared, raw_text, provider_meta, target=target)
+    payload['meta']['progressive'] = {'tier': index, 'dimension': tiers[index]['dimension'], 'tiers': tiers}
+    if recipe_request.fallbacks:
+        payload['meta']['routing'] = {'attempts': attempts}
+    return payload
+
+
+def call_with_fallback(
+    recipe_request: RecipeRequest,
+    prepared: PreparedImage,
+    prompt: str,
+) -> Tuple[ProviderTarget, str, Dict[str, Any], List[Dict[str, Any]]]:
+    """Call the request's backends in order until one answers.
+
+    Backends whose circuit breaker is open are skipped. A failure caused by
+    the provider (timeouts, 5xx, rate limits) that retries did not fix moves
+    on to the next backend; a failure caused by the request itself, such as
+    a rejected API key, or an exhausted deadline is raised straight away.
+
+    Returns:
+        Tuple of (target, raw_text, provider_meta, attempts), where attempts
+        lists each backend tried with its outcome
+
+    Raises:
+        ProviderError: If no backend produced a response
+    """
+    router = get_provider_router()
+    attempts: List[Dict[str, Any]] = []
+    last_error: ProviderError | None = None
+    for target in recipe_request.targets:
+        attempt = {'provider': target.provider, 'model': target.model}
+        breaker = router.breaker(target.provider, target.model)
+        if Config.ROUTER_ENABLED and not breaker.allow():
+            attempts.append({**attempt, 'outcome': 'skipped'})
+            continue
+        try:
+            raw_text, provider_meta = call_provider(target, prepared, prompt, recipe_request.deadline)
+        except ProviderError as provider_error:
+            attempts.append({**attempt, 'outcome': 'error', 'code': provider_error.code})
+            if provider_error.code == 'deadline_exceeded' or not is_provider_fault(provider_error):
+                raise
+            last_error = provider_error
+            continue
+        finally:
+            breaker.release()
+        attempts.append({**attempt, 'outcome': 'ok'})
+        return target, raw_text, provider_meta, attempts
+
+    if last_error is not None:
+        last_error.budget = recipe_request.deadline.breakdown()
+        raise last_error
+    raise ProviderError(
+        'providers_unavailable',
+        'AI providers are temporarily unavailable. Please try again shortly.',
+        status=503,
+        hint='Recent requests to the selected provider kept failing; it will be retried automatically.',
+    )
+
+
+def run_hedged_generation(
+    recipe_request: RecipeRequest,
+    lookup: RecipeCacheLookup,
+    prepared: PreparedImage,
+    prompt: str,
+) -> Dict[str, Any]:
+    """Race the request's provider against its hedge backup.
+
+    The backup receives the same prepared image and prompt once the primary
+    has run longer than its recent latency percentile (or as soon as the
+    primary fails). The first response that parses into a structured recipe
+    wins. meta['hedge'] records the winner and, when the backup won, the time
+    saved as estimated from the primary's latency distribution.
+    """
+    hedge = recipe_request.hedge
+    primary_window = get_latency_tracker().window(recipe_request.provider, recipe_request.model)
+    # Set once a winner is in, so the loser gives up its slot at its next retry instead of running on.
+    finished = threading.Event()
+
+    def attempt(target: RecipeRequest | ProviderTarget):
+        def run():
+            raw_text, provider_meta = call_provider(target, prepared, prompt, recipe_request.deadline, cancelled=finished)
+            return target, raw_text, provider_meta, parse_recipe(raw_text)
+        return run
+
+    try:
+        outcome = hedged_call(
+            attempt(recipe_request),
+            attempt(hedge),
+            delay=hedge_delay(primary_window),
+            accept=lambda result: result[3][1] is None,
+            executor=get_hedge_executor(),
+            may_launch=lambda: get_provider_limiter().has_free_slot(hedge.provider),
+        )
+    finally:
+        finished.set()
+    target, raw_text, provider_meta, parsed = outcome.result
+    payload = finish_recipe(
+        recipe_request, lookup, prepared, raw_text, provider_meta,
+        parsed=parsed,
+        target=target,
+    )
+
+    estimated_saved_ms: float | None = 0.0
+    if outcome.winner == 'secondary':
+        expected_primary = primary_window.tail_mean(outcome.elapsed)
+        estimated_saved_ms = None if expected_primary is None else round((expected_primary - outcome.elapsed) * 1000, 1)
+    payload['meta']['hedge'] = {
+        'winner': outcome.winner,
+        'provider': target.provider,
+        'model': target.model,
+        'launched': outcome.launched,
+        'delay_ms': round(outcome.delay * 1000, 1),
+        'elapsed_ms': round(outcome.elapsed * 1000, 1),
+        'estimated_saved_ms': estimated_saved_ms,
+    }
+    return payload
+
+
+def admitted(view):
+    """Shed recipe requests beyond ADMISSION_MAX_IN_FLIGHT with a 503.
+
+    The check runs before the upload is read, so a rejected request costs
+    the worker almost nothing. The slot is released in teardown, after a
+    streamed response has finished. Endpoints without this decorator, such
+    as /health, are never shed.
+    """
+    @wraps(view)
+    def admitted_view(*args, **kwargs):
+        limiter = get_request_limiter()
+        if limiter is not None:
+            try:
+                limiter.acquire('requests')
+            except Saturated as saturated:
+                return error_response(server_busy_error(saturated))
+            g.admitted_at = time.monotonic()
+        return view(*args, **kwargs)
+
+    return admitted_view
+
+
+def idempotent(view):
+    """Replay the stored response of an earlier request with the same Idempotency-Key.
+
+    Requests without the header run as usual. The first request with a key
+    claims it and its final response (success or problem body) is stored
+    for IDEMPOTENCY_TTL. A retry from the same client (API key, else IP)
+    with the same form fields and files replays that response byte for byte
+    with an Idempotent-Replayed header; a retry arriving while the original
+    is still running waits for it, up to the retry's own deadline, instead
+    of calling the provider again. Reusing a key for a different request
+    is rejected with 422.
+
+    Apply it inside admitted, so waiting retries hold an admission slot.
+    """
+    @wraps(view)
+    def idempotent_view(*args, **kwargs):
+        raw_key = request.headers.get(IDEMPOTENCY_HEADER)
+        store = get_idempotency_store()
+        if raw_key is None or store is None:
+            return view(*args, **kwargs)
+        owner = uuid.uuid4().hex
+        try:
+            key = scoped_key(request.endpoint, client_identity(request.form, request.remote_addr), raw_key)
+            fingerprint = request_fingerprint(request.form, uploaded_file_digests())
+            stored = claim(store, key, owner, fingerprint, wait=wait_budget(request.headers))
+        except (ValueError, InProgress, KeyReused) as error:
+            return error_response(idempotency_error(error))
+        if stored is not None:
+            return Response(stored.body, status=stored.status, headers={**stored.headers, REPLAYED_HEADER: 'true'})
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            store.abandon(key, owner)
+            raise
+        remember(store, key, owner, response.status_code, response.headers, response.get_data())
+        return response
+
+    return idempotent_view
+
+
+def uploaded_file_digests() -> List[Tuple[str, str]]:
+    """(field name, SHA-256 hex) of each file in the request, rewinding each after hashing."""
+    digests = []
+    for name, storage in request.files.items(multi=True):
+        digest = hashlib.sha256()
+        while True:
+            chunk = storage.stream.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            digest.update(chunk)
+        storage.stream.seek(0)
+        digests.append((name, digest.hexdigest()))
+    return digests
+
+
+def idempotency_error(error: Exception) -> ApiError:
+    """Error for an unusable Idempotency-Key, one reused for another request, or one still running."""
+    if isinstance(error, KeyReused):
+        return ApiError(
+            'idempotency_key_reused',
+            str(error),
+            status=422,
+            hint='Send a fresh Idempotency-Key for each new request and reuse it only for retries.',
+        )
+    if isinstance(error, InProgress):
+        return ApiError(
+            'idempotency_in_progress',
+            str(error),
+            status=409,
+            hint=f'Retry in {error.retry_after} seconds with the same Idempotency-Key.',
+            retry_after=error.retry_after,
+        )
+    return ApiError(
+        'invalid_idempotency_key',
+        'The Idempotency-Key header must be 1 to 255 printable ASCII characters.',
+        hint='Send a fresh UUID for each new request and reuse it only for retries.',
+    )
 
 
-def problem_response(code: str, message: str, *, status: int = 400, hint: str | None = None, debug: str | None = None):
-    """Create a standardized error response in JSON format.
+def server_busy_error(saturated: Saturated) -> ApiError:
+    """Count a request shed by the per-worker cap and build its 503 error."""
+    get_metrics().inc('dishcovery_load_shed_total', lane='requests', reason=saturated.reason)
+    return ApiError(
+        'server_busy',
+        'The server is busy. Please try again shortly.',
+        status=503,
+        hint=f'Retry in {saturated.retry_after} seconds.',
+        retry_after=saturated.retry_after,
+    )
+
+
+def check_rate_limit(scope: str, kind: str, identity: str | None, *, cost: float = 1.0) -> None:
+    """Charge the request to a token bucket, rejecting it once the bucket is empty.
 
     Args:
-        code: Machine-readable error code for client-side handling
-        message: User-friendly error message
-        status: HTTP status code (default: 400 for client errors)
-        hint: Optional suggestion for error recovery
-        debug: Optional debug info (only included in development/debug mode)
+        scope: 'recipe' or 'validate'
+        kind: 'ip' for the client address, 'key' for an API key fingerprint
+        identity: Client IP or key fingerprint; None skips the check
+        cost: Tokens to charge, e.g. the number of images in a batch
 
-    Returns:
-        Tuple of (JSON response, HTTP status code) ready for Flask to return
+    Raises:
+        ApiError: 'rate_limited' (429, with Retry-After) if the bucket is empty,
+            or 'batch_exceeds_rate_limit' (413) if cost exceeds the bucket's burst,
+            which no amount of waiting would allow
     """
-    payload: Dict[str, Any] = {
-        "success": False,
-        "error": {
-            "code": code,
-            "message": message,
-        },
-    }
+    limiter = get_rate_limiter()
+    if limiter is None or not identity:
+        return
+    burst = limiter.burst(scope, kind)
+    if burst is not None and cost > burst:
+        raise ApiError(
+            'batch_exceeds_rate_limit',
+            f'This request counts as {cost:g} requests, more than the {burst:g} the rate limit allows at once.',
+            status=413,
+            hint=f'Send at most {math.floor(burst)} images per batch.',
+        )
+    wait = limiter.hit(scope, kind, identity, cost)
+    if wait <= 0:
+        return
+    get_metrics().inc('dishcovery_rate_limited_total', scope=scope, kind=kind)
+    retry_after = max(1, math.ceil(wait))
+    raise ApiError(
+        'rate_limited',
+        'Too many requests. Please slow down.',
+        status=429,
+        hint=f'Retry in {retry_after} seconds.' + (' Using your own API key avoids the shared limit.' if kind == 'key' else ''),
+        retry_after=retry_after,
+    )
 
-    if hint:
-        payload["error"]["hint"] = hint
 
-    if debug and Config.FLASK_ENV.lower() in {"development", "debug"}:
-        payload["error"]["debug"] = debug
+def check_recipe_rate_limits(recipe_request: RecipeRequest, *, cost: float = 1.0) -> None:
+    """Charge a parsed recipe request to its API key's bucket (the IP is charged before the upload is read)."""
+    check_rate_limit('recipe', 'key', fingerprint_api_key(recipe_request.api_key), cost=cost)
+
 
-    return jsonify(payload), status
+@api_bp.teardown_request
+def release_request_slot(error):
+    """Return the request's admission slot once the response is complete."""
+    admitted_at = g.pop('admitted_at', None)
+    if admitted_at is not None:
+        get_request_limiter().release('requests', time.monotonic() - admitted_at)
 
 
 @api_bp.route('/generate-recipe', methods=['POST'])
+@admitted
+@idempotent
 def generate_recipe():
     """Generate recipe from a food image using the configured AI provider."""
     try:
-        file = request.files.get('file')
-        if not file:
-            return problem_response(
-                code='missing_file',
-                message='No image file provided. Please upload a food photo.',
-                hint='Choose a PNG, JPG, JPEG, GIF, or WEBP image.',
-            )
+        check_rate_limit('recipe', 'ip', request.remote_addr)
+        with stage('read_upload'):
+            upload = read_upload(request_file('file'))
+        recipe_request = parse_recipe_request(upload, request.form, request.headers)
+        check_recipe_rate_limits(recipe_request)
+        payload = run_recipe_pipeline(recipe_request)
+        with stage('serialize'):
+            return jsonify(payload)
+    except ApiError as error:
+        return error_response(error)
+    except Exception as exc:  # noqa: BLE001
+        logger.error('Server error: %s', exc)
+        logger.debug(traceback.format_exc())
+        return error_response(SERVER_ERROR)
 
-        if not file.filename:
-            return problem_response(
-                code='empty_filename',
-                message='Empty filename. Please select a valid image.',
-            )
 
-        extension = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else ''
-        if extension not in Config.ALLOWED_EXTENSIONS:
-            return problem_response(
-                code='unsupported_file_type',
-                message=f'Invalid file type. Allowed: {", ".join(sorted(Config.ALLOWED_EXTENSIONS))}',
-            )
+@api_bp.route('/generate-recipe/stream', methods=['POST'])
+@admitted
+def generate_recipe_stream():
+    """Generate a recipe and stream fields to the client as Server-Sent Events.
 
-        mime_type = file.mimetype or mimetypes.guess_type(file.filename)[0] or 'image/jpeg'
+    Emits 'name', 'ingredient' and 'step' events while the model is still
+    writing, then a 'complete' event carrying the same payload as
+    /generate-recipe, or an 'error' event with the problem_response body.
+    Validation failures are returned as regular JSON errors before the stream
+    starts.
+    """
+    try:
+        check_rate_limit('recipe', 'ip', request.remote_addr)
+        upload = read_upload(request_file('file'))
+        recipe_request = parse_recipe_request(upload, request.form, request.headers)
+        check_recipe_rate_limits(recipe_request)
+    except ApiError as error:
+        return error_response(error)
+
+    return Response(
+        stream_with_context(stream_recipe_events(recipe_request)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
 
-        image_bytes = file.read()
-        if not image_bytes:
-            return problem_response(
-                code='empty_image',
-                message='Empty image file.',
-            )
 
-        try:
-            candidate = Image.open(io.BytesIO(image_bytes))
-            candidate.verify()
-        except UnidentifiedImageError as validation_error:
-            logger.info("Invalid image upload: %s", validation_error)
-            return problem_response(
-                code='invalid_image',
-                message='Invalid or corrupted image file.',
-                hint='Try exporting the photo again as PNG or JPG.',
-            )
-        except Exception as validation_error:  # noqa: BLE001
-            logger.warning("Image validation failed: %s", validation_error)
-            return problem_response(
-                code='invalid_image',
-                message='Invalid or corrupted image file.',
-            )
+def stream_recipe_events(recipe_request: RecipeRequest) -> Iterator[str]:
+    """Run the recipe pipeline, yielding SSE messages as fields complete."""
+    try:
+        lookup = RecipeCacheLookup(recipe_request)
+        cached_payload = lookup.exact()
+        if cached_payload is None:
+            image = decode_upload(recipe_request)
+            cached_payload = lookup.near(image)
+        if cached_payload is not None:
+            for event, data in recipe_events(cached_payload['recipe']):
+                yield sse_event(event, data)
+            yield sse_event('complete', cached_payload)
+            return
+
+        prepared = prepare_upload(recipe_request, image)
+        prompt = build_request_prompt(recipe_request)
+        parser = RecipeStreamParser()
+        chunks: List[str] = []
+        target, stream = open_stream_with_fallback(recipe_request, prepared, prompt)
+        for chunk in stream:
+            chunks.append(chunk)
+            for event, data in parser.feed(chunk):
+                yield sse_event(event, data)
+
+        raw_text = ''.join(chunks)
+        if not raw_text.strip():
+            raise ProviderError('empty_response', 'AI did not return a response. Please try again.')
+        yield sse_event('complete', finish_recipe(
+            recipe_request, lookup, prepared, raw_text, {'model': target.model},
+            target=target,
+        ))
+    except ApiError as error:
+        yield sse_event('error', error_payload(error))
+    except Exception as exc:  # noqa: BLE001
+        logger.error('Server error while streaming: %s', exc)
+        logger.debug(traceback.format_exc())
+        yield sse_event('error', error_payload(SERVER_ERROR))
 
-        language = request.form.get('language', Config.DEFAULT_LANGUAGE)
-        dietary_restrictions = request.form.get('dietary_restrictions', '')
-        cuisine_preference = request.form.get('cuisine_preference', '')
 
-        provider = (request.form.get('provider') or Config.DEFAULT_PROVIDER).lower()
-        provider_config = get_provider_config(provider)
-        if not provider_config:
-            return problem_response(
-                code='unsupported_provider',
-                message=f'Provider "{provider}" is not supported.',
-                hint='Select one of: gemini, openai, anthropic.',
-            )
+def open_stream_with_fallback(
+    recipe_request: RecipeRequest,
+    prepared: PreparedImage,
+    prompt: str,
+) -> Tuple[ProviderTarget, Iterator[str]]:
+    """Start streaming from the first backend that produces output.
 
-        api_key = (request.form.get('api_key') or '').strip() or Config.get_api_key_for(provider)
-        if not api_key:
-            return problem_response(
-                code='missing_api_key',
-                message='API key is required for the selected provider.',
-                hint=provider_config['key_hint'],
-            )
+    Fallback is only possible before the first chunk: once text has reached
+    the client, a later failure ends the stream with an error event.
+
+    Returns:
+        Tuple of (target, chunk iterator) for the backend that answered
+
+    Raises:
+        ProviderError: If no backend could start a stream
+    """
+    router = get_provider_router()
+    last_error: ProviderError | None = None
+    for target in recipe_request.targets:
+        breaker = router.breaker(target.provider, target.model)
+        if Config.ROUTER_ENABLED and not breaker.allow():
+            continue
+        stream = stream_provider(target, prepared, prompt, recipe_request.deadline)
+        try:
+            first_chunk = next(stream, None)
+        except BaseException as error:
+            breaker.release()
+            if not isinstance(error, ProviderError) or error.code == 'deadline_exceeded' or not is_provider_fault(error):
+                raise
+            last_error = error
+            continue
+        return target, release_breaker_after(stream, first_chunk, breaker)
+
+    if last_error is not None:
+        raise last_error
+    raise ProviderError(
+        'providers_unavailable',
+        'AI providers are temporarily unavailable. Please try again shortly.',
+        status=503,
+        hint='Recent requests to the selected provider kept failing; it will be retried automatically.',
+    )
 
-        requested_model = (request.form.get('model') or '').strip()
-        default_model = Config.get_default_model_for(provider) or provider_config['default_model']
-        model = requested_model or default_model
 
-        prompt = build_prompt(language, dietary_restrictions, cuisine_preference)
+def release_breaker_after(stream: Iterator[str], first_chunk: str | None, breaker: CircuitBreaker) -> Iterator[str]:
+    """Yield first_chunk and the rest of stream, then release the backend's breaker.
 
+    The release also runs when the client disconnects and the generator is
+    closed mid-stream, which otherwise would leave a half-open trial taken.
+    """
+    try:
+        if first_chunk is not None:
+            yield first_chunk
+        yield from stream
+    finally:
+        stream.close()
+        breaker.release()
+
+
+def stream_provider(
+    recipe_request: RecipeRequest | ProviderTarget,
+    prepared: PreparedImage,
+    prompt: str,
+    deadline: Deadline,
+) -> Iterator[str]:
+    """Yield text chunks from the provider's streaming mode.
+
+    Providers without a 'stream_handler' fall back to the blocking handler and
+    yield its whole response as one chunk. The provider's concurrency slot is
+    held until the stream ends or is closed. Outcomes feed the provider's
+    latency window and circuit breaker like call_provider. The stream gets
+    its timeouts from the deadline but is not retried, since it may already
+    have sent text.
+
+    Raises:
+        ProviderError: If the provider fails for any reason, or
+            'deadline_exceeded' if too little time is left to start
+    """
+    stream_handler = recipe_request.provider_config.get('stream_handler')
+    if stream_handler is None:
+        raw_text, _ = call_provider(recipe_request, prepared, prompt, deadline)
+        yield raw_text
+        return
+    timeout = attempt_timeout(deadline)
+    with provider_slot(recipe_request), lease_api_key(recipe_request) as lease:
+        router = get_provider_router()
+        started = time.monotonic()
         try:
-            raw_text, provider_meta = provider_config['handler'](
-                image_bytes=image_bytes,
+            yield from stream_handler(
+                image_bytes=prepared.data,
                 prompt=prompt,
-                model=model,
-                api_key=api_key,
-                mime_type=mime_type,
+                model=recipe_request.model,
+                api_key=lease.api_key,
+                mime_type=prepared.mime_type,
+                timeout=timeout,
             )
+            elapsed = time.monotonic() - started
+            get_latency_tracker().record(recipe_request.provider, recipe_request.model, elapsed)
+            router.record(recipe_request.provider, recipe_request.model, ok=True, seconds=elapsed)
+            observe_provider_call(recipe_request, elapsed, 'ok')
         except ProviderError as provider_error:
-            logger.warning(
-                "Provider error (%s): %s",
-                provider_error.code,
-                provider_error,
-            )
-            return problem_response(
-                code=provider_error.code,
-                message=str(provider_error),
-                status=provider_error.status,
-                hint=provider_error.hint,
-                debug=provider_error.debug,
-            )
+            logger.warning("Provider error (%s): %s", provider_error.code, provider_error)
+            observe_provider_call(recipe_request, time.monotonic() - started, 'error')
+            lease.rate_limited(provider_error)
+            if is_provider_fault(provider_error):
+                router.record(recipe_request.provider, recipe_request.model, ok=False)
+            raise
         except Exception as unexpected_error:  # noqa: BLE001
-            logger.error(
-                "Unhandled provider exception: %s",
-                unexpected_error,
-            )
+            logger.error("Unhandled provider exception: %s", unexpected_error)
             logger.debug(traceback.format_exc())
-            return problem_response(
-                code='provider_failure',
-                message='AI processing failed. Please try again later.',
-                status=500,
+            lease.rate_limited(unexpected_error)
+            router.record(recipe_request.provider, recipe_request.model, ok=False)
+            observe_provider_call(recipe_request, time.monotonic() - started, 'error')
+            raise ProviderError(
+                'provider_failure',
+                'AI processing failed. Please try again later.',
                 debug=str(unexpected_error),
-            )
-
-        recipe, warning = parse_recipe(raw_text)
+            ) from unexpected_error
 
-        response_payload: Dict[str, Any] = {
-            'success': True,
-            'recipe': recipe,
-            'meta': {
-                'provider': provider,
-                'provider_label': provider_config['label'],
-                'model': provider_meta.get('model', model),
-                'language': language,
-                'dietary_restrictions': dietary_restrictions or None,
-                'cuisine_preference': cuisine_preference or None,
-            },
-        }
 
-        if warning:
-            response_payload['warning'] = warning
+def build_success_payload(
+    recipe: Dict[str, Any],
+    *,
+    provider: str,
+    provider_label: str,
+    model: str,
+    language: str,
+    dietary_restrictions: str,
+    cuisine_preference: str,
+) -> Dict[str, Any]:
+    """Assemble the JSON body returned for a successfully generated recipe.
 
-        if Config.FLASK_ENV.lower() in {'development', 'debug'}:
-            response_payload['debug'] = {
-                'raw_response': raw_text,
-            }
+    Args:
+        recipe: Recipe in Dishcovery's standard schema
+        provider: Provider identifier used for generation
+        provider_label: Human-readable provider name
+        model: Model identifier that produced the recipe
+        language: Requested recipe language
+        dietary_restrictions: Dietary requirements from the request
+        cuisine_preference: Cuisine preference from the request
 
-        return jsonify(response_payload)
+    Returns:
+        Response payload with 'success', 'recipe' and 'meta' keys
+    """
+    return {
+        'success': True,
+        'recipe': recipe,
+        'meta': {
+            'provider': provider,
+            'provider_label': provider_label,
+            'model': model,
+            'language': language,
+            'dietary_restrictions': dietary_restrictions or None,
+            'cuisine_preference': cuisine_preference or None,
+        },
+    }
 
-    except Exception as exc:  # noqa: BLE001
-        logger.error('Server error: %s', exc)
-        logger.debug(traceback.format_exc())
-        return problem_response(
-            code='server_error',
-            message='Server error. Please try again later.',
-            status=500,
-        )
 
 @api_bp.route('/health', methods=['GET'])
 def health_check():
@@ -228,48 +1762,19 @@ def health_check():
 @api_bp.route('/validate-key', methods=['POST'])
 def validate_api_key():
     """Validate API key and return available models for the specified provider."""
-    from .providers import (
-        validate_openai_key,
-        validate_anthropic_key,
-        validate_gemini_key
-    )
-
-    data = request.get_json(silent=True)
-
-    if data is None:
-        return problem_response(
-            code="invalid_json",
-            message="Invalid or missing JSON body",
-            status=400
-        )
-
-    provider = data.get('provider')
-    api_key = data.get('apiKey')
-
-    if not provider or not api_key:
-        return problem_response(
-            code="missing_parameters",
-            message="Provider and API key are required",
-            status=400
-        )
-
-    validators = {
-        'openai': validate_openai_key,
-        'anthropic': validate_anthropic_key,
-        'gemini': validate_gemini_key
-    }
+    from .providers import KEY_VALIDATORS, get_key_validation_cache
 
-    validator = validators.get(provider)
-    if not validator:
-        return problem_response(
-            code="invalid_provider",
-            message=f"Unknown provider: {provider}",
-            hint="Supported providers: openai, anthropic, gemini",
-            status=400
-        )
+    try:
+        check_rate_limit('validate', 'ip', request.remote_addr)
+        provider, api_key = parse_key_validation_body(request.get_json(silent=True), KEY_VALIDATORS)
+        check_rate_limit('validate', 'key', fingerprint_api_key(api_key))
+    except ApiError as error:
+        return error_response(error)
 
     try:
-        result = validator(api_key)
+        started = time.perf_counter()
+        result = get_key_validation_cache().validate(provider, api_key)
+        record_span('provider', time.perf_counter() - started, provider=provider)
 
         if result["valid"]:
             return jsonify(result), 200
@@ -287,6 +1792,30 @@ def validate_api_key():
         )
 
 
+def parse_key_validation_body(data: Any, validators: Dict[str, Any]) -> Tuple[str, str]:
+    """Return the (provider, apiKey) pair from a validate-key JSON body.
+
+    Raises:
+        ApiError: 'invalid_json', 'missing_parameters' or 'invalid_provider'
+    """
+    if data is None:
+        raise ApiError('invalid_json', 'Invalid or missing JSON body')
+
+    provider = data.get('provider')
+    api_key = data.get('apiKey')
+
+    if not provider or not api_key:
+        raise ApiError('missing_parameters', 'Provider and API key are required')
+
+    if provider not in validators:
+        raise ApiError(
+            'invalid_provider',
+            f'Unknown provider: {provider}',
+            hint='Supported providers: openai, anthropic, gemini',
+        )
+    return provider, api_key
+
+
 def get_provider_config(provider: str | None) -> Dict[str, Any] | None:
     """Retrieve configuration dictionary for the specified AI provider.
 
@@ -294,8 +1823,10 @@ def get_provider_config(provider: str | None) -> Dict[str, Any] | None:
         provider: Provider identifier ('gemini', 'openai', or 'anthropic')
 
     Returns:
-        Dictionary containing provider configuration (label, default_model, key_hint, handler)
-        Returns None if provider is not supported
+        Dictionary containing provider configuration (label, default_model, key_hint, handler,
+        async_handler (its asyncio variant), and optionally stream_handler yielding text chunks)
+        Returns None if provider is not supported. The offline 'fake' provider
+        is only available with FAKE_PROVIDER_ENABLED.
     """
     providers: Dict[str, Dict[str, Any]] = {
         'gemini': {
@@ -303,20 +1834,38 @@ def get_provider_config(provider: str | None) -> Dict[str, Any] | None:
             'default_model': 'gemini-2.5-flash',
             'key_hint': 'Visit Google AI Studio and copy an API key that begins with "AI".',
             'handler': generate_with_gemini,
+            'async_handler': generate_with_gemini_async,
+            'stream_handler': stream_with_gemini,
         },
         'openai': {
             'label': 'OpenAI GPT-4o',
             'default_model': 'gpt-4o-mini',
             'key_hint': 'Use an OpenAI key that starts with "sk-" or "sk-proj-".',
             'handler': generate_with_openai,
+            'async_handler': generate_with_openai_async,
+            'stream_handler': stream_with_openai,
         },
         'anthropic': {
             'label': 'Anthropic Claude',
             'default_model': 'claude-3-sonnet-20240229',
             'key_hint': 'Use an Anthropic key that starts with "sk-ant-".',
             'handler': generate_with_anthropic,
+            'async_handler': generate_with_anthropic_async,
+            'stream_handler': stream_with_anthropic,
         },
     }
+    if Config.FAKE_PROVIDER_ENABLED:
+        from .fake_provider import get_fake_provider
+
+        fake_provider = get_fake_provider()
+        providers['fake'] = {
+            'label': 'Fake provider (offline)',
+            'default_model': 'fake-recipe-1',
+            'key_hint': 'Any non-empty key works; FAKE_API_KEY is used when none is sent.',
+            'handler': fake_provider.generate,
+            'async_handler': fake_provider.generate_async,
+            'stream_handler': fake_provider.stream,
+        }
     return providers.get(provider or '')
 
 
@@ -363,7 +1912,10 @@ Important: Return ONLY valid JSON. Do not include markdown fences or commentary.
 def parse_recipe(raw_text: str) -> Tuple[Dict[str, Any], str | None]:
     """Parse and clean AI-generated recipe text into structured format.
 
-    Removes markdown code fences and attempts JSON parsing with fallback to raw text.
+    The JSON object is located in a single scan, so leading prose and
+    markdown fences are ignored. Output cut off at the token limit is
+    repaired and keeps every field that was complete, with a warning. Text
+    without a recoverable object falls back to a raw-text recipe.
 
     Args:
         raw_text: Raw response text from the AI provider
@@ -373,27 +1925,26 @@ def parse_recipe(raw_text: str) -> Tuple[Dict[str, Any], str | None]:
             - recipe_dict: Structured recipe data
             - warning_message: None on success, error description on parse failure
     """
-    cleaned = raw_text.strip()
-    cleaned = re.sub(r'^```json\s*', '', cleaned)
-    cleaned = re.sub(r'^```\s*', '', cleaned)
-    cleaned = re.sub(r'```\s*$', '', cleaned)
-    cleaned = cleaned.strip()
+    with stage('parse'):
+        recipe_json, truncated = extract_json_object(raw_text)
+    if recipe_json is not None:
+        warning = TRUNCATED_RECIPE_WARNING if truncated else None
+        return transform_recipe(recipe_json), warning
+
+    fallback_recipe = {
+        'title': 'Generated Recipe',
+        'prep_time': 'N/A',
+        'cook_time': 'N/A',
+        'servings': 'N/A',
+        'ingredients': [],
+        'steps': [raw_text.strip()],
+        'nutrition': {},
+        'tips': '',
+    }
+    return fallback_recipe, 'Could not parse structured recipe. Returning raw text response.'
 
-    try:
-        recipe_json = json.loads(cleaned)
-        return transform_recipe(recipe_json), None
-    except json.JSONDecodeError:
-        fallback_recipe = {
-            'title': 'Generated Recipe',
-            'prep_time': 'N/A',
-            'cook_time': 'N/A',
-            'servings': 'N/A',
-            'ingredients': [],
-            'steps': [raw_text.strip()],
-            'nutrition': {},
-            'tips': '',
-        }
-        return fallback_recipe, 'Could not parse structured recipe. Returning raw text response.'
+
+TRUNCATED_RECIPE_WARNING = 'The AI response was cut off; showing the parts of the recipe that were complete.'
 
 
 def transform_recipe(recipe_json: Dict[str, Any]) -> Dict[str, Any]:
@@ -417,15 +1968,67 @@ def transform_recipe(recipe_json: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def generate_with_gemini(*, image_bytes: bytes, prompt: str, model: str, api_key: str, mime_type: str) -> Tuple[str, Dict[str, Any]]:
+def gemini_request_options(timeout: ProviderTimeout | None) -> Dict[str, Any]:
+    """Gemini call options for an attempt: no client-side retries, and one overall timeout for its gRPC transport."""
+    options: Dict[str, Any] = {'retry': None}
+    if timeout is not None:
+        options['timeout'] = timeout.total
+    return options
+
+
+def http_request_options(timeout: ProviderTimeout | None) -> Dict[str, Any]:
+    """Per-request options for the OpenAI and Anthropic SDKs carrying the attempt's timeouts."""
+    return {'timeout': timeout.to_httpx()} if timeout is not None else {}
+
+
+def gemini_request(model: str, prompt: str, image_bytes: memoryview | None, mime_type: str | None) -> Any:
+    """Build a Gemini GenerateContentRequest: one user turn with the prompt, then the image if any."""
+    protos = load_sdk('gemini').protos
+    parts = [protos.Part(text=prompt)]
+    if image_bytes is not None:
+        # The Blob proto only accepts bytes, so the view is copied here.
+        parts.append(protos.Part(inline_data=protos.Blob(mime_type=mime_type, data=bytes(image_bytes))))
+    return protos.GenerateContentRequest(
+        model=model if '/' in model else f'models/{model}',
+        contents=[protos.Content(role='user', parts=parts)],
+    )
+
+
+def openai_input(prompt: str, image_bytes: memoryview | None) -> List[Dict[str, Any]]:
+    """Build the OpenAI Responses API input: the prompt, then the base64 image if any."""
+    content: List[Dict[str, Any]] = [{'type': 'input_text', 'text': prompt}]
+    if image_bytes is not None:
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        content.append({'type': 'input_image', 'image': {'base64': base64_image}})
+    return [{'role': 'user', 'content': content}]
+
+
+def anthropic_messages(prompt: str, image_bytes: memoryview | None, mime_type: str | None) -> List[Dict[str, Any]]:
+    """Build Anthropic Messages API input: the prompt, then the base64 image if any."""
+    content: List[Dict[str, Any]] = [{'type': 'text', 'text': prompt}]
+    if image_bytes is not None:
+        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        content.append({
+            'type': 'image',
+            'source': {
+                'type': 'base64',
+                'media_type': mime_type,
+                'data': base64_image,
+            },
+        })
+    return [{'role': 'user', 'content': content}]
+
+
+def generate_with_gemini(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
     """Generate recipe using Google Gemini Vision API.
 
     Args:
-        image_bytes: Raw image data as bytes
+        image_bytes: Prepared (downscaled, re-encoded) image data, or None for a text-only request
         prompt: Recipe generation prompt with user preferences
         model: Gemini model identifier (e.g., 'gemini-2.5-flash')
         api_key: Google AI Studio API key
-        mime_type: Image MIME type
+        mime_type: MIME type of image_bytes, or None without an image
+        timeout: Timeouts for this attempt, or None for the client defaults
 
     Returns:
         Tuple of (response_text, metadata_dict) where metadata contains the model used
@@ -434,11 +2037,12 @@ def generate_with_gemini(*, image_bytes: bytes, prompt: str, model: str, api_key
         ProviderError: If Gemini API fails or returns empty response
     """
     try:
-        genai.configure(api_key=api_key)
-        image = Image.open(io.BytesIO(image_bytes))
-        generative_model = genai.GenerativeModel(model)
-        response = generative_model.generate_content([prompt, image])
-        text = getattr(response, 'text', None)
+        client = get_client_registry().get('gemini', api_key)
+        response = client.generate_content(
+            gemini_request(model, prompt, image_bytes, mime_type),
+            **gemini_request_options(timeout),
+        )
+        text = getattr(load_sdk('gemini').types.GenerateContentResponse.from_response(response), 'text', None)
         if not text:
             raise ProviderError('empty_response', 'AI did not return a response. Please try again.', hint='Try another photo or wait a moment before retrying.')
         return text, {'model': model}
@@ -453,15 +2057,16 @@ def generate_with_gemini(*, image_bytes: bytes, prompt: str, model: str, api_key
         ) from exc
 
 
-def generate_with_openai(*, image_bytes: bytes, prompt: str, model: str, api_key: str, mime_type: str) -> Tuple[str, Dict[str, Any]]:
+def generate_with_openai(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
     """Generate recipe using OpenAI GPT-4o Vision API.
 
     Args:
-        image_bytes: Raw image data as bytes
+        image_bytes: Prepared (downscaled, re-encoded) image data, or None for a text-only request
         prompt: Recipe generation prompt with user preferences
         model: OpenAI model identifier (e.g., 'gpt-4o-mini')
         api_key: OpenAI API key (starts with 'sk-' or 'sk-proj-')
-        mime_type: Image MIME type for base64 encoding
+        mime_type: Image MIME type for base64 encoding, or None without an image
+        timeout: Timeouts for this attempt, or None for the client defaults
 
     Returns:
         Tuple of (response_text, metadata_dict) where metadata contains the model used
@@ -470,20 +2075,12 @@ def generate_with_openai(*, image_bytes: bytes, prompt: str, model: str, api_key
         ProviderError: If OpenAI API fails or model is unavailable
     """
     try:
-        client = OpenAI(api_key=api_key)
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        client = get_client_registry().get('openai', api_key)
         response = client.responses.create(
             model=model,
-            input=[
-                {
-                    'role': 'user',
-                    'content': [
-                        {'type': 'input_text', 'text': prompt},
-                        {'type': 'input_image', 'image': {'base64': base64_image}},
-                    ],
-                }
-            ],
+            input=openai_input(prompt, image_bytes),
             max_output_tokens=1024,
+            **http_request_options(timeout),
         )
         text = getattr(response, 'output_text', None) or extract_openai_text(response)
         if not text:
@@ -500,15 +2097,16 @@ def generate_with_openai(*, image_bytes: bytes, prompt: str, model: str, api_key
         ) from exc
 
 
-def generate_with_anthropic(*, image_bytes: bytes, prompt: str, model: str, api_key: str, mime_type: str) -> Tuple[str, Dict[str, Any]]:
+def generate_with_anthropic(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
     """Generate recipe using Anthropic Claude Vision API.
 
     Args:
-        image_bytes: Raw image data as bytes
+        image_bytes: Prepared (downscaled, re-encoded) image data, or None for a text-only request
         prompt: Recipe generation prompt with user preferences
         model: Claude model identifier (e.g., 'claude-3-sonnet-20240229')
         api_key: Anthropic API key (starts with 'sk-ant-')
-        mime_type: Image MIME type for base64 source
+        mime_type: Image MIME type for base64 source, or None without an image
+        timeout: Timeouts for this attempt, or None for the client defaults
 
     Returns:
         Tuple of (response_text, metadata_dict) where metadata contains the model used
@@ -517,27 +2115,85 @@ def generate_with_anthropic(*, image_bytes: bytes, prompt: str, model: str, api_
         ProviderError: If Claude API fails or access is denied
     """
     try:
-        client = Anthropic(api_key=api_key)
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
+        client = get_client_registry().get('anthropic', api_key)
         response = client.messages.create(
             model=model,
             max_output_tokens=1024,
-            messages=[
-                {
-                    'role': 'user',
-                    'content': [
-                        {'type': 'text', 'text': prompt},
-                        {
-                            'type': 'image',
-                            'source': {
-                                'type': 'base64',
-                                'media_type': mime_type,
-                                'data': base64_image,
-                            },
-                        },
-                    ],
-                }
-            ],
+            messages=anthropic_messages(prompt, image_bytes, mime_type),
+            **http_request_options(timeout),
+        )
+        text = extract_anthropic_text(response)
+        if not text:
+            raise ProviderError('empty_response', 'AI did not return a response. Please try again.', hint='Try switching to another Claude model or re-upload the image.')
+        return text, {'model': model}
+    except ProviderError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='anthropic_error',
+            message='Anthropic could not process the image.',
+            hint='Verify your Claude API key and model access.',
+            debug=str(exc),
+        ) from exc
+
+
+async def generate_with_gemini_async(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
+    """Asyncio variant of generate_with_gemini for the ASGI app; same arguments, result and errors."""
+    try:
+        client = get_async_client_registry().get('gemini', api_key)
+        response = await client.generate_content(
+            gemini_request(model, prompt, image_bytes, mime_type),
+            **gemini_request_options(timeout),
+        )
+        text = getattr(load_sdk('gemini').types.GenerateContentResponse.from_response(response), 'text', None)
+        if not text:
+            raise ProviderError('empty_response', 'AI did not return a response. Please try again.', hint='Try another photo or wait a moment before retrying.')
+        return text, {'model': model}
+    except ProviderError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='gemini_error',
+            message='Gemini could not process the image.',
+            hint='Verify the API key and quota in Google AI Studio.',
+            debug=str(exc),
+        ) from exc
+
+
+async def generate_with_openai_async(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
+    """Asyncio variant of generate_with_openai for the ASGI app; same arguments, result and errors."""
+    try:
+        client = get_async_client_registry().get('openai', api_key)
+        response = await client.responses.create(
+            model=model,
+            input=openai_input(prompt, image_bytes),
+            max_output_tokens=1024,
+            **http_request_options(timeout),
+        )
+        text = getattr(response, 'output_text', None) or extract_openai_text(response)
+        if not text:
+            raise ProviderError('empty_response', 'AI did not return a response. Please try again.', hint='Try another image or retry with a different model.')
+        return text, {'model': model}
+    except ProviderError:
+        raise
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='openai_error',
+            message='OpenAI could not process the image.',
+            hint='Check the model availability and your API key permissions.',
+            debug=str(exc),
+        ) from exc
+
+
+async def generate_with_anthropic_async(*, image_bytes: memoryview | None, prompt: str, model: str, api_key: str, mime_type: str | None, timeout: ProviderTimeout | None = None) -> Tuple[str, Dict[str, Any]]:
+    """Asyncio variant of generate_with_anthropic for the ASGI app; same arguments, result and errors."""
+    try:
+        client = get_async_client_registry().get('anthropic', api_key)
+        response = await client.messages.create(
+            model=model,
+            max_output_tokens=1024,
+            messages=anthropic_messages(prompt, image_bytes, mime_type),
+            **http_request_options(timeout),
         )
         text = extract_anthropic_text(response)
         if not text:
@@ -554,6 +2210,121 @@ def generate_with_anthropic(*, image_bytes: bytes, prompt: str, model: str, api_
         ) from exc
 
 
+def stream_with_gemini(*, image_bytes: memoryview, prompt: str, model: str, api_key: str, mime_type: str, timeout: ProviderTimeout | None = None) -> Iterator[str]:
+    """Stream recipe text from Google Gemini as it is generated.
+
+    Args:
+        image_bytes: Prepared (downscaled, re-encoded) image data
+        prompt: Recipe generation prompt with user preferences
+        model: Gemini model identifier (e.g., 'gemini-2.5-flash')
+        api_key: Google AI Studio API key
+        mime_type: MIME type of image_bytes
+        timeout: Timeouts for this attempt, or None for the client defaults
+
+    Yields:
+        Text chunks in generation order
+
+    Raises:
+        ProviderError: If the Gemini API fails mid-stream
+    """
+    try:
+        client = get_client_registry().get('gemini', api_key)
+        chunks = client.stream_generate_content(
+            gemini_request(model, prompt, image_bytes, mime_type),
+            **gemini_request_options(timeout),
+        )
+        for chunk in load_sdk('gemini').types.GenerateContentResponse.from_iterator(chunks):
+            text = getattr(chunk, 'text', None)
+            if text:
+                yield text
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='gemini_error',
+            message='Gemini could not process the image.',
+            hint='Verify the API key and quota in Google AI Studio.',
+            debug=str(exc),
+        ) from exc
+
+
+def stream_with_openai(*, image_bytes: memoryview, prompt: str, model: str, api_key: str, mime_type: str, timeout: ProviderTimeout | None = None) -> Iterator[str]:
+    """Stream recipe text from OpenAI as it is generated.
+
+    Args:
+        image_bytes: Prepared (downscaled, re-encoded) image data
+        prompt: Recipe generation prompt with user preferences
+        model: OpenAI model identifier (e.g., 'gpt-4o-mini')
+        api_key: OpenAI API key (starts with 'sk-' or 'sk-proj-')
+        mime_type: Image MIME type for base64 encoding
+        timeout: Timeouts for this attempt, or None for the client defaults
+
+    Yields:
+        Text chunks in generation order
+
+    Raises:
+        ProviderError: If the OpenAI API fails mid-stream
+    """
+    try:
+        client = get_client_registry().get('openai', api_key)
+        events = client.responses.create(
+            model=model,
+            input=openai_input(prompt, image_bytes),
+            max_output_tokens=1024,
+            stream=True,
+            **http_request_options(timeout),
+        )
+        for event in events:
+            if getattr(event, 'type', None) == 'response.output_text.delta' and event.delta:
+                yield event.delta
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='openai_error',
+            message='OpenAI could not process the image.',
+            hint='Check the model availability and your API key permissions.',
+            debug=str(exc),
+        ) from exc
+
+
+def stream_with_anthropic(*, image_bytes: memoryview, prompt: str, model: str, api_key: str, mime_type: str, timeout: ProviderTimeout | None = None) -> Iterator[str]:
+    """Stream recipe text from Anthropic Claude as it is generated.
+
+    Args:
+        image_bytes: Prepared (downscaled, re-encoded) image data
+        prompt: Recipe generation prompt with user preferences
+        model: Claude model identifier (e.g., 'claude-3-sonnet-20240229')
+        api_key: Anthropic API key (starts with 'sk-ant-')
+        mime_type: Image MIME type for base64 source
+        timeout: Timeouts for this attempt, or None for the client defaults
+
+    Yields:
+        Text chunks in generation order
+
+    Raises:
+        ProviderError: If the Claude API fails mid-stream
+    """
+    try:
+        client = get_client_registry().get('anthropic', api_key)
+        events = client.messages.create(
+            model=model,
+            max_output_tokens=1024,
+            messages=anthropic_messages(prompt, image_bytes, mime_type),
+            stream=True,
+            **http_request_options(timeout),
+        )
+        for event in events:
+            if getattr(event, 'type', None) != 'content_block_delta':
+                continue
+            text = getattr(event.delta, 'text', None)
+            if text:
+                yield text
+    except Exception as exc:  # noqa: BLE001
+        raise ProviderError(
+            code='anthropic_error',
+            message='Anthropic could not process the image.',
+            hint='Verify your Claude API key and model access.',
+            debug=str(exc),
+        ) from exc
+
+
 def extract_openai_text(response: Any) -> str:
     """Extract text content from OpenAI API response object.
 
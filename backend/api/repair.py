@@ -0,0 +1,109 @@
+"""Validation of provider recipe JSON and text-only repair of bad fields."""
+
+import json
+from typing import Any, Callable, Dict, List, Tuple
+
+NUTRITION_KEYS = ('calories', 'protein', 'fat', 'carbs')
+
+
+def _is_text(value: Any) -> bool:
+    return isinstance(value, str) and value.strip() not in {'', 'N/A'}
+
+
+def _is_amount(value: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    return _is_text(value) or (isinstance(value, (int, float)) and value > 0)
+
+
+def _is_text_list(value: Any) -> bool:
+    return isinstance(value, list) and bool(value) and all(_is_text(item) for item in value)
+
+
+def _is_nutrition(value: Any) -> bool:
+    return isinstance(value, dict) and all(_is_amount(value.get(key)) for key in NUTRITION_KEYS)
+
+
+# Provider-side recipe keys: (validator, required, example shown to the model).
+RECIPE_SCHEMA: Dict[str, Tuple[Callable[[Any], bool], bool, Any]] = {
+    'name': (_is_text, True, 'Dish name'),
+    'prep_time': (_is_amount, True, 'X min'),
+    'cook_time': (_is_amount, True, 'X min'),
+    'servings': (_is_amount, True, 'X'),
+    'ingredients_with_measurements': (_is_text_list, True, ['ingredient 1 with amount', 'ingredient 2 with amount']),
+    'instructions': (_is_text_list, True, ['Step 1 detailed description', 'Step 2 detailed description']),
+    'nutrition': (_is_nutrition, True, {key: 'X kcal' if key == 'calories' else 'Xg' for key in NUTRITION_KEYS}),
+    'tips': (_is_text, False, 'Helpful serving suggestions and variations'),
+}
+
+
+def invalid_fields(recipe_json: Dict[str, Any]) -> List[str]:
+    """List the recipe keys that are missing or malformed.
+
+    Optional keys are only reported when present with a malformed value.
+
+    Args:
+        recipe_json: Recipe object decoded from provider output
+
+    Returns:
+        Invalid keys in schema order
+    """
+    invalid = []
+    for key, (validator, required, _) in RECIPE_SCHEMA.items():
+        if key not in recipe_json:
+            if required:
+                invalid.append(key)
+        elif not validator(recipe_json[key]):
+            invalid.append(key)
+    return invalid
+
+
+def build_repair_prompt(recipe_json: Dict[str, Any], fields: List[str], language: str) -> str:
+    """Build a text-only prompt asking for just the given fields.
+
+    The valid part of the recipe is included as context so the model can
+    complete it without seeing the image again.
+
+    Args:
+        recipe_json: Recipe object with some invalid fields
+        fields: Keys to ask for
+        language: ISO language code for the recipe
+
+    Returns:
+        Prompt string
+    """
+    context = {key: value for key, value in recipe_json.items() if key in RECIPE_SCHEMA and key not in fields}
+    template = {key: RECIPE_SCHEMA[key][2] for key in fields}
+    return f"""This recipe is incomplete:
+{json.dumps(context, ensure_ascii=False)}
+
+Language: {language}
+
+Return ONLY a valid JSON object with these keys, consistent with the recipe above:
+{json.dumps(template, indent=2)}
+
+Do not include markdown fences or commentary."""
+
+
+def merge_repair(
+    recipe_json: Dict[str, Any],
+    repair_json: Dict[str, Any] | None,
+    fields: List[str],
+) -> Tuple[Dict[str, Any], List[str]]:
+    """Copy the requested fields that came back valid into the recipe.
+
+    Args:
+        recipe_json: Recipe object with invalid fields
+        repair_json: Object decoded from the repair response, if any
+        fields: Keys that were asked for
+
+    Returns:
+        Tuple of (merged recipe, keys that were repaired)
+    """
+    merged = dict(recipe_json)
+    repaired = []
+    for key in fields:
+        if repair_json is not None and key in repair_json and RECIPE_SCHEMA[key][0](repair_json[key]):
+            merged[key] = repair_json[key]
+            repaired.append(key)
+    return merged, repaired
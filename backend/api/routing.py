@@ -0,0 +1,319 @@
+"""Latency-aware provider routing with per-backend circuit breakers."""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Tuple
+
+from flask import jsonify
+
+from config import Config
+from . import api_bp
+from .admission import get_provider_limiter, get_request_limiter
+from .latency import LatencyTracker, get_latency_tracker
+from .operator import operator_only
+
+Backend = Tuple[str, str]
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# HTTP statuses that mean the provider itself is struggling; other 4xx
+# responses (bad key, bad request) are the caller's fault and must not trip
+# a breaker shared by every user of that backend.
+PROVIDER_FAULT_STATUSES = {408, 409, 429}
+
+
+def is_provider_fault(error: BaseException) -> bool:
+    """Decide whether a failed call should count against the backend's health.
+
+    Walks the exception's cause chain looking for an HTTP status from the
+    provider SDK (status_code on OpenAI/Anthropic errors, an integer code on
+    Google API errors). Client errors other than timeouts and rate limits are
+    not held against the backend; anything without a status (timeouts,
+    connection failures, empty responses) is.
+    """
+    current: BaseException | None = error
+    while current is not None:
+        status = getattr(current, 'status_code', None)
+        if not isinstance(status, int):
+            status = getattr(current, 'code', None)
+        if isinstance(status, int) and 400 <= status < 500:
+            return status in PROVIDER_FAULT_STATUSES
+        if isinstance(status, int) and status >= 500:
+            return True
+        current = current.__cause__
+    return True
+
+
+class CircuitBreaker:
+    """Rolling-window circuit breaker for one provider backend.
+
+    The breaker opens once at least min_calls outcomes are in the window and
+    the share of failures reaches failure_rate. Calls slower than
+    slow_call_seconds count as failures even when they succeed, so a backend
+    that has degraded into timeouts trips as well. After open_seconds the
+    breaker lets a single trial call through (half-open): success closes it
+    with a fresh window, failure re-opens it.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_size: int,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        open_seconds: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """Create a closed breaker.
+
+        Args:
+            window_size: Number of recent outcomes considered
+            min_calls: Outcomes required before the breaker may open
+            failure_rate: Share of failed outcomes (0-1) that opens the breaker
+            slow_call_seconds: Latency above which a success counts as a failure
+            open_seconds: How long the breaker stays open before a trial call
+            clock: Monotonic time source, replaceable in tests
+        """
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=window_size)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cooldown ends."""
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def available(self) -> bool:
+        """Return whether a call could be admitted right now, without admitting it."""
+        with self._lock:
+            state = self._current_state()
+            return state == CLOSED or (state == HALF_OPEN and not self._trial_in_flight)
+
+    def allow(self) -> bool:
+        """Admit a call; in half-open state only one trial call is admitted."""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Hand back an admitted call that ended without a recorded outcome.
+
+        Callers release every call allow() admitted once it is over. In
+        half-open state this frees the trial slot when the trial never reached
+        record(): it was shed before reaching the provider, ran out of
+        deadline, was rejected for the caller's own fault or abandoned by a
+        disconnected client. After record() it does nothing.
+        """
+        with self._lock:
+            if self._current_state() == HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record(self, ok: bool, seconds: float | None = None) -> None:
+        """Record the outcome of a call.
+
+        Args:
+            ok: Whether the call succeeded
+            seconds: Call latency, used to classify slow successes
+        """
+        failed = not ok or (seconds is not None and seconds > self.slow_call_seconds)
+        with self._lock:
+            state = self._current_state()
+            if state == HALF_OPEN:
+                self._trial_in_flight = False
+                if failed:
+                    self._trip()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(not failed)
+            if state == CLOSED and len(self._outcomes) >= self.min_calls:
+                failures = sum(1 for outcome in self._outcomes if not outcome)
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._trip()
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._outcomes.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return state, window counts and remaining cooldown."""
+        with self._lock:
+            state = self._current_state()
+            failures = sum(1 for outcome in self._outcomes if not outcome)
+            retry_in = max(self.open_seconds - (self._clock() - self._opened_at), 0.0) if state == OPEN else 0.0
+            return {
+                'state': state,
+                'calls': len(self._outcomes),
+                'failures': failures,
+                'error_rate': round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+                'retry_in_seconds': round(retry_in, 1),
+            }
+
+
+def parse_chain(spec: str) -> List[Tuple[str, str | None]]:
+    """Parse a fallback chain such as 'gemini:gemini-2.5-flash,openai,anthropic'.
+
+    Returns:
+        List of (provider, model) pairs; model is None when omitted
+    """
+    chain: List[Tuple[str, str | None]] = []
+    for item in spec.split(','):
+        provider, _, model = item.strip().partition(':')
+        if provider:
+            chain.append((provider.strip().lower(), model.strip() or None))
+    return chain
+
+
+class ProviderRouter:
+    """Orders provider backends by health and recent latency."""
+
+    def __init__(
+        self,
+        tracker: LatencyTracker,
+        breaker_factory: Callable[[], CircuitBreaker],
+        *,
+        min_samples: int,
+    ):
+        """Create a router with no breakers yet.
+
+        Args:
+            tracker: Latency windows fed by every provider call
+            breaker_factory: Builds the breaker for a newly seen backend
+            min_samples: Latency samples needed before a backend's speed is trusted
+        """
+        self.tracker = tracker
+        self.breaker_factory = breaker_factory
+        self.min_samples = min_samples
+        self._breakers: Dict[Backend, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, provider: str, model: str) -> CircuitBreaker:
+        """Return the breaker for a backend, creating it on first use."""
+        key = (provider, model)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self.breaker_factory()
+                    self._breakers[key] = breaker
+        return breaker
+
+    def expected_latency(self, provider: str, model: str) -> float | None:
+        """Return the backend's median latency, or None until enough samples exist."""
+        window = self.tracker.window(provider, model)
+        if len(window) < self.min_samples:
+            return None
+        return window.percentile(50)
+
+    def rank(self, backends: List[Backend]) -> List[Backend]:
+        """Order backends fastest-healthy first.
+
+        Backends whose breaker is open sort last. Among the rest, backends
+        with a known median latency come first, fastest first; backends
+        without enough samples keep their configured order after them.
+        """
+        def sort_key(indexed: Tuple[int, Backend]):
+            index, (provider, model) = indexed
+            latency = self.expected_latency(provider, model)
+            return (
+                not self.breaker(provider, model).available(),
+                latency is None,
+                latency or 0.0,
+                index,
+            )
+
+        return [backend for _, backend in sorted(enumerate(backends), key=sort_key)]
+
+    def record(self, provider: str, model: str, *, ok: bool, seconds: float | None = None) -> None:
+        """Feed a call outcome to the backend's breaker."""
+        self.breaker(provider, model).record(ok, seconds)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Return breaker state and latency figures for every backend seen so far."""
+        with self._lock:
+            backends = sorted(self._breakers)
+        status = []
+        for provider, model in backends:
+            window = self.tracker.window(provider, model)
+            status.append({
+                'provider': provider,
+                'model': model,
+                **self.breaker(provider, model).snapshot(),
+                'samples': len(window),
+                'p50_ms': _to_ms(window.percentile(50)),
+                'p95_ms': _to_ms(window.percentile(95)),
+            })
+        return status
+
+
+def _to_ms(seconds: float | None) -> float | None:
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+_router: ProviderRouter | None = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router() -> ProviderRouter:
+    """Return the process-wide provider router."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ProviderRouter(
+                    get_latency_tracker(),
+                    lambda: CircuitBreaker(
+                        window_size=Config.BREAKER_WINDOW_SIZE,
+                        min_calls=Config.BREAKER_MIN_CALLS,
+                        failure_rate=Config.BREAKER_FAILURE_RATE,
+                        slow_call_seconds=Config.BREAKER_SLOW_CALL_SECONDS,
+                        open_seconds=Config.BREAKER_OPEN_SECONDS,
+                    ),
+                    min_samples=Config.ROUTER_MIN_SAMPLES,
+                )
+    return _router
+
+
+@api_bp.route('/providers/status', methods=['GET'])
+@operator_only
+def provider_status():
+    """Report circuit breaker state and latency for each provider backend, and admission load (operators only)."""
+    request_limiter = get_request_limiter()
+    return jsonify({
+        'routing_enabled': Config.ROUTER_ENABLED,
+        'fallback_chain': [
+            {'provider': provider, 'model': model or Config.get_default_model_for(provider)}
+            for provider, model in parse_chain(Config.PROVIDER_FALLBACK_CHAIN)
+        ],
+        'backends': get_provider_router().snapshot(),
+        'admission': {
+            'providers': get_provider_limiter().snapshot(),
+            'requests': None if request_limiter is None else request_limiter.snapshot().get('requests'),
+        },
+    })
@@ -0,0 +1,230 @@
+"""Perceptual hashing and near-duplicate lookup for uploaded photos."""
+
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Tuple
+
+from PIL import Image
+
+from config import Config
+
+HASH_BITS = 64
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Compute the difference hash of an image.
+
+    The image is reduced to a (hash_size + 1) x hash_size grayscale grid and
+    each bit records whether a pixel is brighter than its right neighbour.
+    Re-encoding, resizing and small framing changes flip only a few bits.
+
+    Args:
+        image: Decoded PIL image
+        hash_size: Grid height; the hash has hash_size ** 2 bits
+
+    Returns:
+        Hash packed into an unsigned integer
+    """
+    grid = image.convert('L').resize(
+        (hash_size + 1, hash_size),
+        Image.Resampling.BILINEAR,
+        reducing_gap=2.0,
+    )
+    pixels = list(grid.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Return the number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+def _choose_chunk_count(max_distance: int, expected_size: int) -> int:
+    """Pick the number of hash substrings that minimises estimated lookup cost.
+
+    With m substrings, any hash within max_distance of the query matches at
+    least one substring within max_distance // m bits (pigeonhole). Cost is
+    the number of bucket probes plus the expected candidates to verify.
+    """
+    best_chunks, best_cost = 1, float('inf')
+    for chunks in range(1, min(max_distance + 1, 8) + 1):
+        bits = HASH_BITS // chunks
+        radius = max_distance // chunks
+        probes = sum(_comb(bits, k) for k in range(radius + 1))
+        cost = chunks * probes * (1 + expected_size / float(2 ** bits))
+        if cost < best_cost:
+            best_chunks, best_cost = chunks, cost
+    return best_chunks
+
+
+def _comb(n: int, k: int) -> int:
+    result = 1
+    for i in range(k):
+        result = result * (n - i) // (i + 1)
+    return result
+
+
+class HammingIndex:
+    """Multi-index hashing structure for radius queries over 64-bit hashes.
+
+    Each hash is split into substrings that are indexed in their own tables.
+    A query probes every substring table with all values within the
+    per-substring radius and verifies the candidates with a popcount, which
+    keeps lookups sub-millisecond at millions of entries. Entries are
+    evicted oldest-first once max_entries is reached.
+    """
+
+    def __init__(self, *, max_distance: int, max_entries: int):
+        """Create an empty index.
+
+        Args:
+            max_distance: Largest hamming distance a query may ask for
+            max_entries: Maximum number of stored hashes before eviction
+        """
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.chunk_count = _choose_chunk_count(max_distance, max_entries)
+        self._spans = self._chunk_spans(self.chunk_count)
+        self._radius = max_distance // self.chunk_count
+        self._probes = [self._probe_masks(width, self._radius) for _, width in self._spans]
+        self._tables: List[Dict[int, List[int]]] = [{} for _ in self._spans]
+        self._entries: "OrderedDict[int, Tuple[int, Hashable, Any]]" = OrderedDict()
+        self._ids: Dict[Tuple[Hashable, Any], int] = {}
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _chunk_spans(chunks: int) -> List[Tuple[int, int]]:
+        base, extra = divmod(HASH_BITS, chunks)
+        spans, shift = [], 0
+        for index in range(chunks):
+            width = base + (1 if index < extra else 0)
+            spans.append((shift, width))
+            shift += width
+        return spans
+
+    @staticmethod
+    def _probe_masks(width: int, radius: int) -> List[int]:
+        masks = [0]
+        for flips in range(1, radius + 1):
+            for bits in itertools.combinations(range(width), flips):
+                mask = 0
+                for bit in bits:
+                    mask |= 1 << bit
+                masks.append(mask)
+        return masks
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, value: int, group: Hashable, payload: Any) -> None:
+        """Insert a hash, replacing any entry with the same group and payload.
+
+        Args:
+            value: 64-bit perceptual hash
+            group: Partition key; queries only match entries of the same group
+            payload: Hashable data returned by matching queries
+        """
+        with self._lock:
+            self.discard(group, payload)
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (value, group, payload)
+            self._ids[(group, payload)] = entry_id
+            for table, (shift, width) in zip(self._tables, self._spans):
+                chunk = (value >> shift) & ((1 << width) - 1)
+                table.setdefault(chunk, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict(next(iter(self._entries)))
+
+    def discard(self, group: Hashable, payload: Any) -> None:
+        """Drop the entry stored for group and payload, if any."""
+        with self._lock:
+            entry_id = self._ids.get((group, payload))
+            if entry_id is not None:
+                self._evict(entry_id)
+
+    def _evict(self, entry_id: int) -> None:
+        value, group, payload = self._entries.pop(entry_id)
+        del self._ids[(group, payload)]
+        for table, (shift, width) in zip(self._tables, self._spans):
+            chunk = (value >> shift) & ((1 << width) - 1)
+            bucket = table.get(chunk)
+            if bucket is None:
+                continue
+            bucket.remove(entry_id)
+            if not bucket:
+                del table[chunk]
+
+    def nearest(self, value: int, group: Hashable, max_distance: int | None = None) -> Tuple[Any, int] | None:
+        """Find the closest stored hash within max_distance.
+
+        Args:
+            value: Query hash
+            group: Only entries added with this group are considered
+            max_distance: Search radius; defaults to and may not exceed the index radius
+
+        Returns:
+            Tuple of (payload, distance) for the best match, or None
+        """
+        radius = self.max_distance if max_distance is None else min(max_distance, self.max_distance)
+        best: Tuple[Any, int] | None = None
+        seen = set()
+        with self._lock:
+            for table, probes, (shift, width) in zip(self._tables, self._probes, self._spans):
+                chunk = (value >> shift) & ((1 << width) - 1)
+                for mask in probes:
+                    bucket = table.get(chunk ^ mask)
+                    if not bucket:
+                        continue
+                    for entry_id in bucket:
+                        if entry_id in seen:
+                            continue
+                        seen.add(entry_id)
+                        stored, entry_group, payload = self._entries[entry_id]
+                        distance = (stored ^ value).bit_count()
+                        if distance <= radius and entry_group == group and (best is None or distance < best[1]):
+                            best = (payload, distance)
+                            if distance == 0:
+                                return best
+        return best
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+            self._ids.clear()
+            for table in self._tables:
+                table.clear()
+
+
+_similarity_index: HammingIndex | None = None
+_similarity_index_lock = threading.Lock()
+
+
+def get_similarity_index() -> HammingIndex | None:
+    """Return the process-wide near-duplicate index, or None when disabled."""
+    global _similarity_index
+    if not Config.NEAR_DUPLICATE_ENABLED:
+        return None
+    if _similarity_index is None:
+        with _similarity_index_lock:
+            if _similarity_index is None:
+                _similarity_index = HammingIndex(
+                    max_distance=Config.NEAR_DUPLICATE_MAX_DISTANCE,
+                    max_entries=Config.NEAR_DUPLICATE_MAX_ENTRIES,
+                )
+    return _similarity_index
+
+
+def reset_similarity_index() -> None:
+    """Drop the process-wide index so the next call rebuilds it from config."""
+    global _similarity_index
+    with _similarity_index_lock:
+        _similarity_index = None
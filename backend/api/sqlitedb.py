@@ -0,0 +1,42 @@
+"""SQLite databases shared by the worker processes of one host."""
+
+import os
+import sqlite3
+import threading
+from typing import Iterable
+
+
+class SQLiteDatabase:
+    """A SQLite database file with one connection per thread.
+
+    Connections are in autocommit mode, so stores open their own
+    transactions (BEGIN IMMEDIATE) where a read and write must be atomic,
+    and use WAL journaling so readers in other processes do not block the
+    writer.
+    """
+
+    def __init__(self, path: str, schema: Iterable[str] = ()):
+        """Open (or create) the database at path.
+
+        Args:
+            path: Filesystem path of the database; missing directories are created
+            schema: CREATE ... IF NOT EXISTS statements run once on open
+        """
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connect()
+        for statement in schema:
+            conn.execute(statement)
+
+    def connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,139 @@
+"""Incremental recipe JSON parsing and Server-Sent Events helpers."""
+
+import json
+from typing import Any, Dict, List, Tuple
+
+# Top-level array keys whose string items are emitted as soon as they close.
+STREAMED_ARRAYS = {
+    'ingredients_with_measurements': 'ingredient',
+    'instructions': 'step',
+}
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+class RecipeStreamParser:
+    """Character-level JSON scanner that reports recipe fields as they complete.
+
+    The parser tracks just enough structure (object/array nesting, whether the
+    next string is a key, and the enclosing top-level key) to recognise the
+    recipe name and the items of the ingredient and instruction arrays while
+    the model is still generating. Anything before the first '{' (prose or a
+    markdown fence) is skipped, and input after the root object closes is
+    ignored. The authoritative result is still produced by parse_recipe on the
+    full text once the stream ends.
+    """
+
+    def __init__(self):
+        self._stack: List[Dict[str, Any]] = []
+        self._started = False
+        self._done = False
+        self._in_string = False
+        self._escaped = False
+        self._string_chars: List[str] = []
+        self._string_is_key = False
+
+    def feed(self, text: str) -> List[Event]:
+        """Consume the next chunk of model output.
+
+        Args:
+            text: Newly received text
+
+        Returns:
+            List of (event_name, data) tuples for fields completed by this chunk
+        """
+        events: List[Event] = []
+        for char in text:
+            if self._done:
+                break
+            if self._in_string:
+                self._consume_string_char(char, events)
+            elif not self._started:
+                if char == '{':
+                    self._started = True
+                    self._stack.append({'type': 'object', 'key': None, 'expect_key': True, 'parent_key': None})
+            else:
+                self._consume_structural_char(char)
+        return events
+
+    def _consume_string_char(self, char: str, events: List[Event]) -> None:
+        if self._escaped:
+            self._string_chars.append(char)
+            self._escaped = False
+        elif char == '\\':
+            self._string_chars.append(char)
+            self._escaped = True
+        elif char == '"':
+            self._in_string = False
+            try:
+                value = json.loads('"' + ''.join(self._string_chars) + '"')
+            except ValueError:
+                value = ''.join(self._string_chars)
+            self._string_chars = []
+            self._on_string(value, events)
+        else:
+            self._string_chars.append(char)
+
+    def _consume_structural_char(self, char: str) -> None:
+        top = self._stack[-1]
+        if char == '"':
+            self._in_string = True
+            self._string_is_key = top['type'] == 'object' and top['expect_key']
+        elif char in '{[':
+            parent_key = top['key'] if top['type'] == 'object' else None
+            if char == '{':
+                self._stack.append({'type': 'object', 'key': None, 'expect_key': True, 'parent_key': parent_key})
+            else:
+                self._stack.append({'type': 'array', 'count': 0, 'parent_key': parent_key})
+        elif char in '}]':
+            self._stack.pop()
+            if not self._stack:
+                self._done = True
+        elif char == ':' and top['type'] == 'object':
+            top['expect_key'] = False
+        elif char == ',' and top['type'] == 'object':
+            top['expect_key'] = True
+            top['key'] = None
+
+    def _on_string(self, value: str, events: List[Event]) -> None:
+        top = self._stack[-1]
+        if self._string_is_key:
+            top['key'] = value
+            return
+        depth = len(self._stack)
+        if depth == 1 and top['key'] == 'name':
+            events.append(('name', {'name': value}))
+        elif depth == 2 and top['type'] == 'array' and top['parent_key'] in STREAMED_ARRAYS:
+            events.append((STREAMED_ARRAYS[top['parent_key']], {'index': top['count'], 'text': value}))
+            top['count'] += 1
+
+
+def recipe_events(recipe: Dict[str, Any]) -> List[Event]:
+    """Produce the incremental events for an already complete recipe.
+
+    Used when a recipe is served from cache so streaming clients receive the
+    same event sequence they would see during live generation.
+
+    Args:
+        recipe: Recipe in Dishcovery's standard schema
+
+    Returns:
+        List of (event_name, data) tuples
+    """
+    events: List[Event] = [('name', {'name': recipe.get('title', '')})]
+    events.extend(('ingredient', {'index': index, 'text': text}) for index, text in enumerate(recipe.get('ingredients', [])))
+    events.extend(('step', {'index': index, 'text': text}) for index, text in enumerate(recipe.get('steps', [])))
+    return events
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format one Server-Sent Events message.
+
+    Args:
+        event: Event name
+        data: JSON-serializable payload
+
+    Returns:
+        Wire-format SSE message terminated by a blank line
+    """
+    return f'event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n'
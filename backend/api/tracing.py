@@ -0,0 +1,398 @@
+"""Per-request traces: request ids, timed spans, Server-Timing and span export."""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List
+
+from flask import g, request
+
+from config import Config
+from . import api_bp
+from .metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+_TRACEPARENT_PATTERN = re.compile(r'^[0-9a-f]{2}-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+# Spans reported in the Server-Timing header, in this order; others are export-only.
+SERVER_TIMING_SPANS = ('read_upload', 'decode', 'prepare_image', 'build_prompt', 'provider', 'backoff', 'parse', 'repair', 'serialize')
+
+
+@dataclass
+class Span:
+    """One timed phase of a request."""
+
+    name: str
+    span_id: str
+    start: float  # unix seconds
+    duration: float  # seconds
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """Spans recorded while serving one request.
+
+    Spans may be added from worker threads (hedged calls, batch items) that
+    run with a copy of the request's context.
+    """
+
+    def __init__(self, name: str, *, trace_id: str | None = None, parent_span_id: str | None = None, request_id: str | None = None):
+        """Start a trace.
+
+        Args:
+            name: Root span name, usually the route's endpoint
+            trace_id: Trace id inherited from an incoming traceparent header
+            parent_span_id: Caller's span id from the traceparent header
+            request_id: Request id supplied by the client; defaults to the trace id
+        """
+        self.name = name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent_span_id
+        self.request_id = request_id or self.trace_id
+        self.start = time.time()
+        self.duration: float | None = None
+        self._started = time.perf_counter()
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, **attributes: Any) -> None:
+        """Record a span that just finished after running for seconds."""
+        span = Span(name, uuid.uuid4().hex[:16], time.time() - seconds, seconds, attributes)
+        with self._lock:
+            self._spans.append(span)
+
+    @property
+    def spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def elapsed(self) -> float:
+        """Seconds since the trace started, or its total duration once finished."""
+        if self.duration is not None:
+            return self.duration
+        return time.perf_counter() - self._started
+
+    def finish(self) -> None:
+        """Fix the trace's duration at the end of the request."""
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._started
+
+    def server_timing(self) -> str:
+        """Format the Server-Timing header: total milliseconds per phase, then the whole request."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            if span.name in SERVER_TIMING_SPANS:
+                totals[span.name] = totals.get(span.name, 0.0) + span.duration
+        entries = [f'{name};dur={totals[name] * 1000:.1f}' for name in SERVER_TIMING_SPANS if name in totals]
+        entries.append(f'total;dur={self.elapsed() * 1000:.1f}')
+        return ', '.join(entries)
+
+
+_current_trace: contextvars.ContextVar[Trace | None] = contextvars.ContextVar('dishcovery_trace', default=None)
+
+
+def current_trace() -> Trace | None:
+    """Return the trace of the request being served, if any."""
+    return _current_trace.get()
+
+
+def current_request_id() -> str | None:
+    """Return the id of the request being served, if any."""
+    trace = _current_trace.get()
+    return None if trace is None else trace.request_id
+
+
+def record_span(name: str, seconds: float, **attributes: Any) -> None:
+    """Add a finished span to the current trace; a no-op outside requests."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, seconds, **attributes)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage into the stage histogram and the current trace."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        get_metrics().observe('dishcovery_stage_seconds', seconds, stage=name)
+        record_span(name, seconds)
+
+
+def with_request_id(debug: str | None) -> str | None:
+    """Prefix debug text with the current request id so errors can be matched to logs."""
+    request_id = current_request_id()
+    if request_id is None:
+        return debug
+    return f'request_id={request_id}' if not debug else f'request_id={request_id}: {debug}'
+
+
+class JsonlSpanExporter:
+    """Appends one JSON object per span to a local file."""
+
+    def __init__(self, path: str):
+        """Write spans to path, creating its directory if needed."""
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, trace: Trace, attributes: Dict[str, Any]) -> None:
+        """Write the root span and its children."""
+        root = {
+            'trace_id': trace.trace_id,
+            'span_id': trace.span_id,
+            'parent_span_id': trace.parent_span_id,
+            'request_id': trace.request_id,
+            'name': trace.name,
+            'start': trace.start,
+            'duration_ms': round(trace.elapsed() * 1000, 3),
+            'attributes': attributes,
+        }
+        lines = [json.dumps(root)]
+        for span in trace.spans:
+            lines.append(json.dumps({
+                'trace_id': trace.trace_id,
+                'span_id': span.span_id,
+                'parent_span_id': trace.span_id,
+                'request_id': trace.request_id,
+                'name': span.name,
+                'start': span.start,
+                'duration_ms': round(span.duration * 1000, 3),
+                'attributes': span.attributes,
+            }))
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            handle.write('\n'.join(lines) + '\n')
+
+
+class OtlpSpanExporter:
+    """Posts spans as OTLP/JSON to a collector's /v1/traces endpoint."""
+
+    def __init__(self, endpoint: str, *, timeout: float = 2.0):
+        """Export to endpoint (e.g. http://localhost:4318/v1/traces)."""
+        self.endpoint = endpoint
+        self.timeout = timeout
+
+    def export(self, trace: Trace, attributes: Dict[str, Any]) -> None:
+        """Send the root span and its children in one request."""
+        from .providers import get_session
+
+        spans = [_otlp_span(trace.trace_id, trace.span_id, trace.parent_span_id, trace.name, trace.start, trace.elapsed(), attributes, kind=2)]
+        spans.extend(
+            _otlp_span(trace.trace_id, span.span_id, trace.span_id, span.name, span.start, span.duration, span.attributes, kind=1)
+            for span in trace.spans
+        )
+        body = {'resourceSpans': [{
+            'resource': {'attributes': _otlp_attributes({'service.name': 'dishcovery-api'})},
+            'scopeSpans': [{'scope': {'name': 'dishcovery'}, 'spans': spans}],
+        }]}
+        response = get_session(self.endpoint).post(self.endpoint, json=body, timeout=self.timeout)
+        response.raise_for_status()
+
+
+def _otlp_span(
+    trace_id: str,
+    span_id: str,
+    parent_span_id: str | None,
+    name: str,
+    start: float,
+    seconds: float,
+    attributes: Dict[str, Any],
+    *,
+    kind: int,
+) -> Dict[str, Any]:
+    # kind: 1 = internal, 2 = server (OTLP SpanKind)
+    span = {
+        'traceId': trace_id,
+        'spanId': span_id,
+        'name': name,
+        'kind': kind,
+        'startTimeUnixNano': str(int(start * 1e9)),
+        'endTimeUnixNano': str(int((start + seconds) * 1e9)),
+        'attributes': _otlp_attributes(attributes),
+    }
+    if parent_span_id:
+        span['parentSpanId'] = parent_span_id
+    return span
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    converted = []
+    for key, value in attributes.items():
+        if isinstance(value, bool):
+            converted.append({'key': key, 'value': {'boolValue': value}})
+        elif isinstance(value, int):
+            converted.append({'key': key, 'value': {'intValue': str(value)}})
+        elif isinstance(value, float):
+            converted.append({'key': key, 'value': {'doubleValue': value}})
+        else:
+            converted.append({'key': key, 'value': {'stringValue': str(value)}})
+    return converted
+
+
+class BackgroundSpanExporter:
+    """Runs an exporter on a daemon thread so export never delays a response.
+
+    Traces are dropped (and counted) when the queue is full rather than
+    blocking request threads behind a slow collector.
+    """
+
+    def __init__(self, exporter: Any, *, max_queue: int = 1000):
+        """Wrap exporter with a bounded queue of max_queue traces."""
+        self.exporter = exporter
+        self.dropped = 0
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name='span-export', daemon=True)
+        self._thread.start()
+
+    def export(self, trace: Trace, attributes: Dict[str, Any]) -> None:
+        """Queue a finished trace for export."""
+        try:
+            self._queue.put_nowait((trace, attributes))
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued trace has been exported; returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return not self._queue.unfinished_tasks
+
+    def _run(self) -> None:
+        while True:
+            trace, attributes = self._queue.get()
+            try:
+                self.exporter.export(trace, attributes)
+            except Exception as exc:  # noqa: BLE001
+                logger.warning('Span export failed: %s', exc)
+            finally:
+                self._queue.task_done()
+
+
+_exporter: BackgroundSpanExporter | None = None
+_exporter_ready = False
+_exporter_lock = threading.Lock()
+
+
+def get_span_exporter() -> BackgroundSpanExporter | None:
+    """Return the configured span exporter, or None when TRACE_EXPORTER is 'none'."""
+    global _exporter, _exporter_ready
+    if not _exporter_ready:
+        with _exporter_lock:
+            if not _exporter_ready:
+                backend_name = (Config.TRACE_EXPORTER or 'none').lower()
+                if backend_name == 'jsonl':
+                    _exporter = BackgroundSpanExporter(JsonlSpanExporter(Config.TRACE_JSONL_PATH), max_queue=Config.TRACE_EXPORT_QUEUE)
+                elif backend_name == 'otlp':
+                    _exporter = BackgroundSpanExporter(OtlpSpanExporter(Config.TRACE_OTLP_ENDPOINT), max_queue=Config.TRACE_EXPORT_QUEUE)
+                elif backend_name != 'none':
+                    logger.warning('Unknown TRACE_EXPORTER "%s"; span export disabled.', backend_name)
+                _exporter_ready = True
+    return _exporter
+
+
+def trace_from_headers(name: str, headers: Any) -> Trace:
+    """Start a trace, continuing the caller's traceparent and X-Request-ID when valid."""
+    trace_id = parent_span_id = None
+    match = _TRACEPARENT_PATTERN.match((headers.get('traceparent') or '').strip())
+    if match:
+        trace_id, parent_span_id = match.groups()
+    request_id = (headers.get('X-Request-ID') or '').strip()
+    return Trace(
+        name,
+        trace_id=trace_id,
+        parent_span_id=parent_span_id,
+        request_id=request_id if _REQUEST_ID_PATTERN.match(request_id) else None,
+    )
+
+
+def activate_trace(trace: Trace | None) -> None:
+    """Make trace the current one for this context (None clears it)."""
+    _current_trace.set(trace)
+
+
+def export_trace(trace: Trace, *, method: str, route: str, status_code: int) -> None:
+    """Finish a trace and hand it to the span exporter, if one is configured."""
+    trace.finish()
+    exporter = get_span_exporter()
+    if exporter is not None:
+        exporter.export(trace, {
+            'http.method': method,
+            'http.route': route,
+            'http.status_code': status_code,
+        })
+
+
+def timing_headers(trace: Trace) -> Dict[str, str]:
+    """Headers carrying a buffered response's request id and per-phase Server-Timing."""
+    return {
+        'X-Request-ID': trace.request_id,
+        'Server-Timing': trace.server_timing(),
+        # Lets cross-origin pages read the timings (PerformanceResourceTiming.serverTiming).
+        'Timing-Allow-Origin': ', '.join(Config.ALLOWED_ORIGINS),
+    }
+
+
+@api_bp.before_request
+def start_request_trace():
+    """Open a trace for every API request."""
+    trace = trace_from_headers(request.endpoint or request.path, request.headers)
+    activate_trace(trace)
+    g.trace = trace
+
+
+@api_bp.after_request
+def add_trace_headers(response):
+    """Send the request id and, for buffered responses, per-phase Server-Timing."""
+    trace = g.get('trace')
+    if trace is None:
+        return response
+    if response.is_streamed:
+        response.headers['X-Request-ID'] = trace.request_id
+    else:
+        response.headers.update(timing_headers(trace))
+    g.trace_status = response.status_code
+    return response
+
+
+@api_bp.teardown_request
+def finish_request_trace(error):
+    """Export the trace once the response (including any stream) is complete."""
+    trace = g.pop('trace', None)
+    if trace is None:
+        return
+    activate_trace(None)
+    export_trace(trace, method=request.method, route=request.path, status_code=g.get('trace_status', 500))
+
+
+_base_record_factory = logging.getLogRecordFactory()
+
+
+def _record_with_request_id(*args: Any, **kwargs: Any) -> logging.LogRecord:
+    record = _base_record_factory(*args, **kwargs)
+    record.request_id = current_request_id() or '-'
+    return record
+
+
+def configure_logging() -> None:
+    """Give every log record a request_id attribute and apply LOG_FORMAT.
+
+    The root logger is only configured when nothing else (such as gunicorn
+    or a test runner) has installed handlers.
+    """
+    logging.setLogRecordFactory(_record_with_request_id)
+    logging.basicConfig(level=Config.LOG_LEVEL.upper(), format=Config.LOG_FORMAT)
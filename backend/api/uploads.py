@@ -0,0 +1,179 @@
+"""Bounded-memory spooling of uploaded images."""
+
+import hashlib
+import io
+import tempfile
+from typing import BinaryIO
+
+# Leading bytes that identify each accepted image format.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+)
+SNIFF_BYTES = 12
+CHUNK_BYTES = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload is empty, too large or not an accepted image format."""
+
+    def __init__(self, reason: str, message: str):
+        """Describe the rejection.
+
+        Args:
+            reason: 'empty', 'too_large' or 'not_an_image'
+            message: Human-readable explanation
+        """
+        super().__init__(message)
+        self.reason = reason
+
+
+def sniff_image_type(header: bytes) -> str | None:
+    """Return the MIME type matching an upload's first bytes, or None if unrecognised."""
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return None
+
+
+def _read_into(stream: BinaryIO, view: memoryview) -> int:
+    """Fill view from stream, returning fewer bytes only at end of stream."""
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count:
+            break
+        filled += count
+    return filled
+
+
+class UploadSpool:
+    """Incremental writer that turns upload chunks into a SpooledUpload.
+
+    Chunks can come from a blocking stream (SpooledUpload.from_stream) or
+    from an ASGI receive loop. The format is sniffed as soon as the first
+    SNIFF_BYTES have arrived, and writing fails once max_bytes is exceeded.
+    """
+
+    def __init__(self, *, max_bytes: int, memory_bytes: int):
+        """Start an empty spool.
+
+        Args:
+            max_bytes: Largest accepted upload
+            memory_bytes: Size above which the spool moves to a temporary file
+        """
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.mime_type: str | None = None
+        self._header = bytearray()
+        self._spool = tempfile.SpooledTemporaryFile(max_size=memory_bytes)
+        self._digest = hashlib.sha256()
+
+    def write(self, chunk: bytes | memoryview) -> None:
+        """Append a chunk of the upload.
+
+        Raises:
+            UploadRejected: If the upload is not an accepted image format or
+                has grown past max_bytes; the spool is discarded
+        """
+        if not chunk:
+            return
+        if self.mime_type is None and len(self._header) < SNIFF_BYTES:
+            self._header += chunk[:SNIFF_BYTES - len(self._header)]
+            if len(self._header) == SNIFF_BYTES:
+                self._sniff()
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            self.discard()
+            raise UploadRejected('too_large', f'The upload is larger than {self.max_bytes} bytes.')
+        self._digest.update(chunk)
+        self._spool.write(chunk)
+
+    def _sniff(self) -> None:
+        self.mime_type = sniff_image_type(bytes(self._header))
+        if self.mime_type is None:
+            self.discard()
+            raise UploadRejected('not_an_image', 'The upload is not a JPEG, PNG, GIF or WEBP image.')
+
+    def finish(self) -> 'SpooledUpload':
+        """Return the completed upload.
+
+        Raises:
+            UploadRejected: If nothing was written or a short upload is not an image
+        """
+        if self.size == 0:
+            self.discard()
+            raise UploadRejected('empty', 'Empty image file.')
+        if self.mime_type is None:
+            self._sniff()
+        self._spool.seek(0)
+        return SpooledUpload(self._spool, size=self.size, sha256=self._digest.digest(), mime_type=self.mime_type)
+
+    def discard(self) -> None:
+        """Drop everything written so far."""
+        self._spool.close()
+
+
+class SpooledUpload:
+    """An uploaded image held in a spool that moves to disk past a memory bound.
+
+    The upload is copied chunk by chunk through one reusable buffer, hashed
+    on the way, so the request never holds more than memory_bytes of it in
+    memory however large it is. The spool belongs to the upload, not to the
+    request, so background jobs can still read it after the response.
+    """
+
+    def __init__(self, spool: BinaryIO, *, size: int, sha256: bytes, mime_type: str):
+        """Wrap a filled spool; use from_stream, from_bytes or UploadSpool instead."""
+        self._spool = spool
+        self.size = size
+        self.sha256 = sha256
+        self.mime_type = mime_type
+
+    @classmethod
+    def from_stream(cls, stream: BinaryIO, *, max_bytes: int, memory_bytes: int) -> 'SpooledUpload':
+        """Copy an upload stream into a new spool.
+
+        The format is checked from the first bytes before anything else is
+        read, and the copy stops as soon as max_bytes is exceeded.
+
+        Args:
+            stream: Readable binary stream positioned at the start of the upload
+            max_bytes: Largest accepted upload
+            memory_bytes: Size above which the spool moves to a temporary file
+
+        Raises:
+            UploadRejected: If the upload is empty, larger than max_bytes or not
+                a JPEG, PNG, GIF or WEBP image
+        """
+        spool = UploadSpool(max_bytes=max_bytes, memory_bytes=memory_bytes)
+        buffer = memoryview(bytearray(CHUNK_BYTES))
+        # Reading the header on its own rejects a non-image before the rest is read.
+        count = _read_into(stream, buffer[:SNIFF_BYTES])
+        while count:
+            spool.write(buffer[:count])
+            count = _read_into(stream, buffer)
+        return spool.finish()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'SpooledUpload':
+        """Wrap image data that is already in memory, without copying it."""
+        if not data:
+            raise UploadRejected('empty', 'Empty image file.')
+        mime_type = sniff_image_type(bytes(data[:SNIFF_BYTES]))
+        if mime_type is None:
+            raise UploadRejected('not_an_image', 'The upload is not a JPEG, PNG, GIF or WEBP image.')
+        return cls(io.BytesIO(data), size=len(data), sha256=hashlib.sha256(data).digest(), mime_type=mime_type)
+
+    def open(self) -> BinaryIO:
+        """Return the spool rewound to the start; callers must not close it."""
+        self._spool.seek(0)
+        return self._spool
+
+    def close(self) -> None:
+        """Release the spool and any temporary file behind it."""
+        self._spool.close()
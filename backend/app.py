@@ -1,21 +1,33 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import Config
 from api import api_bp
+from api.clients import prewarm_sdks
+from api.tracing import configure_logging
+
+def api_cors_options():
+    """CORS settings for the /api/* routes, shared with the ASGI endpoints."""
+    return {
+        "origins": Config.ALLOWED_ORIGINS,
+        "methods": ["GET", "POST", "OPTIONS"],
+        "allow_headers": ["Content-Type", "Authorization", "x-api-key", "anthropic-version", "Cache-Control", "X-Request-ID", "traceparent", "Idempotency-Key", "X-Request-Timeout"],
+        "expose_headers": ["Server-Timing", "X-Request-ID", "Retry-After", "Location", "Idempotent-Replayed"]
+    }
 
 def create_app(config_class=Config):
     """Application factory pattern"""
     app = Flask(__name__)
     app.config.from_object(config_class)
+    if Config.TRUSTED_PROXY_COUNT:
+        # Rate limits key on the client IP, so take it from X-Forwarded-For
+        # only as far as our own proxies vouch for it.
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_COUNT)
     
     # Enable CORS with environment-based configuration
-    CORS(app, resources={
-        r"/api/*": {
-            "origins": Config.ALLOWED_ORIGINS,
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization", "x-api-key", "anthropic-version"]
-        }
-    })
+    CORS(app, resources={r"/api/*": api_cors_options()})
+    configure_logging()
+    prewarm_sdks(Config.PROVIDER_SDK_PREWARM)
     
     # Register blueprints
     app.register_blueprint(api_bp)
@@ -32,7 +44,12 @@ def create_app(config_class=Config):
             'version': '1.0.0',
             'endpoints': {
                 'health': '/api/health',
-                'generate_recipe': '/api/generate-recipe'
+                'generate_recipe': '/api/generate-recipe',
+                'generate_recipe_stream': '/api/generate-recipe/stream',
+                'generate_recipe_batch': '/api/generate-recipe/batch',
+                'provider_status': '/api/providers/status',
+                'jobs': '/api/jobs',
+                'metrics': '/api/metrics'
             }
         })
     
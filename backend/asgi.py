@@ -0,0 +1,9 @@
+"""ASGI entry point: serve with `uvicorn asgi:app --workers 4` from backend/.
+
+POST /api/generate-recipe and /api/validate-key run natively on asyncio;
+every other route is served by the same Flask app that app.py exposes.
+"""
+from api.asgi import create_asgi_app
+from app import api_cors_options, app as flask_app
+
+app = create_asgi_app(flask_app, cors_options=api_cors_options())
@@ -0,0 +1,49 @@
+"""Side-by-side load test of the WSGI (gunicorn) and ASGI (uvicorn) servers.
+
+Runs benchmarks.loadtest against gunicorn gthread workers and then uvicorn
+workers with the same fake provider latency, photos and client concurrency,
+and prints throughput and latency for both. The per-provider call cap is
+lifted by default so it measures how many requests each worker model can
+keep in flight rather than the admission limit.
+
+Usage (from backend/):
+    python -m benchmarks.bench_asgi [--workers 2 --threads 8] [--concurrency 256]
+        [--duration 20 | --requests 4000] [--latency 1.0] [--json asgi.json]
+"""
+
+import argparse
+import copy
+import json
+
+from benchmarks.loadtest import add_arguments, photo_pool, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument('--json', help='also write both reports to this file')
+    parser.set_defaults(concurrency=256, duration=20.0, latency=1.0, distribution='constant', provider_concurrency=0)
+    args = parser.parse_args()
+
+    photos = photo_pool(args.images, args.seed)
+    reports = []
+    for server in ('gunicorn', 'uvicorn'):
+        server_args = copy.copy(args)
+        server_args.server = server
+        reports.append(run(server_args, photos))
+
+    print(f"{args.workers} workers, concurrency {args.concurrency}, fake provider "
+          f"{args.distribution} {args.latency}s (gunicorn: {args.threads} threads per worker)")
+    print(f"{'server':<10}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'RSS MiB':>10}  statuses")
+    for report in reports:
+        latency = report['latency_ms']
+        print(f"{report['server']:<10}{report['requests_per_second']:>9}{latency.get('p50', 0):>10}"
+              f"{latency.get('p95', 0):>10}{latency.get('p99', 0):>10}{report['peak_rss_mib']['total']:>10}"
+              f"  {report['status_counts']}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(reports, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
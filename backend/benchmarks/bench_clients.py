@@ -0,0 +1,89 @@
+"""Per-request overhead of building provider clients versus the pooled registry.
+
+Runs a local keep-alive HTTP server that mimics the OpenAI models endpoint and
+issues the same call with a freshly constructed client (the previous
+behaviour: new client, new connection pool, new TCP connection) and with the
+pooled registry. No network access or API credits are needed. Against the
+real provider each fresh connection additionally pays a TLS handshake.
+
+Usage (from backend/):
+    python -m benchmarks.bench_clients [--requests 300]
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+from openai import OpenAI
+
+from api.clients import ClientRegistry, get_http_pool
+
+BODY = json.dumps({'object': 'list', 'data': []}).encode('utf-8')
+
+
+class ModelsHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def do_GET(self):  # noqa: N802
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def measure(label, make_client, requests):
+    connections_before = ModelsHandler.connections
+    samples = []
+    for index in range(requests):
+        started = time.perf_counter()
+        client = make_client(f'sk-user-{index % 4}')
+        client.models.list()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    mean = sum(samples) / len(samples)
+    opened = ModelsHandler.connections - connections_before
+    print(f'{label:<16} mean {mean * 1000:7.3f}ms  p50 {samples[len(samples) // 2] * 1000:7.3f}ms'
+          f'  p99 {samples[int(len(samples) * 0.99)] * 1000:7.3f}ms  connections opened {opened}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    ModelsHandler.connections = 0
+    original_setup = ModelsHandler.setup
+
+    def counting_setup(self):
+        ModelsHandler.connections += 1
+        original_setup(self)
+
+    ModelsHandler.setup = counting_setup
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ModelsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_address[1]}/v1'
+
+    def fresh_client(api_key):
+        return OpenAI(api_key=api_key, base_url=base_url, http_client=httpx.Client())
+
+    registry = ClientRegistry(
+        {'openai': lambda api_key: OpenAI(api_key=api_key, base_url=base_url, http_client=get_http_pool('bench'))},
+        max_size=16,
+        idle_ttl=600,
+    )
+
+    measure('fresh per call', fresh_client, args.requests)
+    measure('pooled registry', lambda api_key: registry.get('openai', api_key), args.requests)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Time and success rate of recipe JSON extraction, before and after.
+
+Usage (from backend/):
+    python -m benchmarks.bench_parser [--steps 12] [--repeat 2000]
+"""
+
+import argparse
+import json
+import re
+import time
+
+from api.parsing import extract_json_object
+
+
+def synthetic_recipe(steps: int) -> str:
+    """A recipe roughly the size a model returns, pretty-printed like model output."""
+    recipe = {
+        'name': 'Roasted Vegetable Lasagna',
+        'prep_time': '25 minutes',
+        'cook_time': '50 minutes',
+        'servings': 6,
+        'ingredients_with_measurements': [f'{n + 1} cup ingredient number {n}' for n in range(steps)],
+        'instructions': [f'Step {n + 1}: do the "next" thing with care and {{attention}}.' for n in range(steps)],
+        'nutrition': {'calories': 480, 'protein': '22g', 'carbs': '54g', 'fat': '18g'},
+        'tips': 'Rest for ten minutes before slicing.',
+    }
+    return json.dumps(recipe, indent=2)
+
+
+def corpus(steps: int) -> dict:
+    clean = synthetic_recipe(steps)
+    return {
+        'clean': clean,
+        'json fence': f'```json\n{clean}\n```',
+        'prose + fence': f'Here is the recipe:\n```json\n{clean}\n```\nEnjoy!',
+        'raw newline': clean.replace('before slicing.', 'before\nslicing.'),
+        'truncated': clean[:int(len(clean) * 0.8)],
+    }
+
+
+def legacy_parse(raw_text: str):
+    """Previous behaviour: three regex passes to strip fences, then json.loads."""
+    cleaned = raw_text.strip()
+    cleaned = re.sub(r'^```json\s*', '', cleaned)
+    cleaned = re.sub(r'^```\s*', '', cleaned)
+    cleaned = re.sub(r'```\s*$', '', cleaned)
+    try:
+        return json.loads(cleaned.strip())
+    except json.JSONDecodeError:
+        return None
+
+
+def new_parse(raw_text: str):
+    return extract_json_object(raw_text)[0]
+
+
+def measure(parse, text: str, repeat: int):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = parse(text)
+    return (time.perf_counter() - started) / repeat * 1e6, result is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', type=int, default=12)
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    cases = corpus(args.steps)
+    print(f'{"case":<16}{"bytes":>8}  {"legacy µs":>10} {"ok":>4}  {"new µs":>10} {"ok":>4}')
+    successes = {'legacy': 0, 'new': 0}
+    for name, text in cases.items():
+        legacy_us, legacy_ok = measure(legacy_parse, text, args.repeat)
+        new_us, new_ok = measure(new_parse, text, args.repeat)
+        successes['legacy'] += legacy_ok
+        successes['new'] += new_ok
+        print(f'{name:<16}{len(text):>8}  {legacy_us:>10.1f} {"yes" if legacy_ok else "no":>4}  '
+              f'{new_us:>10.1f} {"yes" if new_ok else "no":>4}')
+    print(f'success rate: legacy {successes["legacy"]}/{len(cases)}, new {successes["new"]}/{len(cases)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""Time and bytes per stage of upload preprocessing, before and after.
+
+Usage (from backend/):
+    python -m benchmarks.bench_preprocess [--width 4032 --height 3024] [--repeat 5]
+"""
+
+import argparse
+import base64
+import io
+import time
+
+from PIL import Image
+
+from api.imaging import decode_image, prepare_image
+from api.similarity import dhash
+from config import Config
+
+
+def synthetic_photo(width: int, height: int) -> bytes:
+    """Camera-sized JPEG with photo-like noise so encoders do real work."""
+    noise = Image.effect_noise((width, height), 48).convert('RGB')
+    gradient = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    photo = Image.blend(noise, gradient, 0.6)
+    buffer = io.BytesIO()
+    photo.save(buffer, format='JPEG', quality=92)
+    return buffer.getvalue()
+
+
+def timed(stages, name, func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    stages[name] = stages.get(name, 0.0) + time.perf_counter() - started
+    return result
+
+
+def legacy_pipeline(image_bytes: bytes, stages: dict) -> int:
+    """Previous behaviour: verify, decode again for Gemini, base64 the original."""
+    timed(stages, 'verify', lambda: Image.open(io.BytesIO(image_bytes)).verify())
+    timed(stages, 'decode', lambda: Image.open(io.BytesIO(image_bytes)).load())
+    encoded = timed(stages, 'base64', base64.b64encode, image_bytes)
+    return len(encoded)
+
+
+def prepared_pipeline(image_bytes: bytes, provider: str, stages: dict) -> int:
+    max_dimension = Config.get_max_image_dimension_for(provider)
+    image = timed(stages, 'decode', decode_image, image_bytes, max_dimension=max_dimension)
+    timed(stages, 'dhash', dhash, image)
+    prepared = timed(stages, 'resize+encode', prepare_image, image, max_dimension=max_dimension,
+                     image_format=Config.IMAGE_ENCODE_FORMAT, quality=Config.IMAGE_ENCODE_QUALITY)
+    encoded = timed(stages, 'base64', base64.b64encode, prepared.data)
+    return len(encoded)
+
+
+def report(label, sent_bytes, stages, repeat):
+    timings = ', '.join(f'{name} {seconds / repeat * 1000:.1f}ms' for name, seconds in stages.items())
+    total = sum(stages.values()) / repeat * 1000
+    print(f'{label:<22} sent {sent_bytes / 1024:>8.1f} KiB  total {total:>7.1f}ms  ({timings})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    image_bytes = synthetic_photo(args.width, args.height)
+    print(f'upload: {args.width}x{args.height} JPEG, {len(image_bytes) / 1024:.1f} KiB')
+
+    stages: dict = {}
+    for _ in range(args.repeat):
+        sent = legacy_pipeline(image_bytes, stages)
+    report('legacy (all providers)', sent, stages, args.repeat)
+
+    for provider in ('gemini', 'openai', 'anthropic'):
+        stages = {}
+        for _ in range(args.repeat):
+            sent = prepared_pipeline(image_bytes, provider, stages)
+        report(f'prepared ({provider})', sent, stages, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Bytes sent and latency per resolution tier of progressive requests, against full-size requests.
+
+Runs the Flask app in process with the fake provider, whose latency grows
+with the image it receives (--per-mb seconds per megabyte on top of
+--latency). A --low-confidence-rate share of answers report low confidence,
+which sends those requests on to the next tier. The result cache and
+near-duplicate lookup are off, so every request reaches the provider.
+
+Usage (from backend/):
+    python -m benchmarks.bench_progressive [--requests 20] [--width 4032 --height 3024]
+        [--latency 0.2 --per-mb 2.0] [--low-confidence-rate 0.2] [--tiers 512]
+"""
+
+import argparse
+import io
+import json
+import time
+from collections import defaultdict
+
+from api import fake_provider as fake_module
+from api.fake_provider import CANNED_RECIPE, FakeProvider
+from app import create_app
+from benchmarks.bench_preprocess import synthetic_photo
+from config import Config
+
+
+def fake_responses(low_confidence_rate: float) -> list:
+    """100 canned answers, the given share of them unsure of the dish."""
+    low = round(low_confidence_rate * 100)
+    return [
+        json.dumps({**CANNED_RECIPE, 'confidence': 0.3 if index < low else 0.9})
+        for index in range(100)
+    ]
+
+
+def run(client, photos, progressive: bool) -> list:
+    results = []
+    for photo in photos:
+        started = time.perf_counter()
+        response = client.post(
+            '/api/generate-recipe',
+            data={
+                'file': (io.BytesIO(photo), 'dish.jpg'),
+                'provider': 'fake',
+                'api_key': 'fake',
+                'progressive': 'true' if progressive else 'false',
+            },
+            content_type='multipart/form-data',
+        )
+        elapsed = time.perf_counter() - started
+        meta = response.get_json()['meta']
+        results.append((elapsed, meta))
+    return results
+
+
+def report(label: str, results: list) -> None:
+    count = len(results)
+    latency = sum(elapsed for elapsed, _ in results) / count * 1000
+    sent = [
+        sum(tier['bytes'] for tier in meta['progressive']['tiers']) if 'progressive' in meta else meta['image']['bytes']
+        for _, meta in results
+    ]
+    print(f'{label:<12} avg sent {sum(sent) / count / 1024:>8.1f} KiB  avg latency {latency:>7.1f}ms')
+
+    tiers = defaultdict(list)
+    for _, meta in results:
+        for tier in meta.get('progressive', {}).get('tiers', []):
+            tiers[tier['dimension']].append(tier)
+    for dimension, sent_tiers in sorted(tiers.items()):
+        used = sum(1 for tier in sent_tiers if tier['outcome'] == 'used')
+        average_bytes = sum(tier['bytes'] for tier in sent_tiers) / len(sent_tiers)
+        average_ms = sum(tier['elapsed_ms'] for tier in sent_tiers) / len(sent_tiers)
+        print(f'  tier {dimension:>5}px  sent {len(sent_tiers):>3}x  used {used:>3}x  '
+              f'avg {average_bytes / 1024:>7.1f} KiB  {average_ms:>7.1f}ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--latency', type=float, default=0.2, help='fake provider base latency in seconds')
+    parser.add_argument('--per-mb', type=float, default=2.0, help='seconds added per megabyte of image')
+    parser.add_argument('--low-confidence-rate', type=float, default=0.2)
+    parser.add_argument('--tiers', default='512', help='comma-separated PROGRESSIVE_TIERS')
+    args = parser.parse_args()
+
+    Config.FAKE_PROVIDER_ENABLED = True
+    Config.ROUTER_ENABLED = False
+    Config.RECIPE_CACHE_BACKEND = 'none'
+    Config.NEAR_DUPLICATE_ENABLED = False
+    Config.RECIPE_REPAIR_ENABLED = False
+    Config.PROGRESSIVE_TIERS = [int(size) for size in args.tiers.split(',') if size.strip()]
+    fake_module._fake_provider = FakeProvider(
+        distribution='constant',
+        median=args.latency,
+        per_megabyte=args.per_mb,
+        responses=fake_responses(args.low_confidence_rate),
+        seed=1,
+    )
+    photos = [synthetic_photo(args.width, args.height) for _ in range(args.requests)]
+    print(f'{args.requests} uploads: {args.width}x{args.height} JPEG, '
+          f'{sum(len(photo) for photo in photos) / len(photos) / 1024:.1f} KiB on average')
+
+    with create_app().test_client() as client:
+        report('full size', run(client, photos, progressive=False))
+        report('progressive', run(client, photos, progressive=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""Near-duplicate index lookup latency as the index grows.
+
+Usage (from backend/):
+    python -m benchmarks.bench_similarity [--sizes 10000,100000,1000000] [--distance 4]
+"""
+
+import argparse
+import random
+import time
+
+from api.similarity import HammingIndex
+
+
+def flip_bits(value: int, count: int, rng: random.Random) -> int:
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def run(sizes, distance, queries, seed):
+    rng = random.Random(seed)
+    index = HammingIndex(max_distance=distance, max_entries=max(sizes))
+    stored = []
+    print(f'chunks={index.chunk_count} radius={distance}')
+    print(f'{"entries":>10} {"build s":>9} {"hit p50 us":>11} {"hit p99 us":>11} {"miss p50 us":>12} {"miss p99 us":>12}')
+    for size in sizes:
+        started = time.perf_counter()
+        while len(index) < size:
+            value = rng.getrandbits(64)
+            index.add(value, None, len(stored))
+            stored.append(value)
+        build = time.perf_counter() - started
+
+        hits, misses = [], []
+        for _ in range(queries):
+            near = flip_bits(rng.choice(stored), rng.randrange(distance + 1), rng)
+            started = time.perf_counter()
+            index.nearest(near, None)
+            hits.append(time.perf_counter() - started)
+
+            far = rng.getrandbits(64)
+            started = time.perf_counter()
+            index.nearest(far, None)
+            misses.append(time.perf_counter() - started)
+
+        hits.sort()
+        misses.sort()
+        print(f'{size:>10} {build:>9.2f} {hits[len(hits) // 2] * 1e6:>11.1f} {hits[int(len(hits) * 0.99)] * 1e6:>11.1f}'
+              f' {misses[len(misses) // 2] * 1e6:>12.1f} {misses[int(len(misses) * 0.99)] * 1e6:>12.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000,3000000')
+    parser.add_argument('--distance', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    run([int(size) for size in args.sizes.split(',')], args.distance, args.queries, args.seed)
+
+
+if __name__ == '__main__':
+    main()
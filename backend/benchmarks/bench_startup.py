@@ -0,0 +1,64 @@
+"""Cold-start import time of the app, with and without provider SDKs loaded.
+
+Each run is a fresh interpreter under python -X importtime, like a serverless
+cold start: 'app' imports the Flask app as api/index.py does, 'app+sdks'
+additionally loads every provider SDK the way the first recipe request for
+each provider would. Reports the median cumulative import time and the
+slowest imports directly below the app in the last 'app' run.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup [--repeat 5] [--top 10]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'app': 'import app',
+    'app+sdks': 'import app\nfrom api.clients import SDK_MODULES, load_sdk\nfor name in SDK_MODULES: load_sdk(name)',
+}
+
+
+def import_times(code: str) -> list:
+    """Return (module, self_us, cumulative_us, depth) rows for one fresh interpreter."""
+    env = {**os.environ, 'PROVIDER_SDK_PREWARM': ''}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    for scenario, code in SCENARIOS.items():
+        totals = []
+        for _ in range(args.repeat):
+            rows = import_times(code)
+            totals.append(sum(cumulative for _, _, cumulative, depth in rows if depth == 0) / 1000)
+        print(f'{scenario:<10} median {statistics.median(totals):8.1f} ms   '
+              f'min {min(totals):8.1f} ms   over {args.repeat} runs')
+        if scenario == 'app':
+            slowest = sorted((row for row in rows if row[3] in (1, 2)), key=lambda row: row[2], reverse=True)
+            for name, _, cumulative, _ in slowest[:args.top]:
+                print(f'    {cumulative / 1000:8.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Peak Python memory per request for upload handling, before and after spooling.
+
+Usage (from backend/):
+    python -m benchmarks.bench_upload_memory [--width 4032 --height 3024] [--provider openai]
+"""
+
+import argparse
+import base64
+import tempfile
+import tracemalloc
+
+from werkzeug.datastructures import FileStorage
+
+from api.imaging import decode_image, prepare_image
+from api.uploads import SpooledUpload
+from benchmarks.bench_preprocess import synthetic_photo
+from config import Config
+
+
+def parsed_upload(image_bytes: bytes) -> FileStorage:
+    """A file part as werkzeug's form parser leaves it: in its own disk-backed spool."""
+    stream = tempfile.SpooledTemporaryFile(max_size=500 * 1024)
+    stream.write(image_bytes)
+    stream.seek(0)
+    return FileStorage(stream, filename='dish.jpg', content_type='image/jpeg')
+
+
+def legacy_request(file: FileStorage, provider: str) -> int:
+    image_bytes = file.read()
+    max_dimension = Config.get_max_image_dimension_for(provider)
+    image = decode_image(image_bytes, max_dimension=max_dimension)
+    prepared = prepare_image(image, max_dimension=max_dimension, image_format=Config.IMAGE_ENCODE_FORMAT, quality=Config.IMAGE_ENCODE_QUALITY)
+    return len(base64.b64encode(bytes(prepared.data)))
+
+
+def spooled_request(file: FileStorage, provider: str) -> int:
+    upload = SpooledUpload.from_stream(file.stream, max_bytes=Config.UPLOAD_MAX_BYTES, memory_bytes=Config.UPLOAD_SPOOL_MEMORY_BYTES)
+    try:
+        max_dimension = Config.get_max_image_dimension_for(provider)
+        image = decode_image(upload.open(), max_dimension=max_dimension)
+        prepared = prepare_image(image, max_dimension=max_dimension, image_format=Config.IMAGE_ENCODE_FORMAT, quality=Config.IMAGE_ENCODE_QUALITY)
+        return len(base64.b64encode(prepared.data))
+    finally:
+        upload.close()
+
+
+def peak_allocation(pipeline, image_bytes: bytes, provider: str) -> int:
+    file = parsed_upload(image_bytes)
+    tracemalloc.start()
+    try:
+        pipeline(file, provider)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+        file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=4032)
+    parser.add_argument('--height', type=int, default=3024)
+    parser.add_argument('--provider', default='openai', choices=('gemini', 'openai', 'anthropic'))
+    args = parser.parse_args()
+
+    image_bytes = synthetic_photo(args.width, args.height)
+    print(f'upload: {args.width}x{args.height} JPEG, {len(image_bytes) / 1024:.1f} KiB, provider {args.provider}')
+    # Warm imports and Pillow plugin registration outside the measurement.
+    spooled_request(parsed_upload(image_bytes), args.provider)
+
+    for label, pipeline in (('legacy file.read()', legacy_request), ('spooled upload', spooled_request)):
+        peak = peak_allocation(pipeline, image_bytes, args.provider)
+        print(f'{label:<20} peak {peak / 1024:>9.1f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""Offline load test of /api/generate-recipe under gunicorn or uvicorn with the fake provider.
+
+Starts gunicorn (WSGI, app:app) or uvicorn (ASGI, asgi:app) on a free local port with FAKE_PROVIDER_ENABLED and every real
+provider key blanked, drives /api/generate-recipe from --concurrency client
+threads and reports requests/sec, latency percentiles and the server's peak
+resident memory (master plus workers). Each request sends one of --images
+distinct photos, so the result cache and request coalescing do not flatter
+the numbers. Needs Linux (/proc) but no network access or API credits.
+
+Usage (from backend/):
+    python -m benchmarks.loadtest [--server gunicorn|uvicorn] [--workers 2 --threads 8] [--concurrency 32]
+        [--duration 30 | --requests 2000] [--latency 0.5 --distribution lognormal]
+        [--error-rate 0.0 --truncate-rate 0.0] [--provider-concurrency 16] [--json baseline.json]
+"""
+
+import argparse
+import io
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import requests
+from PIL import Image
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port() -> int:
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def photo_pool(count: int, seed: int) -> list:
+    """Distinct JPEG uploads of phone-thumbnail size."""
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        noise = Image.effect_noise((512, 384), 40).convert('RGB')
+        tint = Image.new('RGB', (512, 384), tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        Image.blend(noise, tint, 0.5).save(buffer, format='JPEG', quality=85)
+        photos.append(buffer.getvalue())
+    return photos
+
+
+def start_server(args, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        'FAKE_PROVIDER_ENABLED': 'true',
+        'FAKE_LATENCY_DISTRIBUTION': args.distribution,
+        'FAKE_LATENCY_MEDIAN': str(args.latency),
+        'FAKE_LATENCY_SPREAD': str(args.spread),
+        'FAKE_ERROR_RATE': str(args.error_rate),
+        'FAKE_TRUNCATE_RATE': str(args.truncate_rate),
+        'FAKE_SEED': str(args.seed),
+        # Never fall back to a real provider.
+        'ROUTER_ENABLED': 'false',
+        'GEMINI_API_KEY': '',
+        'OPENAI_API_KEY': '',
+        'ANTHROPIC_API_KEY': '',
+        'RECIPE_CACHE_BACKEND': args.cache,
+        'METRICS_MULTIPROC_DIR': tempfile.mkdtemp(prefix='dishcovery-loadtest-metrics-'),
+        'LOG_LEVEL': 'WARNING',
+    }
+    if args.provider_concurrency is not None:
+        env['DEFAULT_PROVIDER_CONCURRENCY'] = str(args.provider_concurrency)
+    if args.server == 'uvicorn':
+        command = [
+            sys.executable, '-m', 'uvicorn',
+            '--workers', str(args.workers),
+            '--host', '127.0.0.1',
+            '--port', str(port),
+            '--log-level', 'warning',
+            '--no-access-log',
+            'asgi:app',
+        ]
+    else:
+        command = [
+            sys.executable, '-m', 'gunicorn',
+            '--workers', str(args.workers),
+            '--threads', str(args.threads),
+            '--worker-class', 'gthread',
+            '--bind', f'127.0.0.1:{port}',
+            '--log-level', 'warning',
+            'app:app',
+        ]
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+
+
+def wait_until_healthy(base_url: str, server: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit(f'server exited with status {server.returncode}')
+        try:
+            if requests.get(f'{base_url}/api/health', timeout=2).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise SystemExit('server did not become healthy in time')
+
+
+def rss_kib(pid: int) -> int:
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def server_pids(master: int) -> list:
+    pids = [master]
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', encoding='ascii') as stat:
+                # Field 4 is the parent pid; the command name may contain spaces, so split after ')'.
+                if int(stat.read().rsplit(')', 1)[1].split()[1]) == master:
+                    pids.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return pids
+
+
+class MemorySampler(threading.Thread):
+    """Polls the resident memory of the server's master process and its workers."""
+
+    def __init__(self, master: int, interval: float = 0.1):
+        super().__init__(daemon=True)
+        self.master = master
+        self.interval = interval
+        self.peak_total_kib = 0
+        self.peak_process_kib = 0
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            samples = [rss_kib(pid) for pid in server_pids(self.master)]
+            self.peak_total_kib = max(self.peak_total_kib, sum(samples))
+            self.peak_process_kib = max(self.peak_process_kib, max(samples, default=0))
+            self.stopped.wait(self.interval)
+
+
+def drive(base_url: str, photos: list, args) -> tuple:
+    latencies = []
+    statuses: Counter = Counter()
+    lock = threading.Lock()
+    issued = iter(range(args.requests)) if args.requests else None
+    deadline = time.monotonic() + args.duration
+
+    def client(worker: int):
+        session = requests.Session()
+        index = worker
+        while True:
+            if issued is not None:
+                with lock:
+                    if next(issued, None) is None:
+                        return
+            elif time.monotonic() >= deadline:
+                return
+            photo = photos[index % len(photos)]
+            index += args.concurrency
+            started = time.perf_counter()
+            try:
+                response = session.post(
+                    f'{base_url}/api/generate-recipe',
+                    files={'file': ('dish.jpg', photo, 'image/jpeg')},
+                    data={'provider': 'fake', 'api_key': 'fake'},
+                    timeout=120,
+                )
+                status = response.status_code
+            except requests.RequestException:
+                status = 'connection_error'
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(worker,)) for worker in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def percentile(samples: list, percent: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))]
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run when --requests is not set')
+    parser.add_argument('--requests', type=int, default=0, help='total requests to send instead of a fixed duration')
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--distribution', choices=('constant', 'uniform', 'lognormal'), default='lognormal')
+    parser.add_argument('--latency', type=float, default=0.5, help='median fake provider latency in seconds')
+    parser.add_argument('--spread', type=float, default=0.4)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--truncate-rate', type=float, default=0.0)
+    parser.add_argument('--cache', choices=('none', 'memory'), default='none')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--provider-concurrency', type=int, help='DEFAULT_PROVIDER_CONCURRENCY for the server; 0 removes the cap')
+
+
+def run(args, photos: list) -> dict:
+    """Start the server, drive it and return the report."""
+    port = free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    server = start_server(args, port)
+    try:
+        wait_until_healthy(base_url, server)
+        sampler = MemorySampler(server.pid)
+        sampler.start()
+        latencies, statuses, elapsed = drive(base_url, photos, args)
+        sampler.stopped.set()
+        sampler.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    return {
+        'server': args.server,
+        'workers': args.workers,
+        'threads': args.threads,
+        'concurrency': args.concurrency,
+        'fake_latency': {'distribution': args.distribution, 'median': args.latency, 'spread': args.spread},
+        'requests': len(latencies),
+        'status_counts': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            name: round(percentile(latencies, percent) * 1000, 1)
+            for name, percent in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+        } if latencies else {},
+        'peak_rss_mib': {
+            'total': round(sampler.peak_total_kib / 1024, 1),
+            'largest_process': round(sampler.peak_process_kib / 1024, 1),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--server', choices=('gunicorn', 'uvicorn'), default='gunicorn')
+    add_arguments(parser)
+    parser.add_argument('--json', help='also write the report to this file')
+    args = parser.parse_args()
+
+    report = run(args, photo_pool(args.images, args.seed))
+    print(f"{report['requests']} requests in {report['elapsed_seconds']}s "
+          f"({report['server']}, {report['workers']} workers x {report['threads']} threads, concurrency {report['concurrency']})")
+    print(f"throughput   {report['requests_per_second']} req/s   statuses {report['status_counts']}")
+    print('latency      ' + '  '.join(f'{name} {value}ms' for name, value in report['latency_ms'].items()))
+    print(f"peak RSS     {report['peak_rss_mib']['total']} MiB total, "
+          f"{report['peak_rss_mib']['largest_process']} MiB largest process")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
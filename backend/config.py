@@ -1,6 +1,7 @@
 import os
+import tempfile
 from dotenv import load_dotenv
-from typing import ClassVar
+from typing import ClassVar, List, Tuple
 
 load_dotenv()
 
@@ -18,8 +19,24 @@ class Config:
         'gemini': 'GEMINI_API_KEY',
         'openai': 'OPENAI_API_KEY',
         'anthropic': 'ANTHROPIC_API_KEY',
+        'fake': 'FAKE_API_KEY',
     }
 
+    # API key pools: more server keys per provider, comma-separated, each
+    # optionally weighted as key:weight. The single key above joins its pool.
+    GEMINI_API_KEYS = os.getenv('GEMINI_API_KEYS', '')
+    OPENAI_API_KEYS = os.getenv('OPENAI_API_KEYS', '')
+    ANTHROPIC_API_KEYS = os.getenv('ANTHROPIC_API_KEYS', '')
+    FAKE_API_KEYS = os.getenv('FAKE_API_KEYS', '')
+    PROVIDER_KEY_POOL_MAP = {
+        'gemini': 'GEMINI_API_KEYS',
+        'openai': 'OPENAI_API_KEYS',
+        'anthropic': 'ANTHROPIC_API_KEYS',
+        'fake': 'FAKE_API_KEYS',
+    }
+    API_KEY_POOL_STRATEGY = os.getenv('API_KEY_POOL_STRATEGY', 'least_loaded')  # least_loaded or round_robin (weighted)
+    API_KEY_COOLDOWN = float(os.getenv('API_KEY_COOLDOWN', 30))  # seconds a key rests after a 429, or longer if Retry-After says so
+
     DEFAULT_PROVIDER = os.getenv('DEFAULT_PROVIDER', 'gemini')
     DEFAULT_MODELS = {
         'gemini': os.getenv('GEMINI_DEFAULT_MODEL', 'gemini-2.5-flash'),
@@ -40,6 +57,193 @@ class Config:
     # File Upload Settings
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB default
     ALLOWED_EXTENSIONS: ClassVar[frozenset[str]] = frozenset({'png', 'jpg', 'jpeg', 'gif', 'webp'})
+    # Largest single image, and how much of one is held in memory before it spools to disk
+    UPLOAD_MAX_BYTES = int(os.getenv('UPLOAD_MAX_BYTES', MAX_CONTENT_LENGTH))
+    UPLOAD_SPOOL_MEMORY_BYTES = int(os.getenv('UPLOAD_SPOOL_MEMORY_BYTES', 1024 * 1024))
+
+    # Provider client pooling
+    PROVIDER_CLIENT_CACHE_SIZE = int(os.getenv('PROVIDER_CLIENT_CACHE_SIZE', 64))
+    PROVIDER_CLIENT_IDLE_SECONDS = int(os.getenv('PROVIDER_CLIENT_IDLE_SECONDS', 600))
+    PROVIDER_HTTP_MAX_CONNECTIONS = int(os.getenv('PROVIDER_HTTP_MAX_CONNECTIONS', 100))
+    PROVIDER_HTTP_MAX_KEEPALIVE = int(os.getenv('PROVIDER_HTTP_MAX_KEEPALIVE', 20))
+    PROVIDER_HTTP_KEEPALIVE_SECONDS = float(os.getenv('PROVIDER_HTTP_KEEPALIVE_SECONDS', 60))
+    # Provider SDKs are imported on first use; list providers (or 'all') to
+    # import them on a background thread at startup instead.
+    PROVIDER_SDK_PREWARM: ClassVar[list[str]] = [
+        name.strip()
+        for name in os.getenv('PROVIDER_SDK_PREWARM', '').split(',')
+        if name.strip()
+    ]
+
+    # API key validation cache (results keyed by a hash of the key)
+    KEY_VALIDATION_TTL = int(os.getenv('KEY_VALIDATION_TTL', 15 * 60))  # seconds
+    KEY_VALIDATION_INVALID_TTL = int(os.getenv('KEY_VALIDATION_INVALID_TTL', 60))
+    KEY_VALIDATION_REFRESH_AFTER = int(os.getenv('KEY_VALIDATION_REFRESH_AFTER', 5 * 60))
+    KEY_VALIDATION_CACHE_SIZE = int(os.getenv('KEY_VALIDATION_CACHE_SIZE', 1024))
+
+    # Image preprocessing before provider upload
+    IMAGE_MAX_DIMENSIONS = {
+        'gemini': int(os.getenv('GEMINI_IMAGE_MAX_DIMENSION', 1536)),
+        'openai': int(os.getenv('OPENAI_IMAGE_MAX_DIMENSION', 1536)),
+        'anthropic': int(os.getenv('ANTHROPIC_IMAGE_MAX_DIMENSION', 1568)),
+    }
+    DEFAULT_IMAGE_MAX_DIMENSION = int(os.getenv('DEFAULT_IMAGE_MAX_DIMENSION', 1536))
+    IMAGE_ENCODE_FORMAT = os.getenv('IMAGE_ENCODE_FORMAT', 'JPEG')  # JPEG or WEBP
+    IMAGE_ENCODE_QUALITY = int(os.getenv('IMAGE_ENCODE_QUALITY', 85))
+
+    # Batch generation
+    BATCH_MAX_FILES = int(os.getenv('BATCH_MAX_FILES', 10))
+    BATCH_MAX_WORKERS = int(os.getenv('BATCH_MAX_WORKERS', 16))
+
+    # Admission control: per-provider call caps with a bounded wait queue, and
+    # an optional per-worker cap on in-flight recipe requests (0 = no cap)
+    PROVIDER_CONCURRENCY = {
+        'gemini': int(os.getenv('GEMINI_CONCURRENCY', 16)),
+        'openai': int(os.getenv('OPENAI_CONCURRENCY', 16)),
+        'anthropic': int(os.getenv('ANTHROPIC_CONCURRENCY', 16)),
+    }
+    DEFAULT_PROVIDER_CONCURRENCY = int(os.getenv('DEFAULT_PROVIDER_CONCURRENCY', 16))
+    PROVIDER_QUEUE_SIZE = int(os.getenv('PROVIDER_QUEUE_SIZE', 16))
+    PROVIDER_QUEUE_TIMEOUT = float(os.getenv('PROVIDER_QUEUE_TIMEOUT', 5.0))
+    ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', 0))
+
+    # Deadlines: each recipe request gets an overall time budget (X-Request-Timeout
+    # header, capped at REQUEST_TIMEOUT_MAX) that bounds every provider attempt
+    REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', 60.0))
+    REQUEST_TIMEOUT_MAX = float(os.getenv('REQUEST_TIMEOUT_MAX', 120.0))
+    PROVIDER_CONNECT_TIMEOUT = float(os.getenv('PROVIDER_CONNECT_TIMEOUT', 5.0))
+    PROVIDER_MIN_ATTEMPT_SECONDS = float(os.getenv('PROVIDER_MIN_ATTEMPT_SECONDS', 2.0))
+    # Retries of rate-limited, 5xx and timed-out provider calls, with full-jitter backoff
+    PROVIDER_MAX_RETRIES = int(os.getenv('PROVIDER_MAX_RETRIES', 2))
+    PROVIDER_RETRY_BASE_DELAY = float(os.getenv('PROVIDER_RETRY_BASE_DELAY', 0.5))
+    PROVIDER_RETRY_MAX_DELAY = float(os.getenv('PROVIDER_RETRY_MAX_DELAY', 8.0))
+
+    # Rate limiting: token buckets per client IP and per hashed API key
+    RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'memory')  # memory, sqlite or redis
+    RATE_LIMIT_SQLITE_PATH = os.getenv('RATE_LIMIT_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-ratelimit.sqlite3'))
+    RATE_LIMIT_REDIS_URL = os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0')
+    RATE_LIMIT_MAX_KEYS = int(os.getenv('RATE_LIMIT_MAX_KEYS', 100000))
+    RATE_LIMIT_IP_PER_MINUTE = float(os.getenv('RATE_LIMIT_IP_PER_MINUTE', 10))
+    RATE_LIMIT_IP_BURST = float(os.getenv('RATE_LIMIT_IP_BURST', 5))
+    RATE_LIMIT_KEY_PER_MINUTE = float(os.getenv('RATE_LIMIT_KEY_PER_MINUTE', 60))
+    RATE_LIMIT_KEY_BURST = float(os.getenv('RATE_LIMIT_KEY_BURST', 20))
+    RATE_LIMIT_VALIDATE_PER_MINUTE = float(os.getenv('RATE_LIMIT_VALIDATE_PER_MINUTE', 20))
+    RATE_LIMIT_VALIDATE_BURST = float(os.getenv('RATE_LIMIT_VALIDATE_BURST', 5))
+    # Reverse proxies in front of the app whose X-Forwarded-For entries are trusted
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+
+    # Provider latency tracking
+    LATENCY_WINDOW_SIZE = int(os.getenv('LATENCY_WINDOW_SIZE', 200))
+
+    # Provider routing and circuit breakers
+    ROUTER_ENABLED = os.getenv('ROUTER_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    PROVIDER_FALLBACK_CHAIN = os.getenv(
+        'PROVIDER_FALLBACK_CHAIN',
+        'gemini:gemini-2.5-flash,openai:gpt-4o-mini,anthropic',
+    )  # provider[:model] entries, comma separated
+    ROUTER_MIN_SAMPLES = int(os.getenv('ROUTER_MIN_SAMPLES', 5))
+    BREAKER_WINDOW_SIZE = int(os.getenv('BREAKER_WINDOW_SIZE', 20))
+    BREAKER_MIN_CALLS = int(os.getenv('BREAKER_MIN_CALLS', 5))
+    BREAKER_FAILURE_RATE = float(os.getenv('BREAKER_FAILURE_RATE', 0.5))
+    BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', 45.0))
+    BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', 30.0))
+
+    # Hedged requests (race a backup provider when the primary is slow)
+    HEDGE_ENABLED = os.getenv('HEDGE_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    HEDGE_SECONDARY_PROVIDER = os.getenv('HEDGE_SECONDARY_PROVIDER', 'openai')
+    HEDGE_SECONDARY_MODEL = os.getenv('HEDGE_SECONDARY_MODEL', '')
+    HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+    HEDGE_MIN_SAMPLES = int(os.getenv('HEDGE_MIN_SAMPLES', 20))
+    HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 8.0))  # seconds
+    HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 1.0))
+    HEDGE_MAX_DELAY = float(os.getenv('HEDGE_MAX_DELAY', 20.0))
+    HEDGE_MAX_WORKERS = int(os.getenv('HEDGE_MAX_WORKERS', 32))
+
+    # Progressive resolution (send a small image first, a larger one only when the answer falls short)
+    PROGRESSIVE_ENABLED = os.getenv('PROGRESSIVE_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    # Longest edges to try, smallest first, before the provider's full IMAGE_MAX_DIMENSIONS size
+    PROGRESSIVE_TIERS: ClassVar[list[int]] = [
+        int(size)
+        for size in os.getenv('PROGRESSIVE_TIERS', '512').split(',')
+        if size.strip()
+    ]
+    PROGRESSIVE_MIN_CONFIDENCE = float(os.getenv('PROGRESSIVE_MIN_CONFIDENCE', 0.6))  # 0-1, as reported by the model
+
+    # Coalescing of identical in-flight requests
+    COALESCE_ENABLED = os.getenv('COALESCE_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+    COALESCE_LOCK_BACKEND = os.getenv('COALESCE_LOCK_BACKEND', 'none')  # none or sqlite (cross-worker)
+    COALESCE_LOCK_PATH = os.getenv('COALESCE_LOCK_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-locks.sqlite3'))
+    COALESCE_LOCK_TTL = float(os.getenv('COALESCE_LOCK_TTL', 120.0))  # seconds before a stuck lock is ignored
+    COALESCE_WAIT_TIMEOUT = float(os.getenv('COALESCE_WAIT_TIMEOUT', 90.0))
+    COALESCE_POLL_INTERVAL = float(os.getenv('COALESCE_POLL_INTERVAL', 0.2))
+    COALESCE_ERROR_LINGER = float(os.getenv('COALESCE_ERROR_LINGER', 5.0))
+
+    # Idempotency-Key on POST /generate-recipe, /generate-recipe/batch and /jobs:
+    # the final response is stored and replayed byte-for-byte on retry
+    IDEMPOTENCY_BACKEND = os.getenv('IDEMPOTENCY_BACKEND', 'sqlite')  # sqlite (shared by workers), memory (one worker only) or none
+    IDEMPOTENCY_PATH = os.getenv('IDEMPOTENCY_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-idempotency.sqlite3'))
+    IDEMPOTENCY_TTL = int(os.getenv('IDEMPOTENCY_TTL', 24 * 60 * 60))  # seconds a response can be replayed
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv('IDEMPOTENCY_MAX_ENTRIES', 10000))
+    IDEMPOTENCY_LOCK_TTL = float(os.getenv('IDEMPOTENCY_LOCK_TTL', 120.0))  # seconds before a crashed request's claim lapses
+    IDEMPOTENCY_WAIT_TIMEOUT = float(os.getenv('IDEMPOTENCY_WAIT_TIMEOUT', 90.0))  # a retry waits this long for the original, at most its deadline
+    IDEMPOTENCY_POLL_INTERVAL = float(os.getenv('IDEMPOTENCY_POLL_INTERVAL', 0.2))
+
+    # Field-level repair of incomplete recipes (text-only follow-up call)
+    RECIPE_REPAIR_ENABLED = os.getenv('RECIPE_REPAIR_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    RECIPE_REPAIR_MAX_FIELDS = int(os.getenv('RECIPE_REPAIR_MAX_FIELDS', 5))  # more invalid fields need a full regeneration
+
+    # Asynchronous jobs
+    JOB_STORE_BACKEND = os.getenv('JOB_STORE_BACKEND', 'memory')  # memory or sqlite
+    JOB_STORE_PATH = os.getenv('JOB_STORE_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-jobs.sqlite3'))
+    JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', 8))
+    JOB_MAX_QUEUE = int(os.getenv('JOB_MAX_QUEUE', 64))
+    JOB_TTL = int(os.getenv('JOB_TTL', 60 * 60))  # seconds a job is kept after its last update
+    JOB_MAX_STORED = int(os.getenv('JOB_MAX_STORED', 10000))  # memory store only
+    JOB_DEFAULT_RETRY_AFTER = int(os.getenv('JOB_DEFAULT_RETRY_AFTER', 10))  # seconds, until durations are known
+    JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', 0.5))  # seconds between /events polls
+
+    # Operational endpoints (/api/providers/status, /api/providers/keys); unset hides them
+    OPERATOR_TOKEN = os.getenv('OPERATOR_TOKEN', '')  # callers send 'Authorization: Bearer <token>'
+
+    # Metrics (/api/metrics in Prometheus text format)
+    METRICS_MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR', '')  # shared directory so every worker reports server-wide totals
+    METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1.0))  # seconds between per-worker snapshot writes
+
+    # Request tracing (X-Request-ID, Server-Timing, span export) and logging
+    TRACE_EXPORTER = os.getenv('TRACE_EXPORTER', 'none')  # none, jsonl or otlp
+    TRACE_JSONL_PATH = os.getenv('TRACE_JSONL_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-spans.jsonl'))
+    TRACE_OTLP_ENDPOINT = os.getenv('TRACE_OTLP_ENDPOINT', 'http://localhost:4318/v1/traces')
+    TRACE_EXPORT_QUEUE = int(os.getenv('TRACE_EXPORT_QUEUE', 1000))  # traces waiting for export before new ones are dropped
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', '%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s')
+
+    # ASGI server (uvicorn asgi:app): threads running the routes delegated to Flask
+    ASGI_WSGI_WORKERS = int(os.getenv('ASGI_WSGI_WORKERS', 10))
+
+    # Fake provider for offline load tests ('fake'); never enable in production
+    FAKE_PROVIDER_ENABLED = os.getenv('FAKE_PROVIDER_ENABLED', 'false').lower() in {'1', 'true', 'yes'}
+    FAKE_API_KEY = os.getenv('FAKE_API_KEY', 'fake')
+    FAKE_LATENCY_DISTRIBUTION = os.getenv('FAKE_LATENCY_DISTRIBUTION', 'lognormal')  # constant, uniform or lognormal
+    FAKE_LATENCY_MEDIAN = float(os.getenv('FAKE_LATENCY_MEDIAN', 1.5))  # seconds
+    FAKE_LATENCY_SPREAD = float(os.getenv('FAKE_LATENCY_SPREAD', 0.4))  # uniform: +/- seconds; lognormal: sigma
+    FAKE_LATENCY_PER_MB = float(os.getenv('FAKE_LATENCY_PER_MB', 0.0))  # seconds added per megabyte of image
+    FAKE_ERROR_RATE = float(os.getenv('FAKE_ERROR_RATE', 0.0))
+    FAKE_TRUNCATE_RATE = float(os.getenv('FAKE_TRUNCATE_RATE', 0.0))
+    FAKE_RESPONSES_PATH = os.getenv('FAKE_RESPONSES_PATH', '')  # JSON list of raw responses or recipe objects
+    FAKE_SEED = int(os.getenv('FAKE_SEED', 0))
+
+    # Recipe Result Cache
+    RECIPE_CACHE_BACKEND = os.getenv('RECIPE_CACHE_BACKEND', 'memory')  # memory, sqlite or none
+    RECIPE_CACHE_PATH = os.getenv('RECIPE_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'dishcovery-cache.sqlite3'))
+    RECIPE_CACHE_MAX_ENTRIES = int(os.getenv('RECIPE_CACHE_MAX_ENTRIES', 1024))
+    RECIPE_CACHE_MAX_BYTES = int(os.getenv('RECIPE_CACHE_MAX_BYTES', 32 * 1024 * 1024))  # 32MB default
+    RECIPE_CACHE_TTL = int(os.getenv('RECIPE_CACHE_TTL', 24 * 60 * 60))  # seconds
+
+    # Near-duplicate photo detection (perceptual hash over cached recipes)
+    NEAR_DUPLICATE_ENABLED = os.getenv('NEAR_DUPLICATE_ENABLED', 'true').lower() in {'1', 'true', 'yes'}
+    NEAR_DUPLICATE_MAX_DISTANCE = int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', 4))  # hamming bits out of 64
+    NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv('NEAR_DUPLICATE_MAX_ENTRIES', 100000))
 
     @classmethod
     def get_api_key_for(cls, provider: str | None) -> str | None:
@@ -49,14 +253,42 @@ class Config:
             provider: Provider name ('gemini', 'openai', or 'anthropic')
 
         Returns:
-            API key string from environment, or None if provider is invalid or key not set
+            API key string from environment (the first pooled key when only a
+            pool is configured), or None if provider is invalid or key not set
         """
         if not provider:
             return None
         env_attr = cls.PROVIDER_KEY_MAP.get(provider.lower())
         if not env_attr:
             return None
-        return getattr(cls, env_attr, None)
+        pool = cls.get_api_key_pool_for(provider)
+        return getattr(cls, env_attr, None) or (pool[0][0] if pool else None)
+
+    @classmethod
+    def get_api_key_pool_for(cls, provider: str | None) -> List[Tuple[str, int]]:
+        """List the server API keys pooled for a provider, with their weights.
+
+        Args:
+            provider: Provider name ('gemini', 'openai', 'anthropic' or 'fake')
+
+        Returns:
+            (api_key, weight) pairs: the single *_API_KEY first (weight 1)
+            unless the pool lists it, then the *_API_KEYS entries in order.
+            Empty if the provider is invalid or has no server key.
+        """
+        if not provider:
+            return []
+        single = getattr(cls, cls.PROVIDER_KEY_MAP.get(provider.lower(), ''), None)
+        pool = []
+        for entry in (getattr(cls, cls.PROVIDER_KEY_POOL_MAP.get(provider.lower(), ''), '') or '').split(','):
+            key, separator, weight = entry.strip().rpartition(':')
+            if not (separator and weight.isdigit()):
+                key, weight = entry.strip(), '1'
+            if key and key not in {pooled for pooled, _ in pool}:
+                pool.append((key, max(1, int(weight))))
+        if single and single not in {pooled for pooled, _ in pool}:
+            pool.insert(0, (single, 1))
+        return pool
 
     @classmethod
     def get_default_model_for(cls, provider: str | None) -> str | None:
@@ -71,3 +303,17 @@ class Config:
         if not provider:
             return None
         return cls.DEFAULT_MODELS.get(provider.lower())
+
+    @classmethod
+    def get_max_image_dimension_for(cls, provider: str | None) -> int:
+        """Get the longest image edge (in pixels) to send to the specified provider.
+
+        Args:
+            provider: Provider name ('gemini', 'openai', or 'anthropic')
+
+        Returns:
+            Maximum edge length, falling back to DEFAULT_IMAGE_MAX_DIMENSION
+        """
+        if not provider:
+            return cls.DEFAULT_IMAGE_MAX_DIMENSION
+        return cls.IMAGE_MAX_DIMENSIONS.get(provider.lower(), cls.DEFAULT_IMAGE_MAX_DIMENSION)
@@ -0,0 +1,107 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from api import admission
+from api import cache as cache_module
+from api import recipes
+from api.admission import ConcurrencyLimiter, Saturated
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client without a result cache or routing."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(admission, '_provider_limiter', None)
+    monkeypatch.setattr(admission, '_request_limiter', None)
+    monkeypatch.setattr(admission, '_request_limiter_ready', True)
+    monkeypatch.setattr(
+        recipes, 'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Paella'}), {'model': kwargs['model']}),
+    )
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def post_image(client):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(200, 120, 30)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+    )
+
+
+def test_released_slot_goes_to_the_oldest_waiter_and_full_queue_is_shed():
+    limiter = ConcurrencyLimiter({'gemini': 1}, default_limit=1, max_queue=1, queue_timeout=5.0)
+    limiter.acquire('gemini')
+    waited = []
+    waiter = threading.Thread(target=lambda: waited.append(limiter.acquire('gemini')))
+    waiter.start()
+    while limiter.snapshot()['gemini']['queued'] == 0:
+        time.sleep(0.001)
+
+    with pytest.raises(Saturated) as raised:
+        limiter.acquire('gemini')
+    assert raised.value.reason == 'queue_full'
+    assert raised.value.retry_after >= 1
+
+    limiter.release('gemini', held=0.5)
+    waiter.join(timeout=5)
+    assert waited and waited[0] > 0
+    assert limiter.snapshot()['gemini'] == {'limit': 1, 'active': 1, 'queued': 0, 'shed': 1}
+
+
+def test_waiting_past_the_queue_timeout_is_shed():
+    limiter = ConcurrencyLimiter({}, default_limit=1, max_queue=4, queue_timeout=0.05)
+    with limiter.slot('openai'):
+        started = time.monotonic()
+        with pytest.raises(Saturated) as raised:
+            limiter.acquire('openai')
+    assert raised.value.reason == 'queue_timeout'
+    assert time.monotonic() - started < 1.0
+    assert limiter.snapshot()['openai'] == {'limit': 1, 'active': 0, 'queued': 0, 'shed': 1}
+
+
+def test_busy_provider_returns_429_without_calling_it_or_tripping_the_breaker(client, monkeypatch):
+    limiter = ConcurrencyLimiter({'gemini': 1}, default_limit=1, max_queue=0, queue_timeout=0.0)
+    monkeypatch.setattr(admission, '_provider_limiter', limiter)
+    calls, outcomes = [], []
+    monkeypatch.setattr(recipes, 'generate_with_gemini', lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(recipes.get_provider_router(), 'record', lambda *args, **kwargs: outcomes.append(args))
+    limiter.acquire('gemini')
+
+    response = post_image(client)
+
+    assert response.status_code == 429
+    assert response.get_json()['error']['code'] == 'provider_busy'
+    assert int(response.headers['Retry-After']) >= 1
+    assert calls == [] and outcomes == []
+
+
+def test_request_cap_sheds_recipes_but_never_health_checks(client, monkeypatch):
+    limiter = ConcurrencyLimiter({}, default_limit=1, max_queue=0, queue_timeout=0.0)
+    monkeypatch.setattr(admission, '_request_limiter', limiter)
+    limiter.acquire('requests')
+
+    response = post_image(client)
+    assert response.status_code == 503
+    assert response.get_json()['error']['code'] == 'server_busy'
+    assert 'Retry-After' in response.headers
+    assert client.get('/api/health').status_code == 200
+
+    limiter.release('requests')
+    assert post_image(client).status_code == 200
+    assert limiter.snapshot()['requests']['active'] == 0
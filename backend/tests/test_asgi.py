@@ -0,0 +1,185 @@
+import asyncio
+import io
+import json
+import time
+
+import httpx
+import pytest
+from PIL import Image
+
+from api import admission
+from api import cache as cache_module
+from api import fake_provider as fake_module
+from api import providers
+from api.admission import ConcurrencyLimiter
+from api.asgi import create_asgi_app
+from api.fake_provider import FakeProvider
+from app import api_cors_options, create_app
+from config import Config
+
+
+@pytest.fixture
+def apps(monkeypatch):
+    """Create the Flask app and the ASGI app around it, with a fake provider taking 0.2s per call."""
+    monkeypatch.setattr(Config, 'FAKE_PROVIDER_ENABLED', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(fake_module, '_fake_provider', FakeProvider(distribution='constant', median=0.2, seed=1))
+    monkeypatch.setattr(admission, '_provider_limiter', ConcurrencyLimiter({}, default_limit=0, max_queue=0, queue_timeout=0.0))
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    with flask_app.test_client() as client:
+        yield client, create_asgi_app(flask_app, cors_options=api_cors_options())
+
+
+def png(color=(200, 120, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', (48, 48), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def form(image, filename='dish.png'):
+    return {'provider': 'fake', 'api_key': 'fake', 'language': 'en'}, {'file': (filename, image, 'image/png')}
+
+
+def run(asgi_app, *requests):
+    """Send requests (method, path, kwargs) to the ASGI app concurrently; returns responses in order."""
+    async def send_all():
+        transport = httpx.ASGITransport(app=asgi_app, client=('203.0.113.7', 4321))
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return await asyncio.gather(*(client.request(method, path, **kwargs) for method, path, kwargs in requests))
+    return asyncio.run(send_all())
+
+
+def post_recipe(image, filename='dish.png', **kwargs):
+    data, files = form(image, filename)
+    return ('POST', '/api/generate-recipe', {'data': data, 'files': files, **kwargs})
+
+
+def test_generate_recipe_matches_the_flask_endpoint(apps):
+    client, asgi_app = apps
+    image = png()
+    headers = {'Origin': 'https://dishcovery.example', 'X-Request-ID': 'req-42'}
+    data, files = form(image)
+
+    wsgi_response = client.post(
+        '/api/generate-recipe',
+        data={**data, 'file': (io.BytesIO(image), 'dish.png')},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+    (asgi_response,) = run(asgi_app, post_recipe(image, headers=headers))
+
+    assert asgi_response.status_code == wsgi_response.status_code == 200
+    assert asgi_response.content == wsgi_response.get_data()
+    for name in ('Content-Type', 'X-Request-ID', 'Access-Control-Allow-Origin', 'Access-Control-Expose-Headers', 'Vary'):
+        assert asgi_response.headers[name] == wsgi_response.headers[name]
+    timings = asgi_response.headers['Server-Timing']
+    assert 'read_upload;dur=' in timings and 'provider;dur=' in timings
+
+
+def test_errors_are_problem_responses_like_flask(apps, monkeypatch):
+    client, asgi_app = apps
+    not_an_image = b'<html>' + b'x' * 4096
+
+    responses = run(
+        asgi_app,
+        ('POST', '/api/generate-recipe', {'data': {'provider': 'fake'}}),
+        post_recipe(not_an_image),
+        post_recipe(png(), filename='dish.txt'),
+        post_recipe(png(), **{'data': {'provider': 'nope', 'api_key': 'k'}}),
+    )
+    wsgi_bodies = [
+        client.post('/api/generate-recipe', data={'provider': 'fake'}, content_type='multipart/form-data'),
+        client.post('/api/generate-recipe', data={'provider': 'fake', 'file': (io.BytesIO(not_an_image), 'dish.png')}),
+        client.post('/api/generate-recipe', data={'provider': 'fake', 'file': (io.BytesIO(png()), 'dish.txt')}),
+        client.post('/api/generate-recipe', data={'provider': 'nope', 'api_key': 'k', 'file': (io.BytesIO(png()), 'dish.png')}),
+    ]
+
+    assert [response.json()['error']['code'] for response in responses] == [
+        'missing_file', 'invalid_image', 'unsupported_file_type', 'unsupported_provider',
+    ]
+    assert [response.content for response in responses] == [response.get_data() for response in wsgi_bodies]
+    assert [response.status_code for response in responses] == [response.status_code for response in wsgi_bodies]
+
+    client.application.config['MAX_CONTENT_LENGTH'] = 1024
+    (too_large,) = run(asgi_app, post_recipe(png() + b'\0' * 2048))
+    assert too_large.status_code == 413
+    assert too_large.json()['error']['code'] == 'file_too_large'
+
+
+def test_concurrent_generations_wait_on_the_event_loop(apps, monkeypatch):
+    _, asgi_app = apps
+    monkeypatch.setattr(Config, 'COALESCE_ENABLED', False)
+    count = 100
+
+    started = time.monotonic()
+    responses = run(asgi_app, *(post_recipe(png((index, 80, 160))) for index in range(count)))
+    elapsed = time.monotonic() - started
+
+    assert all(response.status_code == 200 for response in responses)
+    assert {response.json()['meta']['provider'] for response in responses} == {'fake'}
+    # 100 provider calls of 0.2s each; well under the 20s they would take one at a time.
+    assert elapsed < 5
+
+
+def test_identical_uploads_in_flight_share_one_generation(apps, monkeypatch):
+    _, asgi_app = apps
+    calls = []
+    generate_async = fake_module._fake_provider.generate_async
+
+    async def counting_generate(**kwargs):
+        calls.append(kwargs['model'])
+        return await generate_async(**kwargs)
+
+    monkeypatch.setattr(fake_module._fake_provider, 'generate_async', counting_generate)
+    responses = run(asgi_app, *(post_recipe(png()) for _ in range(5)))
+
+    assert len(calls) == 1
+    assert sorted(bool(response.json()['meta'].get('coalesced')) for response in responses) == [False] + [True] * 4
+
+
+def test_validate_key_awaits_the_async_validator_once_per_key(apps, monkeypatch):
+    _, asgi_app = apps
+    monkeypatch.setattr(providers, '_validation_cache', None)
+    checked = []
+
+    async def validator(api_key):
+        checked.append(api_key)
+        await asyncio.sleep(0.05)
+        return {'valid': api_key == 'sk-good', 'models': [] if api_key == 'sk-good' else None}
+
+    monkeypatch.setitem(providers.ASYNC_KEY_VALIDATORS, 'openai', validator)
+    validate = ('POST', '/api/validate-key', {'json': {'provider': 'openai', 'apiKey': 'sk-good'}})
+
+    responses = run(
+        asgi_app,
+        validate,
+        validate,
+        ('POST', '/api/validate-key', {'json': {'provider': 'openai', 'apiKey': 'sk-bad'}}),
+        ('POST', '/api/validate-key', {'json': {'provider': 'nope', 'apiKey': 'k'}}),
+        ('POST', '/api/validate-key', {'content': b'not json', 'headers': {'Content-Type': 'application/json'}}),
+    )
+
+    assert [response.status_code for response in responses] == [200, 200, 401, 400, 400]
+    assert sorted(checked) == ['sk-bad', 'sk-good']
+    assert responses[3].json()['error']['code'] == 'invalid_provider'
+    assert responses[4].json()['error']['code'] == 'invalid_json'
+
+
+def test_other_routes_are_served_by_flask(apps):
+    client, asgi_app = apps
+    health, preflight = run(
+        asgi_app,
+        ('GET', '/api/health', {}),
+        ('OPTIONS', '/api/generate-recipe', {'headers': {
+            'Origin': 'https://dishcovery.example',
+            'Access-Control-Request-Method': 'POST',
+        }}),
+    )
+
+    assert health.json() == json.loads(client.get('/api/health').get_data())
+    assert preflight.status_code == 200
+    assert preflight.headers['Access-Control-Allow-Origin'] == 'https://dishcovery.example'
+    assert 'POST' in preflight.headers['Access-Control-Allow-Methods']
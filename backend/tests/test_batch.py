@@ -0,0 +1,129 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from api import admission, batch
+from api import cache as cache_module
+from api import recipes
+from api.admission import ConcurrencyLimiter
+from app import create_app
+from config import Config
+
+
+def provider_limiter(gemini_limit):
+    return ConcurrencyLimiter({'gemini': gemini_limit}, default_limit=16, max_queue=10, queue_timeout=5)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with caching disabled and fresh provider admission limits."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(admission, '_provider_limiter', provider_limiter(5))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def slow_handler(monkeypatch):
+    """Gemini stub that sleeps and records peak concurrency."""
+    state = {'active': 0, 'peak': 0, 'calls': 0}
+    lock = threading.Lock()
+
+    def handler(**kwargs):
+        with lock:
+            state['active'] += 1
+            state['calls'] += 1
+            state['peak'] = max(state['peak'], state['active'])
+        time.sleep(0.2)
+        with lock:
+            state['active'] -= 1
+        color = Image.open(io.BytesIO(kwargs['image_bytes'])).getpixel((0, 0))
+        return json.dumps({'name': f'Dish {color[0] // 10}'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    return state
+
+
+def image_file(red, name):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(red, 0, 0)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return (buffer, name)
+
+
+def post_batch(client, files, **form):
+    data = {'files': files, 'provider': 'gemini', 'api_key': 'test-key'}
+    data.update(form)
+    return client.post('/api/generate-recipe/batch', data=data, content_type='multipart/form-data')
+
+
+def test_batch_fans_out_and_keeps_order(client, slow_handler):
+    files = [image_file(red, f'dish{index}.png') for index, red in enumerate((10, 50, 100, 150, 200))]
+    started = time.perf_counter()
+    response = post_batch(client, files)
+    elapsed = time.perf_counter() - started
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert [item['recipe']['title'] for item in data['results']] == ['Dish 1', 'Dish 5', 'Dish 10', 'Dish 15', 'Dish 20']
+    assert [item['filename'] for item in data['results']] == [f'dish{index}.png' for index in range(5)]
+    assert data['meta']['succeeded'] == 5
+    assert slow_handler['peak'] == 5
+    assert elapsed < 0.6
+
+
+def test_batch_respects_provider_concurrency_cap(client, slow_handler, monkeypatch):
+    monkeypatch.setattr(admission, '_provider_limiter', provider_limiter(2))
+    files = [image_file(red, f'dish{red}.png') for red in (10, 20, 30, 40, 50)]
+    response = post_batch(client, files)
+    assert response.get_json()['meta']['succeeded'] == 5
+    assert slow_handler['peak'] == 2
+
+
+def test_batch_reports_per_item_errors(client, slow_handler):
+    files = [
+        image_file(10, 'good.png'),
+        (io.BytesIO(b'not an image'), 'broken.jpg'),
+        (io.BytesIO(b'text'), 'notes.txt'),
+    ]
+    data = post_batch(client, files).get_json()
+    results = data['results']
+    assert results[0]['success'] is True
+    assert results[1]['success'] is False and results[1]['error']['code'] == 'invalid_image'
+    assert results[2]['success'] is False and results[2]['error']['code'] == 'unsupported_file_type'
+    assert data['meta'] == {**data['meta'], 'count': 3, 'succeeded': 1, 'failed': 2}
+    assert slow_handler['calls'] == 1
+
+
+def test_batch_shared_option_errors_fail_the_request(client):
+    response = post_batch(client, [image_file(10, 'a.png')], provider='unknown')
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'unsupported_provider'
+
+
+def test_batch_requires_files(client):
+    response = client.post('/api/generate-recipe/batch', data={}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'missing_file'
+
+
+def test_batch_items_get_their_own_deadlines(client, monkeypatch):
+    deadlines = []
+
+    def pipeline(recipe_request):
+        deadlines.append(recipe_request.deadline)
+        return {'success': True}
+
+    monkeypatch.setattr(batch, 'run_recipe_pipeline', pipeline)
+    response = post_batch(client, [image_file(10, 'a.png'), image_file(20, 'b.png')])
+
+    assert response.get_json()['meta']['succeeded'] == 2
+    assert len({id(deadline) for deadline in deadlines}) == 2
+    assert all(0 < deadline.budget <= Config.REQUEST_TIMEOUT for deadline in deadlines)
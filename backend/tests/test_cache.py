@@ -0,0 +1,159 @@
+import io
+import json
+import time
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api import similarity
+from api.cache import MemoryCacheBackend, RecipeCache, SQLiteCacheBackend, make_cache_key
+from app import create_app
+
+RECIPE_JSON = json.dumps({
+    'name': 'Tomato Soup',
+    'prep_time': '10 min',
+    'cook_time': '20 min',
+    'servings': '2',
+    'ingredients_with_measurements': ['4 tomatoes'],
+    'instructions': ['Simmer the tomatoes.'],
+    'nutrition': {'calories': '120 kcal'},
+    'tips': 'Serve hot.',
+})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with a fresh in-memory recipe cache."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(
+        MemoryCacheBackend(max_entries=16, max_bytes=1024 * 1024), default_ttl=60,
+    ))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(similarity, '_similarity_index', None)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def handler_calls(monkeypatch):
+    """Replace the Gemini handler with a counting stub."""
+    calls = []
+
+    def fake_handler(**kwargs):
+        calls.append(kwargs)
+        return RECIPE_JSON, {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', fake_handler)
+    return calls
+
+
+def create_test_image(color='red'):
+    """Create a simple test image in memory."""
+    img = Image.new('RGB', (32, 32), color=color)
+    img_bytes = io.BytesIO()
+    img.save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
+
+def post_image(client, image_bytes, **form):
+    data = {'file': (io.BytesIO(image_bytes), 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'}
+    data.update(form)
+    return client.post('/api/generate-recipe', data=data, content_type='multipart/form-data')
+
+
+def test_cache_key_depends_on_every_prompt_input():
+    """Changing the image or any prompt input produces a different key."""
+    base = dict(language='en', dietary_restrictions='', cuisine_preference='', provider='gemini', model='m')
+    key = make_cache_key(b'image', **base)
+    assert key == make_cache_key(b'image', **base)
+    assert key != make_cache_key(b'other', **base)
+    for field, value in [('language', 'es'), ('dietary_restrictions', 'vegan'), ('cuisine_preference', 'Thai'),
+                         ('provider', 'openai'), ('model', 'n')]:
+        assert key != make_cache_key(b'image', **{**base, field: value})
+
+
+def test_memory_backend_evicts_least_recently_used_by_count():
+    backend = MemoryCacheBackend(max_entries=2, max_bytes=1024)
+    backend.set('a', b'1', 60)
+    backend.set('b', b'2', 60)
+    assert backend.get('a') == b'1'
+    backend.set('c', b'3', 60)
+    assert backend.get('b') is None
+    assert backend.get('a') == b'1'
+    assert backend.get('c') == b'3'
+
+
+def test_memory_backend_evicts_by_size_and_expires_entries():
+    backend = MemoryCacheBackend(max_entries=10, max_bytes=10)
+    backend.set('a', b'12345', 60)
+    backend.set('b', b'123456', 60)
+    assert backend.get('a') is None
+    assert backend.stats()['bytes'] == 6
+    backend.set('c', b'1', 0.01)
+    time.sleep(0.02)
+    assert backend.get('c') is None
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    writer = SQLiteCacheBackend(path, max_entries=2, max_bytes=1024)
+    reader = SQLiteCacheBackend(path, max_entries=2, max_bytes=1024)
+    writer.set('a', b'1', 60)
+    assert reader.get('a') == b'1'
+    writer.set('b', b'2', 60)
+    writer.set('c', b'3', 60)
+    assert reader.stats()['entries'] == 2
+    assert reader.get('a') is None
+
+
+def test_repeat_upload_is_served_from_cache(client, handler_calls):
+    image = create_test_image()
+    first = post_image(client, image)
+    assert first.status_code == 200
+    assert first.get_json()['meta']['cache']['status'] == 'miss'
+
+    second = post_image(client, image)
+    data = second.get_json()
+    assert second.status_code == 200
+    assert data['meta']['cache']['status'] == 'hit'
+    assert data['recipe']['title'] == 'Tomato Soup'
+    assert len(handler_calls) == 1
+
+
+def test_different_prompt_inputs_miss_the_cache(client, handler_calls):
+    image = create_test_image()
+    post_image(client, image)
+    response = post_image(client, image, language='es')
+    assert response.get_json()['meta']['cache']['status'] == 'miss'
+    assert len(handler_calls) == 2
+
+
+def test_no_cache_header_bypasses_lookup(client, handler_calls):
+    image = create_test_image()
+    post_image(client, image)
+    response = client.post(
+        '/api/generate-recipe',
+        data={'file': (io.BytesIO(image), 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+        headers={'Cache-Control': 'no-cache'},
+    )
+    assert response.get_json()['meta']['cache']['status'] == 'bypass'
+    assert len(handler_calls) == 2
+
+
+def test_unparseable_responses_are_not_cached(client, monkeypatch):
+    calls = []
+
+    def fake_handler(**kwargs):
+        calls.append(kwargs)
+        return 'not json at all', {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', fake_handler)
+    image = create_test_image('blue')
+    post_image(client, image)
+    response = post_image(client, image)
+    assert response.get_json()['meta']['cache']['status'] == 'miss'
+    assert len(calls) == 2
@@ -0,0 +1,165 @@
+import asyncio
+import threading
+
+import google.generativeai as genai
+import pytest
+
+from api import clients, recipes
+from api.clients import ClientRegistry, fingerprint_api_key
+
+
+@pytest.fixture
+def registry():
+    """Registry whose factories build plain marker objects."""
+    created = []
+
+    def factory(api_key):
+        client = {'api_key': api_key}
+        created.append(client)
+        return client
+
+    registry = ClientRegistry({'openai': factory, 'gemini': factory}, max_size=2, idle_ttl=60)
+    registry.created_clients = created
+    return registry
+
+
+def test_registry_reuses_client_per_provider_and_key(registry):
+    first = registry.get('openai', 'sk-one')
+    assert registry.get('openai', 'sk-one') is first
+    assert registry.get('openai', 'sk-two') is not first
+    assert registry.get('gemini', 'sk-one') is not first
+    assert registry.stats()['reused'] == 1
+
+
+def test_registry_never_stores_raw_keys(registry):
+    registry.get('openai', 'sk-secret')
+    assert all('sk-secret' not in part for key in registry._clients for part in key)
+    assert ('openai', fingerprint_api_key('sk-secret')) in registry._clients
+
+
+def test_registry_is_bounded_and_evicts_least_recently_used(registry):
+    a = registry.get('openai', 'a')
+    registry.get('openai', 'b')
+    registry.get('openai', 'a')
+    registry.get('openai', 'c')
+    assert registry.stats()['clients'] == 2
+    assert registry.get('openai', 'a') is a
+    assert len(registry.created_clients) == 3
+    registry.get('openai', 'b')
+    assert len(registry.created_clients) == 4
+
+
+def test_registry_evicts_idle_clients(registry, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(clients.time, 'monotonic', lambda: now[0])
+    first = registry.get('openai', 'a')
+    now[0] += 61
+    assert registry.get('openai', 'a') is not first
+
+
+def test_registry_builds_one_client_under_concurrency(registry):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(registry.get('openai', 'shared'))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(registry.created_clients) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_registry_builds_clients_outside_its_lock():
+    started = threading.Event()
+    release = threading.Event()
+
+    def factory(api_key):
+        if api_key == 'slow':
+            started.set()
+            release.wait(5)
+        return {'api_key': api_key}
+
+    registry = ClientRegistry({'openai': factory}, max_size=4, idle_ttl=60)
+    slow = threading.Thread(target=registry.get, args=('openai', 'slow'))
+    slow.start()
+    started.wait(5)
+
+    assert registry.get('openai', 'fast') == {'api_key': 'fast'}
+    release.set()
+    slow.join(5)
+    assert registry.stats()['clients'] == 2
+
+
+def test_registry_failed_builds_are_not_cached():
+    attempts = []
+
+    def factory(api_key):
+        attempts.append(api_key)
+        if len(attempts) == 1:
+            raise RuntimeError('boom')
+        return {'api_key': api_key}
+
+    registry = ClientRegistry({'openai': factory}, max_size=2, idle_ttl=60)
+    with pytest.raises(RuntimeError):
+        registry.get('openai', 'a')
+    assert registry.get('openai', 'a') == {'api_key': 'a'}
+
+
+def test_scoped_registry_rebuilds_clients_per_event_loop(registry):
+    scoped = ClientRegistry(registry.factories, max_size=2, idle_ttl=60, scope=asyncio.get_running_loop)
+
+    async def get_twice():
+        return scoped.get('openai', 'a'), scoped.get('openai', 'a')
+
+    first, again = asyncio.run(get_twice())
+    other_loop, _ = asyncio.run(get_twice())
+
+    assert first is again
+    assert other_loop is not first
+    assert scoped.stats() == {'clients': 1, 'created': 2, 'reused': 2}
+
+
+def test_gemini_clients_do_not_touch_global_configuration(monkeypatch):
+    def fail(**kwargs):
+        raise AssertionError('genai.configure must not be called')
+
+    monkeypatch.setattr(genai, 'configure', fail)
+    first = clients._make_gemini_client('key-one')
+    second = clients._make_gemini_client('key-two')
+    assert first is not second
+
+
+def test_sdk_clients_share_provider_http_pool():
+    first = clients._make_openai_client('sk-one')
+    second = clients._make_openai_client('sk-two')
+    assert first._client is second._client is clients.get_http_pool('openai')
+
+
+def test_gemini_handler_calls_the_service_client_without_retries(monkeypatch):
+    import google.generativeai as genai
+
+    calls = []
+
+    class FakeClient:
+        def generate_content(self, request, **options):
+            calls.append((request, options))
+            part = genai.protos.Part(text='{"name": "Soup"}')
+            return genai.protos.GenerateContentResponse(candidates=[genai.protos.Candidate(content=genai.protos.Content(parts=[part]))])
+
+    monkeypatch.setattr(clients, '_registry', ClientRegistry({'gemini': lambda api_key: FakeClient()}, max_size=1, idle_ttl=60))
+
+    text, meta = recipes.generate_with_gemini(
+        image_bytes=memoryview(b'jpeg'), prompt='Describe', model='gemini-2.5-flash', api_key='k', mime_type='image/jpeg',
+    )
+
+    assert (text, meta) == ('{"name": "Soup"}', {'model': 'gemini-2.5-flash'})
+    request, options = calls[0]
+    assert request.model == 'models/gemini-2.5-flash'
+    assert [part.text for part in request.contents[0].parts][0] == 'Describe'
+    assert request.contents[0].parts[1].inline_data.data == b'jpeg'
+    assert options == {'retry': None}
@@ -0,0 +1,178 @@
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import coalescing, recipes
+from api.cache import MemoryCacheBackend, RecipeCache, SQLiteCacheBackend
+from api.coalescing import FAILED, RUNNING, SingleFlight, SQLiteFlightLocks
+from api.uploads import SpooledUpload
+from app import create_app
+from config import Config
+
+WORKERS = 8
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """Create an app with an empty in-memory cache and in-process coalescing only."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(MemoryCacheBackend(max_entries=10, max_bytes=10**6), default_ttl=60))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(coalescing, '_flight_locks', None)
+    monkeypatch.setattr(coalescing, '_flight_locks_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+def counting_handler(monkeypatch, *, delay=0.3, error=None):
+    calls = []
+    lock = threading.Lock()
+
+    def handler(**kwargs):
+        with lock:
+            calls.append(kwargs['model'])
+        time.sleep(delay)
+        if error is not None:
+            raise error
+        return json.dumps({'name': 'Shared Stew'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    return calls
+
+
+def image_bytes():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(70, 140, 210)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def post_concurrently(app, count, api_keys=('test-key',), **headers):
+    payload = image_bytes()
+    barrier = threading.Barrier(count)
+
+    def post(index):
+        with app.test_client() as client:
+            barrier.wait()
+            return client.post(
+                '/api/generate-recipe',
+                data={'file': (io.BytesIO(payload), 'dish.png'), 'provider': 'gemini', 'api_key': api_keys[index % len(api_keys)]},
+                content_type='multipart/form-data',
+                headers=headers,
+            )
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(post, range(count)))
+
+
+def test_identical_concurrent_requests_share_one_provider_call(app, monkeypatch):
+    calls = counting_handler(monkeypatch)
+
+    responses = post_concurrently(app, WORKERS)
+
+    assert len(calls) == 1
+    bodies = [response.get_json() for response in responses]
+    assert all(response.status_code == 200 for response in responses)
+    assert {body['recipe']['title'] for body in bodies} == {'Shared Stew'}
+    assert sum(1 for body in bodies if body['meta'].get('coalesced')) == WORKERS - 1
+
+
+def test_requests_with_different_api_keys_are_not_coalesced(app, monkeypatch):
+    calls = counting_handler(monkeypatch)
+
+    responses = post_concurrently(app, 4, api_keys=('key-a', 'key-b'), **{'Cache-Control': 'no-cache'})
+
+    assert len(calls) == 2
+    assert sum(1 for response in responses if response.get_json()['meta'].get('coalesced')) == 2
+
+
+def test_waiters_give_up_at_their_deadline(app, monkeypatch):
+    monkeypatch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 0.1)
+    calls = counting_handler(monkeypatch, delay=1.0)
+
+    responses = post_concurrently(app, 2, **{'X-Request-Timeout': '0.5'})
+
+    assert len(calls) == 1
+    assert sorted(response.status_code for response in responses) == [200, 504]
+    assert {response.get_json().get('error', {}).get('code') for response in responses} == {None, 'deadline_exceeded'}
+
+
+def test_single_flight_waiter_timeout_leaves_the_call_running():
+    group = SingleFlight()
+    release = threading.Event()
+    leader = ThreadPoolExecutor(max_workers=1).submit(group.do, 'key', lambda: release.wait(5) and 'done')
+    while not group.in_flight():
+        time.sleep(0.01)
+
+    with pytest.raises(TimeoutError):
+        group.do('key', lambda: 'never', timeout=0.05)
+    release.set()
+    assert leader.result(5) == ('done', False)
+
+
+def test_concurrent_waiters_share_provider_error(app, monkeypatch):
+    calls = counting_handler(monkeypatch, error=recipes.ProviderError('gemini_error', 'Gemini could not process the image.'))
+
+    responses = post_concurrently(app, WORKERS, **{'Cache-Control': 'no-cache'})
+
+    assert len(calls) == 1
+    assert {response.status_code for response in responses} == {500}
+    assert {response.get_json()['error']['code'] for response in responses} == {'gemini_error'}
+
+
+def test_single_flight_runs_again_after_completion():
+    group = SingleFlight()
+    assert group.do('key', lambda: 1) == (1, False)
+    assert group.do('key', lambda: 2) == (2, False)
+    assert group.in_flight() == 0
+
+
+def test_flight_locks_hand_over_between_owners(tmp_path):
+    locks = SQLiteFlightLocks(str(tmp_path / 'locks.sqlite3'))
+    assert locks.acquire('k', 'a', ttl=60)
+    assert not locks.acquire('k', 'b', ttl=60)
+    assert locks.state('k') == (RUNNING, None)
+
+    locks.release('k', 'a', {'code': 'gemini_error'}, linger=60)
+    assert locks.state('k') == (FAILED, {'code': 'gemini_error'})
+    assert locks.acquire('k', 'b', ttl=60)
+    locks.release('k', 'b')
+    assert locks.state('k') == (None, None)
+
+    assert locks.acquire('stale', 'a', ttl=-1)
+    assert locks.acquire('stale', 'b', ttl=60)
+
+
+def test_workers_coalesce_through_shared_lock_store(tmp_path, monkeypatch):
+    """Separate single-flight groups stand in for separate worker processes."""
+    calls = counting_handler(monkeypatch)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'COALESCE_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(coalescing, '_flight_locks', SQLiteFlightLocks(str(tmp_path / 'locks.sqlite3')))
+    monkeypatch.setattr(coalescing, '_flight_locks_ready', True)
+    cache = RecipeCache(SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'), max_entries=10, max_bytes=10**6), default_ttl=60)
+    monkeypatch.setattr(cache_module, '_recipe_cache', cache)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+
+    payload = image_bytes()
+    form = {'provider': 'gemini', 'api_key': 'test-key'}
+    barrier = threading.Barrier(4)
+
+    def worker(_):
+        recipe_request = recipes.parse_recipe_request(SpooledUpload.from_bytes(payload), form, {})
+        lookup = recipes.RecipeCacheLookup(recipe_request)
+        barrier.wait()
+        return recipes.generate_with_worker_lock(recipe_request, lookup)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(worker, range(4)))
+
+    assert len(calls) == 1
+    assert {result['recipe']['title'] for result in results} == {'Shared Stew'}
+    assert sum(1 for result in results if result['meta'].get('coalesced')) == 3
@@ -0,0 +1,192 @@
+import asyncio
+import io
+import json
+import time
+
+import pytest
+from PIL import Image
+
+from api import aio, recipes
+from api import cache as cache_module
+from api.deadlines import Deadline, ProviderTimeout, request_deadline, retry_delay
+from api.fake_provider import FakeProvider
+from api.imaging import PreparedImage
+from api.recipes import ProviderError, ProviderTarget, get_provider_config
+from app import create_app
+from config import Config
+
+
+class StatusError(Exception):
+    """Stands in for an SDK error carrying the provider's HTTP status."""
+
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f'HTTP {status_code}')
+        self.status_code = status_code
+        self.response = type('Response', (), {'headers': {'retry-after': retry_after} if retry_after else {}})()
+
+
+def sdk_failure(status_code, **kwargs):
+    """A ProviderError wrapping an SDK error, as the real handlers raise them."""
+    try:
+        raise StatusError(status_code, **kwargs)
+    except StatusError as exc:
+        try:
+            raise ProviderError('gemini_error', 'Gemini could not process the image.') from exc
+        except ProviderError as error:
+            return error
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with caching disabled and short retry delays."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'PROVIDER_RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 0.1)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def gemini_stub(monkeypatch, outcomes, *, latency=0.0):
+    """Gemini stub returning or raising each outcome in turn; records the timeout of every call."""
+    timeouts = []
+
+    def handler(**kwargs):
+        timeouts.append(kwargs['timeout'])
+        time.sleep(latency)
+        outcome = outcomes[min(len(timeouts), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return json.dumps({'name': outcome}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    return timeouts
+
+
+def post_recipe(client, **headers):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(200, 120, 40)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+
+
+def test_transient_failures_are_retried_within_the_deadline(client, monkeypatch):
+    timeouts = gemini_stub(monkeypatch, [sdk_failure(503), sdk_failure(429), 'Third Time Lucky'])
+
+    response = post_recipe(client, **{'X-Request-Timeout': '30'})
+
+    assert response.status_code == 200
+    assert response.get_json()['recipe']['title'] == 'Third Time Lucky'
+    assert len(timeouts) == 3
+    assert all(isinstance(timeout, ProviderTimeout) for timeout in timeouts)
+    assert timeouts[0].connect == Config.PROVIDER_CONNECT_TIMEOUT
+    assert 29 < timeouts[0].total <= 30
+    assert timeouts[2].total < timeouts[0].total
+    assert 'backoff;dur=' in response.headers['Server-Timing']
+
+
+def test_client_errors_are_not_retried(client, monkeypatch):
+    timeouts = gemini_stub(monkeypatch, [sdk_failure(401), 'Never Reached'])
+
+    response = post_recipe(client)
+
+    assert response.status_code == 500
+    assert len(timeouts) == 1
+    budget = response.get_json()['error']['budget']
+    assert budget['attempts'] == 1
+    assert budget['budget_ms'] == Config.REQUEST_TIMEOUT * 1000
+
+
+def test_retries_stop_when_the_budget_runs_out(client, monkeypatch):
+    monkeypatch.setattr(Config, 'PROVIDER_MAX_RETRIES', 10)
+    timeouts = gemini_stub(monkeypatch, [sdk_failure(503)], latency=0.2)
+
+    started = time.monotonic()
+    response = post_recipe(client, **{'X-Request-Timeout': '1'})
+    elapsed = time.monotonic() - started
+
+    error = response.get_json()['error']
+    assert error['code'] in {'gemini_error', 'deadline_exceeded'}
+    assert elapsed < 1.5
+    assert 2 <= len(timeouts) < 10
+    assert error['budget']['budget_ms'] == 1000
+    assert error['budget']['attempts'] == len(timeouts)
+    spent = error['budget']['spent_ms']
+    assert spent['gemini/gemini-2.5-flash'] >= 200 * len(timeouts)
+    assert set(spent) >= {'queue', 'backoff', 'other'}
+
+
+def test_request_deadline_header_is_clamped_or_ignored(monkeypatch):
+    monkeypatch.setattr(Config, 'REQUEST_TIMEOUT', 60.0)
+    monkeypatch.setattr(Config, 'REQUEST_TIMEOUT_MAX', 120.0)
+
+    assert request_deadline({}).budget == 60.0
+    assert request_deadline({'X-Request-Timeout': '7.5'}).budget == 7.5
+    assert request_deadline({'X-Request-Timeout': '3600'}).budget == 120.0
+    for unusable in ('soon', '-1', 'inf', 'nan', '0'):
+        assert request_deadline({'X-Request-Timeout': unusable}).budget == 60.0
+
+
+def test_retry_delay_backs_off_with_jitter_and_respects_the_budget(monkeypatch):
+    monkeypatch.setattr(Config, 'PROVIDER_MAX_RETRIES', 3)
+    monkeypatch.setattr(Config, 'PROVIDER_RETRY_BASE_DELAY', 0.5)
+    monkeypatch.setattr(Config, 'PROVIDER_RETRY_MAX_DELAY', 1.5)
+    monkeypatch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 2.0)
+    deadline = Deadline(60.0)
+
+    for attempt, ceiling in enumerate((0.5, 1.0, 1.5)):
+        delays = {retry_delay(sdk_failure(503), attempt, deadline) for _ in range(50)}
+        assert all(0.0 <= delay <= ceiling for delay in delays)
+        assert len(delays) > 1
+    assert retry_delay(sdk_failure(503), 3, deadline) is None
+    assert retry_delay(sdk_failure(400), 0, deadline) is None
+    assert retry_delay(ProviderError('empty_response', 'Nothing came back.'), 0, deadline) is None
+    assert retry_delay(ProviderError('fake_error', 'Unavailable.', status=503), 0, deadline) is not None
+
+    assert retry_delay(sdk_failure(429, retry_after='12'), 0, deadline) == 12.0
+    assert retry_delay(sdk_failure(429, retry_after='12'), 0, Deadline(13.0)) is None
+
+
+def test_fake_provider_gives_up_at_the_timeout():
+    slept = []
+    provider = FakeProvider(distribution='constant', median=5.0, sleep=slept.append, seed=1)
+
+    with pytest.raises(ProviderError) as raised:
+        provider.generate(image_bytes=None, prompt='p', model='fake', api_key='k', mime_type=None,
+                          timeout=ProviderTimeout(connect=0.1, read=0.4))
+
+    assert raised.value.status == 504
+    assert slept == [0.5]
+
+
+def test_async_calls_retry_and_charge_the_deadline(monkeypatch):
+    monkeypatch.setattr(Config, 'PROVIDER_RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 0.1)
+    calls = []
+
+    async def flaky(**kwargs):
+        calls.append(kwargs['timeout'])
+        if len(calls) == 1:
+            raise sdk_failure(502)
+        return 'text', {'model': kwargs['model']}
+
+    provider_config = {**get_provider_config('gemini'), 'async_handler': flaky}
+    target = ProviderTarget('gemini', provider_config, 'test-key', 'gemini-2.5-flash')
+    prepared = PreparedImage(memoryview(b'image'), 'image/jpeg', 1, 1)
+    deadline = Deadline(5.0)
+
+    result = asyncio.run(aio.call_provider_async(target, prepared, 'prompt', deadline))
+
+    assert result == ('text', {'model': 'gemini-2.5-flash'})
+    assert len(calls) == 2 and calls[1].total < calls[0].total <= 5.0
+    breakdown = deadline.breakdown()
+    assert breakdown['attempts'] == 2
+    assert breakdown['spent_ms']['backoff'] > 0
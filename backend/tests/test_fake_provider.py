@@ -0,0 +1,105 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import fake_provider as fake_module
+from api.fake_provider import CANNED_RECIPE, FakeProvider
+from api.recipes import ProviderError, get_provider_config
+from app import create_app
+from config import Config
+
+CALL = {'image_bytes': b'jpeg', 'prompt': 'p', 'model': 'fake-recipe-1', 'api_key': 'fake', 'mime_type': 'image/jpeg'}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with an instant fake provider enabled."""
+    monkeypatch.setattr(Config, 'FAKE_PROVIDER_ENABLED', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(fake_module, '_fake_provider', FakeProvider(distribution='constant', median=0.0, seed=1))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def recorder():
+    sleeps = []
+    return sleeps, sleeps.append
+
+
+def test_fake_provider_is_registered_only_when_enabled(monkeypatch):
+    assert get_provider_config('fake') is None
+    monkeypatch.setattr(Config, 'FAKE_PROVIDER_ENABLED', True)
+    assert get_provider_config('fake')['default_model'] == 'fake-recipe-1'
+
+
+def test_same_seed_draws_the_same_latencies():
+    runs = []
+    for _ in range(2):
+        sleeps, sleep = recorder()
+        provider = FakeProvider(distribution='lognormal', median=1.0, spread=0.5, seed=42, sleep=sleep)
+        for _ in range(20):
+            provider.generate(**CALL)
+        runs.append(sleeps)
+    assert runs[0] == runs[1]
+    assert len(set(runs[0])) == 20
+    assert sorted(runs[0])[10] == pytest.approx(1.0, rel=0.5)
+
+
+def test_uniform_latency_stays_within_spread():
+    sleeps, sleep = recorder()
+    provider = FakeProvider(distribution='uniform', median=1.0, spread=0.25, seed=3, sleep=sleep)
+    for _ in range(50):
+        provider.generate(**CALL)
+    assert all(0.75 <= seconds <= 1.25 for seconds in sleeps)
+
+
+def test_errors_and_truncation_follow_their_rates():
+    failing = FakeProvider(distribution='constant', median=0.0, error_rate=1.0, sleep=lambda _: None)
+    with pytest.raises(ProviderError) as raised:
+        failing.generate(**CALL)
+    assert (raised.value.code, raised.value.status) == ('fake_error', 503)
+
+    truncating = FakeProvider(distribution='constant', median=0.0, truncate_rate=1.0, sleep=lambda _: None)
+    text, _ = truncating.generate(**CALL)
+    with pytest.raises(ValueError):
+        json.loads(text)
+    # Text-only repair calls always get the whole response.
+    text, _ = truncating.generate(**{**CALL, 'image_bytes': None, 'mime_type': None})
+    assert json.loads(text) == CANNED_RECIPE
+
+
+def test_stream_yields_the_whole_response():
+    provider = FakeProvider(distribution='constant', median=0.3, sleep=lambda _: None)
+    chunks = list(provider.stream(**CALL))
+    assert len(chunks) > 1
+    assert json.loads(''.join(chunks)) == CANNED_RECIPE
+
+
+def test_unknown_distribution_is_rejected():
+    with pytest.raises(ValueError):
+        FakeProvider(distribution='pareto')
+
+
+def test_generate_recipe_with_fake_provider(client):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(10, 200, 10)).save(buffer, format='PNG')
+    buffer.seek(0)
+
+    response = client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'fake', 'api_key': 'fake'},
+        content_type='multipart/form-data',
+    )
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['recipe']['title'] == CANNED_RECIPE['name']
+    assert body['meta']['provider'] == 'fake'
+    assert body['meta']['model'] == 'fake-recipe-1'
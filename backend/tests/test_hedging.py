@@ -0,0 +1,249 @@
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import admission, latency, recipes
+from api.admission import ConcurrencyLimiter
+from api.hedging import hedge_delay, hedged_call
+from api.latency import LatencyTracker, LatencyWindow
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=4)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with caching disabled and an empty latency tracker."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(latency, '_tracker', LatencyTracker(50))
+    monkeypatch.setattr(Config, 'HEDGE_DEFAULT_DELAY', 0.05)
+    monkeypatch.setattr(Config, 'HEDGE_MIN_DELAY', 0.0)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def sleeper(seconds, value=None, error=None):
+    def call():
+        time.sleep(seconds)
+        if error is not None:
+            raise error
+        return value
+    return call
+
+
+def test_hedged_call_primary_wins_without_launching_backup(executor):
+    outcome = hedged_call(sleeper(0.01, 'primary'), sleeper(0, 'secondary'), delay=0.5, accept=bool, executor=executor)
+    assert outcome.winner == 'primary'
+    assert outcome.result == 'primary'
+    assert outcome.launched is False
+
+
+def test_hedged_call_backup_wins_when_primary_is_slow(executor):
+    started = time.monotonic()
+    outcome = hedged_call(sleeper(0.5, 'primary'), sleeper(0.01, 'secondary'), delay=0.05, accept=bool, executor=executor)
+    assert outcome.winner == 'secondary'
+    assert outcome.launched is True
+    assert time.monotonic() - started < 0.3
+
+
+def test_hedged_call_launches_backup_immediately_on_primary_failure(executor):
+    outcome = hedged_call(
+        sleeper(0, error=RuntimeError('boom')),
+        sleeper(0, 'secondary'),
+        delay=10,
+        accept=bool,
+        executor=executor,
+    )
+    assert outcome.winner == 'secondary'
+    assert outcome.elapsed < 1
+
+
+def test_hedged_call_prefers_primary_when_nothing_is_accepted(executor):
+    outcome = hedged_call(sleeper(0, ''), sleeper(0, None), delay=0, accept=bool, executor=executor)
+    assert outcome.winner == 'primary'
+    assert outcome.result == ''
+
+    with pytest.raises(RuntimeError):
+        hedged_call(
+            sleeper(0, error=RuntimeError('primary')),
+            sleeper(0, error=ValueError('secondary')),
+            delay=0,
+            accept=bool,
+            executor=executor,
+        )
+
+
+def test_hedge_delay_uses_percentile_once_warm(monkeypatch):
+    monkeypatch.setattr(Config, 'HEDGE_MIN_SAMPLES', 10)
+    window = LatencyWindow(100)
+    assert hedge_delay(window) == Config.HEDGE_DEFAULT_DELAY
+    for sample in range(1, 21):
+        window.add(float(sample))
+    assert hedge_delay(window) == pytest.approx(min(19.0, Config.HEDGE_MAX_DELAY))
+    assert window.tail_mean(18.5) == pytest.approx(19.5)
+
+
+def image_file():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(90, 40, 10)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return (buffer, 'dish.png')
+
+
+def test_generate_recipe_hedges_to_backup_provider(client, monkeypatch):
+    def slow_gemini(**kwargs):
+        time.sleep(0.5)
+        return json.dumps({'name': 'Slow Soup'}), {'model': kwargs['model']}
+
+    def fast_openai(**kwargs):
+        return json.dumps({'name': 'Fast Soup'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', slow_gemini)
+    monkeypatch.setattr(recipes, 'generate_with_openai', fast_openai)
+
+    response = client.post('/api/generate-recipe', data={
+        'file': image_file(),
+        'provider': 'gemini',
+        'api_key': 'gemini-key',
+        'hedge': 'true',
+        'hedge_provider': 'openai',
+        'hedge_api_key': 'openai-key',
+    }, content_type='multipart/form-data')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['recipe']['title'] == 'Fast Soup'
+    assert data['meta']['provider'] == 'openai'
+    assert data['meta']['hedge']['winner'] == 'secondary'
+    assert data['meta']['hedge']['launched'] is True
+    assert data['meta']['hedge']['elapsed_ms'] < 400
+
+
+def post_hedged(client):
+    return client.post('/api/generate-recipe', data={
+        'file': image_file(),
+        'provider': 'gemini',
+        'api_key': 'gemini-key',
+        'hedge': 'true',
+        'hedge_provider': 'openai',
+        'hedge_api_key': 'openai-key',
+    }, content_type='multipart/form-data')
+
+
+def test_losing_call_stops_at_its_next_retry(client, monkeypatch):
+    class Unavailable(Exception):
+        status_code = 503
+        response = type('Response', (), {'headers': {'retry-after': '5'}})()
+
+    def failing_gemini(**kwargs):
+        raise recipes.ProviderError('gemini_error', 'overloaded') from Unavailable()
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', failing_gemini)
+    monkeypatch.setattr(recipes, 'generate_with_openai', lambda **kwargs: (json.dumps({'name': 'Soup'}), {'model': kwargs['model']}))
+    ended = []
+    call_provider = recipes.call_provider
+
+    def recorded_call_provider(target, *args, **kwargs):
+        try:
+            return call_provider(target, *args, **kwargs)
+        except recipes.ProviderError as error:
+            ended.append((target.provider, error.code, time.monotonic()))
+            raise
+
+    monkeypatch.setattr(recipes, 'call_provider', recorded_call_provider)
+
+    started = time.monotonic()
+    response = post_hedged(client)
+    assert response.get_json()['meta']['hedge']['winner'] == 'secondary'
+    while not ended and time.monotonic() - started < 3:
+        time.sleep(0.01)
+
+    # The primary was backing off for its 5s Retry-After; the win cut that short.
+    assert [(provider, code) for provider, code, _ in ended] == [('gemini', 'cancelled')]
+    assert ended[0][2] - started < 1
+
+
+def test_hedge_is_not_sent_while_the_backup_provider_is_saturated(client, monkeypatch):
+    limiter = ConcurrencyLimiter({'openai': 1}, default_limit=16, max_queue=10, queue_timeout=5)
+    monkeypatch.setattr(admission, '_provider_limiter', limiter)
+    limiter.acquire('openai')
+    calls = []
+
+    def slow_gemini(**kwargs):
+        time.sleep(0.2)
+        return json.dumps({'name': 'Slow Soup'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', slow_gemini)
+    monkeypatch.setattr(recipes, 'generate_with_openai', lambda **kwargs: calls.append(1))
+
+    response = post_hedged(client)
+
+    hedge = response.get_json()['meta']['hedge']
+    assert hedge['winner'] == 'primary'
+    assert hedge['launched'] is False
+    assert calls == []
+    assert limiter.snapshot()['openai']['queued'] == 0
+
+
+def test_generate_recipe_without_backup_key_is_not_hedged(client, monkeypatch):
+    monkeypatch.setattr(Config, 'get_api_key_for', classmethod(lambda cls, provider: None))
+    monkeypatch.setattr(
+        recipes,
+        'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Soup'}), {'model': kwargs['model']}),
+    )
+
+    response = client.post('/api/generate-recipe', data={
+        'file': image_file(),
+        'provider': 'gemini',
+        'api_key': 'gemini-key',
+        'hedge': 'true',
+        'hedge_provider': 'openai',
+    }, content_type='multipart/form-data')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['meta']['provider'] == 'gemini'
+    assert 'hedge' not in data['meta']
+
+
+def test_client_keyed_request_does_not_hedge_on_server_key(client, monkeypatch):
+    monkeypatch.setattr(Config, 'get_api_key_for', classmethod(lambda cls, provider: f'server-{provider}-key'))
+    calls = []
+
+    def gemini(**kwargs):
+        calls.append(kwargs['api_key'])
+        time.sleep(0.3)
+        return json.dumps({'name': 'Soup'}), {'model': kwargs['model']}
+
+    def openai(**kwargs):
+        calls.append(kwargs['api_key'])
+        return json.dumps({'name': 'Server Soup'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', gemini)
+    monkeypatch.setattr(recipes, 'generate_with_openai', openai)
+
+    form = {'provider': 'gemini', 'hedge': 'true', 'hedge_provider': 'openai'}
+    client_keyed = client.post('/api/generate-recipe', data={'file': image_file(), 'api_key': 'user-key', **form},
+                               content_type='multipart/form-data')
+    server_keyed = client.post('/api/generate-recipe', data={'file': image_file(), **form},
+                               content_type='multipart/form-data')
+
+    assert 'hedge' not in client_keyed.get_json()['meta']
+    assert server_keyed.get_json()['meta']['hedge']['launched'] is True
+    assert calls[0] == 'user-key'
+    assert 'server-openai-key' in calls
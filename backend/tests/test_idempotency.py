@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import io
+import json
+import threading
+import time
+
+import httpx
+import pytest
+from PIL import Image
+from werkzeug.datastructures import MultiDict
+
+from api import cache as cache_module
+from api import idempotency, recipes
+from api.asgi import create_asgi_app
+from api.idempotency import (
+    DONE,
+    MISMATCH,
+    RUNNING,
+    STARTED,
+    MemoryIdempotencyStore,
+    SQLiteIdempotencyStore,
+    StoredResponse,
+    client_identity,
+    remember,
+    request_fingerprint,
+    scoped_key,
+)
+from api.metrics import get_metrics
+from app import api_cors_options, create_app
+from config import Config
+
+
+@pytest.fixture
+def store(monkeypatch):
+    """Install a fresh in-memory idempotency store and disable the recipe cache."""
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'IDEMPOTENCY_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    memory_store = MemoryIdempotencyStore(max_entries=100)
+    monkeypatch.setattr(idempotency, '_store', memory_store)
+    monkeypatch.setattr(idempotency, '_store_ready', True)
+    return memory_store
+
+
+@pytest.fixture
+def app(store):
+    flask_app = create_app()
+    flask_app.config['TESTING'] = True
+    return flask_app
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Gemini stub counting calls; blocks while the returned event is clear."""
+    release = threading.Event()
+    release.set()
+    calls = []
+
+    def handler(**kwargs):
+        calls.append(kwargs['model'])
+        release.wait(5)
+        return json.dumps({'name': f'Dish {len(calls)}'}), {'model': kwargs['model']}
+
+    async def async_handler(**kwargs):
+        return await asyncio.to_thread(handler, **kwargs)
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    monkeypatch.setattr(recipes, 'generate_with_gemini_async', async_handler)
+    release.calls = calls
+    yield release
+    release.set()
+
+
+def png(red=200):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(red, 120, 40)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def post_recipe(client, key=None, image=None, api_key='test-key', **headers):
+    if key is not None:
+        headers['Idempotency-Key'] = key
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (io.BytesIO(image or png()), 'dish.png'), 'provider': 'gemini', 'api_key': api_key},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+
+
+def test_retry_replays_the_stored_response_byte_for_byte(app, gemini):
+    client = app.test_client()
+    first = post_recipe(client, 'order-1')
+    retry = post_recipe(client, 'order-1')
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.get_data() == first.get_data()
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert 'Idempotent-Replayed' not in first.headers
+    assert len(gemini.calls) == 1
+    assert 'dishcovery_idempotency_total{outcome="replayed"}' in get_metrics().render()
+
+    assert post_recipe(client, 'order-2').status_code == 200
+    assert post_recipe(client).status_code == 200
+    assert len(gemini.calls) == 3
+
+
+def test_retry_mid_flight_attaches_to_the_original(app, gemini):
+    gemini.clear()
+    responses = {}
+
+    def send(name, red):
+        responses[name] = post_recipe(app.test_client(), 'order-1', png(red))
+
+    original = threading.Thread(target=send, args=('original', 20))
+    original.start()
+    while not gemini.calls:
+        threading.Event().wait(0.01)
+    retry = threading.Thread(target=send, args=('retry', 20))
+    retry.start()
+    threading.Event().wait(0.1)
+    gemini.set()
+    original.join(5)
+    retry.join(5)
+
+    assert len(gemini.calls) == 1
+    assert responses['retry'].get_data() == responses['original'].get_data()
+    assert responses['retry'].headers['Idempotent-Replayed'] == 'true'
+
+
+def test_structured_errors_are_replayed(app, gemini):
+    client = app.test_client()
+    first = post_recipe(client, 'order-1', b'<html>' + b'x' * 1024)
+    retry = post_recipe(client, 'order-1', b'<html>' + b'x' * 1024)
+
+    assert first.status_code == retry.status_code == 400
+    assert retry.get_json()['error']['code'] == 'invalid_image'
+    assert retry.get_data() == first.get_data()
+    assert gemini.calls == []
+
+
+def test_retry_after_responses_release_the_key(store):
+    status, _ = store.begin('k', 'owner-1', 'f', lock_ttl=60)
+    assert status == STARTED
+    remember(store, 'k', 'owner-1', 503, {'Content-Type': 'application/json', 'Retry-After': '2'}, b'{}')
+
+    assert store.begin('k', 'owner-2', 'f', lock_ttl=60) == (STARTED, None)
+
+
+def test_invalid_and_busy_keys_are_rejected(app, store, gemini, monkeypatch):
+    client = app.test_client()
+    invalid = post_recipe(client, 'x' * 256)
+    assert invalid.status_code == 400
+    assert invalid.get_json()['error']['code'] == 'invalid_idempotency_key'
+
+    monkeypatch.setattr(Config, 'IDEMPOTENCY_WAIT_TIMEOUT', 0.05)
+    form = MultiDict({'provider': 'gemini', 'api_key': 'test-key'})
+    key = scoped_key('api.generate_recipe', client_identity(form, '127.0.0.1'), 'order-1')
+    store.begin(key, 'another-worker', request_fingerprint(form, [('file', hashlib.sha256(png()).hexdigest())]), lock_ttl=60)
+    busy = post_recipe(client, 'order-1')
+    assert busy.status_code == 409
+    assert busy.get_json()['error']['code'] == 'idempotency_in_progress'
+    assert int(busy.headers['Retry-After']) >= 1
+    assert gemini.calls == []
+
+
+def test_reusing_a_key_for_another_request_is_rejected(app, gemini):
+    client = app.test_client()
+    assert post_recipe(client, 'order-1').status_code == 200
+
+    reused = post_recipe(client, 'order-1', png(20))
+
+    assert reused.status_code == 422
+    assert reused.get_json()['error']['code'] == 'idempotency_key_reused'
+    assert len(gemini.calls) == 1
+
+
+def test_keys_are_scoped_to_the_client(app, gemini):
+    client = app.test_client()
+    first = post_recipe(client, 'order-1', api_key='key-a')
+    other_client = post_recipe(client, 'order-1', api_key='key-b')
+
+    assert first.status_code == other_client.status_code == 200
+    assert 'Idempotent-Replayed' not in other_client.headers
+    assert len(gemini.calls) == 2
+
+
+def test_waiting_for_the_original_stops_at_the_deadline(app, store, gemini):
+    form = MultiDict({'provider': 'gemini', 'api_key': 'test-key'})
+    key = scoped_key('api.generate_recipe', client_identity(form, '127.0.0.1'), 'order-1')
+    store.begin(key, 'another-worker', request_fingerprint(form, [('file', hashlib.sha256(png()).hexdigest())]), lock_ttl=60)
+
+    started = time.monotonic()
+    busy = post_recipe(app.test_client(), 'order-1', **{'X-Request-Timeout': '0.2'})
+
+    assert busy.status_code == 409
+    assert time.monotonic() - started < 2
+
+
+def test_sqlite_store_is_shared_and_bounded(tmp_path):
+    path = str(tmp_path / 'idempotency.sqlite3')
+    worker_a = SQLiteIdempotencyStore(path, max_entries=2)
+    worker_b = SQLiteIdempotencyStore(path, max_entries=2)
+    response = StoredResponse(200, {'Content-Type': 'application/json'}, b'{"ok":true}')
+
+    assert worker_a.begin('k1', 'a', 'f', lock_ttl=60) == (STARTED, None)
+    assert worker_b.begin('k1', 'b', 'f', lock_ttl=60) == (RUNNING, None)
+    worker_b.complete('k1', 'b', response, ttl=60)
+    assert worker_b.begin('k1', 'b', 'f', lock_ttl=60) == (RUNNING, None)
+    worker_a.complete('k1', 'a', response, ttl=60)
+    assert worker_b.begin('k1', 'b', 'f', lock_ttl=60) == (DONE, response)
+    assert worker_b.begin('k1', 'b', 'other', lock_ttl=60) == (MISMATCH, None)
+
+    for key in ('k2', 'k3'):
+        worker_a.begin(key, 'a', 'f', lock_ttl=60)
+        worker_a.complete(key, 'a', response, ttl=60)
+    assert worker_b.begin('k1', 'b', 'f', lock_ttl=60) == (STARTED, None)
+    assert worker_b.begin('k3', 'b', 'f', lock_ttl=60) == (DONE, response)
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryIdempotencyStore(max_entries=2)
+    for key in ('k1', 'k2', 'k3'):
+        store.begin(key, 'owner', 'f', lock_ttl=60)
+
+    assert store.begin('k1', 'other', 'f', lock_ttl=60) == (STARTED, None)
+    assert store.begin('k3', 'other', 'f', lock_ttl=60) == (RUNNING, None)
+
+
+def test_asgi_endpoint_replays_like_flask(app, gemini):
+    asgi_app = create_asgi_app(app, cors_options=api_cors_options())
+
+    async def send_twice():
+        transport = httpx.ASGITransport(app=asgi_app, client=('203.0.113.7', 4321))
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return [
+                await client.post(
+                    '/api/generate-recipe',
+                    data={'provider': 'gemini', 'api_key': 'test-key'},
+                    files={'file': ('dish.png', png(), 'image/png')},
+                    headers={'Idempotency-Key': 'order-1'},
+                )
+                for _ in range(2)
+            ]
+
+    first, retry = asyncio.run(send_twice())
+    assert first.status_code == retry.status_code == 200
+    assert retry.content == first.content
+    assert retry.headers['Idempotent-Replayed'] == 'true'
+    assert retry.headers.get_list('Content-Type') == ['application/json']
+    assert len(gemini.calls) == 1
@@ -0,0 +1,93 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api.imaging import decode_image, prepare_image
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with the result cache disabled."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def encode(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def test_decode_applies_exif_orientation():
+    img = Image.new('RGB', (200, 100), color='green')
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees clockwise on display
+    decoded = decode_image(encode(img, 'JPEG', exif=exif.tobytes()))
+    assert decoded.size == (100, 200)
+
+
+def test_decode_keeps_first_gif_frame():
+    frames = [Image.new('P', (40, 40), color=index) for index in (1, 2, 3)]
+    data = encode(frames[0], 'GIF', save_all=True, append_images=frames[1:])
+    decoded = decode_image(data)
+    assert decoded.size == (40, 40)
+    prepared = prepare_image(decoded, max_dimension=100, image_format='JPEG', quality=80)
+    assert Image.open(io.BytesIO(prepared.data)).format == 'JPEG'
+
+
+def test_decode_uses_draft_scaling_for_large_jpegs():
+    img = Image.new('RGB', (3200, 2400), color='orange')
+    decoded = decode_image(encode(img, 'JPEG'), max_dimension=800)
+    assert 800 <= max(decoded.size) < 3200
+
+
+def test_prepare_downscales_and_strips_metadata():
+    img = Image.new('RGB', (3000, 1500), color='purple')
+    exif = Image.Exif()
+    exif[0x010F] = 'CameraMaker'
+    decoded = decode_image(encode(img, 'JPEG', exif=exif.tobytes()))
+    prepared = prepare_image(decoded, max_dimension=1000, image_format='JPEG', quality=85)
+    assert (prepared.width, prepared.height) == (1000, 500)
+    assert prepared.mime_type == 'image/jpeg'
+    assert not Image.open(io.BytesIO(prepared.data)).getexif()
+
+
+def test_prepare_flattens_transparency_for_jpeg_and_keeps_it_for_webp():
+    img = Image.new('RGBA', (50, 50), color=(255, 0, 0, 0))
+    jpeg = prepare_image(img, max_dimension=100, image_format='JPEG', quality=85)
+    assert Image.open(io.BytesIO(jpeg.data)).getpixel((0, 0))[0] > 240
+    webp = prepare_image(img, max_dimension=100, image_format='WEBP', quality=85)
+    assert webp.mime_type == 'image/webp'
+    assert Image.open(io.BytesIO(webp.data)).mode == 'RGBA'
+
+
+def test_handler_receives_prepared_payload(client, monkeypatch):
+    received = {}
+
+    def fake_handler(**kwargs):
+        received.update(kwargs)
+        return json.dumps({'name': 'Salad'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_openai', fake_handler)
+    original = encode(Image.new('RGB', (4000, 3000), color='yellow'), 'PNG')
+    response = client.post(
+        '/api/generate-recipe',
+        data={'file': (io.BytesIO(original), 'dish.png'), 'provider': 'openai', 'api_key': 'sk-test'},
+        content_type='multipart/form-data',
+    )
+    assert response.status_code == 200
+    sent = Image.open(io.BytesIO(received['image_bytes']))
+    assert sent.format == Config.IMAGE_ENCODE_FORMAT
+    assert max(sent.size) == Config.get_max_image_dimension_for('openai')
+    assert received['mime_type'] == 'image/jpeg'
+    assert response.get_json()['meta']['image']['bytes'] == len(received['image_bytes'])
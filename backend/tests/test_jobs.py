@@ -0,0 +1,160 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import jobs, recipes
+from api.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, Job, JobRunner, MemoryJobStore, SQLiteJobStore
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def runner(monkeypatch):
+    """Install a small job runner: one worker and one queue slot."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'JOB_POLL_INTERVAL', 0.01)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    job_runner = JobRunner(MemoryJobStore(max_entries=100), max_workers=1, max_queue=1, ttl=60)
+    monkeypatch.setattr(jobs, '_runner', job_runner)
+    return job_runner
+
+
+@pytest.fixture
+def client(runner):
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Gemini stub that blocks until the returned event is set."""
+    release = threading.Event()
+    calls = []
+
+    def handler(**kwargs):
+        calls.append(kwargs['model'])
+        release.wait(5)
+        return json.dumps({'name': 'Queued Curry'}), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    release.calls = calls
+    yield release
+    release.set()
+
+
+def image_file():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(200, 120, 40)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return (buffer, 'dish.png')
+
+
+def submit(client):
+    return client.post(
+        '/api/jobs',
+        data={'file': image_file(), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+    )
+
+
+def wait_for_status(client, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/jobs/{job_id}').get_json()['job']
+        if job['status'] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f'job {job_id} never reached {statuses}')
+
+
+def test_submit_returns_immediately_and_poll_returns_result(client, gate):
+    response = submit(client)
+    assert response.status_code == 202
+    job = response.get_json()['job']
+    assert job['status'] in (QUEUED, RUNNING)
+    assert response.headers['Location'] == f"/api/jobs/{job['id']}"
+
+    wait_for_status(client, job['id'], (RUNNING,))
+    gate.set()
+    finished = wait_for_status(client, job['id'], (SUCCEEDED,))
+    assert finished['result']['recipe']['title'] == 'Queued Curry'
+
+
+def test_full_queue_returns_429_with_retry_after(client, gate):
+    first = submit(client).get_json()['job']
+    wait_for_status(client, first['id'], (RUNNING,))
+    assert submit(client).status_code == 202
+
+    rejected = submit(client)
+    assert rejected.status_code == 429
+    assert rejected.get_json()['error']['code'] == 'queue_full'
+    assert int(rejected.headers['Retry-After']) >= 1
+
+
+def test_cancelled_queued_job_never_runs(client, gate):
+    first = submit(client).get_json()['job']
+    wait_for_status(client, first['id'], (RUNNING,))
+    second = submit(client).get_json()['job']
+
+    response = client.delete(f"/api/jobs/{second['id']}")
+    assert response.status_code == 200
+    assert response.get_json()['job']['status'] == CANCELLED
+
+    gate.set()
+    wait_for_status(client, first['id'], (SUCCEEDED,))
+    time.sleep(0.05)
+    assert len(gate.calls) == 1
+    assert client.delete(f"/api/jobs/{first['id']}").status_code == 409
+
+
+def test_failed_job_reports_problem_body(client, monkeypatch):
+    def failing(**kwargs):
+        raise recipes.ProviderError('gemini_error', 'Gemini could not process the image.')
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', failing)
+    job = submit(client).get_json()['job']
+    finished = wait_for_status(client, job['id'], (FAILED,))
+    assert finished['error']['code'] == 'gemini_error'
+
+
+def test_events_stream_ends_with_complete(client, gate):
+    job = submit(client).get_json()['job']
+    gate.set()
+    body = client.get(f"/api/jobs/{job['id']}/events").get_data(as_text=True)
+    assert 'event: status' in body
+    complete = body.split('event: complete\ndata: ')[1].strip()
+    assert json.loads(complete)['status'] == SUCCEEDED
+
+
+def test_unknown_job_is_404(client):
+    response = client.get('/api/jobs/does-not-exist')
+    assert response.status_code == 404
+    assert response.get_json()['error']['code'] == 'job_not_found'
+
+
+@pytest.mark.parametrize('make_store', [
+    lambda tmp_path: MemoryJobStore(max_entries=10),
+    lambda tmp_path: SQLiteJobStore(str(tmp_path / 'jobs.sqlite3')),
+])
+def test_job_stores_transition_atomically_and_expire(tmp_path, make_store):
+    store = make_store(tmp_path)
+    now = time.time()
+    store.add(Job(id='a', status=QUEUED, created_at=now, updated_at=now, expires_at=now + 60))
+
+    assert store.transition('a', (QUEUED,), RUNNING, ttl=60)
+    assert not store.transition('a', (QUEUED,), RUNNING, ttl=60)
+    assert store.transition('a', (RUNNING,), SUCCEEDED, ttl=60, result={'recipe': {'title': 'Soup'}})
+    assert store.get('a').result == {'recipe': {'title': 'Soup'}}
+
+    assert store.transition('a', (SUCCEEDED,), SUCCEEDED, ttl=-1)
+    assert store.get('a') is None
+    store.purge_expired()
+    assert not store.transition('a', (SUCCEEDED,), SUCCEEDED, ttl=60)
@@ -0,0 +1,175 @@
+import io
+import json
+import time
+from collections import Counter
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import keypool, recipes
+from api.keypool import ROUND_ROBIN, KeyPool
+from api.metrics import get_metrics
+from api.recipes import ProviderError
+from app import create_app
+from config import Config
+
+
+class RateLimited(Exception):
+    """Stands in for an SDK 429 error carrying the provider's Retry-After."""
+
+    status_code = 429
+
+    def __init__(self, retry_after):
+        super().__init__('HTTP 429')
+        self.response = type('Response', (), {'headers': {'retry-after': retry_after}})()
+
+
+class QuotaHandler:
+    """Gemini stub enforcing a per-key call quota with 429s, like a provider's RPM limit."""
+
+    def __init__(self, quotas):
+        self.quotas = quotas
+        self.calls = Counter()
+
+    def __call__(self, **kwargs):
+        api_key = kwargs['api_key']
+        self.calls[api_key] += 1
+        if self.calls[api_key] > self.quotas.get(api_key, float('inf')):
+            try:
+                raise RateLimited('30')
+            except RateLimited as exc:
+                raise ProviderError('gemini_error', 'Gemini could not process the image.') from exc
+        return json.dumps({'name': f'Dish via {api_key}'}), {'model': kwargs['model']}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client whose server Gemini keys are a two-key pool."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'PROVIDER_RETRY_BASE_DELAY', 0.01)
+    monkeypatch.setattr(Config, 'GEMINI_API_KEY', 'server-key-1')
+    monkeypatch.setattr(keypool, '_pool', KeyPool({'gemini': [('server-key-1', 1), ('server-key-2', 1)]}, cooldown=60))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def post_recipe(client, **form):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(200, 120, 40)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', **form},
+        content_type='multipart/form-data',
+    )
+
+
+def test_pool_config_merges_the_single_key_and_weights(monkeypatch):
+    monkeypatch.setattr(Config, 'GEMINI_API_KEY', 'single')
+    monkeypatch.setattr(Config, 'GEMINI_API_KEYS', 'a:3, b ,a,,c:x')
+
+    assert Config.get_api_key_pool_for('gemini') == [('single', 1), ('a', 3), ('b', 1), ('c:x', 1)]
+    assert Config.get_api_key_for('gemini') == 'single'
+
+    monkeypatch.setattr(Config, 'GEMINI_API_KEY', None)
+    assert Config.get_api_key_for('gemini') == 'a'
+    assert Config.get_api_key_pool_for('nope') == []
+
+
+def test_least_loaded_spreads_concurrent_calls_by_weight():
+    pool = KeyPool({'gemini': [('a', 2), ('b', 1)]}, cooldown=10)
+
+    held = [pool.acquire('gemini') for _ in range(6)]
+
+    assert Counter(held) == {'a': 4, 'b': 2}
+    pool.release('gemini', 'a')
+    pool.release('gemini', 'a')
+    assert pool.acquire('gemini') == 'a'
+
+
+def test_weighted_round_robin_interleaves_keys():
+    pool = KeyPool({'gemini': [('a', 2), ('b', 1)]}, strategy=ROUND_ROBIN, cooldown=10)
+
+    order = []
+    for _ in range(6):
+        order.append(pool.acquire('gemini'))
+        pool.release('gemini', order[-1])
+
+    assert order == ['a', 'b', 'a', 'a', 'b', 'a']
+    with pytest.raises(ValueError):
+        KeyPool({}, strategy='random', cooldown=10)
+
+
+def test_throttled_keys_cool_down_for_the_longer_of_cooldown_and_retry_after():
+    clock = Clock()
+    pool = KeyPool({'gemini': [('a', 1), ('b', 1)]}, cooldown=10, clock=clock)
+
+    assert pool.throttle('gemini', 'a', retry_after=30) is True
+    assert {pool.acquire('gemini') for _ in range(3)} == {'b'}
+
+    assert pool.throttle('gemini', 'b') is False
+    assert pool.acquire('gemini') == 'b'  # every key cooling: b recovers first
+
+    clock.now += 30
+    snapshot = pool.snapshot()['providers']['gemini']
+    assert snapshot['ready'] == 2
+    assert [key['throttled'] for key in snapshot['keys']] == [1, 1]
+    assert pool.acquire('gemini') == 'a'
+
+
+def test_requests_rotate_past_a_throttled_key(client, monkeypatch):
+    handler = QuotaHandler({'server-key-1': 1})
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+
+    started = time.monotonic()
+    titles = [post_recipe(client).get_json()['recipe']['title'] for _ in range(4)]
+
+    # Retry-After on the throttled key is 30s; the retry moved to the other key instead.
+    assert time.monotonic() - started < 5
+    assert titles == ['Dish via server-key-1', 'Dish via server-key-2', 'Dish via server-key-2', 'Dish via server-key-2']
+    assert handler.calls == {'server-key-1': 2, 'server-key-2': 3}
+
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', 'ops-secret')
+    status = client.get('/api/providers/keys', headers={'Authorization': 'Bearer ops-secret'})
+    body = status.get_json()
+    gemini = body['providers']['gemini']
+    assert [key['throttled'] for key in gemini['keys']] == [1, 0]
+    assert gemini['keys'][0]['cooling_seconds'] > 25
+    assert gemini['in_flight'] == 0
+    assert 'server-key' not in status.get_data(as_text=True)
+    assert 'dishcovery_api_key_throttled_total{key=' in get_metrics().render()
+
+
+def test_key_pool_status_is_hidden_without_the_operator_token(client, monkeypatch):
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', '')
+    response = client.get('/api/providers/keys')
+
+    assert response.status_code == 404
+    assert 'keys' not in response.get_json()
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', 'ops-secret')
+    assert client.get('/api/providers/keys', headers={'Authorization': 'Bearer guess'}).status_code == 401
+
+
+def test_client_keys_bypass_the_pool(client, monkeypatch):
+    handler = QuotaHandler({})
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+
+    response = post_recipe(client, api_key='user-key')
+
+    assert response.status_code == 200
+    assert handler.calls == {'user-key': 1}
+    snapshot = keypool.get_key_pool().snapshot()['providers']['gemini']
+    assert sum(key['calls'] for key in snapshot['keys']) == 0
@@ -0,0 +1,121 @@
+import io
+import json
+import multiprocessing
+import re
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import metrics as metrics_module
+from api import recipes
+from api.cache import MemoryCacheBackend, RecipeCache
+from api.metrics import Metrics
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Install a fresh single-process metrics registry."""
+    fresh = Metrics()
+    monkeypatch.setattr(metrics_module, '_metrics', fresh)
+    return fresh
+
+
+@pytest.fixture
+def client(registry, monkeypatch):
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(MemoryCacheBackend(max_entries=10, max_bytes=10**6), default_ttl=60))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(
+        recipes, 'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Miso Soup'}), {'model': kwargs['model']}),
+    )
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def post_image(client, **form):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(30, 160, 90)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key', **form},
+        content_type='multipart/form-data',
+    )
+
+
+def sample(text, series):
+    match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+    return None if match is None else float(match.group(1))
+
+
+def test_metrics_cover_every_stage_and_outcome(client):
+    assert post_image(client).status_code == 200
+    assert post_image(client).status_code == 200
+    client.post('/api/generate-recipe', data={}, content_type='multipart/form-data')
+
+    response = client.get('/api/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+
+    for stage in ('read_upload', 'decode', 'prepare_image', 'build_prompt', 'parse', 'serialize'):
+        assert sample(text, f'dishcovery_stage_seconds_count{{stage="{stage}"}}') >= 1, stage
+    assert sample(text, 'dishcovery_provider_call_seconds_count{model="gemini-2.5-flash",outcome="ok",provider="gemini"}') == 1
+    assert sample(text, 'dishcovery_recipe_responses_total{cache="miss",coalesced="false"}') == 1
+    assert sample(text, 'dishcovery_recipe_responses_total{cache="hit",coalesced="false"}') == 1
+    assert sample(text, 'dishcovery_errors_total{code="missing_file"}') == 1
+    assert '# TYPE dishcovery_stage_seconds histogram' in text
+
+
+def test_histogram_buckets_are_cumulative(registry):
+    for seconds in (0.0002, 0.003, 0.003, 120.0):
+        registry.observe('dishcovery_stage_seconds', seconds, stage='parse')
+
+    text = registry.render()
+    assert sample(text, 'dishcovery_stage_seconds_bucket{stage="parse",le="0.0005"}') == 1
+    assert sample(text, 'dishcovery_stage_seconds_bucket{stage="parse",le="0.005"}') == 3
+    assert sample(text, 'dishcovery_stage_seconds_bucket{stage="parse",le="80.0"}') == 3
+    assert sample(text, 'dishcovery_stage_seconds_bucket{stage="parse",le="+Inf"}') == 4
+    assert sample(text, 'dishcovery_stage_seconds_count{stage="parse"}') == 4
+    assert sample(text, 'dishcovery_stage_seconds_sum{stage="parse"}') == pytest.approx(120.0062)
+
+
+def test_unregistered_names_are_logged_once(registry, caplog):
+    registry.inc('dishcovery_made_up_total')
+    registry.observe('dishcovery_made_up_seconds', 0.1)
+    registry.inc('dishcovery_made_up_total')
+    registry.inc('dishcovery_errors_total', code='invalid_image')
+
+    warned = [record.getMessage() for record in caplog.records if 'not registered' in record.getMessage()]
+    assert len(warned) == 2
+    assert 'dishcovery_made_up_total' in warned[0]
+    assert 'dishcovery_made_up' not in registry.render()
+
+
+def record_in_child(directory):
+    child = Metrics(directory)
+    child.inc('dishcovery_errors_total', code='invalid_image')
+    child.observe('dishcovery_stage_seconds', 0.01, stage='decode')
+    child.flush()
+
+
+def test_snapshots_from_every_process_are_summed(tmp_path):
+    directory = str(tmp_path / 'metrics')
+    parent = Metrics(directory, flush_interval=60)
+    parent.inc('dishcovery_errors_total', code='invalid_image')
+
+    for _ in range(2):
+        child = multiprocessing.get_context('spawn').Process(target=record_in_child, args=(directory,))
+        child.start()
+        child.join(30)
+        assert child.exitcode == 0
+
+    text = parent.render()
+    assert sample(text, 'dishcovery_errors_total{code="invalid_image"}') == 3
+    assert sample(text, 'dishcovery_stage_seconds_count{stage="decode"}') == 2
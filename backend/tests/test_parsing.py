@@ -0,0 +1,90 @@
+import json
+import re
+
+import pytest
+
+from api.parsing import extract_json_object, repair_truncated_json
+from api.recipes import TRUNCATED_RECIPE_WARNING, parse_recipe
+
+RECIPE = {
+    'name': 'Shakshuka',
+    'prep_time': '10 minutes',
+    'cook_time': '20 minutes',
+    'servings': 2,
+    'ingredients_with_measurements': ['4 eggs', '1 can tomatoes', '1 tsp "smoked" paprika'],
+    'instructions': ['Simmer the sauce.', 'Crack in the eggs {gently}.', 'Cover and cook.'],
+    'nutrition': {'calories': 320, 'protein': '18g'},
+    'tips': 'Serve with bread.',
+}
+CLEAN = json.dumps(RECIPE, indent=2)
+
+# (name, model output, fields expected to survive)
+CORPUS = [
+    ('clean', CLEAN, set(RECIPE)),
+    ('json_fence', f'```json\n{CLEAN}\n```', set(RECIPE)),
+    ('bare_fence', f'```\n{CLEAN}\n```\n', set(RECIPE)),
+    ('leading_prose', f'Here is your recipe:\n\n{CLEAN}', set(RECIPE)),
+    ('prose_and_fence', f'Sure! Based on the photo:\n```json\n{CLEAN}\n```\nEnjoy your meal!', set(RECIPE)),
+    ('raw_newline_in_string', CLEAN.replace('Serve with bread.', 'Serve with\nbread.'), set(RECIPE)),
+    ('truncated_in_step', CLEAN[:CLEAN.index('Cover and')], {'name', 'prep_time', 'cook_time', 'servings', 'ingredients_with_measurements', 'instructions'}),
+    ('truncated_in_key', CLEAN[:CLEAN.index('"nutri') + 4], {'name', 'prep_time', 'cook_time', 'servings', 'ingredients_with_measurements', 'instructions'}),
+    ('truncated_in_nested_object', CLEAN[:CLEAN.index('"protein"') + 12], {'name', 'prep_time', 'cook_time', 'servings', 'ingredients_with_measurements', 'instructions', 'nutrition'}),
+    ('truncated_in_escape', CLEAN[:CLEAN.index('smoked') - 1], {'name', 'prep_time', 'cook_time', 'servings', 'ingredients_with_measurements'}),
+    ('truncated_fenced', '```json\n' + CLEAN[:CLEAN.index('"tips"')], set(RECIPE) - {'tips'}),
+]
+
+
+def legacy_parse(raw_text):
+    """The parser this module replaced: strip fences, then json.loads or give up."""
+    cleaned = raw_text.strip()
+    cleaned = re.sub(r'^```json\s*', '', cleaned)
+    cleaned = re.sub(r'^```\s*', '', cleaned)
+    cleaned = re.sub(r'```\s*$', '', cleaned)
+    try:
+        return json.loads(cleaned.strip())
+    except json.JSONDecodeError:
+        return None
+
+
+@pytest.mark.parametrize('name,text,fields', CORPUS, ids=[case[0] for case in CORPUS])
+def test_corpus_salvages_complete_fields(name, text, fields):
+    value, truncated = extract_json_object(text)
+    assert value is not None
+    assert set(value) == fields
+    assert truncated == name.startswith('truncated')
+    for field in fields - {'ingredients_with_measurements', 'instructions', 'nutrition', 'tips'}:
+        assert value[field] == RECIPE[field]
+    for field in fields & {'ingredients_with_measurements', 'instructions'}:
+        assert RECIPE[field][:len(value[field])] == value[field]
+    if 'tips' in fields:
+        assert value['tips'].replace('\n', ' ') == RECIPE['tips']
+
+
+def test_new_parser_recovers_everything_the_legacy_parser_does():
+    legacy = {name for name, text, _ in CORPUS if legacy_parse(text) is not None}
+    recovered = {name for name, text, _ in CORPUS if extract_json_object(text)[0] is not None}
+    assert legacy < recovered
+    assert recovered == {name for name, _, _ in CORPUS}
+
+
+def test_unrecoverable_text_returns_none():
+    assert extract_json_object('I could not identify this dish.') == (None, False)
+    assert extract_json_object('{"na') == (None, False)
+    assert extract_json_object('[1, 2, 3]') == (None, False)
+
+
+def test_repair_drops_incomplete_scalars():
+    assert json.loads(repair_truncated_json('{"a": "x", "b": 12')) == {'a': 'x'}
+    assert json.loads(repair_truncated_json('{"a": [1, 2,')) == {'a': [1, 2]}
+    assert json.loads(repair_truncated_json('{"a": {"b": [')) == {'a': {'b': []}}
+
+
+def test_parse_recipe_warns_on_truncation_and_falls_back_on_prose():
+    recipe, warning = parse_recipe(CORPUS[6][1])
+    assert warning == TRUNCATED_RECIPE_WARNING
+    assert recipe['title'] == 'Shakshuka'
+    assert recipe['steps'] == RECIPE['instructions'][:2]
+
+    recipe, warning = parse_recipe('Just some prose.')
+    assert warning is not None
+    assert recipe['steps'] == ['Just some prose.']
@@ -0,0 +1,164 @@
+import io
+import json
+import time
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api.fake_provider import CANNED_RECIPE
+from api.progressive import escalation_reason, resolution_tiers
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with caching disabled and a single 512px progressive tier."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'PROGRESSIVE_TIERS', [512])
+    monkeypatch.setattr(Config, 'PROGRESSIVE_MIN_CONFIDENCE', 0.6)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def gemini_stub(monkeypatch, confidence_at, *, latency=0.0):
+    """Gemini stub whose confidence depends on the longest edge of the image it is sent."""
+    calls = []
+
+    def handler(**kwargs):
+        size = Image.open(io.BytesIO(bytes(kwargs['image_bytes']))).size
+        calls.append({'size': size, 'prompt': kwargs['prompt']})
+        time.sleep(latency)
+        recipe = {**CANNED_RECIPE, 'confidence': confidence_at(max(size))}
+        return json.dumps(recipe), {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    return calls
+
+
+def post_recipe(client, progressive='true', size=(2048, 1536), path='/api/generate-recipe', **headers):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=(200, 120, 40)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        path,
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key', 'progressive': progressive},
+        content_type='multipart/form-data',
+        headers=headers,
+    )
+
+
+def test_resolution_tiers_only_include_sizes_that_shrink_the_image():
+    assert resolution_tiers(1536, (4032, 3024), [1024, 512, 4096]) == [512, 1024, 1536]
+    assert resolution_tiers(1536, (800, 600), [512, 1024]) == [512, 1536]
+    assert resolution_tiers(1536, (400, 300), [512]) == [1536]
+    assert resolution_tiers(1536, (4032, 3024), []) == [1536]
+
+
+def test_escalation_reasons():
+    complete = dict(CANNED_RECIPE)
+    assert escalation_reason('I think this is soup.', 0.6) == 'unparsed'
+    assert escalation_reason(json.dumps({**complete, 'instructions': []}), 0.6) == 'missing_fields'
+    assert escalation_reason(json.dumps(complete)[:-40], 0.6) == 'missing_fields'
+    assert escalation_reason(json.dumps({**complete, 'confidence': 0.4}), 0.6) == 'low_confidence'
+    assert escalation_reason(json.dumps({**complete, 'confidence': '0.9'}), 0.6) is None
+    assert escalation_reason(json.dumps(complete), 0.6) is None
+
+
+def test_confident_thumbnail_answers_are_used(client, monkeypatch):
+    calls = gemini_stub(monkeypatch, lambda edge: 0.9)
+
+    response = post_recipe(client)
+
+    assert response.status_code == 200
+    meta = response.get_json()['meta']
+    assert [max(call['size']) for call in calls] == [512]
+    assert 'confidence' in calls[0]['prompt']
+    assert meta['progressive']['tier'] == 0
+    assert meta['progressive']['dimension'] == 512
+    assert [tier['outcome'] for tier in meta['progressive']['tiers']] == ['used']
+    assert meta['image']['width'] == 512
+    assert 'confidence' not in response.get_json()['recipe']
+
+
+def test_low_confidence_escalates_to_full_resolution(client, monkeypatch):
+    calls = gemini_stub(monkeypatch, lambda edge: 0.3 if edge <= 512 else 0.95)
+
+    response = post_recipe(client)
+
+    meta = response.get_json()['meta']
+    assert [max(call['size']) for call in calls] == [512, 1536]
+    progressive = meta['progressive']
+    assert progressive['tier'] == 1
+    assert progressive['dimension'] == Config.get_max_image_dimension_for('gemini')
+    assert [tier['outcome'] for tier in progressive['tiers']] == ['escalated', 'used']
+    assert progressive['tiers'][0]['reason'] == 'low_confidence'
+    assert progressive['tiers'][0]['bytes'] < progressive['tiers'][1]['bytes'] == meta['image']['bytes']
+
+
+def test_non_progressive_requests_send_full_resolution_once(client, monkeypatch):
+    calls = gemini_stub(monkeypatch, lambda edge: 0.1)
+
+    response = post_recipe(client, progressive='false')
+
+    assert response.status_code == 200
+    assert [max(call['size']) for call in calls] == [1536]
+    assert 'confidence' not in calls[0]['prompt']
+    assert 'progressive' not in response.get_json()['meta']
+
+
+def test_only_requests_with_tiers_to_escalate_ask_for_confidence(client, monkeypatch):
+    calls = gemini_stub(monkeypatch, lambda edge: 0.1)
+    prompts = []
+
+    def stream(**kwargs):
+        prompts.append(kwargs['prompt'])
+        yield json.dumps(CANNED_RECIPE)
+
+    monkeypatch.setattr(recipes, 'stream_with_gemini', stream)
+
+    assert post_recipe(client, size=(400, 300)).status_code == 200
+    assert post_recipe(client, path='/api/generate-recipe/stream').status_code == 200
+
+    assert [max(call['size']) for call in calls] == [400]
+    assert 'confidence' not in calls[0]['prompt']
+    assert len(prompts) == 1 and 'confidence' not in prompts[0]
+
+
+def test_escalation_stops_when_the_deadline_is_spent(client, monkeypatch):
+    monkeypatch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 0.3)
+    calls = gemini_stub(monkeypatch, lambda edge: 0.3, latency=0.75)
+
+    response = post_recipe(client, **{'X-Request-Timeout': '1'})
+
+    assert response.status_code == 200
+    progressive = response.get_json()['meta']['progressive']
+    assert len(calls) == 1
+    assert progressive['tier'] == 0
+    assert [(tier['outcome'], tier['reason']) for tier in progressive['tiers']] == [('used', 'low_confidence')]
+
+
+def test_a_failed_escalation_falls_back_to_the_lower_tier(client, monkeypatch):
+    calls = gemini_stub(monkeypatch, lambda edge: 0.3)
+    handler = recipes.generate_with_gemini
+
+    def fail_at_full_size(**kwargs):
+        result = handler(**kwargs)
+        if len(calls) > 1:
+            raise recipes.ProviderError('empty_response', 'Nothing came back.')
+        return result
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', fail_at_full_size)
+
+    response = post_recipe(client)
+
+    assert response.status_code == 200
+    progressive = response.get_json()['meta']['progressive']
+    assert progressive['tier'] == 0
+    assert [tier['outcome'] for tier in progressive['tiers']] == ['used', 'empty_response']
@@ -0,0 +1,138 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from api import providers
+from api.providers import INVALID_KEY_ERROR, KeyValidationCache, build_catalog
+from app import create_app
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeValidator:
+    """Validator stub counting calls; keys starting with 'bad' are rejected."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, api_key):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if api_key.startswith('bad'):
+            return {'valid': False, 'error': INVALID_KEY_ERROR}
+        if api_key.startswith('offline'):
+            return {'valid': False, 'error': 'Request timed out. Please try again.'}
+        return {'valid': True, 'models': [{'id': 'gpt-4o', 'name': f'GPT 4o #{self.calls}'}]}
+
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=2)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+def make_cache(validator, executor, clock):
+    return KeyValidationCache(
+        {'openai': validator},
+        ttl=600,
+        invalid_ttl=60,
+        refresh_after=300,
+        max_entries=2,
+        executor=executor,
+        clock=clock,
+    )
+
+
+def test_repeat_validation_is_served_from_cache(executor):
+    validator = FakeValidator()
+    cache = make_cache(validator, executor, FakeClock())
+
+    first = cache.validate('openai', 'sk-live')
+    second = cache.validate('openai', 'sk-live')
+
+    assert first is second
+    assert validator.calls == 1
+    assert cache.stats()['hits'] == 1
+    assert all('sk-live' not in key for key in cache._entries)
+
+
+def test_concurrent_validations_share_one_call(executor):
+    validator = FakeValidator(delay=0.2)
+    cache = make_cache(validator, executor, FakeClock())
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.validate('openai', 'sk-live'), range(8)))
+
+    assert validator.calls == 1
+    assert all(result['valid'] for result in results)
+
+
+def test_invalid_keys_expire_sooner_and_network_errors_are_not_cached(executor):
+    validator = FakeValidator()
+    clock = FakeClock()
+    cache = make_cache(validator, executor, clock)
+
+    cache.validate('openai', 'bad-key')
+    cache.validate('openai', 'bad-key')
+    assert validator.calls == 1
+    clock.now = 61
+    cache.validate('openai', 'bad-key')
+    assert validator.calls == 2
+
+    cache.validate('openai', 'offline-key')
+    cache.validate('openai', 'offline-key')
+    assert validator.calls == 4
+
+
+def test_stale_entry_is_served_while_refreshing_in_background(executor):
+    validator = FakeValidator()
+    clock = FakeClock()
+    cache = make_cache(validator, executor, clock)
+
+    cache.validate('openai', 'sk-live')
+    clock.now = 301
+    stale = cache.validate('openai', 'sk-live')
+    assert stale['models'][0]['name'] == 'GPT 4o #1'
+
+    executor.shutdown(wait=True)
+    assert validator.calls == 2
+    assert cache.validate('openai', 'sk-live')['models'][0]['name'] == 'GPT 4o #2'
+    assert cache.stats()['refreshes'] == 1
+
+
+def test_build_catalog_formats_sorts_and_returns_copies():
+    entries = (('gpt-4-turbo', None), ('gpt-4o', None))
+    catalog = build_catalog('openai', entries)
+    assert [model['id'] for model in catalog] == ['gpt-4o', 'gpt-4-turbo']
+    assert catalog[0]['name'] == 'GPT 4O'
+
+    catalog[0]['name'] = 'changed'
+    assert build_catalog('openai', entries)[0]['name'] == 'GPT 4O'
+
+
+def test_validate_key_endpoint_uses_cache(monkeypatch, executor):
+    validator = FakeValidator()
+    monkeypatch.setattr(providers, '_validation_cache', make_cache(validator, executor, FakeClock()))
+    app = create_app()
+    app.config['TESTING'] = True
+
+    with app.test_client() as client:
+        for _ in range(3):
+            response = client.post('/api/validate-key', json={'provider': 'openai', 'apiKey': 'sk-live'})
+            assert response.status_code == 200
+        rejected = client.post('/api/validate-key', json={'provider': 'openai', 'apiKey': 'bad-key'})
+
+    assert rejected.status_code == 401
+    assert validator.calls == 2
@@ -0,0 +1,216 @@
+import io
+import json
+import socketserver
+import threading
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import providers, ratelimit, recipes
+from api.ratelimit import MemoryBucketStore, RateLimiter, RedisBucketStore, SQLiteBucketStore, refill
+from app import create_app
+from config import Config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with routing and the result cache disabled."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(ratelimit, '_rate_limiter_ready', True)
+    monkeypatch.setattr(
+        recipes, 'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Pho'}), {'model': kwargs['model']}),
+    )
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def use_limits(monkeypatch, limits):
+    limiter = RateLimiter(MemoryBucketStore(max_keys=100), limits)
+    monkeypatch.setattr(ratelimit, '_rate_limiter', limiter)
+    return limiter
+
+
+def post_image(client, *, ip='203.0.113.7', api_key='test-key', path='/api/generate-recipe'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(90, 160, 60)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        path,
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': api_key},
+        content_type='multipart/form-data',
+        environ_base={'REMOTE_ADDR': ip},
+    )
+
+
+def test_bucket_allows_a_burst_then_refills_at_rate():
+    clock = FakeClock()
+    store = MemoryBucketStore(max_keys=10, clock=clock)
+
+    assert [store.take('ip:a', rate=0.5, burst=3, cost=1) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert store.take('ip:a', rate=0.5, burst=3, cost=1) == pytest.approx(2.0)
+    assert store.take('ip:b', rate=0.5, burst=3, cost=1) == 0.0
+
+    clock.now += 2.0
+    assert store.take('ip:a', rate=0.5, burst=3, cost=1) == 0.0
+    assert refill(0.0, 0.0, 100.0, 0.5, 3) == 3
+
+
+def test_sqlite_buckets_are_shared_between_stores(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / 'buckets.sqlite3')
+    first, second = SQLiteBucketStore(path, clock=clock), SQLiteBucketStore(path, clock=clock)
+
+    assert first.take('key:k', rate=1.0, burst=2, cost=1) == 0.0
+    assert second.take('key:k', rate=1.0, burst=2, cost=1) == 0.0
+    assert first.take('key:k', rate=1.0, burst=2, cost=1) == pytest.approx(1.0)
+
+
+class RespStandIn(socketserver.StreamRequestHandler):
+    """Speaks enough of the Redis protocol to run the bucket script's logic in Python."""
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def handle(self):
+        buckets = self.server.buckets
+        while True:
+            command = self.read_command()
+            if command is None:
+                return
+            self.server.commands.append(command[0])
+            if command[0] != 'EVAL':
+                self.wfile.write(b'+OK\r\n')
+                continue
+            assert 'HMGET' in command[1] and command[2] == '1'
+            key = command[3]
+            rate, burst, cost, now = map(float, command[4:8])
+            tokens, updated = buckets.get(key, (burst, now))
+            tokens = refill(tokens, updated, now, rate, burst)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            buckets[key] = (tokens, now)
+            reply = str(wait).encode()
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(reply), reply))
+
+
+def test_redis_store_speaks_resp_to_a_stand_in_server():
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), RespStandIn)
+    server.daemon_threads = True
+    server.buckets, server.commands = {}, []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        clock = FakeClock()
+        store = RedisBucketStore(f'redis://:s3cret@127.0.0.1:{server.server_address[1]}/2', clock=clock)
+        assert store.take('recipe:ip:1.2.3.4', rate=0.25, burst=1, cost=1) == 0.0
+        assert store.take('recipe:ip:1.2.3.4', rate=0.25, burst=1, cost=1) == pytest.approx(4.0)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert server.commands == ['AUTH', 'SELECT', 'EVAL', 'EVAL']
+    assert list(server.buckets) == ['dishcovery:rate:recipe:ip:1.2.3.4']
+
+
+def test_unreachable_store_allows_requests():
+    limiter = RateLimiter(RedisBucketStore('redis://127.0.0.1:1/0', timeout=0.2), {('recipe', 'ip'): (1.0, 1)})
+    assert limiter.hit('recipe', 'ip', '1.2.3.4') == 0.0
+
+
+def test_client_ip_is_limited_before_the_upload_is_decoded(client, monkeypatch):
+    use_limits(monkeypatch, {('recipe', 'ip'): (1 / 60, 1)})
+    decoded = []
+    original_decode = recipes.decode_upload
+    monkeypatch.setattr(recipes, 'decode_upload', lambda recipe_request: decoded.append(1) or original_decode(recipe_request))
+
+    assert post_image(client).status_code == 200
+    response = post_image(client)
+
+    assert response.status_code == 429
+    assert response.get_json()['error']['code'] == 'rate_limited'
+    assert 55 <= int(response.headers['Retry-After']) <= 60
+    assert decoded == [1]
+    assert post_image(client, ip='198.51.100.9').status_code == 200
+    assert client.get('/api/health').status_code == 200
+
+
+def test_api_key_is_limited_across_client_ips(client, monkeypatch):
+    use_limits(monkeypatch, {('recipe', 'key'): (1 / 60, 1)})
+
+    assert post_image(client, ip='203.0.113.1').status_code == 200
+    assert post_image(client, ip='203.0.113.2').status_code == 429
+    assert post_image(client, ip='203.0.113.2', api_key='other-key').status_code == 200
+
+
+def test_job_submissions_share_the_recipe_limits(client, monkeypatch):
+    use_limits(monkeypatch, {('recipe', 'ip'): (1 / 60, 1)})
+
+    assert post_image(client).status_code == 200
+    response = post_image(client, path='/api/jobs')
+
+    assert response.status_code == 429
+    assert response.get_json()['error']['code'] == 'rate_limited'
+
+
+def post_batch(client, count, *, ip='203.0.113.7'):
+    files = []
+    for _ in range(count):
+        buffer = io.BytesIO()
+        Image.new('RGB', (32, 32), color=(90, 160, 60)).save(buffer, format='PNG')
+        buffer.seek(0)
+        files.append((buffer, 'dish.png'))
+    return client.post(
+        '/api/generate-recipe/batch',
+        data={'files': files, 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+        environ_base={'REMOTE_ADDR': ip},
+    )
+
+
+def test_batches_larger_than_the_burst_are_refused(client, monkeypatch):
+    use_limits(monkeypatch, {('recipe', 'ip'): (1 / 60, 3)})
+
+    response = post_batch(client, 4)
+
+    assert response.status_code == 413
+    error = response.get_json()['error']
+    assert error['code'] == 'batch_exceeds_rate_limit'
+    assert 'at most 3 images' in error['hint']
+    assert post_batch(client, 3).status_code == 200
+    assert post_batch(client, 1).status_code == 429
+
+
+def test_validate_key_is_rate_limited(client, monkeypatch):
+    use_limits(monkeypatch, {('validate', 'ip'): (1 / 60, 2)})
+    monkeypatch.setattr(providers, '_validation_cache', None)
+    monkeypatch.setitem(providers.KEY_VALIDATORS, 'openai', lambda api_key: {'valid': True, 'models': []})
+
+    statuses = [
+        client.post('/api/validate-key', json={'provider': 'openai', 'apiKey': f'sk-{index}'}).status_code
+        for index in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
@@ -0,0 +1,130 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api.cache import MemoryCacheBackend, RecipeCache
+from api.repair import invalid_fields, merge_repair
+from app import create_app
+from config import Config
+
+COMPLETE = {
+    'name': 'Pad Thai',
+    'prep_time': '15 min',
+    'cook_time': '10 min',
+    'servings': 2,
+    'ingredients_with_measurements': ['200g rice noodles', '2 eggs'],
+    'instructions': ['Soak the noodles.', 'Stir-fry everything.'],
+    'nutrition': {'calories': '550 kcal', 'protein': '20g', 'fat': '18g', 'carbs': '70g'},
+    'tips': 'Finish with lime.',
+}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with repair enabled and an empty in-memory cache."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(MemoryCacheBackend(max_entries=10, max_bytes=10**6), default_ttl=60))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(Config, 'RECIPE_REPAIR_ENABLED', True)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def install_handler(monkeypatch, vision_text, repair_text=None, repair_error=None):
+    """Gemini stub answering vision calls with vision_text and text-only calls with the repair."""
+    calls = []
+
+    def handler(**kwargs):
+        calls.append(kwargs)
+        if kwargs['image_bytes'] is not None:
+            return vision_text, {'model': kwargs['model']}
+        if repair_error is not None:
+            raise repair_error
+        return repair_text, {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', handler)
+    return calls
+
+
+def post_image(client):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(90, 30, 160)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+    )
+
+
+def test_missing_fields_are_requested_without_the_image(client, monkeypatch):
+    partial = {key: value for key, value in COMPLETE.items() if key not in {'instructions', 'nutrition'}}
+    repair = {'instructions': COMPLETE['instructions'], 'nutrition': COMPLETE['nutrition']}
+    calls = install_handler(monkeypatch, json.dumps(partial), json.dumps(repair))
+
+    body = post_image(client).get_json()
+
+    assert len(calls) == 2
+    assert calls[1]['image_bytes'] is None and calls[1]['mime_type'] is None
+    assert '"instructions"' in calls[1]['prompt'] and 'Pad Thai' in calls[1]['prompt']
+    assert body['recipe']['steps'] == COMPLETE['instructions']
+    assert body['recipe']['nutrition'] == COMPLETE['nutrition']
+    assert body['meta']['repair']['fields'] == ['instructions', 'nutrition']
+    assert body['meta']['repair']['repaired'] == ['instructions', 'nutrition']
+    assert body['meta']['repair']['elapsed_ms'] >= 0
+    assert 'warning' not in body
+
+    # The repaired recipe was cached, so the next identical request makes no calls.
+    assert post_image(client).get_json()['meta']['cache']['status'] == 'hit'
+    assert len(calls) == 2
+
+
+def test_complete_recipe_skips_repair(client, monkeypatch):
+    calls = install_handler(monkeypatch, json.dumps(COMPLETE))
+
+    body = post_image(client).get_json()
+
+    assert len(calls) == 1
+    assert 'repair' not in body['meta']
+
+
+def test_failed_repair_keeps_parsed_recipe(client, monkeypatch):
+    partial = {key: value for key, value in COMPLETE.items() if key != 'nutrition'}
+    install_handler(monkeypatch, json.dumps(partial), repair_error=recipes.ProviderError('gemini_error', 'Gemini failed.'))
+
+    response = post_image(client)
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['recipe']['title'] == 'Pad Thai'
+    assert body['meta']['repair'] == {**body['meta']['repair'], 'fields': ['nutrition'], 'repaired': [], 'error': 'gemini_error'}
+
+
+def test_repair_completes_truncated_response(client, monkeypatch):
+    text = json.dumps(COMPLETE, indent=2)
+    truncated = text[:text.index('"nutrition"') + 20]
+    install_handler(monkeypatch, truncated, json.dumps({'nutrition': COMPLETE['nutrition'], 'tips': 'x'}))
+
+    body = post_image(client).get_json()
+
+    assert body['meta']['repair']['repaired'] == ['nutrition']
+    assert body['recipe']['nutrition'] == COMPLETE['nutrition']
+    assert 'warning' not in body
+
+
+def test_invalid_fields_and_merge_only_accept_valid_values():
+    broken = {**COMPLETE, 'servings': 'N/A', 'instructions': [], 'tips': 3}
+    del broken['cook_time']
+    assert invalid_fields(broken) == ['cook_time', 'servings', 'instructions', 'tips']
+    assert invalid_fields({key: value for key, value in COMPLETE.items() if key != 'tips'}) == []
+
+    merged, repaired = merge_repair(broken, {'cook_time': '', 'servings': 4, 'instructions': ['Boil.']}, ['cook_time', 'servings', 'instructions'])
+    assert repaired == ['servings', 'instructions']
+    assert 'cook_time' not in merged
+    assert merge_repair(broken, None, ['servings']) == (broken, [])
@@ -0,0 +1,359 @@
+import io
+import json
+import time
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import latency, recipes, routing
+from api.admission import Saturated
+from api.latency import LatencyTracker
+from api.recipes import ProviderError
+from api.routing import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderRouter, is_provider_fault, parse_chain
+from app import create_app
+from config import Config
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_breaker(clock=None):
+    return CircuitBreaker(
+        window_size=10,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=1.0,
+        open_seconds=30,
+        clock=clock or FakeClock(),
+    )
+
+
+def make_router():
+    return ProviderRouter(LatencyTracker(50), make_breaker, min_samples=3)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with caching disabled, fresh breakers and server keys for every provider."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    tracker = LatencyTracker(50)
+    monkeypatch.setattr(latency, '_tracker', tracker)
+    monkeypatch.setattr(routing, '_router', ProviderRouter(tracker, make_breaker, min_samples=3))
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', True)
+    monkeypatch.setattr(Config, 'PROVIDER_FALLBACK_CHAIN', 'gemini,openai,anthropic')
+    monkeypatch.setattr(Config, 'get_api_key_for', classmethod(lambda cls, provider: f'server-{provider}-key'))
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def fake_handler(name, calls, *, latency=0.0, error=None):
+    """Provider stub that sleeps for latency, then raises error or returns a recipe named after itself."""
+    def handler(**kwargs):
+        calls.append(name)
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        return json.dumps({'name': f'{name} soup'}), {'model': kwargs['model']}
+    return handler
+
+
+def install_handlers(monkeypatch, calls, **overrides):
+    for provider in ('gemini', 'openai', 'anthropic'):
+        handler = overrides.get(provider) or fake_handler(provider, calls)
+        monkeypatch.setattr(recipes, f'generate_with_{provider}', handler)
+
+
+def image_file():
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(120, 80, 20)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return (buffer, 'dish.png')
+
+
+def post_recipe(client, **form):
+    return client.post('/api/generate-recipe', data={'file': image_file(), **form}, content_type='multipart/form-data')
+
+
+def test_breaker_opens_on_failure_rate_and_recovers_after_trial():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for ok in (True, False, True, False):
+        breaker.record(ok)
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+
+def test_released_trial_without_outcome_lets_the_next_trial_through():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(False)
+
+    clock.now = 31
+    assert breaker.allow() is True
+    breaker.release()
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    breaker.record(True)
+    breaker.release()
+    assert breaker.state == CLOSED
+
+
+def test_breaker_counts_slow_calls_and_reopens_on_failed_trial():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    for _ in range(4):
+        breaker.record(True, seconds=5.0)
+    assert breaker.state == OPEN
+
+    clock.now = 31
+    assert breaker.allow() is True
+    breaker.record(False)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()['retry_in_seconds'] == 30
+
+
+def test_router_ranks_fastest_healthy_first():
+    router = make_router()
+    for _ in range(3):
+        router.tracker.record('gemini', 'g', 2.0)
+        router.tracker.record('openai', 'o', 0.5)
+    assert router.rank([('gemini', 'g'), ('openai', 'o'), ('anthropic', 'a')]) == [
+        ('openai', 'o'), ('gemini', 'g'), ('anthropic', 'a'),
+    ]
+
+    for _ in range(4):
+        router.record('openai', 'o', ok=False)
+    assert router.rank([('gemini', 'g'), ('openai', 'o')]) == [('gemini', 'g'), ('openai', 'o')]
+
+
+def test_parse_chain_and_fault_classification():
+    assert parse_chain('gemini:gemini-2.5-flash, openai ,') == [('gemini', 'gemini-2.5-flash'), ('openai', None)]
+
+    class StatusError(Exception):
+        def __init__(self, status_code):
+            super().__init__(status_code)
+            self.status_code = status_code
+
+    def wrapped(cause):
+        error = ProviderError('openai_error', 'failed')
+        error.__cause__ = cause
+        return error
+
+    assert is_provider_fault(wrapped(StatusError(401))) is False
+    assert is_provider_fault(wrapped(StatusError(429))) is True
+    assert is_provider_fault(wrapped(StatusError(503))) is True
+    assert is_provider_fault(wrapped(TimeoutError())) is True
+
+
+def test_pinned_provider_falls_back_along_chain(client, monkeypatch):
+    calls = []
+    install_handlers(monkeypatch, calls, gemini=fake_handler('gemini', calls, error=ProviderError('gemini_error', 'down')))
+
+    response = post_recipe(client, provider='gemini')
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['recipe']['title'] == 'openai soup'
+    assert data['meta']['provider'] == 'openai'
+    assert [attempt['outcome'] for attempt in data['meta']['routing']['attempts']] == ['error', 'ok']
+    assert calls == ['gemini', 'openai']
+
+
+def test_client_keys_do_not_fall_back_to_server_keys(client, monkeypatch):
+    calls = []
+    install_handlers(monkeypatch, calls, gemini=fake_handler('gemini', calls, error=ProviderError('gemini_error', 'down')))
+
+    response = post_recipe(client, provider='gemini', api_key='user-key')
+
+    assert response.status_code == 500
+    assert response.get_json()['error']['code'] == 'gemini_error'
+    assert calls == ['gemini']
+
+
+def test_client_errors_do_not_fall_back(client, monkeypatch):
+    calls = []
+
+    class Unauthorized(Exception):
+        status_code = 401
+
+    def bad_key(**kwargs):
+        calls.append('gemini')
+        raise ProviderError('gemini_error', 'bad key') from Unauthorized()
+
+    install_handlers(monkeypatch, calls, gemini=bad_key)
+
+    response = post_recipe(client, provider='gemini', api_key='user-key')
+    assert response.status_code == 500
+    assert response.get_json()['error']['code'] == 'gemini_error'
+    assert calls == ['gemini']
+    assert routing.get_provider_router().breaker('gemini', 'gemini-2.5-flash').snapshot()['failures'] == 0
+
+
+def test_open_breaker_skips_backend_and_shows_in_status(client, monkeypatch):
+    calls = []
+    install_handlers(monkeypatch, calls, gemini=fake_handler('gemini', calls, error=ProviderError('gemini_error', 'down')))
+
+    for _ in range(4):
+        post_recipe(client, provider='gemini')
+    calls.clear()
+
+    response = post_recipe(client, provider='gemini')
+    attempts = response.get_json()['meta']['routing']['attempts']
+    assert attempts[0] == {'provider': 'gemini', 'model': 'gemini-2.5-flash', 'outcome': 'skipped'}
+    assert calls == ['openai']
+
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', 'ops-secret')
+    status = client.get('/api/providers/status', headers={'Authorization': 'Bearer ops-secret'}).get_json()
+    states = {backend['provider']: backend['state'] for backend in status['backends']}
+    assert states['gemini'] == OPEN
+    assert states['openai'] == CLOSED
+    assert [entry['provider'] for entry in status['fallback_chain']] == ['gemini', 'openai', 'anthropic']
+
+
+def test_provider_status_is_hidden_without_the_operator_token(client, monkeypatch):
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', '')
+    assert client.get('/api/providers/status').status_code == 404
+
+    monkeypatch.setattr(Config, 'OPERATOR_TOKEN', 'ops-secret')
+    assert client.get('/api/providers/status').status_code == 401
+    assert client.get('/api/providers/status', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/api/providers/status', headers={'Authorization': 'Bearer ops-secret'}).status_code == 200
+
+
+def test_unpinned_request_routes_to_fastest_backend(client, monkeypatch):
+    calls = []
+    install_handlers(
+        monkeypatch,
+        calls,
+        gemini=fake_handler('gemini', calls, latency=0.05),
+        openai=fake_handler('openai', calls, latency=0.0),
+    )
+    tracker = latency.get_latency_tracker()
+    for _ in range(3):
+        tracker.record('gemini', 'gemini-2.5-flash', 0.05)
+        tracker.record('openai', 'gpt-4o-mini', 0.001)
+
+    response = post_recipe(client)
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data['meta']['provider'] == 'openai'
+    assert calls == ['openai']
+
+
+def test_all_backends_open_returns_503(client, monkeypatch):
+    calls = []
+    install_handlers(monkeypatch, calls)
+    router = routing.get_provider_router()
+    for provider, model in (('gemini', 'gemini-2.5-flash'), ('openai', 'gpt-4o-mini'), ('anthropic', Config.get_default_model_for('anthropic'))):
+        for _ in range(4):
+            router.record(provider, model, ok=False)
+
+    response = post_recipe(client, provider='gemini')
+    assert response.status_code == 503
+    assert response.get_json()['error']['code'] == 'providers_unavailable'
+    assert calls == []
+
+
+def half_open_gemini(monkeypatch):
+    """Trip the Gemini breaker and let its cooldown pass, so the next call is the half-open trial."""
+    clock = FakeClock()
+    router = ProviderRouter(latency.get_latency_tracker(), lambda: make_breaker(clock), min_samples=3)
+    monkeypatch.setattr(routing, '_router', router)
+    breaker = router.breaker('gemini', 'gemini-2.5-flash')
+    for _ in range(4):
+        breaker.record(False)
+    clock.now = 31
+    assert breaker.state == HALF_OPEN
+    return breaker
+
+
+def assert_next_request_is_the_trial(client, monkeypatch, breaker, calls):
+    install_handlers(monkeypatch, calls)
+    response = post_recipe(client, provider='gemini', api_key='user-key')
+    assert response.status_code == 200
+    assert breaker.state == CLOSED
+
+
+def test_trial_rejected_for_the_callers_fault_is_released(client, monkeypatch):
+    calls = []
+    breaker = half_open_gemini(monkeypatch)
+
+    class Unauthorized(Exception):
+        status_code = 401
+
+    def bad_key(**kwargs):
+        raise ProviderError('gemini_error', 'bad key') from Unauthorized()
+
+    install_handlers(monkeypatch, calls, gemini=bad_key)
+    assert post_recipe(client, provider='gemini', api_key='user-key').status_code == 500
+    assert breaker.snapshot()['state'] == HALF_OPEN
+
+    assert_next_request_is_the_trial(client, monkeypatch, breaker, calls)
+
+
+def test_trial_shed_by_the_provider_limiter_is_released(client, monkeypatch):
+    calls = []
+    breaker = half_open_gemini(monkeypatch)
+    install_handlers(monkeypatch, calls)
+
+    class FullLimiter:
+        def acquire(self, name):
+            raise Saturated(name, 'queue_full', 1)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(recipes, 'get_provider_limiter', lambda: FullLimiter())
+        response = post_recipe(client, provider='gemini', api_key='user-key')
+    assert response.get_json()['error']['code'] == 'provider_busy'
+    assert calls == []
+
+    assert_next_request_is_the_trial(client, monkeypatch, breaker, calls)
+
+
+def test_trial_out_of_deadline_is_released(client, monkeypatch):
+    calls = []
+    breaker = half_open_gemini(monkeypatch)
+    install_handlers(monkeypatch, calls)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Config, 'PROVIDER_MIN_ATTEMPT_SECONDS', 10_000)
+        response = post_recipe(client, provider='gemini', api_key='user-key')
+    assert response.get_json()['error']['code'] == 'deadline_exceeded'
+    assert calls == []
+
+    assert_next_request_is_the_trial(client, monkeypatch, breaker, calls)
+
+
+def test_stream_closed_by_a_disconnected_client_releases_the_trial(monkeypatch):
+    breaker = half_open_gemini(monkeypatch)
+    assert breaker.allow() is True
+    closed = []
+
+    def provider_stream():
+        try:
+            yield 'more'
+        finally:
+            closed.append(True)
+
+    stream = recipes.release_breaker_after(provider_stream(), 'first', breaker)
+    assert [next(stream), next(stream)] == ['first', 'more']
+    stream.close()
+
+    assert closed == [True]
+    assert breaker.available() is True
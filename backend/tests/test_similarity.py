@@ -0,0 +1,128 @@
+import io
+import random
+import json
+
+import pytest
+from PIL import Image, ImageDraw
+
+from api import cache as cache_module
+from api import recipes
+from api import similarity
+from api.cache import MemoryCacheBackend, RecipeCache
+from api.similarity import HammingIndex, dhash, hamming_distance
+from app import create_app
+
+RECIPE_JSON = json.dumps({
+    'name': 'Pad Thai',
+    'ingredients_with_measurements': ['200g rice noodles'],
+    'instructions': ['Soak the noodles.'],
+})
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with a fresh cache and near-duplicate index."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(
+        MemoryCacheBackend(max_entries=16, max_bytes=1024 * 1024), default_ttl=60,
+    ))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(similarity, '_similarity_index', None)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def create_dish_image(seed=1, size=(240, 180)):
+    """Draw a deterministic scene with enough structure for a meaningful hash."""
+    rng = random.Random(seed)
+    img = Image.new('RGB', size, color=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x0, y0 = rng.randrange(size[0]), rng.randrange(size[1])
+        x1, y1 = x0 + rng.randrange(20, 120), y0 + rng.randrange(20, 120)
+        draw.ellipse((x0, y0, x1, y1), fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    return img
+
+
+def encode(img, fmt, **options):
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def test_dhash_survives_reencoding_and_resizing():
+    img = create_dish_image()
+    reencoded = Image.open(io.BytesIO(encode(img, 'JPEG', quality=40)))
+    resized = img.resize((120, 90))
+    assert hamming_distance(dhash(img), dhash(reencoded)) <= 4
+    assert hamming_distance(dhash(img), dhash(resized)) <= 4
+    assert hamming_distance(dhash(img), dhash(create_dish_image(seed=2))) > 10
+
+
+def test_index_finds_nearest_within_radius_and_group():
+    index = HammingIndex(max_distance=4, max_entries=100)
+    index.add(0b1111, 'en', 'a')
+    index.add(0b1111 << 40, 'en', 'b')
+    index.add(0b1110, 'es', 'c')
+    assert index.nearest(0b1011, 'en') == ('a', 1)
+    assert index.nearest(0b1110, 'es') == ('c', 0)
+    assert index.nearest((0b1111 << 40) ^ 0b11111, 'en') is None
+
+
+def test_index_matches_brute_force_on_random_hashes():
+    rng = random.Random(7)
+    index = HammingIndex(max_distance=6, max_entries=10000)
+    stored = [rng.getrandbits(64) for _ in range(2000)]
+    for position, value in enumerate(stored):
+        index.add(value, None, position)
+    for _ in range(200):
+        query = rng.choice(stored) ^ sum(1 << rng.randrange(64) for _ in range(rng.randrange(8)))
+        expected = min(hamming_distance(query, value) for value in stored)
+        match = index.nearest(query, None)
+        if expected <= 6:
+            assert match is not None and match[1] == expected
+        else:
+            assert match is None
+
+
+def test_index_evicts_oldest_and_discards():
+    index = HammingIndex(max_distance=2, max_entries=2)
+    index.add(1, None, 'a')
+    index.add(2, None, 'b')
+    index.add(4, None, 'c')
+    assert len(index) == 2
+    assert index.nearest(1, None, max_distance=0) is None
+    index.discard(None, 'b')
+    assert index.nearest(2, None, max_distance=0) is None
+    assert index.nearest(4, None, max_distance=0) == ('c', 0)
+
+
+def test_reencoded_photo_is_served_without_provider_call(client, monkeypatch):
+    calls = []
+
+    def fake_handler(**kwargs):
+        calls.append(kwargs)
+        return RECIPE_JSON, {'model': kwargs['model']}
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', fake_handler)
+    img = create_dish_image()
+    form = {'provider': 'gemini', 'api_key': 'test-key'}
+
+    first = client.post('/api/generate-recipe', data={**form, 'file': (io.BytesIO(encode(img, 'PNG')), 'dish.png')},
+                        content_type='multipart/form-data')
+    assert first.get_json()['meta']['cache']['status'] == 'miss'
+
+    second = client.post('/api/generate-recipe',
+                         data={**form, 'file': (io.BytesIO(encode(img, 'JPEG', quality=50)), 'dish.jpg')},
+                         content_type='multipart/form-data')
+    data = second.get_json()
+    assert data['meta']['cache']['status'] == 'near_hit'
+    assert data['recipe']['title'] == 'Pad Thai'
+    assert len(calls) == 1
+
+    other = client.post('/api/generate-recipe',
+                        data={**form, 'file': (io.BytesIO(encode(create_dish_image(seed=3), 'PNG')), 'other.png')},
+                        content_type='multipart/form-data')
+    assert other.get_json()['meta']['cache']['status'] == 'miss'
+    assert len(calls) == 2
@@ -0,0 +1,65 @@
+import json
+import os
+import subprocess
+import sys
+
+from api import clients
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SDK_PREFIXES = ('google.generativeai', 'google.ai', 'openai', 'anthropic', 'httpx')
+# Importing the app with all provider SDKs took ~1.6s; without them ~0.3s.
+# The ceiling is loose enough for slow CI machines but still catches an SDK
+# (or another heavy dependency) creeping back into the import path.
+IMPORT_BUDGET_SECONDS = 1.0
+
+
+def run_python(*args):
+    env = {**os.environ, 'PROVIDER_SDK_PREWARM': ''}
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env,
+        capture_output=True, text=True, timeout=120, check=True,
+    )
+
+
+def parse_importtime(stderr):
+    """Return {module: cumulative_seconds} from python -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+
+def test_app_import_skips_provider_sdks_and_stays_within_budget():
+    modules = parse_importtime(run_python('-X', 'importtime', '-c', 'import app').stderr)
+
+    assert not [name for name in modules if name.startswith(SDK_PREFIXES)]
+    assert modules['app'] < IMPORT_BUDGET_SECONDS
+
+
+def test_health_and_validate_key_never_load_provider_sdks():
+    script = '''
+import json, sys
+from api import providers
+providers.KEY_VALIDATORS['openai'] = lambda api_key: {'valid': True, 'models': []}
+from app import app
+client = app.test_client()
+assert client.get('/api/health').status_code == 200
+assert client.post('/api/validate-key', json={'provider': 'openai', 'apiKey': 'sk-test'}).status_code == 200
+print(json.dumps(sorted(name for name in sys.modules if name.startswith(%r))))
+''' % (SDK_PREFIXES,)
+
+    assert json.loads(run_python('-c', script).stdout.splitlines()[-1]) == []
+
+
+def test_prewarm_loads_sdks_in_the_background():
+    assert clients.prewarm_sdks(['not-a-provider']) is None
+
+    thread = clients.prewarm_sdks(['openai'])
+    thread.join(timeout=60)
+
+    assert not thread.is_alive()
+    assert 'openai' in clients.sdk_load_times()
+    assert clients.load_sdk('openai') is sys.modules['openai']
@@ -0,0 +1,129 @@
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api.cache import MemoryCacheBackend, RecipeCache
+from api.streaming import RecipeStreamParser
+from app import create_app
+
+RECIPE = {
+    'name': 'Shakshuka "Deluxe"',
+    'prep_time': '10 min',
+    'cook_time': '20 min',
+    'servings': '2',
+    'ingredients_with_measurements': ['4 eggs', '1 can tomatoes, {crushed}', '1 tsp cumin'],
+    'instructions': ['Simmer the sauce.', 'Crack in the eggs.'],
+    'nutrition': {'calories': '300 kcal', 'protein': '18g'},
+    'tips': 'Serve with bread.',
+}
+RAW_TEXT = '```json\n' + json.dumps(RECIPE, indent=2) + '\n```'
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with a fresh in-memory recipe cache."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', RecipeCache(
+        MemoryCacheBackend(max_entries=16, max_bytes=1024 * 1024), default_ttl=60,
+    ))
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(recipes, 'get_similarity_index', lambda: None)
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def create_test_image():
+    img_bytes = io.BytesIO()
+    Image.new('RGB', (64, 64), color='orange').save(img_bytes, format='PNG')
+    return img_bytes.getvalue()
+
+
+def parse_sse(body):
+    events = []
+    for message in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in message.splitlines())
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def post_stream(client, **form):
+    data = {'file': (io.BytesIO(create_test_image()), 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'}
+    data.update(form)
+    return client.post('/api/generate-recipe/stream', data=data, content_type='multipart/form-data')
+
+
+def test_parser_emits_fields_regardless_of_chunking():
+    for size in (1, 3, 17, len(RAW_TEXT)):
+        parser = RecipeStreamParser()
+        events = []
+        for offset in range(0, len(RAW_TEXT), size):
+            events.extend(parser.feed(RAW_TEXT[offset:offset + size]))
+        assert events == [
+            ('name', {'name': 'Shakshuka "Deluxe"'}),
+            ('ingredient', {'index': 0, 'text': '4 eggs'}),
+            ('ingredient', {'index': 1, 'text': '1 can tomatoes, {crushed}'}),
+            ('ingredient', {'index': 2, 'text': '1 tsp cumin'}),
+            ('step', {'index': 0, 'text': 'Simmer the sauce.'}),
+            ('step', {'index': 1, 'text': 'Crack in the eggs.'}),
+        ]
+
+
+def test_parser_ignores_nested_keys_and_trailing_text():
+    parser = RecipeStreamParser()
+    text = 'Here you go: {"nutrition": {"name": "x"}, "name": "Soup"} and {"name": "ignored"}'
+    assert parser.feed(text) == [('name', {'name': 'Soup'})]
+
+
+def test_stream_endpoint_emits_incremental_events_then_final_payload(client, monkeypatch):
+    def fake_stream(**kwargs):
+        for offset in range(0, len(RAW_TEXT), 25):
+            yield RAW_TEXT[offset:offset + 25]
+
+    monkeypatch.setattr(recipes, 'stream_with_gemini', fake_stream)
+    response = post_stream(client)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = parse_sse(response.get_data(as_text=True))
+    names = [event for event, _ in events]
+    assert names == ['name', 'ingredient', 'ingredient', 'ingredient', 'step', 'step', 'complete']
+    final = events[-1][1]
+    assert final['success'] is True
+    assert final['recipe'] == recipes.transform_recipe(RECIPE)
+    assert final['meta']['cache']['status'] == 'miss'
+
+
+def test_stream_endpoint_replays_cached_recipe(client, monkeypatch):
+    calls = []
+
+    def fake_stream(**kwargs):
+        calls.append(kwargs)
+        yield RAW_TEXT
+
+    monkeypatch.setattr(recipes, 'stream_with_gemini', fake_stream)
+    post_stream(client).get_data()
+    events = parse_sse(post_stream(client).get_data(as_text=True))
+    assert len(calls) == 1
+    assert events[0] == ('name', {'name': 'Shakshuka "Deluxe"'})
+    assert events[-1][1]['meta']['cache']['status'] == 'hit'
+
+
+def test_stream_endpoint_reports_provider_errors_as_events(client, monkeypatch):
+    def failing_stream(**kwargs):
+        yield '{"name": "Par'
+        raise recipes.ProviderError('gemini_error', 'Gemini could not process the image.')
+
+    monkeypatch.setattr(recipes, 'stream_with_gemini', failing_stream)
+    events = parse_sse(post_stream(client).get_data(as_text=True))
+    assert events[-1][0] == 'error'
+    assert events[-1][1]['error']['code'] == 'gemini_error'
+
+
+def test_stream_endpoint_validates_before_streaming(client):
+    response = client.post('/api/generate-recipe/stream', data={}, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert response.get_json()['error']['code'] == 'missing_file'
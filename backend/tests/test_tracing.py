@@ -0,0 +1,143 @@
+import io
+import json
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import providers, recipes, tracing
+from api.providers import KeyValidationCache
+from api.tracing import BackgroundSpanExporter, JsonlSpanExporter, OtlpSpanExporter
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client without a result cache, routing or span export."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(tracing, '_exporter', None)
+    monkeypatch.setattr(tracing, '_exporter_ready', True)
+    monkeypatch.setattr(
+        recipes, 'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Ramen'}), {'model': kwargs['model']}),
+    )
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+def post_image(client, headers=None):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color=(220, 180, 40)).save(buffer, format='PNG')
+    buffer.seek(0)
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (buffer, 'dish.png'), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+        headers=headers or {},
+    )
+
+
+def timings(response):
+    return dict(re.findall(r'(\w+);dur=([\d.]+)', response.headers['Server-Timing']))
+
+
+def test_generate_recipe_reports_server_timing_and_request_id(client):
+    response = post_image(client, {'X-Request-ID': 'req-123'})
+
+    assert response.status_code == 200
+    assert response.headers['X-Request-ID'] == 'req-123'
+    phases = timings(response)
+    assert {'read_upload', 'decode', 'provider', 'parse', 'serialize', 'total'} <= set(phases)
+    assert float(phases['total']) >= float(phases['provider'])
+
+
+def test_validate_key_reports_provider_time(client, monkeypatch):
+    cache = KeyValidationCache(
+        {'openai': lambda api_key: {'valid': True, 'models': []}},
+        ttl=60, invalid_ttl=60, refresh_after=30, max_entries=2,
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+    monkeypatch.setattr(providers, '_validation_cache', cache)
+
+    response = client.post('/api/validate-key', json={'provider': 'openai', 'apiKey': 'sk-live'})
+
+    assert response.status_code == 200
+    assert 'provider' in timings(response)
+
+
+def test_traceparent_is_continued_and_bad_request_ids_are_replaced(client):
+    trace_id = '4bf92f3577b34da6a3ce929d0e0e4736'
+    response = post_image(client, {'traceparent': f'00-{trace_id}-00f067aa0ba902b7-01', 'X-Request-ID': 'bad id; <script>'})
+    assert response.headers['X-Request-ID'] == trace_id
+
+
+def test_provider_errors_and_logs_carry_the_request_id(client, monkeypatch, caplog):
+    def failing(**kwargs):
+        recipes.logger.warning('calling gemini')
+        raise recipes.ProviderError('gemini_error', 'Gemini could not process the image.', debug='quota exceeded')
+
+    monkeypatch.setattr(recipes, 'generate_with_gemini', failing)
+    monkeypatch.setattr(Config, 'FLASK_ENV', 'development')
+
+    with caplog.at_level(logging.WARNING, logger='api.recipes'):
+        response = post_image(client, {'X-Request-ID': 'req-err'})
+
+    assert response.get_json()['error']['debug'] == 'request_id=req-err: quota exceeded'
+    assert {record.request_id for record in caplog.records if record.name == 'api.recipes'} == {'req-err'}
+
+
+def test_jsonl_export_writes_root_and_child_spans(client, monkeypatch, tmp_path):
+    exporter = BackgroundSpanExporter(JsonlSpanExporter(str(tmp_path / 'spans.jsonl')))
+    monkeypatch.setattr(tracing, '_exporter', exporter)
+
+    post_image(client, {'X-Request-ID': 'req-jsonl'})
+    assert exporter.flush()
+
+    spans = [json.loads(line) for line in (tmp_path / 'spans.jsonl').read_text().splitlines()]
+    root = spans[0]
+    assert root['name'] == 'api.generate_recipe'
+    assert root['attributes']['http.status_code'] == 200
+    assert {span['trace_id'] for span in spans} == {root['trace_id']}
+    assert {span['parent_span_id'] for span in spans[1:]} == {root['span_id']}
+    provider_span = next(span for span in spans if span['name'] == 'provider')
+    assert provider_span['attributes'] == {'provider': 'gemini', 'model': 'gemini-2.5-flash', 'outcome': 'ok'}
+
+
+def test_otlp_export_posts_to_collector():
+    received = []
+
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append((self.path, json.loads(self.rfile.read(int(self.headers['Content-Length'])))))
+            self.send_response(200)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        trace = tracing.Trace('api.generate_recipe', request_id='req-otlp')
+        trace.add('decode', 0.01)
+        trace.finish()
+        OtlpSpanExporter(f'http://127.0.0.1:{server.server_port}/v1/traces').export(trace, {'http.status_code': 200})
+    finally:
+        server.shutdown()
+
+    path, body = received[0]
+    assert path == '/v1/traces'
+    spans = body['resourceSpans'][0]['scopeSpans'][0]['spans']
+    assert [span['name'] for span in spans] == ['api.generate_recipe', 'decode']
+    assert spans[1]['parentSpanId'] == spans[0]['spanId'] == trace.span_id
+    assert spans[0]['attributes'] == [{'key': 'http.status_code', 'value': {'intValue': '200'}}]
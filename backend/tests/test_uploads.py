@@ -0,0 +1,117 @@
+import hashlib
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from api import cache as cache_module
+from api import recipes
+from api.cache import make_cache_key, make_cache_key_for_digest
+from api.uploads import SNIFF_BYTES, SpooledUpload, UploadRejected, sniff_image_type
+from app import create_app
+from config import Config
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Create a test client with routing and the result cache disabled."""
+    monkeypatch.setattr(cache_module, '_recipe_cache', None)
+    monkeypatch.setattr(cache_module, '_recipe_cache_ready', True)
+    monkeypatch.setattr(Config, 'ROUTER_ENABLED', False)
+    monkeypatch.setattr(
+        recipes, 'generate_with_gemini',
+        lambda **kwargs: (json.dumps({'name': 'Borscht'}), {'model': kwargs['model']}),
+    )
+    app = create_app()
+    app.config['TESTING'] = True
+    with app.test_client() as client:
+        yield client
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def readinto(self, buffer):
+        count = super().readinto(buffer)
+        self.consumed += count
+        return count
+
+
+def noisy_png(size):
+    buffer = io.BytesIO()
+    Image.effect_noise((size, size), 64).convert('RGB').save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def post_image(client, data, filename='dish.png'):
+    return client.post(
+        '/api/generate-recipe',
+        data={'file': (io.BytesIO(data), filename), 'provider': 'gemini', 'api_key': 'test-key'},
+        content_type='multipart/form-data',
+    )
+
+
+def test_formats_are_sniffed_from_the_header():
+    assert sniff_image_type(b'\xff\xd8\xff\xe0\x00\x10JFIF') == 'image/jpeg'
+    assert sniff_image_type(noisy_png(4)) == 'image/png'
+    assert sniff_image_type(b'GIF89a\x01\x00') == 'image/gif'
+    assert sniff_image_type(b'RIFF\x24\x00\x00\x00WEBPVP8 ') == 'image/webp'
+    assert sniff_image_type(b'RIFF\x24\x00\x00\x00WAVEfmt ') is None
+    assert sniff_image_type(b'%PDF-1.7') is None
+
+
+def test_non_image_is_rejected_after_reading_only_its_header():
+    stream = CountingStream(b'<html>' + b'x' * 1_000_000)
+
+    with pytest.raises(UploadRejected) as rejected:
+        SpooledUpload.from_stream(stream, max_bytes=10**7, memory_bytes=1024)
+
+    assert rejected.value.reason == 'not_an_image'
+    assert stream.consumed == SNIFF_BYTES
+
+
+def test_large_upload_spools_to_disk_and_hashes_like_the_cache_key():
+    data = noisy_png(300)
+    upload = SpooledUpload.from_stream(io.BytesIO(data), max_bytes=len(data), memory_bytes=16 * 1024)
+
+    assert upload.size == len(data) and upload.mime_type == 'image/png'
+    assert upload.open()._rolled
+    assert upload.open().read() == data
+    assert upload.sha256 == hashlib.sha256(data).digest()
+    options = dict(language='en', dietary_restrictions='', cuisine_preference='', provider='gemini', model='m')
+    assert make_cache_key_for_digest(upload.sha256, **options) == make_cache_key(data, **options)
+
+    with pytest.raises(UploadRejected) as rejected:
+        SpooledUpload.from_stream(io.BytesIO(data), max_bytes=len(data) - 1, memory_bytes=16 * 1024)
+    assert rejected.value.reason == 'too_large'
+
+
+def test_oversized_uploads_get_a_413_problem_response(client, monkeypatch):
+    data = noisy_png(64)
+    monkeypatch.setattr(Config, 'UPLOAD_MAX_BYTES', len(data) - 1)
+    response = post_image(client, data)
+    assert response.status_code == 413
+    assert response.get_json()['error']['code'] == 'file_too_large'
+
+    client.application.config['MAX_CONTENT_LENGTH'] = 1024
+    response = post_image(client, data)
+    assert response.status_code == 413
+    assert response.get_json()['error']['code'] == 'file_too_large'
+
+
+def test_spool_is_closed_when_the_request_ends(client, monkeypatch):
+    seen = []
+    original_decode = recipes.decode_upload
+    monkeypatch.setattr(
+        recipes, 'decode_upload',
+        lambda recipe_request: seen.append(recipe_request.upload) or original_decode(recipe_request),
+    )
+
+    response = post_image(client, noisy_png(32))
+
+    assert response.status_code == 200
+    assert seen[0]._spool.closed
+    assert post_image(client, b'GIF89a but not really').get_json()['error']['code'] == 'invalid_image'